@@ -0,0 +1,38 @@
+"""add game_events table
+
+Revision ID: c2d3e4f5a6b7
+Revises: b1c2d3e4f5a6
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2d3e4f5a6b7'
+down_revision: Union[str, None] = 'b1c2d3e4f5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'game_events',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('session_id', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    op.create_index('ix_game_events_session_kind_seq', 'game_events', ['session_id', 'kind', 'seq'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_game_events_session_kind_seq', table_name='game_events')
+    op.drop_table('game_events')
@@ -0,0 +1,38 @@
+"""add daily_batches
+
+Revision ID: e4f5a6b7c8d9
+Revises: d3e4f5a6b7c8
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4f5a6b7c8d9'
+down_revision: Union[str, None] = 'd3e4f5a6b7c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_batches',
+        sa.Column('tenant_id', sa.String(), nullable=False),
+        sa.Column('mode', sa.String(), nullable=False),
+        sa.Column('batch_date', sa.Date(), nullable=False),
+        sa.Column('items', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('tenant_id', 'mode')
+    )
+    op.create_index(op.f('ix_daily_batches_batch_date'), 'daily_batches', ['batch_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_daily_batches_batch_date'), table_name='daily_batches')
+    op.drop_table('daily_batches')
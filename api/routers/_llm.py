@@ -3,10 +3,24 @@
 Provides a single async function `chat_completion(system, user_prompt, *, temperature=0.8, max_tokens=300)`
 that handles model candidate fallback, retries, and returns the assistant text (string).
 If OPENROUTER_API_KEY is not set, raises RuntimeError so callers can provide deterministic fallback.
+
+Candidates are hedged: if the current model has not answered within the hedge delay
+(its recent p90 latency, or LLM_HEDGE_DELAY_MS until enough samples exist) the next
+candidate is fired in parallel and the first answer wins. Per-model latency/error
+stats are kept in a rolling window and used to reorder candidates by recent health.
+
+When the current request asked for a streamed response (see core/streaming.py) the
+first call streams tokens from the provider as they arrive; candidates are then
+hedged on time-to-first-token instead of full completion time.
 """
+import asyncio
 import os
-import httpx
+import time
 from typing import Optional, List
+from services.llm_transport import llm_transport
+from services.model_health import ModelHealthTracker
+from services.llm_cache import llm_cache, make_key
+from services.llm_stream import claim_sink, iter_sse_deltas
 
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
@@ -14,8 +28,17 @@ OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL')
 
 DEFAULT_MODELS = ['meta-llama/llama-3.3-70b-instruct:free', 'google/gemma-3-27b-it:free']
 
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', '1') not in ('0', 'false', 'no')
+LLM_HEDGE_DELAY_MS = float(os.getenv('LLM_HEDGE_DELAY_MS', '4000'))
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '90'))
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', '30'))
 
-def _model_candidates() -> List[str]:
+model_health = ModelHealthTracker(window=int(os.getenv('LLM_HEALTH_WINDOW', '50')))
+# Time-to-first-token per model, used as the hedge delay for streamed calls.
+ttft_health = ModelHealthTracker(window=int(os.getenv('LLM_HEALTH_WINDOW', '50')))
+
+
+def _configured_models() -> List[str]:
     lst: List[str] = []
     if OPENROUTER_MODEL:
         lst.append(OPENROUTER_MODEL)
@@ -25,6 +48,10 @@ def _model_candidates() -> List[str]:
     return lst
 
 
+def _model_candidates() -> List[str]:
+    return model_health.order(_configured_models())
+
+
 async def chat_completion(system: str = None, user_prompt: str = None, *, messages: List[dict] = None, temperature: float = 0.8, max_tokens: int = 300) -> str:
     """Call the OpenRouter-compatible chat completions endpoint and return assistant text.
 
@@ -45,21 +72,42 @@ async def chat_completion(system: str = None, user_prompt: str = None, *, messag
             {'role': 'user', 'content': user_prompt or ""},
         ]
 
-    async with httpx.AsyncClient(timeout=30) as client:
+    sink = claim_sink()
+    if sink is not None:
+        return await _stream_completion(models, url, headers, chat_messages, temperature, max_tokens, sink)
+
+    async def _call(model: str) -> str:
+        payload = {
+            'model': model,
+            'messages': chat_messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+        }
+        start = time.perf_counter()
+        try:
+            resp = await llm_transport.post(url, json=payload, headers=headers, timeout=LLM_REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            data = resp.json()
+            text = (data.get('choices') or [{}])[0].get('message', {}).get('content', '') or ''
+            if not text:
+                raise RuntimeError(f'empty completion from {model}')
+        except asyncio.CancelledError:
+            # Lost the hedge race - not a health signal.
+            raise
+        except Exception:
+            model_health.record_error(model, time.perf_counter() - start)
+            raise
+        model_health.record_success(model, time.perf_counter() - start)
+        return text.strip()
+
+    if LLM_HEDGE_ENABLED:
+        text = await _hedged(models, _call)
+        if text:
+            return text
+    else:
         for model in models:
-            payload = {
-                'model': model,
-                'messages': chat_messages,
-                'temperature': temperature,
-                'max_tokens': max_tokens,
-            }
             try:
-                resp = await client.post(url, json=payload, headers=headers)
-                resp.raise_for_status()
-                data = resp.json()
-                text = (data.get('choices') or [{}])[0].get('message', {}).get('content', '') or ''
-                if text:
-                    return text.strip()
+                return await _call(model)
             except Exception:
                 # try next model
                 continue
@@ -68,16 +116,153 @@ async def chat_completion(system: str = None, user_prompt: str = None, *, messag
     raise RuntimeError('LLM call failed for all model candidates')
 
 
-async def safe_chat_completion(system: str = None, user_prompt: str = None, *, messages: List[dict] = None, temperature: float = 0.8, max_tokens: int = 300, fallback: Optional[str] = None) -> str:
-    """Call chat_completion but return a fallback string when LLM unavailable or errors occur.
+async def _hedged(models: List[str], call, tracker: ModelHealthTracker = None, discard=None):
+    """Run `call(model)` over the candidates with hedging; return the first answer or None.
 
-    This helps routers remain functional in local/dev environments without OPENROUTER_API_KEY.
+    The next candidate is launched when the current one fails or exceeds its hedge
+    delay; whichever in-flight call answers first wins and the rest are cancelled.
+    Extra answers that completed in the same tick are handed to `discard`.
     """
+    tracker = tracker or model_health
+    default_delay = LLM_HEDGE_DELAY_MS / 1000
+    pending = {}
+    next_idx = 0
+
+    def launch() -> str:
+        nonlocal next_idx
+        model = models[next_idx]
+        next_idx += 1
+        pending[asyncio.ensure_future(call(model))] = model
+        return model
+
+    current = launch()
     try:
-        return await chat_completion(system, user_prompt, messages=messages, temperature=temperature, max_tokens=max_tokens)
+        while pending:
+            delay = None
+            if next_idx < len(models):
+                delay = tracker.hedge_delay(current, default_delay, LLM_HEDGE_PERCENTILE)
+            done, _ = await asyncio.wait(set(pending), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            failed = False
+            winner = None
+            for task in done:
+                pending.pop(task, None)
+                if task.exception() is not None:
+                    failed = True
+                elif winner is None:
+                    winner = task
+                elif discard is not None:
+                    await discard(task.result())
+            if winner is not None:
+                return winner.result()
+            # Hedge delay elapsed or a candidate failed: bring in the next one.
+            if (failed or not done) and next_idx < len(models):
+                current = launch()
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_completion(models: List[str], url: str, headers: dict, chat_messages: List[dict], temperature: float, max_tokens: int, sink) -> str:
+    """Stream the completion into `sink` and return the full text once it ends."""
+
+    async def _open(model: str):
+        payload = {
+            'model': model,
+            'messages': chat_messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'stream': True,
+        }
+        start = time.perf_counter()
+        tokens = _stream_tokens(url, payload, headers)
+        try:
+            first = await tokens.__anext__()
+        except asyncio.CancelledError:
+            raise
+        except StopAsyncIteration:
+            model_health.record_error(model, time.perf_counter() - start)
+            raise RuntimeError(f'empty completion from {model}')
+        except Exception:
+            model_health.record_error(model, time.perf_counter() - start)
+            raise
+        ttft_health.record_success(model, time.perf_counter() - start)
+        return model, start, first, tokens
+
+    async def _discard(opened):
+        await opened[3].aclose()
+
+    opened = None
+    if LLM_HEDGE_ENABLED:
+        opened = await _hedged(models, _open, tracker=ttft_health, discard=_discard)
+    else:
+        for model in models:
+            try:
+                opened = await _open(model)
+                break
+            except Exception:
+                continue
+    if opened is None:
+        raise RuntimeError('LLM call failed for all model candidates')
+
+    model, start, first, tokens = opened
+    parts = [first]
+    sink.push(first)
+    try:
+        async for token in tokens:
+            parts.append(token)
+            sink.push(token)
     except Exception:
-        # On any failure, return provided fallback or a generic deterministic message.
-        if fallback is not None:
-            return fallback
-        return "[llm-unavailable] Default response — OpenRouter key not configured or request failed."
+        model_health.record_error(model, time.perf_counter() - start)
+        raise
+    finally:
+        await tokens.aclose()
+    model_health.record_success(model, time.perf_counter() - start)
+    return "".join(parts).strip()
+
+
+async def _stream_tokens(url: str, payload: dict, headers: dict):
+    async with llm_transport.stream(url, json=payload, headers=headers, timeout=LLM_REQUEST_TIMEOUT) as resp:
+        resp.raise_for_status()
+        async for delta in iter_sse_deltas(resp):
+            yield delta
+
+
+def model_stats() -> dict:
+    """Rolling latency/error stats per model, for debug endpoints."""
+    return model_health.snapshot()
+
+
+def ttft_model_stats() -> dict:
+    """Rolling time-to-first-token stats per model for streamed calls."""
+    return ttft_health.snapshot()
+
+
+async def safe_chat_completion(system: str = None, user_prompt: str = None, *, messages: List[dict] = None, temperature: float = 0.8, max_tokens: int = 300, fallback: Optional[str] = None, cache_site: Optional[str] = None, cache_ttl: Optional[int] = None) -> str:
+    """Call chat_completion but return a fallback string when LLM unavailable or errors occur.
+
+    This helps routers remain functional in local/dev environments without OPENROUTER_API_KEY.
+    Pass `cache_site` to serve repeated identical prompts from the response cache
+    (see services/llm_cache.py); fallbacks are never cached.
+    """
+    default = fallback if fallback is not None else "[llm-unavailable] Default response — OpenRouter key not configured or request failed."
+
+    async def _compute():
+        try:
+            return await chat_completion(system, user_prompt, messages=messages, temperature=temperature, max_tokens=max_tokens), True
+        except Exception:
+            # On any failure, return provided fallback or a generic deterministic message.
+            return default, False
+
+    if not cache_site:
+        value, _ = await _compute()
+        return value
 
+    chat_messages = messages or [
+        {'role': 'system', 'content': system or "You are a helpful AI assistant."},
+        {'role': 'user', 'content': user_prompt or ""},
+    ]
+    # Key on the configured models, not the health-ordered candidates: hedging
+    # reorders those per request and would otherwise split the cache.
+    key = make_key("|".join(_configured_models()), chat_messages, temperature, max_tokens)
+    return await llm_cache.get_or_compute(key, cache_site, _compute, ttl=cache_ttl)
@@ -1,16 +1,20 @@
+from datetime import datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database.session import get_db
+from database.repositories import Repository
+from database.session import get_async_db, get_db
 from models.platform import Report, Subscription
 from schemas.platform import AdminStats, ReportCreate
-from utils.token import get_current_user
+from services.auth_cache import Principal, auth_cache
+from utils.token import get_current_principal
 from models.user import Tenant
 from typing import Dict
 
 # Prefix /admin/panel to distinguish from user dashboard
 router = APIRouter(tags=["Admin Panel"])
 
-async def verify_admin(user: Tenant):
+async def verify_admin(user: Principal):
     if user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -20,7 +24,7 @@ async def verify_admin(user: Tenant):
 @router.get("/stats", response_model=AdminStats)
 async def get_stats(
     db: Session = Depends(get_db), 
-    current_user: Tenant = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     await verify_admin(current_user)
     
@@ -49,7 +53,7 @@ async def get_stats(
 async def create_report(
     report: ReportCreate, 
     db: Session = Depends(get_db), 
-    current_user: Tenant = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     db_report = Report(reporter_id=current_user.id, **report.model_dump())
     db.add(db_report)
@@ -59,17 +63,22 @@ async def create_report(
 @router.post("/users/{user_id}/suspend")
 async def suspend_user(
     user_id: str, 
-    db: Session = Depends(get_db), 
-    current_user: Tenant = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: Principal = Depends(get_current_principal)
 ):
     await verify_admin(current_user)
-    # MVP: Log suspension or set a flag (not implemented in Tenant model yet)
+    tenants = Repository(db, Tenant)
+    if not await tenants.update_where(Tenant.id == user_id, suspended_at=datetime.now(timezone.utc)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    await tenants.commit()
+    # Cached principals of the user are dropped everywhere within AUTH_REVOCATION_CHECK_SECONDS.
+    await auth_cache.revoke(user_id)
     return {"message": f"User {user_id} suspended"}
 
 @router.post("/sessions/reset")
 async def reset_sessions(
     db: Session = Depends(get_db), 
-    current_user: Tenant = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     await verify_admin(current_user)
     from sqlalchemy import text
@@ -207,7 +207,7 @@ async def recommend_game(query: str):
     
     # 2. Call LLM
     try:
-        response = await safe_chat_completion(system, prompt, temperature=0.3, max_tokens=150)
+        response = await safe_chat_completion(system, prompt, temperature=0.3, max_tokens=150, cache_site="recommend_game")
         # simplistic parsing/fallback
         # Ideally we parse JSON. For robustness, let's just search for the ID or title in response or fall back to keyword search.
         
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database.session import get_db
-from models.user import Tenant
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.session import get_async_db
+from database.repositories import Repository
 from models.platform import Subscription, Referral
 from schemas.platform import SubscriptionResponse, ReferralResponse
-from utils.token import get_current_user
+from services.auth_cache import Principal
+from services.plan_limits import plan_limits
+from utils.token import get_current_principal
 import uuid
 from typing import List, Dict
 
@@ -37,40 +39,40 @@ async def list_plans():
     return PLANS
 
 @router.get("/subscription", response_model=SubscriptionResponse)
-async def get_subscription(db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
-    sub = db.query(Subscription).filter(Subscription.tenant == current_user.id).first()
+async def get_subscription(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
+    subscriptions = Repository(db, Subscription)
+    sub = await subscriptions.first(Subscription.tenant == current_user.id)
     if not sub:
         # Create default free sub
-        sub = Subscription(tenant=current_user.id, tier="free")
-        db.add(sub)
-        db.commit()
-        db.refresh(sub)
+        sub = await subscriptions.create(tenant=current_user.id, tier="free")
     return sub
 
 @router.post("/subscription/upgrade")
-async def upgrade_subscription(tier: str, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def upgrade_subscription(tier: str, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Integration stub for upgrading description."""
     valid_tiers = [p['id'] for p in PLANS]
     if tier not in valid_tiers:
         return {"error": "Invalid tier"}
         
-    sub = db.query(Subscription).filter(Subscription.tenant == current_user.id).first()
+    subscriptions = Repository(db, Subscription)
+    sub = await subscriptions.first(Subscription.tenant == current_user.id)
     if not sub:
-        sub = Subscription(tenant=current_user.id)
-        db.add(sub)
+        sub = subscriptions.add(Subscription(tenant=current_user.id))
     
     sub.tier = tier
     sub.status = "active"
-    db.commit()
+    await subscriptions.commit()
+    plan_limits.forget(current_user.id)  # rate limits follow the new plan right away
     return {"message": f"Upgraded to {tier}"}
 
 @router.get("/referrals", response_model=ReferralResponse)
-async def get_referrals(db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def get_referrals(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     # Simple logic: count referrals
-    count = db.query(Referral).filter(Referral.referrer_id == current_user.id, Referral.status == "completed").count()
+    referrals = Repository(db, Referral)
+    count = await referrals.count(Referral.referrer_id == current_user.id, Referral.status == "completed")
     
     # Get or create code
-    my_ref = db.query(Referral).filter(Referral.referrer_id == current_user.id, Referral.referee_id == None).first()
+    my_ref = await referrals.first(Referral.referrer_id == current_user.id, Referral.referee_id == None)
     if not my_ref:
         code = str(uuid.uuid4())[:8]
         # Store as a template referral for the code
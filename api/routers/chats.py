@@ -1,7 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from models.chat import Chat, Group, GroupMember
-from database.session import get_db, Session
-from utils.token import get_current_user
+from database.session import get_db, get_async_db, Session
+from database.repositories import Repository
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.auth_cache import Principal
+from utils.token import get_current_principal
 from models.user import Tenant, PersonalInfo, ProfilePicture
 from models.connection import Connection
 from sqlalchemy import or_, and_
@@ -22,10 +25,10 @@ ai_service = AIService()
 # ---------------------------
 @router.get("/", tags=["Chats"])
 async def get_chats(
-    current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    return db.query(Chat).filter(Chat.sender == current_user.id).all()
+    return await Repository(db, Chat).list(Chat.sender == current_user.id)
 
 
 # ---------------------------
@@ -34,19 +37,15 @@ async def get_chats(
 @router.post("/", tags=["Chats"], response_model=ChatSchema)
 async def create_chat(
     chat: ChatCreateSchema,   # ✅ use create schema
-    current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # sender is always current_user
-    chat_obj = Chat(sender=current_user.id, **chat.model_dump())
-    db.add(chat_obj)
-    db.commit()
-    db.refresh(chat_obj)
-    return chat_obj
+    return await Repository(db, Chat).create(sender=current_user.id, **chat.model_dump())
 
 
 @router.post("/direct/{target_id}", tags=["Chats"]) 
-async def send_direct_message(target_id: str, payload: dict, current_user: Tenant = Depends(get_current_user), db: Session = Depends(get_db)):
+async def send_direct_message(target_id: str, payload: dict, current_user: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)):
     """Send a direct message to another user. Automatically creates a private group (dm_{a}_{b}) and stores messages."""
     message = payload.get("message")
     if not message:
@@ -55,19 +54,18 @@ async def send_direct_message(target_id: str, payload: dict, current_user: Tenan
         raise HTTPException(status_code=400, detail="Cannot message yourself")
 
     # Ensure target exists
-    target = db.query(Tenant).filter(Tenant.id == target_id).first()
-    if not target:
+    if not await Repository(db, Tenant).exists(Tenant.id == target_id):
         raise HTTPException(status_code=404, detail="Target user not found")
 
     # --- CONNECTION CHECK ---
     # Normal chats only allowed if status is 'matched' or 'personal_circle'
-    connection = db.query(Connection).filter(
+    connection = await Repository(db, Connection).first(
         or_(
             and_(Connection.user_a_id == current_user.id, Connection.user_b_id == target_id),
             and_(Connection.user_a_id == target_id, Connection.user_b_id == current_user.id)
         ),
         Connection.status.in_(['matched', 'personal_circle', 'personal'])
-    ).first()
+    )
 
     if not connection:
         raise HTTPException(
@@ -79,20 +77,19 @@ async def send_direct_message(target_id: str, payload: dict, current_user: Tenan
     ids = sorted([current_user.id, target_id])
     group_name = f"dm_{ids[0]}_{ids[1]}"
 
-    group = db.query(Group).filter(Group.name == group_name).first()
+    groups = Repository(db, Group)
+    group = await groups.first(Group.name == group_name)
     if not group:
-        group = Group(name=group_name, tenant=current_user.id, description=f"Direct messages between {ids[0]} and {ids[1]}", type='users_ai')
-        db.add(group); db.commit(); db.refresh(group)
+        group = await groups.create(name=group_name, tenant=current_user.id, description=f"Direct messages between {ids[0]} and {ids[1]}", type='users_ai')
         # add members
         gm1 = GroupMember(group=group.id, tenant=current_user.id)
         gm2 = GroupMember(group=group.id, tenant=target_id)
-        db.add_all([gm1, gm2]); db.commit()
+        db.add_all([gm1, gm2]); await db.commit()
 
     asset_id = payload.get("asset_url") or payload.get("asset_id")
 
     # store chat message in group
-    chat_obj = Chat(sender=current_user.id, receiver=target_id, group=group.id, message=message, asset_url=asset_id)
-    db.add(chat_obj); db.commit(); db.refresh(chat_obj)
+    chat_obj = await Repository(db, Chat).create(sender=current_user.id, receiver=target_id, group=group.id, message=message, asset_url=asset_id)
 
     return {"status": "ok", "chat_id": chat_obj.id, "group_id": group.id}
 
@@ -101,7 +98,7 @@ async def send_direct_message(target_id: str, payload: dict, current_user: Tenan
 
 
 @router.get("/inbox", tags=["Chats"])
-def get_inbox(current_user: Tenant = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_inbox(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Get list of active conversations (inbox) with last message and metadata."""
     
     # 1. Get all groups I am a member of
@@ -170,7 +167,7 @@ def get_inbox(current_user: Tenant = Depends(get_current_user), db: Session = De
 
 
 @router.get("/history/{group_id}", tags=["Chats"])
-def get_chat_history(group_id: str, current_user: Tenant = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_chat_history(group_id: str, current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Get chat history for a specific group."""
     # Check membership
     is_member = db.query(GroupMember).filter(
@@ -219,7 +216,7 @@ def get_chat_history(group_id: str, current_user: Tenant = Depends(get_current_u
 
 
 @router.post("/seed", tags=["Chats"])
-def seed_chat_data(current_user: Tenant = Depends(get_current_user), db: Session = Depends(get_db)):
+def seed_chat_data(current_user: Principal = Depends(get_current_principal), db: Session = Depends(get_db)):
     """Generate mock users and chats for the current user."""
     
     # 1. Create fake users
@@ -341,10 +338,10 @@ async def trigger_vibe_check(type: str = "personality"):
 @router.get("/{chat_id}", tags=["Chats"], response_model=ChatSchema)
 async def get_chat(
     chat_id: str,  # UUID
-    current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    chat_obj = db.query(Chat).filter(Chat.id == chat_id).first()
+    chat_obj = await Repository(db, Chat).get(chat_id)
     if not chat_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
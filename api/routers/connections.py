@@ -1,18 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, and_
-from database.session import get_db
+from sqlalchemy import or_, and_, select
+from database.session import get_async_db
+from database.repositories import Repository, run_sync
 from models.user import Tenant
-from models.connection import Connection
+from models.connection import Connection, DailyBatch
 from models.notifications import Notification
 from utils.token import get_current_user
+from services.matching import matching_engine
+from services import daily_batches
+from services.connection_graph import connection_graph
 from datetime import datetime, timezone
 import logging
 
 router = APIRouter(prefix="/connections", tags=["Connections P1"])
 logger = logging.getLogger(__name__)
 
-def create_notification(db: Session, tenant_id: str, title: str, message: str, type: str = 'social', metadata: dict = None):
+def connection_changed(db: Session, user_a_id: str, user_b_id: str):
+    """Drop the stored daily batches of a pair whose connection changed, in the caller's transaction.
+
+    Uses the sync helpers of services/daily_batches.py; call it through `run_sync`,
+    then commit with `commit_connection_change`.
+    """
+    daily_batches.invalidate(db, user_a_id, user_b_id)
+
+async def commit_connection_change(db: AsyncSession, user_a_id: str, user_b_id: str):
+    """Commit, then drop the pair's cached status; before the commit, a concurrent read could re-cache the old one."""
+    await db.commit()
+    connection_graph.invalidate(user_a_id, user_b_id)
+
+def create_notification(db, tenant_id: str, title: str, message: str, type: str = 'social', metadata: dict = None):
     import json
     notif = Notification(
         tenant=tenant_id,
@@ -29,7 +47,7 @@ async def request_connection(
     target_id: str,
     mode: str = Body("social", embed=True),
     current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Initial connection request from User A to User B."""
     # 1. Check if self
@@ -39,23 +57,25 @@ async def request_connection(
     
     # 2. Check if target user exists
     print(f"🔍 CONNECTION REQUEST: current_user={current_user.id}, target_id={target_id}")
-    target_user = db.query(Tenant).filter(Tenant.id == target_id).first()
+    tenants = Repository(db, Tenant)
+    target_user = await tenants.get(target_id)
     if not target_user:
         print(f"❌ TARGET USER NOT FOUND: {target_id}")
         # List all users for debugging
-        all_users = db.query(Tenant).all()
+        all_users = await tenants.list()
         print(f"📋 AVAILABLE USERS: {[(str(u.id), u.email) for u in all_users]}")
         raise HTTPException(404, f"User not found: {target_id}")
     print(f"✅ TARGET USER FOUND: {target_user.email}")
 
 
     # 3. Check if connection exists
-    conn = db.query(Connection).filter(
+    connections = Repository(db, Connection)
+    conn = await connections.first(
         or_(
             and_(Connection.user_a_id == current_user.id, Connection.user_b_id == target_id),
             and_(Connection.user_a_id == target_id, Connection.user_b_id == current_user.id)
         )
-    ).first()
+    )
 
     if conn:
         # If already suggested, move to pending
@@ -63,26 +83,22 @@ async def request_connection(
             conn.status = 'pending_b'
             conn.user_a_id = current_user.id
             conn.user_b_id = target_id
-            db.commit()
+            await db.commit()
         else:
             return {"status": "exists", "connection_status": conn.status, "connection_id": conn.id}
     else:
         # Create new
-        conn = Connection(
+        conn = await connections.create(
             user_a_id=current_user.id,
             user_b_id=target_id,
             mode=mode,
             status='pending_b',
             score=0.5 # Default
         )
-        db.add(conn)
-        db.commit()
     
     
-    # 3. Notify User B - Load personal info if not already loaded
+    # 3. Notify User B (personal info is loaded with current_user)
     try:
-        if not current_user.personal_info:
-            db.refresh(current_user, ['personal_info'])
         sender_name = f"{current_user.personal_info.first_name if current_user.personal_info else ''}".strip() or "Someone"
     except Exception as e:
         logger.warning(f"Could not load sender name: {e}")
@@ -101,14 +117,18 @@ async def request_connection(
             "action": "connection_request"
         }
     )
-    db.commit()
+    await run_sync(db, connection_changed, current_user.id, target_id)
+    await commit_connection_change(db, current_user.id, target_id)
 
     return {"status": "ok", "connection_status": conn.status, "connection_id": conn.id}
 
 
 # --- HELPERS (Adapted from recommendations.py) ---
 def calculate_heuristic_score(user_a, user_b):
-    """Simple python-based similarity score until Vector DB is fully stable."""
+    """Simple python-based similarity score until Vector DB is fully stable.
+
+    Scalar reference for the vectorized scoring in services/matching.py.
+    """
     try:
         score = 0.1 # Base score
         
@@ -131,17 +151,13 @@ def calculate_heuristic_score(user_a, user_b):
         logger.error(f"Scoring error: {e}")
         return 0.1
 
-def generate_ai_insight(user_b, score):
-    """Stub for AI explanation."""
-    return f"We noticed you share common interests. With a compatibility score of {int(score*100)}%, {user_b.personal_info.first_name} could be a great match."
-
 # --- ENDPOINTS ---
 
 @router.get("/daily/{mode}")
 async def get_daily_batch(
     mode: str, 
     current_user: Tenant = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Fetch daily recommendations based on the Founder's P1 logic.
@@ -149,6 +165,12 @@ async def get_daily_batch(
     - Apply Threshold vs Top Pick logic
     - Persist as 'suggested' connections
     """
+    # 0. Precomputed batch (nightly job, or an earlier request today): one primary-key read.
+    today = daily_batches.today()
+    cached = await db.get(DailyBatch, (current_user.id, mode))
+    if cached is not None and cached.batch_date == today:
+        return cached.items
+
     prefs = current_user.connection_preferences or {}
     
     # 1. Config
@@ -160,65 +182,53 @@ async def get_daily_batch(
     # (Simple logic: Count 'suggested' created today)
     # For a real app, we'd check date. For prototype, just check total active suggestions.
     
-    existing_recs = db.query(Connection).filter(
+    connections = Repository(db, Connection)
+    existing_recs = await connections.list(
         Connection.user_a_id == current_user.id,
         Connection.status == 'suggested',
         Connection.mode == mode
-    ).all()
+    )
     
     # If we already have a batch, return it
     if len(existing_recs) >= daily_limit:
-        return [format_connection(c, db) for c in existing_recs]
+        items = await format_connections(existing_recs, db)
+        await run_sync(db, daily_batches.store, current_user.id, mode, today, items)
+        await db.commit()
+        return items
         
     # 3. Generate New Recommendations (Fill the gap)
     needed = daily_limit - len(existing_recs)
     
     # Get Candidates (exclude self and already connected in either direction)
-    conns = db.query(Connection).filter(
-        or_(Connection.user_a_id == current_user.id, Connection.user_b_id == current_user.id)
-    ).all()
+    pairs = await db.execute(
+        select(Connection.user_a_id, Connection.user_b_id).where(
+            or_(Connection.user_a_id == current_user.id, Connection.user_b_id == current_user.id)
+        )
+    )
     
     existing_ids = set()
-    for c in conns:
-        existing_ids.add(c.user_a_id)
-        existing_ids.add(c.user_b_id)
+    for user_a_id, user_b_id in pairs:
+        existing_ids.add(user_a_id)
+        existing_ids.add(user_b_id)
     existing_ids.add(current_user.id)
 
-    
-    candidates = db.query(Tenant).filter(
-        Tenant.id.notin_(existing_ids),
-        ~Tenant.id.like("host_%"),
-        ~Tenant.id.like("player_%"),
-        ~Tenant.id.like("guest_%"),
-        ~Tenant.email.like("host_%"),
-        ~Tenant.email.like("player_%"),
-        ~Tenant.email.like("guest_%")
-    ).limit(50).all()
-    
-    scored = []
-    for cand in candidates:
-        score = calculate_heuristic_score(current_user, cand)
-        scored.append((cand, score))
-        
-    # 4. Apply Filtering Logic
-    scored.sort(key=lambda x: x[1], reverse=True)
-    
-    final_picks = []
-    if filter_mode == 'threshold':
-        # Only above N%
-        final_picks = [x for x in scored if x[1] >= min_threshold]
-        # Just take top 'needed' from those who passed
-        final_picks = final_picks[:needed]
-    else:
-        # Top picks regardless of score
-        final_picks = scored[:needed]
+
+    # 4. Score every eligible tenant and apply the filtering logic:
+    # 'threshold' keeps only those above N%, 'top_picks' takes the best regardless of score.
+    matching_engine.observe(current_user)
+    final_picks = await matching_engine.top_k(
+        current_user,
+        k=needed,
+        exclude=existing_ids,
+        min_score=min_threshold if filter_mode == 'threshold' else None,
+    )
         
     # 5. Persist
     new_connections = []
-    for cand, score in final_picks:
+    for cand_id, score in final_picks:
         conn = Connection(
             user_a_id=current_user.id,
-            user_b_id=cand.id,
+            user_b_id=cand_id,
             mode=mode,
             score=score,
             status='suggested',
@@ -227,18 +237,21 @@ async def get_daily_batch(
         db.add(conn)
         new_connections.append(conn)
         
-    db.commit()
+    await db.commit()
     
     # Refresh to get IDs
     for c in new_connections:
-        db.refresh(c)
+        await db.refresh(c)
+        connection_graph.invalidate(c.user_a_id, c.user_b_id)
         
     # Combine old + new
     all_recs = existing_recs + new_connections
     
     # Generate insights concurrently if needed (future improvement)
-    # For now, just ensure format_connection is efficient
-    return [format_connection(c, db) for c in all_recs]
+    items = await format_connections(all_recs, db)
+    await run_sync(db, daily_batches.store, current_user.id, mode, today, items)
+    await db.commit()
+    return items
 
 @router.post("/action/{connection_id}")
 async def handle_connection_action(
@@ -247,7 +260,7 @@ async def handle_connection_action(
     feedback: str = Body(None, embed=True),
     reason: str = Body(None, embed=True),
     current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Handle user actions on a profile.
@@ -255,16 +268,19 @@ async def handle_connection_action(
     - Decline: Move to 'declined', store AI Feedback.
     - Archive: Move to 'archived'.
     """
-    conn = db.query(Connection).filter(Connection.id == connection_id).first()
+    conn = await Repository(db, Connection).get(connection_id)
     if not conn:
         raise HTTPException(404, "Connection not found")
         
     if conn.user_a_id != current_user.id and conn.user_b_id != current_user.id:
         raise HTTPException(403, "Not authorized")
+
+    # Any action takes the connection out of both users' stored daily batches.
+    await run_sync(db, connection_changed, conn.user_a_id, conn.user_b_id)
         
     if action == 'archive':
         conn.status = 'archived'
-        db.commit()
+        await commit_connection_change(db, conn.user_a_id, conn.user_b_id)
         return {"ok": True, "status": "archived"}
         
     if action == 'decline':
@@ -275,7 +291,7 @@ async def handle_connection_action(
             "feedback_text": feedback,
             "timestamp": str(datetime.now())
         }
-        db.commit()
+        await commit_connection_change(db, conn.user_a_id, conn.user_b_id)
         return {"ok": True, "status": "declined"}
         
     if action == 'accept':
@@ -305,7 +321,7 @@ async def handle_connection_action(
             ids = sorted([conn.user_a_id, conn.user_b_id])
             group_name = f"dm_{ids[0]}_{ids[1]}"
             
-            group = db.query(Group).filter(Group.name == group_name).first()
+            group = await Repository(db, Group).first(Group.name == group_name)
             if not group:
                 group = Group(
                     name=group_name, 
@@ -315,7 +331,7 @@ async def handle_connection_action(
                     status='active'
                 )
                 db.add(group)
-                db.flush()
+                await db.flush()
                 # add members
                 gm1 = GroupMember(group=group.id, tenant=conn.user_a_id)
                 gm2 = GroupMember(group=group.id, tenant=conn.user_b_id)
@@ -336,7 +352,7 @@ async def handle_connection_action(
                     "action": "connection_accepted"
                 }
             )
-        db.commit()
+        await commit_connection_change(db, conn.user_a_id, conn.user_b_id)
         return {"ok": True, "status": conn.status}
 
 
@@ -346,13 +362,13 @@ async def handle_connection_action(
 async def confirm_relationship(
     connection_id: str,
     current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Moves a match to 'Personal Circle'.
     If mode is 'romantic', this should disable further romantic searches.
     """
-    conn = db.query(Connection).filter(Connection.id == connection_id).first()
+    conn = await Repository(db, Connection).get(connection_id)
     if not conn or conn.status != 'matched':
         raise HTTPException(400, "Must be a match first")
         
@@ -363,21 +379,23 @@ async def confirm_relationship(
         prefs = dict(current_user.connection_preferences)
         if 'active_modes' in prefs:
              prefs['active_modes']['romantic'] = False
-             current_user.connection_preferences = prefs
+             # current_user is detached; write through this session
+             await Repository(db, Tenant).update_where(Tenant.id == current_user.id, connection_preferences=prefs)
              
-    db.commit()
+    await run_sync(db, connection_changed, conn.user_a_id, conn.user_b_id)
+    await commit_connection_change(db, conn.user_a_id, conn.user_b_id)
     return {"ok": True, "message": "Moved to Personal Circle"}
 
 @router.get("/pending", tags=["Connections P1"])
 async def list_pending_requests(
     current_user: Tenant = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List connection requests sent to ME that I haven't accepted yet (status='pending_b')."""
-    conns = db.query(Connection).filter(
+    conns = await Repository(db, Connection).list(
         Connection.user_b_id == current_user.id,
         Connection.status == 'pending_b'
-    ).all()
+    )
     
     results = []
     for c in conns:
@@ -394,17 +412,31 @@ async def list_pending_requests(
 async def list_connections(
     status_filter: str = "personal_circle",
     current_user: Tenant = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List all connections with a specific status (default: personal_circle)"""
-    conns = db.query(Connection).options(
-        joinedload(Connection.user_a).joinedload(Tenant.personal_info),
-        joinedload(Connection.user_b).joinedload(Tenant.personal_info)
-    ).filter(
+    conns = await Repository(db, Connection).list(
         or_(Connection.user_a_id == current_user.id, Connection.user_b_id == current_user.id),
-        Connection.status == status_filter
-    ).all()
+        Connection.status == status_filter,
+        options=[
+            joinedload(Connection.user_a).joinedload(Tenant.personal_info),
+            joinedload(Connection.user_b).joinedload(Tenant.personal_info)
+        ]
+    )
     
+    # Latest profile picture of every other user, in one query
+    from models.user import ProfilePicture
+    others = {c.user_b_id if c.user_a_id == current_user.id else c.user_a_id for c in conns}
+    avatars = {}
+    if others:
+        pics = await db.execute(
+            select(ProfilePicture.tenant, ProfilePicture.url)
+            .where(ProfilePicture.tenant.in_(others))
+            .order_by(ProfilePicture.uploaded_at.desc())
+        )
+        for tenant_id, url in pics:
+            avatars.setdefault(tenant_id, url)
+
     results = []
     for c in conns:
         other_user = c.user_b if c.user_a_id == current_user.id else c.user_a
@@ -414,10 +446,7 @@ async def list_connections(
              last = other_user.personal_info.last_name if other_user.personal_info else ""
              name = f"{first} {last}".strip() or "Unknown"
              
-             # Fetch latest profile picture
-             from models.user import ProfilePicture
-             profile_pic = db.query(ProfilePicture).filter(ProfilePicture.tenant == other_user.id).order_by(ProfilePicture.uploaded_at.desc()).first()
-             avatar_url = profile_pic.url if profile_pic else "/default-avatar.png"
+             avatar_url = avatars.get(other_user.id) or "/default-avatar.png"
              
              results.append({
                  "id": str(other_user.id),
@@ -437,25 +466,12 @@ async def list_connections(
 
     return results
 
-def format_connection(conn, db):
-    # Fetch User B profile efficiently
-    user_b = db.query(Tenant).options(joinedload(Tenant.personal_info)).filter(Tenant.id == conn.user_b_id).first()
-    if not user_b:
-        return None
-        
-    first = user_b.personal_info.first_name if user_b.personal_info else ""
-    last = user_b.personal_info.last_name if user_b.personal_info else ""
-    name = f"{first} {last}".strip() or "Unknown"
-
-    return {
-        "id": conn.id,
-        "user_b": {
-            "id": user_b.id,
-            "name": name,
-            "location": user_b.personal_info.location if user_b.personal_info else "",
-        },
-        "score": conn.score,
-        "mode": conn.mode,
-        "status": conn.status,
-        "ai_insight": generate_ai_insight(user_b, conn.score)
-    }
+async def format_connections(conns, db: AsyncSession):
+    """Response entries for `conns`, loading every other user's personal info in one query."""
+    people = await Repository(db, Tenant).get_many(
+        {c.user_b_id for c in conns}, options=[joinedload(Tenant.personal_info)]
+    )
+    return [
+        daily_batches.suggestion_payload(c.id, c.user_b_id, people[c.user_b_id].personal_info, c.score, c.mode, c.status)
+        for c in conns if c.user_b_id in people
+    ]
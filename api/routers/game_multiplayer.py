@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, WebSocket
 from pydantic import BaseModel
 from typing import Optional, List
 from .game_session_manager import GameManager
@@ -7,12 +7,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from utils.token import get_optional_user
 from models.user import Tenant
+from services import game_push
 
 import json
 import uuid
 
 router = APIRouter(tags=["Multiplayer"])
 
+# session_id -> chat group id; only lookups that found a group are cached.
+_GROUP_IDS = {}
+_GROUP_IDS_MAX = 4096
+
 class CreateRoomReq(BaseModel):
     game_slug: str
     user_id: Optional[str] = None  # For guest support
@@ -31,6 +36,11 @@ class PlayerStatusReq(BaseModel):
     truth_analysis_enabled: Optional[bool] = None
     persona: Optional[str] = None
 
+class StatePatchReq(BaseModel):
+    ops: List[dict]  # RFC 6902 operations, paths under /state/ (e.g. "/state/score")
+    base_version: Optional[int] = None
+    user_id: Optional[str] = None  # For guest support
+
 class ChatMessageReq(BaseModel):
     session_id: str
     user_id: Optional[str] = None  # For guest support
@@ -156,6 +166,7 @@ async def send_chat_message(req: ChatMessageReq, user: Optional[Tenant] = Depend
     
     # Update state with new messages
     await gm.update_state(req.session_id, {"chat_messages": chat_messages})
+    game_push.emit(req.session_id, "chat", message=new_message)
     
     return {"ok": True, "message": new_message, "total_messages": len(chat_messages)}
 
@@ -188,11 +199,10 @@ async def start_game(session_id: str, user: Optional[Tenant] = Depends(get_optio
     fallback = "The adventure begins. What will you do?"
     
     # Generate Opening
-    opening_text = await safe_chat_completion(system or '', prompt, temperature=0.8, max_tokens=250, fallback=fallback)
+    opening_text = await safe_chat_completion(system or '', prompt, temperature=0.8, max_tokens=250, fallback=fallback, cache_site="game_opening")
     
     # 1. Update State
-    initial_state = dict(session.state or {})
-    initial_state.update({
+    await gm.update_state(session_id, {
         "narrative": opening_text,
         "scene": opening_text, # Backward compat
         "story_text": [opening_text], # For narrative games
@@ -201,30 +211,50 @@ async def start_game(session_id: str, user: Optional[Tenant] = Depends(get_optio
         "active_player": list(players.keys())[0] if players else None # Simple turn init
     })
     
-    session.state = initial_state
-    session.status = "active" # DB Status Column -> Triggers Frontend Redirect
-    
-    from sqlalchemy.orm.attributes import flag_modified
-    flag_modified(session, "state")
-    
-    await db.commit()
-    await db.refresh(session)
+    # DB Status Column -> Triggers Frontend Redirect (flushed to Postgres immediately)
+    session = await gm.start_game(session_id)
     
     return {"ok": True, "player_count": len(players), "state": session.state}
 
+async def _group_id(db: AsyncSession, session_id: str):
+    if session_id in _GROUP_IDS:
+        return _GROUP_IDS[session_id]
+    from models.chat import Group
+    result = await db.execute(select(Group).where(Group.name == f"game_{session_id}"))
+    group = result.scalars().first()
+    if group is None:
+        return session_id  # Fallback to session_id
+    if len(_GROUP_IDS) >= _GROUP_IDS_MAX:
+        _GROUP_IDS.pop(next(iter(_GROUP_IDS)))
+    _GROUP_IDS[session_id] = group.id
+    return group.id
+
 @router.get("/session/{session_id}")
-async def get_room_details(session_id: str, db: AsyncSession = Depends(get_async_db)):
+async def get_room_details(session_id: str, request: Request, response: Response, since: Optional[int] = None, db: AsyncSession = Depends(get_async_db)):
+    """Full room snapshot, or with `since=<version>` only the JSON-patch ops since that version.
+
+    Falls back to the full snapshot when the deltas are no longer available.
+    Responses carry a weak ETag of the session version; a poll with a matching
+    If-None-Match gets 304 without loading the session. Prefer the websocket
+    at /ws/{session_id}, which pushes every change.
+    """
+    from services.game_session_store import game_store
+    version = await game_store.version(session_id)
+    if version is not None:
+        tag = game_push.etag(session_id, version)
+        if tag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+            return Response(status_code=304, headers={"ETag": tag})
     gm = GameManager(db)
     session = await gm.get_session(session_id)
+    response.headers["ETag"] = game_push.etag(session_id, session.version)
+    if since is not None:
+        ops = await game_store.deltas_since(session_id, since)
+        if ops is not None:
+            return {"ok": True, "session_id": session_id, "version": session.version, "since": since, "ops": ops, "status": session.status}
     state = dict(session.state or {})
-    state['history'] = session.history or [] # Inject history for frontend visibility
-
     
     # NEW: Try to find the associated chat group_id
-    from models.chat import Group
-    group_name = f"game_{session_id}"
-    result = await db.execute(select(Group).where(Group.name == group_name))
-    group = result.scalars().first()
+    group_id = await _group_id(db, session_id)
     
     return {
         "ok": True, 
@@ -234,14 +264,79 @@ async def get_room_details(session_id: str, db: AsyncSession = Depends(get_async
         "players": session.players,
         "host_id": session.host_user_id,
         "game_slug": session.game_slug,
+        "version": session.version,
         "analysis": session.analysis,
         "state": state,  # CRITICAL: Return full game state for multiplayer sync
         "history": session.history or [], # NEW: Return history event log
         "chat_messages": state.get("chat_messages", []),
-        "group_id": group.id if group else session_id,  # Fallback to session_id
+        "group_id": group_id,
         "min_players": 1
     }
 
+@router.websocket("/ws/{session_id}")
+async def game_socket(websocket: WebSocket, session_id: str):
+    """Live game channel: a `snapshot` frame, then `delta`/`resync` and lobby events.
+
+    Frames queued before the snapshot carry versions it already includes and
+    can be ignored; a delta whose version skips ahead means frames were
+    dropped, so refetch with GET /session/{id}?since=<version>.
+    """
+    from database.session import async_session
+    from utils.websockets import manager
+
+    room = game_push.topic(session_id)
+    await manager.connect(websocket, room)
+    try:
+        # Short-lived DB session: don't pin a pooled connection for the socket's lifetime.
+        async with async_session() as db:
+            session = await GameManager(db).get_session(session_id)
+        manager.send_to(websocket, room, {
+            "type": "snapshot",
+            "session_id": session_id,
+            "version": session.version,
+            "status": session.status,
+            "players": session.players,
+            "state": session.state or {},
+            "analysis": session.analysis,
+            "history": session.history or [],
+        })
+        while True:
+            await websocket.receive_text()  # keep-alives; writes go through the HTTP endpoints
+    except HTTPException:
+        await websocket.close(code=1008)  # unknown session
+    except Exception:
+        pass
+    finally:
+        await manager.disconnect(websocket, room)
+
+@router.get("/session/{session_id}/history")
+async def get_room_history(session_id: str, kind: str = "history", cursor: Optional[int] = None, limit: int = 50, db: AsyncSession = Depends(get_async_db)):
+    """Newest-first page of the full game history; pass `next_cursor` back as `cursor` for older entries."""
+    from services.game_history import game_history, WINDOWED_STATE_KEYS
+    if kind != "history" and kind not in WINDOWED_STATE_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unknown history kind '{kind}'")
+    gm = GameManager(db)
+    session = await gm.get_session(session_id)
+    page = await game_history.page(session, kind=kind, before=cursor, limit=max(1, min(limit, 200)))
+    return {"ok": True, "session_id": session_id, **page}
+
+@router.patch("/session/{session_id}/state")
+async def patch_room_state(session_id: str, req: StatePatchReq, user: Optional[Tenant] = Depends(get_optional_user), db: AsyncSession = Depends(get_async_db)):
+    """Apply JSON-patch ops to the session; 409 (with the current version) if they no longer apply.
+
+    Only players of the session may patch it, and only its game state (422 for other paths).
+    """
+    target_user_id = user.id if user else req.user_id
+    if not target_user_id:
+        raise HTTPException(status_code=400, detail="user_id required for guests")
+
+    gm = GameManager(db)
+    current = await gm.get_session(session_id)
+    if target_user_id not in (current.players or {}) and target_user_id != current.host_user_id:
+        raise HTTPException(status_code=403, detail="Only players in this session can change its state")
+    session = await gm.patch_state(session_id, req.ops, req.base_version)
+    return {"ok": True, "session_id": session_id, "version": session.version}
+
 @router.get("/list")
 async def get_all_games():
     """Returns a comprehensive list of all verified games, separated by tier."""
@@ -3,36 +3,71 @@ from sqlalchemy.future import select
 from models.game_session import GameSession
 from fastapi import HTTPException
 from sqlalchemy.sql import func
+from services.game_session_store import check_client_ops, game_store, clone
+from services.json_patch import JsonPatchError, apply_patch, make_patch
+from services.game_history import game_history, trim, WINDOWED_STATE_KEYS, OFFSETS_KEY
+from services import game_push
 import uuid
 
 import random
 import string
 
+# Keys whose change marks a phase transition / game end; these flush immediately.
+_FLUSH_STATE_KEYS = ("phase", "status", "game_over", "winner")
+
+# Tenants already known to exist, so joins skip the lookup.
+_KNOWN_TENANTS = set()
+_KNOWN_TENANTS_MAX = 10000
+
+
 class GameManager:
+    """Game-session operations.
+
+    Live sessions are read from and patched in the hot store
+    (services/game_session_store.py) and written back to Postgres write-behind.
+    Methods return `HotSession` copies that expose the same attributes as the
+    `GameSession` model.
+
+    Each instance remembers the version and state it last read per session, so a
+    state patch computed from that read is applied as a delta on top of turns
+    other players committed in the meantime instead of overwriting them.
+    """
+
     def __init__(self, db: AsyncSession):
         self.db = db
+        self._reads = {}
 
     def generate_room_code(self, length=6):
         return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
 
-    async def ensure_tenant(self, user_id: str):
-        """Ensures a tenant exists for the given user_id; creates a guest if not."""
-        if not user_id: return
-        
+    async def ensure_tenant(self, user_id: str) -> bool:
+        """Ensures a tenant exists for the given user_id; creates a guest if not.
+
+        Returns True when a guest was added (the caller must commit).
+        """
+        if not user_id or user_id in _KNOWN_TENANTS: return False
+
         from models.user import Tenant
+        created = False
         result = await self.db.execute(select(Tenant).where(Tenant.id == user_id))
         if not result.scalars().first():
             try:
                 new_guest = Tenant(
                     id=user_id,
-                    email=f"guest_{user_id}@elinity.ai", 
+                    email=f"guest_{user_id}@elinity.ai",
                     password="guest_password",
                     role="user"
                 )
                 self.db.add(new_guest)
-                await self.db.flush() 
+                await self.db.flush()
+                created = True
             except Exception as e:
                 print(f"Failed to auto-create guest {user_id}: {e}")
+                return False
+        if len(_KNOWN_TENANTS) >= _KNOWN_TENANTS_MAX:
+            _KNOWN_TENANTS.clear()
+        _KNOWN_TENANTS.add(user_id)
+        return created
 
     async def create_session(self, game_slug: str, host_id: str = None, initial_state: dict = None, max_players: int = 5):
         """Creates a new game session with a room code."""
@@ -41,7 +76,7 @@ class GameManager:
 
         session_id = str(uuid.uuid4())
         room_code = self.generate_room_code()
-        
+
         new_session = GameSession(
             session_id=session_id,
             room_code=room_code,
@@ -55,123 +90,230 @@ class GameManager:
         self.db.add(new_session)
         await self.db.commit()
         await self.db.refresh(new_session)
-        return new_session
+        return await game_store.adopt(new_session)
 
     async def get_session(self, session_id: str = None, room_code: str = None):
-        """Retrieves a session by ID or Room Code."""
+        """Retrieves a session by ID or Room Code (hot store first, then Postgres)."""
+        session = await game_store.get(session_id=session_id, room_code=room_code)
+        if session is not None:
+            return self._remember(session)
+
         if session_id:
             result = await self.db.execute(select(GameSession).where(GameSession.session_id == session_id))
         else:
             result = await self.db.execute(select(GameSession).where(GameSession.room_code == room_code))
-            
-        session = result.scalars().first()
-        if not session:
+
+        row = result.scalars().first()
+        if not row:
             raise HTTPException(status_code=404, detail="Session not found")
+        return self._remember(await game_store.adopt(row))
+
+    def _remember(self, session):
+        self._reads[session.session_id] = (session.version, clone(session.state or {}))
+        return session
+
+    async def _mutate(self, session_id: str, fn, flush: bool = False):
+        """Applies `fn` to the live session (loading it first if needed) and returns the result."""
+        session = await game_store.mutate(session_id, fn)
+        if session is None:
+            await self.get_session(session_id)
+            session = await game_store.mutate(session_id, fn)
+        if flush or not game_store.running:
+            await game_store.flush(session_id)
         return session
 
     async def join_session(self, session_id: str, user_id: str, user_data: dict = None):
         """Adds a player to the session with max player check."""
-        await self.ensure_tenant(user_id)
+        if await self.ensure_tenant(user_id):
+            await self.db.commit()
         session = await self.get_session(session_id)
-        
-        players = dict(session.players or {})
-        
-        if user_id not in players:
-            if len(players) >= (session.max_players or 5):
+        if user_id in (session.players or {}):
+            return session
+
+        import datetime
+        joined_at = datetime.datetime.now().isoformat()
+
+        def add_player(s):
+            players = dict(s.players or {})
+            if user_id in players:
+                return {}
+            if len(players) >= (s.max_players or 5):
                 raise HTTPException(status_code=400, detail="Room is full")
-                
-            import datetime
             players[user_id] = {
                 **(user_data or {}),
-                "joined_at": datetime.datetime.now().isoformat(),
+                "joined_at": joined_at,
                 "is_ready": False,
                 "score": 0
             }
-            session.players = players
-            from sqlalchemy.orm.attributes import flag_modified
-            flag_modified(session, "players")
-            
-            await self.db.commit()
-            await self.db.refresh(session)
-            
+            return {"players": players}
+
+        # Lobby membership is read straight from Postgres by /my-games, so flush now.
+        session = await self._mutate(session_id, add_player, flush=True)
+        if user_id in (session.players or {}):
+            game_push.emit(session_id, "player_joined", user_id=user_id, player=session.players[user_id])
         return session
 
     async def update_player_status(self, session_id: str, user_id: str, is_ready: bool, truth_analysis_enabled: bool = None, persona: str = None):
         """Updates player ready status and fun-mode preferences."""
-        session = await self.get_session(session_id)
-        players = dict(session.players or {})
-        if user_id in players:
+        def set_status(s):
+            players = dict(s.players or {})
+            if user_id not in players:
+                return {}
             players[user_id]["is_ready"] = is_ready
             if truth_analysis_enabled is not None:
                 players[user_id]["truth_analysis_enabled"] = truth_analysis_enabled
             if persona:
                 players[user_id]["persona"] = persona
-                
-            session.players = players
-            from sqlalchemy.orm.attributes import flag_modified
-            flag_modified(session, "players")
-            await self.db.commit()
+            return {"players": players}
+
+        session = await self._mutate(session_id, set_status)
+        player = (session.players or {}).get(user_id)
+        if player is not None:
+            game_push.emit(session_id, "player_ready", user_id=user_id, is_ready=player.get("is_ready"), player=player)
         return session
 
     async def start_game(self, session_id: str):
         """Sets session status to active."""
-        session = await self.get_session(session_id)
-        session.status = "active"
-        await self.db.commit()
-        return session
+        return await self._mutate(session_id, lambda s: {"status": "active"}, flush=True)
 
     async def update_state(self, session_id: str, new_state_patch: dict, history_entry: dict = None):
-        """Updates the game state and optionally adds to history with AI analysis."""
-        session = await self.get_session(session_id)
-        
-        current_state = dict(session.state or {})
-        current_state.update(new_state_patch)
-        session.state = current_state
-        from sqlalchemy.orm.attributes import flag_modified
-        flag_modified(session, "state")
-        
+        """Updates the game state and optionally adds to history.
+
+        Only the difference to the state this request read is recorded (see
+        services/json_patch.py); if another turn was committed since, that
+        difference is replayed on top of it.
+
+        `history` and the growing story lists in state keep a rolling window;
+        older entries move to `game_events` (see services/game_history.py).
+
+        AI analysis of new history entries is queued on the shadow observer
+        (services/observer_queue.py) and merged into the session when it finishes.
+        Phase changes and game end are flushed to Postgres immediately.
+        """
+        phase_changed = False
+        rolled, starts = {}, {}
+        read = self._reads.get(session_id)
+
+        def apply(s):
+            nonlocal phase_changed, rolled, starts
+            current_state = dict(s.state or {})
+            phase_changed = any(
+                key in new_state_patch and new_state_patch[key] != current_state.get(key)
+                for key in _FLUSH_STATE_KEYS
+            )
+            if read is not None and read[0] != s.version:
+                base_state = read[1]
+                ops = make_patch(base_state, {**base_state, **new_state_patch})
+                try:
+                    current_state = apply_patch(current_state, clone(ops))
+                except JsonPatchError:
+                    # The turn no longer fits the newer state: last writer wins on its keys.
+                    current_state = dict(s.state or {})
+                    current_state.update(new_state_patch)
+            else:
+                current_state.update(new_state_patch)
+            updates = {"state": current_state}
+            rolled, starts = {}, {}
+            for key in WINDOWED_STATE_KEYS:
+                if isinstance(current_state.get(key), list):
+                    current_state[key], rolled[key] = trim(current_state[key])
+            if history_entry:
+                updates["history"], rolled["history"] = trim(list(s.history or []) + [history_entry])
+            rolled = {key: entries for key, entries in rolled.items() if entries}
+            if rolled:
+                offsets = dict(current_state.get(OFFSETS_KEY) or {})
+                for key, entries in rolled.items():
+                    starts[key] = offsets.get(key, 0)
+                    offsets[key] = starts[key] + len(entries)
+                current_state[OFFSETS_KEY] = offsets
+            return updates
+
+        session = await self._mutate(session_id, apply)
+        self._remember(session)
+        if rolled:
+            await game_history.append(session_id, rolled, starts)
+        if phase_changed:
+            await game_store.flush(session_id)
+
         if history_entry:
-            history = list(session.history or [])
-            history.append(history_entry)
-            session.history = history
-            flag_modified(session, "history")
-            
             # TRIGGER AI ANALYSIS
-            try:
-                from ._ai_observer import analyze_gameplay
-                from ._profile_helper import get_user_profile_summary
-                
-                # Fetch profiles for current players to provide context to AI
-                players = dict(session.players or {})
-                players_rich_data = {}
-                for pid, pdata in players.items():
-                    players_rich_data[pid] = pdata.copy()
-                    if pdata.get("truth_analysis_enabled"):
-                        players_rich_data[pid]["profile_summary"] = await get_user_profile_summary(self.db, pid)
-
-                analysis_results = await analyze_gameplay(session.game_slug, session.history, players_rich_data)
-                
-                if analysis_results:
-                    current_analysis = dict(session.analysis or {})
-                    # Update scores/stats based on analysis
-                    for pid, data in analysis_results.items():
-                        # Update global session analysis
-                        current_analysis[pid] = data
-                        
-                        # Also update player score in the players dict for easy UI access
-                        if pid in players:
-                            players[pid]["score"] = (players[pid].get("score", 0) + data.get("insight_points_awarded", 0))
-                            # Cache the latest fun commentary
-                            players[pid]["last_commentary"] = data.get("fun_commentary")
-                            players[pid]["truth_mismatch"] = data.get("truth_mismatch_detected", False)
-                            
-                    session.players = players
-                    flag_modified(session, "players")
-                    session.analysis = current_analysis
-                    flag_modified(session, "analysis")
-            except Exception as e:
-                print(f"AI Analysis failed: {e}")
-            
-        await self.db.commit()
-        await self.db.refresh(session)
+            from services.observer_queue import observer_queue, OBSERVER_ASYNC
+            if OBSERVER_ASYNC:
+                observer_queue.schedule(session_id)
+            else:
+                try:
+                    session = await self.run_analysis(session_id)
+                except Exception as e:
+                    print(f"AI Analysis failed: {e}")
         return session
+
+    async def patch_state(self, session_id: str, ops: list, base_version: int = None):
+        """Applies a client's RFC 6902 operations (paths under ``/state/``) to the session.
+
+        Raises 422 for operations outside the game state, 409 with the current
+        version when an operation no longer applies.
+        """
+        try:
+            check_client_ops(ops)
+        except JsonPatchError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        try:
+            session = await game_store.patch(session_id, ops, base_version)
+            if session is None:
+                await self.get_session(session_id)
+                session = await game_store.patch(session_id, ops, base_version)
+        except JsonPatchError as e:
+            current = await self.get_session(session_id)
+            raise HTTPException(status_code=409, detail={"error": str(e), "version": current.version})
+        if not game_store.running:
+            await game_store.flush(session_id)
+        return self._remember(session)
+
+    async def run_analysis(self, session_id: str):
+        """Runs the AI shadow observer over the session history and merges the results."""
+        from ._ai_observer import analyze_gameplay
+        from ._profile_helper import get_user_profile_summary
+
+        session = await self.get_session(session_id)
+        if not session.history:
+            return session
+
+        # Fetch profiles for current players to provide context to AI
+        players_rich_data = {}
+        for pid, pdata in (session.players or {}).items():
+            players_rich_data[pid] = dict(pdata)
+            if pdata.get("truth_analysis_enabled"):
+                players_rich_data[pid]["profile_summary"] = await get_user_profile_summary(self.db, pid)
+        # Release the read transaction while the LLM call is in flight.
+        await self.db.commit()
+
+        analysis_results = await analyze_gameplay(session.game_slug, session.history, players_rich_data)
+        if not analysis_results:
+            return session
+        return await self.apply_analysis(session_id, analysis_results)
+
+    async def apply_analysis(self, session_id: str, analysis_results: dict):
+        """Merges observer results into session.analysis and player scores.
+
+        Applied to the live session, so turns committed while the analysis was
+        running are kept.
+        """
+        def merge(s):
+            players = dict(s.players or {})
+            current_analysis = dict(s.analysis or {})
+            # Update scores/stats based on analysis
+            for pid, data in analysis_results.items():
+                if not isinstance(data, dict):
+                    continue
+                # Update global session analysis
+                current_analysis[pid] = data
+
+                # Also update player score in the players dict for easy UI access
+                if pid in players:
+                    players[pid]["score"] = (players[pid].get("score", 0) + data.get("insight_points_awarded", 0))
+                    # Cache the latest fun commentary
+                    players[pid]["last_commentary"] = data.get("fun_commentary")
+                    players[pid]["truth_mismatch"] = data.get("truth_mismatch_detected", False)
+            return {"players": players, "analysis": current_analysis}
+
+        return await self._mutate(session_id, merge)
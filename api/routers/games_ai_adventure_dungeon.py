@@ -5,6 +5,7 @@ import os
 from ._system_prompt import load_system_prompt
 from ._llm import safe_chat_completion
 from .game_session_manager import GameManager
+from services.game_history import story_so_far
 from database.session import get_async_db
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -82,7 +83,7 @@ async def action(req: ActionReq, db: AsyncSession = Depends(get_async_db)):
     history_context = ""
     if session.history:
         recent = session.history[-8:]
-        history_context = "\n".join([f"Action: {h.get('content')}\nResult: {h.get('result')}" for h in recent])
+        history_context = story_so_far(s) + "\n".join([f"Action: {h.get('content')}\nResult: {h.get('result')}" for h in recent])
 
     prompt = f"""
     THE CHRONICLE:
@@ -5,6 +5,7 @@ import json
 from ._system_prompt import load_system_prompt
 from ._llm import safe_chat_completion
 from .game_session_manager import GameManager
+from services.game_history import story_so_far
 from database.session import get_async_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -94,7 +95,7 @@ async def action(req: ActionReq, db: AsyncSession = Depends(get_async_db)):
         raise HTTPException(status_code=403, detail="Not in this session!")
 
     # Context Construction
-    history_str = "\n".join(s.get("story_text", [])[-8:])
+    history_str = story_so_far(s) + "\n".join(s.get("story_text", [])[-8:])
     
     observer_note = ""
     if session.analysis and req.user_id in session.analysis:
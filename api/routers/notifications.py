@@ -1,49 +1,44 @@
 from fastapi import APIRouter, Depends
 from models.notifications import Notification,FBToken
 from schemas.notification import TokenCreate, NotificationSchema, TokenSchema  # Keep Pydantic models
-from database.session import get_db, Session
-from models.user import Tenant
+from database.session import get_async_db
+from database.repositories import Repository
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-from utils.token import get_current_user
+from services.auth_cache import Principal
+from utils.token import get_current_principal
 
 router = APIRouter(tags=['Notifications'])
 
 @router.get('/', response_model=List[NotificationSchema])
-def get_notification(
-    current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_notification(
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    notifications = db.query(Notification).filter(
-        Notification.tenant == current_user.id
-    ).all()
-    return notifications
+    return await Repository(db, Notification).list(Notification.tenant == current_user.id)
 
 @router.post('/token/', response_model=TokenSchema)
-def create_token(
+async def create_token(
     request: TokenCreate,
-    current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    token = FBToken(
+    return await Repository(db, FBToken).create(
         tenant=current_user.id,
         token=request.token,
         type=request.type
     )
-    db.add(token)
-    db.commit()
-    db.refresh(token)
-    return token
 @router.post('/{notification_id}/read')
-def mark_notification_read(
+async def mark_notification_read(
     notification_id: str,
-    current_user: Tenant = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    notif = db.query(Notification).filter(
+    notifications = Repository(db, Notification)
+    if await notifications.update_where(
         Notification.id == notification_id,
-        Notification.tenant == current_user.id
-    ).first()
-    if notif:
-        notif.read = True
-        db.commit()
-    return {"ok": True}
\ No newline at end of file
+        Notification.tenant == current_user.id,
+        read=True,
+    ):
+        await notifications.commit()
+    return {"ok": True}
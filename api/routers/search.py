@@ -1,30 +1,35 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from database.session import get_async_db
+from database.repositories import Repository
 from models.user import Tenant
 from models.social import Event, SocialPost
 from models.journal import Journal
-from utils.token import get_current_user
+from services.auth_cache import Principal
+from utils.token import get_current_principal
 from typing import List, Dict, Any
 
 router = APIRouter(tags=["Search"])
 
 @router.get("/global")
-async def global_search(q: str, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def global_search(q: str, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Search across Events, Posts, and Journals."""
     if not q: return {}
 
     # 1. Search Events (Public or User's)
-    events = db.query(Event).filter(Event.title.ilike(f"%{q}%")).limit(5).all()
+    events = await Repository(db, Event).list(Event.title.ilike(f"%{q}%"), limit=5)
     
     # 2. Search Posts
-    posts = db.query(SocialPost).filter(SocialPost.content.ilike(f"%{q}%")).limit(5).all()
+    posts = await Repository(db, SocialPost).list(SocialPost.content.ilike(f"%{q}%"), limit=5)
     
     # 3. Search Journals (Private)
-    journals = db.query(Journal).filter(Journal.tenant == current_user.id, Journal.title.ilike(f"%{q}%")).limit(5).all()
+    journals = await Repository(db, Journal).list(Journal.tenant == current_user.id, Journal.title.ilike(f"%{q}%"), limit=5)
     
     # 4. Search Users (Stub - Recommendations router handles semantic search)
-    users = db.query(Tenant).filter(Tenant.personal_info.has(first_name=q)).limit(5).all() # Simple exact match stub
+    users = await Repository(db, Tenant).list(
+        Tenant.personal_info.has(first_name=q), options=[joinedload(Tenant.personal_info)], limit=5
+    ) # Simple exact match stub
     
     return {
         "events": [{"id": e.id, "title": e.title} for e in events],
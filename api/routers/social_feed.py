@@ -1,32 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import List
 import traceback
 import datetime
 import uuid
 
-from database.session import get_db
+from database.session import get_async_db
+from database.repositories import Repository
 from models.user import Tenant, PersonalInfo, ProfilePicture
 from models.social import SocialPost, SocialInteraction
 from schemas.social import SocialPostCreate, SocialPostResponse
 from sqlalchemy.orm.attributes import flag_modified
-from utils.token import get_current_user
+from services.auth_cache import Principal
+from utils.token import get_current_principal, get_current_user
 
 router = APIRouter(tags=["Social Feed"])
 
+
+async def _profiles(db: AsyncSession, tenant_ids):
+    """({tenant: PersonalInfo}, {tenant: ProfilePicture}) for all `tenant_ids` in two queries."""
+    tenant_ids = list({str(t) for t in tenant_ids if t})
+    if not tenant_ids:
+        return {}, {}
+    infos = await Repository(db, PersonalInfo).get_many(tenant_ids, key="tenant")
+    pictures = {}
+    for pic in await Repository(db, ProfilePicture).list(ProfilePicture.tenant.in_(tenant_ids)):
+        pictures.setdefault(pic.tenant, pic)
+    return infos, pictures
+
+
 @router.get("/", response_model=List[SocialPostResponse])
-async def get_feed(db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def get_feed(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Get social feed. Currently returns all posts (Public Feed MVP)."""
     try:
-        posts = db.query(SocialPost).order_by(SocialPost.created_at.desc()).limit(50).all()
+        posts = await Repository(db, SocialPost).list(order_by=SocialPost.created_at.desc(), limit=50)
+        # Author info for the whole page at once
+        infos, pictures = await _profiles(db, (post.author_id for post in posts))
         
         results = []
         for post in posts:
             author_id_str = str(post.author_id)
-            # Fetch user info
-            user_info = db.query(PersonalInfo).filter(PersonalInfo.tenant == author_id_str).first()
-            user_pic = db.query(ProfilePicture).filter(ProfilePicture.tenant == author_id_str).first()
+            user_info = infos.get(author_id_str)
+            user_pic = pictures.get(author_id_str)
             
             full_name = f"{user_info.first_name} {user_info.last_name}".strip() if user_info and user_info.first_name else "Unknown User"
             avatar = user_pic.url if user_pic and user_pic.url else f"https://ui-avatars.com/api/?name={full_name}&background=random"
@@ -56,24 +72,22 @@ async def get_feed(db: Session = Depends(get_db), current_user: Tenant = Depends
         raise HTTPException(status_code=500, detail=f"Feed error: {str(e)}")
 
 @router.post("/", response_model=SocialPostResponse, status_code=status.HTTP_201_CREATED)
-async def create_post(post: SocialPostCreate, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def create_post(post: SocialPostCreate, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Create a new social post."""
     try:
         # Ensure likes/comments are initialized
-        db_post = SocialPost(
+        db_post = await Repository(db, SocialPost).create(
             author_id=current_user.id,
             content=post.content,
             media_urls=post.media_urls if post.media_urls is not None else [],
             likes=[],
             comments=[]
         )
-        db.add(db_post)
-        db.commit()
-        db.refresh(db_post)
         
         # Fetch author info for response
-        user_info = db.query(PersonalInfo).filter(PersonalInfo.tenant == current_user.id).first()
-        user_pic = db.query(ProfilePicture).filter(ProfilePicture.tenant == current_user.id).first()
+        infos, pictures = await _profiles(db, [current_user.id])
+        user_info = infos.get(current_user.id)
+        user_pic = pictures.get(current_user.id)
         
         full_name = f"{user_info.first_name} {user_info.last_name}".strip() if user_info and user_info.first_name else "You"
         avatar = user_pic.url if user_pic and user_pic.url else f"https://ui-avatars.com/api/?name={full_name}&background=random"
@@ -95,21 +109,24 @@ async def create_post(post: SocialPostCreate, db: Session = Depends(get_db), cur
     except Exception as e:
         print(f"ERROR creating post: {str(e)}")
         traceback.print_exc()
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 from models.notifications import Notification
 
 @router.get("/{post_id}", response_model=SocialPostResponse)
-async def get_post(post_id: str, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def get_post(post_id: str, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Get a single post with author details and enriched comments."""
-    post = db.query(SocialPost).filter(SocialPost.id == post_id).first()
+    post = await Repository(db, SocialPost).get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    # Fetch post author info
-    user_info = db.query(PersonalInfo).filter(PersonalInfo.tenant == post.author_id).first()
-    user_pic = db.query(ProfilePicture).filter(ProfilePicture.tenant == post.author_id).first()
+    # Fetch post author and commenter info in one go
+    infos, pictures = await _profiles(
+        db, [post.author_id] + [comment.get("user_id") for comment in (post.comments or [])]
+    )
+    user_info = infos.get(post.author_id)
+    user_pic = pictures.get(post.author_id)
     
     full_name = f"{user_info.first_name} {user_info.last_name}".strip() if user_info and user_info.first_name else "Unknown User"
     avatar = user_pic.url if user_pic and user_pic.url else f"https://ui-avatars.com/api/?name={full_name}&background=random"
@@ -118,8 +135,8 @@ async def get_post(post_id: str, db: Session = Depends(get_db), current_user: Te
     enriched_comments = []
     for comment in (post.comments or []):
         c_user_id = comment.get("user_id")
-        c_user_info = db.query(PersonalInfo).filter(PersonalInfo.tenant == c_user_id).first()
-        c_user_pic = db.query(ProfilePicture).filter(ProfilePicture.tenant == c_user_id).first()
+        c_user_info = infos.get(c_user_id)
+        c_user_pic = pictures.get(c_user_id)
         
         c_name = f"{c_user_info.first_name} {c_user_info.last_name}".strip() if c_user_info else "Unknown"
         c_avatar = c_user_pic.url if c_user_pic else f"https://ui-avatars.com/api/?name={c_name}&background=random"
@@ -149,13 +166,13 @@ async def get_post(post_id: str, db: Session = Depends(get_db), current_user: Te
     }
 
 @router.post("/{post_id}/comment", response_model=SocialPostResponse)
-async def create_comment(post_id: str, payload: dict, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def create_comment(post_id: str, payload: dict, db: AsyncSession = Depends(get_async_db), current_user: Tenant = Depends(get_current_user)):
     """Add a comment to a post and notify the author."""
     content = payload.get("content")
     if not content:
         raise HTTPException(status_code=400, detail="Content is required")
 
-    post = db.query(SocialPost).filter(SocialPost.id == post_id).first()
+    post = await Repository(db, SocialPost).get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -175,7 +192,7 @@ async def create_comment(post_id: str, payload: dict, db: Session = Depends(get_
     
     # Notification Logic
     try:
-        user_info = db.query(PersonalInfo).filter(PersonalInfo.tenant == current_user.id).first()
+        user_info = current_user.personal_info
         name = f"{user_info.first_name} {user_info.last_name}" if user_info else "Someone"
         
         target_user_id = None
@@ -205,13 +222,13 @@ async def create_comment(post_id: str, payload: dict, db: Session = Depends(get_
     except Exception as e:
         print(f"Notification error: {e}")
 
-    db.commit()
+    await db.commit()
     return await get_post(post_id, db, current_user)
 
 @router.post("/{post_id}/like", response_model=SocialPostResponse)
-async def like_post(post_id: str, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def like_post(post_id: str, db: AsyncSession = Depends(get_async_db), current_user: Tenant = Depends(get_current_user)):
     """Like a post and notify the author."""
-    post = db.query(SocialPost).filter(SocialPost.id == post_id).first()
+    post = await Repository(db, SocialPost).get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
@@ -232,7 +249,7 @@ async def like_post(post_id: str, db: Session = Depends(get_db), current_user: T
 
         # Notify author
         if post.author_id != current_user.id:
-            user_info = db.query(PersonalInfo).filter(PersonalInfo.tenant == current_user.id).first()
+            user_info = current_user.personal_info
             name = f"{user_info.first_name} {user_info.last_name}" if user_info else "Someone"
             notif = Notification(
                 tenant=post.author_id,
@@ -242,13 +259,13 @@ async def like_post(post_id: str, db: Session = Depends(get_db), current_user: T
             )
             db.add(notif)
             
-        db.commit()
+        await db.commit()
     
     return await get_post(post_id, db, current_user)
 @router.post("/{post_id}/moodscape")
-async def generate_post_moodscape(post_id: str, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def generate_post_moodscape(post_id: str, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Generate a visual 'Perspective' art for a social post."""
-    post = db.query(SocialPost).filter(SocialPost.id == post_id).first()
+    post = await Repository(db, SocialPost).get(post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
         
@@ -279,7 +296,7 @@ async def generate_post_moodscape(post_id: str, db: Session = Depends(get_db), c
         post.media_urls = current_media
         flag_modified(post, "media_urls")
         
-        db.commit()
+        await db.commit()
         return {"moodscape_prompt": mood_prompt, "image_url": media_url}
         
     return {"error": "Generation failed"}
@@ -1,34 +1,37 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from database.session import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.session import get_async_db
+from database.repositories import Repository
 from models.user import Tenant
 from models.social import Event
-from utils.token import get_current_user
+from services.auth_cache import Principal
+from utils.token import get_current_principal, get_current_user
 from typing import Dict, Any
 
 # Note: Using prefix in main.py, so this is relative
 router = APIRouter(tags=["Dashboard"])
 
 @router.get("/relationship", response_model=Dict[str, Any])
-async def get_relationship_dashboard(db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def get_relationship_dashboard(db: AsyncSession = Depends(get_async_db), current_user: Tenant = Depends(get_current_user)):
     """Aggregate data for the Relationship Dashboard."""
     # MVP: Fetch upcoming events and basic user info.
     from models.social import Event
     from models.tools import GoalRitual, Nudge
     
-    upcoming_events = db.query(Event).filter(Event.host_id == current_user.id).limit(5).all()
+    upcoming_events = await Repository(db, Event).list(Event.host_id == current_user.id, limit=5)
     
     # Get active relationship rituals (streaks)
-    rituals = db.query(GoalRitual).filter(
+    rituals = await Repository(db, GoalRitual).list(
         GoalRitual.tenant == current_user.id,
         GoalRitual.is_active == True
-    ).all()
+    )
     
     # Get recent nudges
-    nudges = db.query(Nudge).filter(
+    nudges = await Repository(db, Nudge).list(
         Nudge.tenant == current_user.id,
-        Nudge.is_read == False
-    ).limit(3).all()
+        Nudge.is_read == False,
+        limit=3
+    )
     
     return {
         "status": current_user.personal_info.relationship_status if current_user.personal_info else "Single",
@@ -41,7 +44,7 @@ async def get_relationship_dashboard(db: Session = Depends(get_db), current_user
     }
 
 @router.get("/relationship/daily-card", response_model=Dict[str, Any])
-async def get_daily_relationship_card(current_user: Tenant = Depends(get_current_user)):
+async def get_daily_relationship_card(current_user: Principal = Depends(get_current_principal)):
     """Get a daily AI-generated relationship card/prompt."""
     from api.routers._llm import safe_chat_completion
     
@@ -55,7 +58,7 @@ async def get_daily_relationship_card(current_user: Tenant = Depends(get_current
     )
     
     try:
-        resp = await safe_chat_completion(system="You are an AI Relationship Coach.", user_prompt=prompt)
+        resp = await safe_chat_completion(system="You are an AI Relationship Coach.", user_prompt=prompt, cache_site="daily_relationship_card")
         import json
         card = json.loads(resp)
     except Exception:
@@ -68,7 +71,7 @@ async def get_daily_relationship_card(current_user: Tenant = Depends(get_current
     return {"daily_card": card}
 
 @router.get("/me", response_model=Dict[str, Any])
-async def get_personal_dashboard(db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def get_personal_dashboard(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Aggregate data for the Personal Dashboard."""
     # Lazy import to avoid circulars
     from models.tools import GoalRitual
@@ -76,26 +79,26 @@ async def get_personal_dashboard(db: Session = Depends(get_db), current_user: Te
     from models.connection import Connection
     from sqlalchemy import or_, and_
     
-    active_rituals_count = db.query(GoalRitual).filter(
+    active_rituals_count = await Repository(db, GoalRitual).count(
         GoalRitual.tenant == current_user.id, 
         GoalRitual.is_active == True
-    ).count()
+    )
     
-    journal_count = db.query(Journal).filter(Journal.tenant == current_user.id).count()
+    journal_count = await Repository(db, Journal).count(Journal.tenant == current_user.id)
     
     # Count connections (matched or in personal circle)
-    matches_count = db.query(Connection).filter(
+    matches_count = await Repository(db, Connection).count(
         or_(Connection.user_a_id == current_user.id, Connection.user_b_id == current_user.id),
         Connection.status.in_(['matched', 'personal_circle'])
-    ).count()
+    )
 
     
     # Count unread notifications (matching the Notifications page)
     from models.notifications import Notification
-    unread_notifications = db.query(Notification).filter(
+    unread_notifications = await Repository(db, Notification).count(
         Notification.tenant == current_user.id,
         Notification.read == False
-    ).count()
+    )
 
     return {
         "quote_of_the_day": "Believe you can and you're halfway there.",
@@ -108,7 +111,7 @@ async def get_personal_dashboard(db: Session = Depends(get_db), current_user: Te
 
 
 @router.get("/professional-insights", response_model=Dict[str, Any])
-async def get_professional_insights(db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
+async def get_professional_insights(db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_principal)):
     """Instagram-style Professional Dashboard for the user themselves."""
     from models.social import SocialPost, SocialInteraction
     from models.journal import Journal
@@ -117,24 +120,27 @@ async def get_professional_insights(db: Session = Depends(get_db), current_user:
     from sqlalchemy import func
     
     # 1. Reach: Count unique profile views (mocked + real from SocialInteraction)
-    profile_views = db.query(SocialInteraction).filter(
+    profile_views = await Repository(db, SocialInteraction).count(
         SocialInteraction.target_id == current_user.id,
         SocialInteraction.target_type == "user"
-    ).count()
+    )
     
     # 2. Engagement: Likes and comments on their posts
-    posts = db.query(SocialPost).filter(SocialPost.author_id == current_user.id).all()
+    posts = await Repository(db, SocialPost).list(SocialPost.author_id == current_user.id)
     total_likes = sum(len(p.likes or []) for p in posts)
     total_comments = sum(len(p.comments or []) for p in posts)
     
     # 3. Content Performance: If they write blogs
-    personal_blogs = db.query(Blog).filter(Blog.author_id == current_user.id).count()
+    personal_blogs = await Repository(db, Blog).count(Blog.author_id == current_user.id)
     
     # 4. Growth Momentum: Journals + Skills
-    journals_last_week = db.query(Journal).filter(
+    journals_last_week = await Repository(db, Journal).count(
         Journal.tenant == current_user.id
         # In a real app we'd filter by date: Journal.created_at > (now - 7 days)
-    ).count()
+    )
+    connections_made = await Repository(db, Connection).count(
+        (Connection.user_a_id == current_user.id) | (Connection.user_b_id == current_user.id)
+    )
     
     # AI Summary of behavior (Mocked for speed, but based on real counts)
     ai_status = "Creative Energy Rising" if journals_last_week > 0 else "Observing Your Sanctuary"
@@ -155,9 +161,7 @@ async def get_professional_insights(db: Session = Depends(get_db), current_user:
         },
         "activity_metrics": {
             "journals_completed": journals_last_week,
-            "connections_made": db.query(Connection).filter(
-                (Connection.user_a_id == current_user.id) | (Connection.user_b_id == current_user.id)
-            ).count(),
+            "connections_made": connections_made,
             "blogs_published": personal_blogs
         },
         "ai_insights": {
@@ -28,6 +28,7 @@ from models.user import Lifestyle, KeyMemories
 from schemas.user import ProfilePicture as ProfilePictureSchema, ProfilePictureCreate
 from models.user import ProfilePicture as ProfilePictureModel
 from utils.token import get_current_user
+from services.profile_embeddings import mark_profile_dirty
 from utils.storage import AzureStorageClient
 
 class RouteTagEnum:
@@ -129,6 +130,7 @@ async def update_personal_info(req: PersonalInfoSchema, db: Session = Depends(ge
         obj = PersonalInfo(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.BIG_FIVE_TRAITS, response_model=BigFiveTraitsSchema, tags=[RouteTagEnum.ME])
@@ -140,6 +142,7 @@ async def update_big_five(req: BigFiveTraitsSchema, db: Session = Depends(get_db
         obj = BigFiveTraits(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.MBTI_TRAITS, response_model=MBTITraitsSchema, tags=[RouteTagEnum.ME])
@@ -151,6 +154,7 @@ async def update_mbti(req: MBTITraitsSchema, db: Session = Depends(get_db), curr
         obj = MBTITraits(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.PSYCHOLOGY, response_model=PsychologySchema, tags=[RouteTagEnum.ME])
@@ -162,6 +166,7 @@ async def update_psychology(req: PsychologySchema, db: Session = Depends(get_db)
         obj = Psychology(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.INTERESTS_AND_HOBBIES, response_model=InterestsAndHobbiesSchema, tags=[RouteTagEnum.ME])
@@ -173,6 +178,7 @@ async def update_interests(req: InterestsAndHobbiesSchema, db: Session = Depends
         obj = InterestsAndHobbies(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.VALUES_BELIEFS_AND_GOALS, response_model=ValuesBeliefsAndGoalsSchema, tags=[RouteTagEnum.ME])
@@ -184,6 +190,7 @@ async def update_values(req: ValuesBeliefsAndGoalsSchema, db: Session = Depends(
         obj = ValuesBeliefsAndGoals(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.FAVORITES, response_model=FavoritesSchema, tags=[RouteTagEnum.ME])
@@ -195,6 +202,7 @@ async def update_favorites(req: FavoritesSchema, db: Session = Depends(get_db),
         obj = Favorites(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.RELATIONSHIP_PREFERENCES, response_model=RelationshipPreferencesSchema, tags=[RouteTagEnum.ME])
@@ -206,6 +214,7 @@ async def update_relationships(req: RelationshipPreferencesSchema, db: Session =
         obj = RelationshipPreferences(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.FRIENDSHIP_PREFERENCES, response_model=FriendshipPreferencesSchema, tags=[RouteTagEnum.ME])
@@ -217,6 +226,7 @@ async def update_friendships(req: FriendshipPreferencesSchema, db: Session = Dep
         obj = FriendshipPreferences(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.COLLABORATION_PREFERENCES, response_model=CollaborationPreferencesSchema, tags=[RouteTagEnum.ME])
@@ -228,6 +238,7 @@ async def update_collaborations(req: CollaborationPreferencesSchema, db: Session
         obj = CollaborationPreferences(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.PERSONAL_FREE_FORM, response_model=PersonalFreeFormSchema, tags=[RouteTagEnum.ME])
@@ -239,6 +250,7 @@ async def update_freeform(req: PersonalFreeFormSchema, db: Session = Depends(get
         obj = PersonalFreeForm(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.INTENTIONS, response_model=IntentionsSchema, tags=[RouteTagEnum.ME])
@@ -250,6 +262,7 @@ async def update_intentions(req: IntentionsSchema, db: Session = Depends(get_db)
         obj = Intentions(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.IDEAL_CHARACTERISTICS, response_model=IdealCharacteristicsSchema, tags=[RouteTagEnum.ME])
@@ -261,6 +274,7 @@ async def update_ideal_characteristics(req: IdealCharacteristicsSchema, db: Sess
         obj = IdealCharacteristics(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.ASPIRATION_AND_REFLECTIONS, response_model=AspirationAndReflectionsSchema, tags=[RouteTagEnum.ME])
@@ -272,6 +286,7 @@ async def update_aspiration_and_reflections(req: AspirationAndReflectionsSchema,
         obj = AspirationAndReflections(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.put(RouteEnum.ME + UserRouteEnum.LIFESTYLE, response_model=LifestyleSchema, tags=[RouteTagEnum.ME])
@@ -283,6 +298,7 @@ async def update_lifestyle(req: LifestyleSchema, db: Session = Depends(get_db),
         obj = Lifestyle(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 @router.put(RouteEnum.ME + UserRouteEnum.KEY_MEMORIES, response_model=KeyMemoriesSchema, tags=[RouteTagEnum.ME])
 async def update_key_memories(req: KeyMemoriesSchema, db: Session = Depends(get_db), current_user: Tenant = Depends(get_current_user)):
@@ -294,6 +310,7 @@ async def update_key_memories(req: KeyMemoriesSchema, db: Session = Depends(get_
         obj = KeyMemories(tenant=current_user.id, **req.model_dump())
         db.add(obj)
     db.commit(); db.refresh(obj)
+    await mark_profile_dirty(current_user.id)
     return obj
 
 @router.post(RouteEnum.ME + UserRouteEnum.PROFILE_PICTURE, response_model=ProfilePictureSchema, status_code=status.HTTP_201_CREATED, tags=[RouteTagEnum.ME])
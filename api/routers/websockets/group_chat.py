@@ -3,6 +3,8 @@ from fastapi.encoders import jsonable_encoder
 import logging 
 from schemas.chat import ChatSchema, GroupSchema
 from utils.websockets import manager
+from utils.websockets._broker import WS_BROKER
+from services.chat_writer import chat_writer
 from utils.token import get_current_user
 from fastapi import HTTPException
 from fastapi import status
@@ -34,6 +36,10 @@ async def send_ai_message(room_id: str, conversation: List[dict], db: AsyncSessi
         chat = Chat(group=room_id, message=elinity_chatbot.get_message())
         db.add(chat)
         await db.commit()
+        chat_writer.remember(room_id, {
+            "id": str(chat.id), "sender": chat.sender, "group": room_id, "message": chat.message,
+            "created_at": chat.created_at.isoformat() if chat.created_at else None,
+        })
     
         await manager.broadcast(room_id, jsonable_encoder(chat))
         return chat
@@ -46,7 +52,9 @@ async def group_chat(websocket: WebSocket, room_id: str, db: AsyncSession = Depe
     result = await db.execute(select(Group).where((Group.id == room_id) | (Group.name == f"game_{room_id}")))
     group = result.scalars().first()
     
-    actual_room_id = group.id if group else room_id
+    # Rooms without a Group (e.g. a game lobby whose group was never created) are not persisted:
+    # chats.group must reference groups.id.
+    actual_room_id = group.id if group else None
 
     await manager.connect(websocket, room_id)
     
@@ -84,17 +92,29 @@ async def group_chat(websocket: WebSocket, room_id: str, db: AsyncSession = Depe
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
 
-        # LOAD HISTORY from DB (use actual_room_id for persistence)
+        # LOAD HISTORY from the room's ring buffer, else from DB (use actual_room_id for persistence).
+        # Other workers' messages never reach this process's ring, so it is only used single-worker.
         try:
-            history_query = select(Chat).where(Chat.group == actual_room_id).order_by(desc(Chat.created_at)).limit(50)
-            history_result = await db.execute(history_query)
-            messages = history_result.scalars().all()
-            for msg in reversed(messages):
-                await websocket.send_json({
+            messages = chat_writer.recent(actual_room_id) if WS_BROKER == "memory" and actual_room_id else None
+            if actual_room_id is None:
+                messages = []
+            elif messages is None:
+                history_query = select(Chat).where(Chat.group == actual_room_id).order_by(desc(Chat.created_at)).limit(50)
+                history_result = await db.execute(history_query)
+                messages = [{
                     "id": str(msg.id),
                     "sender": msg.sender,
+                    "group": msg.group,
                     "message": msg.message,
                     "created_at": msg.created_at.isoformat() if msg.created_at else None,
+                } for msg in reversed(history_result.scalars().all())]
+                messages = chat_writer.seed(actual_room_id, messages)
+            for msg in messages[-50:]:
+                await websocket.send_json({
+                    "id": msg["id"],
+                    "sender": msg["sender"],
+                    "message": msg["message"],
+                    "created_at": msg["created_at"],
                     "type": "chat"
                 })
         except Exception as e:
@@ -113,23 +133,23 @@ async def group_chat(websocket: WebSocket, room_id: str, db: AsyncSession = Depe
                 "type": msg_type
             }
 
-            # SAVE TO DB if it's a chat message (use actual_room_id)
-            if msg_type == "chat" and data.get("message") and actual_room_id:
-                try:
-                    new_chat = Chat(
-                        id=chat_data["id"],
-                        sender=current_user_id,
-                        group=actual_room_id,
-                        message=data.get("message")
-                    )
-                    db.add(new_chat)
-                    await db.commit()
-                except Exception as db_err:
-                    print(f"Failed to save chat to DB: {db_err}")
-                    await db.rollback()
-            
             await manager.broadcast(room_id, jsonable_encoder(chat_data)) 
 
+            # SAVE TO DB if it's a chat message (use actual_room_id); batched write-behind
+            if msg_type == "chat" and data.get("message") and actual_room_id:
+                chat_writer.submit({
+                    "id": chat_data["id"],
+                    "sender": current_user_id,
+                    "group": actual_room_id,
+                    "message": data.get("message"),
+                    "created_at": chat_data["created_at"],
+                })
+                if not chat_writer.running:
+                    try:
+                        await chat_writer.flush()
+                    except Exception as db_err:
+                        print(f"Failed to save chat to DB: {db_err}")
+
     except Exception as e:
         print(f"WS Disconnect: {e}")
         await manager.disconnect(websocket, room_id)
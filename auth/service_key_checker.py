@@ -1,7 +1,7 @@
 from typing import Optional
 from fastapi import Header, HTTPException, status
-import os
-from datetime import datetime
+
+from auth.service_key_registry import service_key_registry
 
 
 def _extract_bearer(authorization: Optional[str]) -> Optional[str]:
@@ -15,40 +15,22 @@ def _extract_bearer(authorization: Optional[str]) -> Optional[str]:
 async def require_service_key(authorization: Optional[str] = Header(None)) -> dict:
     """Validate Authorization: Bearer <service_key> against MongoDB `service_keys` collection.
 
+    Keys are checked against the in-memory registry of auth/service_key_registry.py.
     Returns the matching service key document (dict) on success, raises 401 on failure.
     """
     token = _extract_bearer(authorization)
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing service key")
 
-    mongo_url = os.environ.get('MONGO_DB_URL')
-    if not mongo_url:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="MONGO_DB_URL not configured")
-
     try:
-        # import pymongo lazily (avoid failing import if package not present)
-        from pymongo import MongoClient
-    except Exception:
+        doc = await service_key_registry.verify(token)
+    except RuntimeError as e:  # MONGO_DB_URL not configured
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    except ImportError:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="pymongo not installed on server")
-
-    try:
-        client = MongoClient(mongo_url, serverSelectionTimeoutMS=3000)
-        db = client.get_default_database()
-        coll = db.get_collection('service_keys')
-        docs = list(coll.find({}))
     except Exception:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unable to query service keys")
 
-    try:
-        from utils.token import pwd_context
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Server hashing context unavailable")
-
-    for d in docs:
-        try:
-            if pwd_context.verify(token, d.get('key_hash', '')):
-                return d
-        except Exception:
-            continue
-
-    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid service key")
+    if doc is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid service key")
+    return doc
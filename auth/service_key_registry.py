@@ -0,0 +1,245 @@
+"""In-memory registry of the service keys guarding `/internal/*`.
+
+`require_service_key` used to open a new MongoClient on every request, read
+the whole `service_keys` collection and bcrypt-verify the presented key
+against each document. The registry instead:
+
+- loads the collection once (at startup, on the shared client of
+  utils/mongo_pool.py) into a map from the SHA-256 digest of each key
+  (``key_digest``) to its document, so checking a key is one hash and a dict
+  lookup, confirmed with `hmac.compare_digest`. Service keys are 48 random
+  bytes, so a fast unsalted digest is as safe to store as a bcrypt hash;
+- reloads it every SERVICE_KEY_REFRESH_SECONDS, and right away on changes
+  when the server supports change streams (replica sets, Atlas);
+- still accepts documents that only have a bcrypt ``key_hash`` (created
+  before ``key_digest``): a key missing from the map is checked against them,
+  one check at a time, in a worker thread. A match writes its ``key_digest``
+  back, so each legacy key is bcrypt-checked only once. These scans go
+  through a global token bucket (SERVICE_KEY_LEGACY_RATE per second, bursts
+  of SERVICE_KEY_LEGACY_BURST): beyond it, unknown keys are refused without
+  any bcrypt, so a stream of distinct bad keys can't tie up the workers;
+- remembers rejected digests for SERVICE_KEY_NEGATIVE_TTL seconds, so
+  retrying a bad key costs a dict lookup instead of a round of bcrypt.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from core.logging import logger
+
+SERVICE_KEY_REFRESH_SECONDS = float(os.getenv("SERVICE_KEY_REFRESH_SECONDS", "60"))
+SERVICE_KEY_NEGATIVE_TTL = float(os.getenv("SERVICE_KEY_NEGATIVE_TTL", "300"))
+SERVICE_KEY_NEGATIVE_SIZE = int(os.getenv("SERVICE_KEY_NEGATIVE_SIZE", "10000"))
+SERVICE_KEY_LEGACY_RATE = float(os.getenv("SERVICE_KEY_LEGACY_RATE", "1"))
+SERVICE_KEY_LEGACY_BURST = float(os.getenv("SERVICE_KEY_LEGACY_BURST", "5"))
+SERVICE_KEY_WATCH = os.getenv("SERVICE_KEY_WATCH", "1") not in ("0", "false", "no")
+
+
+def key_digest(key: str) -> str:
+    """What `service_keys` documents store in ``key_digest`` for `key`."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _collection():
+    from utils.mongo_pool import mongo_client
+
+    return mongo_client().get_default_database().get_collection("service_keys")
+
+
+def _bcrypt_verify(key: str, key_hash: str) -> bool:
+    from utils.token import pwd_context
+
+    try:
+        return pwd_context.verify(key, key_hash)
+    except Exception:
+        return False
+
+
+class ServiceKeyRegistry:
+    def __init__(
+        self,
+        collection: Callable[[], Any] = _collection,
+        verify_hash: Callable[[str, str], bool] = _bcrypt_verify,
+        refresh_interval: float = SERVICE_KEY_REFRESH_SECONDS,
+        negative_ttl: float = SERVICE_KEY_NEGATIVE_TTL,
+        negative_size: int = SERVICE_KEY_NEGATIVE_SIZE,
+        legacy_rate: float = SERVICE_KEY_LEGACY_RATE,
+        legacy_burst: float = SERVICE_KEY_LEGACY_BURST,
+        watch: bool = SERVICE_KEY_WATCH,
+    ):
+        self._collection = collection
+        self._verify_hash = verify_hash
+        self.refresh_interval = refresh_interval
+        self.negative_ttl = negative_ttl
+        self.negative_size = negative_size
+        self.legacy_rate = legacy_rate
+        self.legacy_burst = legacy_burst
+        self._legacy_tokens = legacy_burst
+        self._legacy_filled_at = time.monotonic()
+        self.watch = watch
+        self._by_digest: Dict[str, dict] = {}
+        self._legacy: List[dict] = []  # documents with only a bcrypt key_hash
+        self._loaded_at: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self._legacy_lock = threading.Lock()
+        self._rejected: "OrderedDict[str, float]" = OrderedDict()  # digest -> expires at
+        self._watcher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.stats_counters = {
+            "checks": 0, "hits": 0, "rejected": 0, "negative_hits": 0,
+            "legacy_checks": 0, "legacy_throttled": 0, "refreshes": 0, "refresh_errors": 0, "changes": 0,
+        }
+
+    # -- loading --------------------------------------------------------------
+    def refresh(self):
+        """Reload every service key document (blocking)."""
+        with self._refresh_lock:
+            try:
+                docs = list(self._collection().find({}))
+            except Exception:
+                self.stats_counters["refresh_errors"] += 1
+                if self._loaded_at is not None:
+                    self._loaded_at = time.monotonic()  # keep serving the old keys, retry next interval
+                raise
+            by_digest, legacy = {}, []
+            for doc in docs:
+                if doc.get("key_digest"):
+                    by_digest[doc["key_digest"]] = doc
+                elif doc.get("key_hash"):
+                    legacy.append(doc)
+            if by_digest.keys() != self._by_digest.keys():
+                self._rejected.clear()  # a rejected key may exist now
+            self._by_digest, self._legacy = by_digest, legacy
+            self._loaded_at = time.monotonic()
+            self.stats_counters["refreshes"] += 1
+
+    def _stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    def _refresh_if_stale(self):
+        if not self._stale():  # another request refreshed while this one waited
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            if self._loaded_at is None:
+                raise
+            logger.warning(f"Service keys: refresh failed, serving the keys loaded earlier: {e}")
+
+    def _watch(self):
+        """Reload on every change to the collection until `close()` (change streams need a replica set)."""
+        try:
+            with self._collection().watch(max_await_time_ms=1000) as stream:
+                while not self._stopped.is_set():
+                    if stream.try_next() is not None:
+                        self.stats_counters["changes"] += 1
+                        self.refresh()
+        except Exception as e:
+            if not self._stopped.is_set():
+                logger.info(f"Service keys: no change stream ({e}); reloading every {self.refresh_interval:g}s")
+
+    async def start(self):
+        try:
+            await asyncio.to_thread(self.refresh)
+        except Exception as e:
+            logger.warning(f"Service keys: initial load failed ({e}); retrying on first use")
+            return
+        logger.info(f"Service keys loaded ({len(self._by_digest)} keys, {len(self._legacy)} bcrypt-only)")
+        if self.watch and self._watcher is None:
+            self._stopped.clear()
+            self._watcher = threading.Thread(target=self._watch, name="service-key-watch", daemon=True)
+            self._watcher.start()
+
+    async def close(self):
+        self._stopped.set()
+        if self._watcher is not None:
+            await asyncio.to_thread(self._watcher.join, 2)
+            self._watcher = None
+
+    # -- checks ---------------------------------------------------------------
+    def _rejected_recently(self, digest: str) -> bool:
+        expires = self._rejected.get(digest)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._rejected[digest]
+            return False
+        return True
+
+    def _reject(self, digest: str):
+        self._rejected[digest] = time.monotonic() + self.negative_ttl
+        self._rejected.move_to_end(digest)
+        while len(self._rejected) > self.negative_size:
+            self._rejected.popitem(last=False)
+
+    def _legacy_allowed(self) -> bool:
+        """Take a token for one bcrypt scan of the legacy documents (called on the event loop)."""
+        now = time.monotonic()
+        self._legacy_tokens = min(self.legacy_burst, self._legacy_tokens + (now - self._legacy_filled_at) * self.legacy_rate)
+        self._legacy_filled_at = now
+        if self._legacy_tokens < 1:
+            return False
+        self._legacy_tokens -= 1
+        return True
+
+    def _check_legacy(self, key: str, digest: str) -> Optional[dict]:
+        with self._legacy_lock:
+            if digest in self._by_digest:  # learned while waiting for the lock
+                return self._by_digest[digest]
+            for doc in list(self._legacy):
+                self.stats_counters["legacy_checks"] += 1
+                if self._verify_hash(key, doc.get("key_hash", "")):
+                    doc["key_digest"] = digest
+                    self._by_digest[digest] = doc
+                    self._legacy = [d for d in self._legacy if d is not doc]
+                    try:
+                        self._collection().update_one({"_id": doc["_id"]}, {"$set": {"key_digest": digest}})
+                    except Exception as e:
+                        logger.warning(f"Service keys: could not store key_digest of {doc.get('_id')}: {e}")
+                    return doc
+        return None
+
+    async def verify(self, key: str) -> Optional[dict]:
+        """The service key document for `key`, or None. Raises if the keys were never loaded."""
+        self.stats_counters["checks"] += 1
+        if self._stale():
+            await asyncio.to_thread(self._refresh_if_stale)
+        digest = key_digest(key)
+        doc = self._by_digest.get(digest)
+        if doc is not None and hmac.compare_digest(doc["key_digest"], digest):
+            self.stats_counters["hits"] += 1
+            return doc
+        if self._rejected_recently(digest):
+            self.stats_counters["negative_hits"] += 1
+            return None
+        if self._legacy:
+            if not self._legacy_allowed():
+                # Not remembered as rejected: it may be a legacy key, retried once the bucket refills.
+                self.stats_counters["legacy_throttled"] += 1
+                self.stats_counters["rejected"] += 1
+                return None
+            doc = await asyncio.to_thread(self._check_legacy, key, digest)
+            if doc is not None:
+                self.stats_counters["hits"] += 1
+                return doc
+        self.stats_counters["rejected"] += 1
+        self._reject(digest)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "keys": len(self._by_digest),
+            "bcrypt_only": len(self._legacy),
+            "negative_entries": len(self._rejected),
+            "loaded_seconds_ago": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            "watching": self._watcher is not None and self._watcher.is_alive(),
+        }
+
+
+service_key_registry = ServiceKeyRegistry()
@@ -1,7 +1,8 @@
 from ._celery import celery_app
-from ._tasks import create_profile_embeddings
+from ._tasks import create_profile_embeddings, precompute_daily_batches
 
 __all__ = (
     "celery_app",
     "create_profile_embeddings",
+    "precompute_daily_batches",
 )
\ No newline at end of file
@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 from dotenv import load_dotenv
 import os
 
@@ -28,10 +29,15 @@ celery_app.conf.update(
     
     # Beat schedule configuration
     beat_schedule={
-        'run-create-profile-embeddings-every-minute': {
+        'run-create-profile-embeddings': {
             'task': 'core.celery._tasks.create_profile_embeddings',
-            'schedule': 60,  # Execute every 60 seconds
-        }
+            # Cheap when nothing is dirty; the interval bounds edit-to-index lag.
+            'schedule': float(os.getenv("EMBED_PIPELINE_INTERVAL", "15")),
+        },
+        'precompute-daily-batches-nightly': {
+            'task': 'core.celery._tasks.precompute_daily_batches',
+            'schedule': crontab(hour=int(os.getenv("DAILY_BATCH_HOUR", "3")), minute=0),
+        },
     },
     timezone='UTC',
 )
@@ -1,31 +1,401 @@
-from fastapi import FastAPI,Depends,HTTPException,status
+"""Rate limiting: GCRA buckets in Redis, with an in-process fallback.
+
+Every limit is a GCRA (generic cell rate algorithm) bucket: "N requests per
+W seconds" is one stored timestamp per bucket (the theoretical arrival time),
+so memory is fixed per client whatever the request rate. A request checks
+all of its limits (per minute / hour / day) at once and is only counted when
+all of them allow it.
+
+- Redis backend: one atomic Lua script (`GCRA_LUA`) per request, using the
+  Redis clock, so every worker shares the same buckets;
+- in-process fallback: the same algorithm on a bounded LRU of
+  RATE_LIMIT_LOCAL_KEYS buckets. It is used when RATE_LIMIT_BACKEND=memory,
+  and for RATE_LIMIT_REDIS_RETRY_SECONDS after a Redis error; its buckets
+  are per worker.
+
+`RateLimitMiddleware` applies this to every HTTP request. Buckets are keyed
+by route group and by subject: the user id when the request carries a valid
+access token (resolved through services/auth_cache.py), the client IP
+otherwise. There are two groups:
+
+- "api" (browsing: profile, feed, dashboards, ...): an abuse limit only.
+  Users get RATE_LIMIT_AUTHENTICATED, anonymous clients RATE_LIMIT_ANONYMOUS;
+- "llm" (`LLM_ROUTES`, metered): users get their plan's quota
+  (services/plan_limits.py), anonymous clients RATE_LIMIT_ANONYMOUS_LLM.
+
+Within a group, the anonymous limits are a floor for users (`at_least`): a
+signed-in user, whatever their plan, is never limited more tightly than
+anonymous traffic. `RateLimiter` is the per-endpoint dependency for extra,
+fixed limits.
+
+Client IPs: behind a proxy (Azure App Service, a load balancer), uvicorn must
+run with ``--proxy-headers`` and FORWARDED_ALLOW_IPS (entryPoint.sh does), so
+``scope["client"]`` is the real client; RATE_LIMIT_TRUST_FORWARDED=1 reads
+X-Forwarded-For here instead. Ports some proxies append are dropped. Anonymous
+requests that still come from a private or loopback address (the proxy
+itself, when neither is set up) are not IP-limited, rather than all sharing
+one bucket.
+"""
+import ipaddress
+import math
+import os
+import re
 import time
-from fastapi.middleware.cors import CORSMiddleware 
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request
+
+from core.logging import logger
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "no")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")  # redis | memory
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", "100000"))
+RATE_LIMIT_REDIS_RETRY_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_RETRY_SECONDS", "5"))
+RATE_LIMIT_ANONYMOUS = os.getenv("RATE_LIMIT_ANONYMOUS", "60/minute,1000/hour,10000/day")
+RATE_LIMIT_AUTHENTICATED = os.getenv("RATE_LIMIT_AUTHENTICATED", "120/minute,2000/hour,20000/day")
+RATE_LIMIT_ANONYMOUS_LLM = os.getenv("RATE_LIMIT_ANONYMOUS_LLM", "2/minute,20/hour,50/day")
+# Use the first X-Forwarded-For address as the client IP (only behind a trusted proxy).
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "0") not in ("0", "false", "no")
+
+# Routes that call an LLM on (almost) every request.
+LLM_ROUTES = re.compile(
+    r"^/(lumi|ai-mode|multimodal|relationship-skills|self-growth|social|evaluate|onboarding)(/|$)"
+    r"|^/games/[^/]+/(action|start)/?$"
+)
+EXEMPT_ROUTES = re.compile(r"^/(health|debug|static|docs|redoc|openapi\.json)(/|$)")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit(NamedTuple):
+    count: int
+    seconds: int
+
+    def __str__(self):
+        return f"{self.count};w={self.seconds}"
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    limit: Limit  # the tightest of the limits checked
+    remaining: int
+    retry_after: float  # seconds, when not allowed
+
+
+def parse_limits(spec: str) -> Tuple[Limit, ...]:
+    """"10/minute,100/hour" -> (Limit(10, 60), Limit(100, 3600))."""
+    limits = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        count, _, period = part.partition("/")
+        limits.append(Limit(int(count), PERIODS[period.strip().rstrip("s")]))
+    return tuple(limits)
+
+
+def at_least(limits: Sequence[Limit], floor: Sequence[Limit]) -> Tuple[Limit, ...]:
+    """`limits` loosened to `floor`: each window allows at least the floor's count.
+
+    Windows the floor doesn't limit are dropped, so the result is never
+    tighter than `floor` in any window.
+    """
+    floors = {limit.seconds: limit.count for limit in floor}
+    return tuple(
+        Limit(max(limit.count, floors[limit.seconds]), limit.seconds)
+        for limit in limits if limit.seconds in floors
+    )
+
+
+def _gcra(tats: Sequence[Optional[float]], limits: Sequence[Limit], now: float):
+    """(decision, new arrival times) for one request against `limits`; times in seconds."""
+    new_tats, retry, remaining, tightest = [], 0.0, None, 0
+    for i, (tat, limit) in enumerate(zip(tats, limits)):
+        period = limit.seconds / limit.count
+        new_tat = max(tat or now, now) + period
+        retry = max(retry, new_tat - now - limit.seconds)
+        left = math.floor((limit.seconds - (new_tat - now)) / period + 1e-9)
+        if remaining is None or left < remaining:
+            remaining, tightest = left, i
+        new_tats.append(new_tat)
+    if retry > 0:
+        return Decision(False, limits[tightest], 0, retry), None
+    return Decision(True, limits[tightest], remaining, 0.0), new_tats
+
+
+# KEYS: one bucket per limit. ARGV: per limit, its period (window / count) and window, in ms.
+GCRA_LUA = """
+if redis.replicate_commands then pcall(redis.replicate_commands) end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local new_tats, retry, remaining, tightest = {}, 0, -1, 1
+for i = 1, #KEYS do
+  local period, window = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+  local tat = tonumber(redis.call('GET', KEYS[i]) or now)
+  if tat < now then tat = now end
+  local new_tat = tat + period
+  if new_tat - now - window > retry then retry = new_tat - now - window end
+  local left = math.floor((window - (new_tat - now)) / period + 1e-9)
+  if remaining < 0 or left < remaining then remaining, tightest = left, i end
+  new_tats[i] = new_tat
+end
+if retry > 0 then return {0, tostring(retry), tightest, 0} end
+for i = 1, #KEYS do
+  redis.call('SET', KEYS[i], tostring(new_tats[i]), 'PX', math.ceil(new_tats[i] - now))
+end
+return {1, '0', tightest, remaining}
+"""
+
+
+def _redis_client():
+    from utils.redis_pool import async_redis_client
+
+    return async_redis_client()
+
+
+class RateLimits:
+    def __init__(
+        self,
+        backend: str = RATE_LIMIT_BACKEND,
+        max_local_keys: int = RATE_LIMIT_LOCAL_KEYS,
+        redis_retry: float = RATE_LIMIT_REDIS_RETRY_SECONDS,
+        redis_client: Callable[[], Any] = _redis_client,
+    ):
+        self.backend = backend
+        self.max_local_keys = max_local_keys
+        self.redis_retry = redis_retry
+        self._redis_client = redis_client
+        self._script = None  # GCRA_LUA, run on whichever loop's client (EVALSHA, loaded on first NOSCRIPT)
+        self._redis_down_until = 0.0
+        self._local: "OrderedDict[str, float]" = OrderedDict()  # bucket key -> arrival time
+        self.stats_counters = {"checks": 0, "limited": 0, "redis": 0, "local": 0, "redis_errors": 0}
+
+    @staticmethod
+    def keys(group: str, subject: str, limits: Sequence[Limit]) -> List[str]:
+        # One hash tag per (group, subject): all of a request's buckets live on one cluster slot.
+        # Keyed by window only, so a plan change keeps the user's buckets.
+        return [f"rl:{{{group}:{subject}}}:{limit.seconds}" for limit in limits]
+
+    async def hit(self, group: str, subject: str, limits: Sequence[Limit]) -> Decision:
+        """Count one request of `subject` in `group`'s buckets, if all of `limits` allow it."""
+        self.stats_counters["checks"] += 1
+        keys = self.keys(group, subject, limits)
+        decision = None
+        if self.backend == "redis" and time.monotonic() >= self._redis_down_until:
+            try:
+                decision = await self._hit_redis(keys, limits)
+                self.stats_counters["redis"] += 1
+            except Exception as e:
+                self.stats_counters["redis_errors"] += 1
+                self._redis_down_until = time.monotonic() + self.redis_retry
+                logger.warning(f"Rate limiter: Redis unavailable ({e}); per-process limits for {self.redis_retry:g}s")
+        if decision is None:
+            decision = self._hit_local(keys, limits)
+            self.stats_counters["local"] += 1
+        if not decision.allowed:
+            self.stats_counters["limited"] += 1
+        return decision
+
+    async def _hit_redis(self, keys: List[str], limits: Sequence[Limit]) -> Decision:
+        client = self._redis_client()
+        if self._script is None:
+            self._script = client.register_script(GCRA_LUA)
+        args = []
+        for limit in limits:
+            args += [limit.seconds * 1000 / limit.count, limit.seconds * 1000]
+        allowed, retry_ms, tightest, remaining = await self._script(keys=keys, args=args, client=client)
+        return Decision(bool(allowed), limits[int(tightest) - 1], int(remaining), float(retry_ms) / 1000)
+
+    def _hit_local(self, keys: List[str], limits: Sequence[Limit]) -> Decision:
+        now = time.monotonic()
+        decision, new_tats = _gcra([self._local.get(k) for k in keys], limits, now)
+        if new_tats is not None:
+            for key, tat in zip(keys, new_tats):
+                self._local[key] = tat
+                self._local.move_to_end(key)
+            while len(self._local) > self.max_local_keys:
+                self._local.popitem(last=False)  # forgets the least recently seen client's bucket
+        return decision
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "backend": self.backend,
+            "redis_down": time.monotonic() < self._redis_down_until,
+            "local_buckets": len(self._local),
+        }
+
+
+rate_limits = RateLimits()
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _bearer_token(scope: Dict[str, Any]) -> Optional[str]:
+    authorization = _header(scope, b"authorization") or ""
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:]
+    for part in (_header(scope, b"cookie") or "").split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == "access_token" and value:
+            value = value.strip('"')
+            return value[7:] if value.startswith("Bearer ") else value
+    return None
+
+
+def _host(address: str) -> str:
+    """`address` without the port some proxies append ("1.2.3.4:5678", "[::1]:443")."""
+    if address.startswith("["):
+        return address[1:].split("]", 1)[0]
+    if address.count(":") == 1:
+        return address.split(":", 1)[0]
+    return address
+
+
+def client_ip(scope: Dict[str, Any]) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = _header(scope, b"x-forwarded-for")
+        if forwarded:
+            return _host(forwarded.split(",")[0].strip())
+    client = scope.get("client")
+    return _host(client[0]) if client else "unknown"
+
+
+def _internal(ip: str) -> bool:
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return address.is_private or address.is_loopback or address.is_link_local
+
+
+async def subject_of(scope: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """("u:<user id>", user id) for a valid access token, else ("ip:<address>", None).
+
+    (None, None) for anonymous requests from an internal address: not limited.
+    """
+    token = _bearer_token(scope)
+    if token:
+        from services.auth_cache import auth_cache
+
+        try:
+            principal = await auth_cache.principal(token)
+        except Exception:
+            principal = None
+        if principal is not None:
+            return f"u:{principal.id}", principal.id
+    ip = client_ip(scope)
+    if _internal(ip):
+        return None, None
+    return f"ip:{ip}", None
+
+
+async def _plan_limits(user_id: str) -> Tuple[Limit, ...]:
+    from services.plan_limits import plan_limits
+
+    return await plan_limits.limits_for(user_id)
+
+
+def route_group(path: str) -> Optional[str]:
+    """"llm", "api", or None for routes that aren't limited."""
+    if EXEMPT_ROUTES.match(path):
+        return None
+    return "llm" if LLM_ROUTES.match(path) else "api"
+
+
+def _limited_response(decision: Decision):
+    from fastapi.responses import JSONResponse
+
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Rate limit exceeded."},
+        headers={"Retry-After": str(max(1, math.ceil(decision.retry_after))), **_rate_headers(decision)},
+    )
+
+
+def _rate_headers(decision: Decision) -> Dict[str, str]:
+    return {"X-RateLimit-Limit": str(decision.limit), "X-RateLimit-Remaining": str(decision.remaining)}
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing per-user / per-IP limits, with plan quotas on the LLM routes."""
+
+    def __init__(
+        self,
+        app,
+        limits: RateLimits = rate_limits,
+        resolve_limits: Callable[[str], Any] = _plan_limits,
+        anonymous: Sequence[Limit] = parse_limits(RATE_LIMIT_ANONYMOUS),
+        authenticated: Sequence[Limit] = parse_limits(RATE_LIMIT_AUTHENTICATED),
+        anonymous_llm: Sequence[Limit] = parse_limits(RATE_LIMIT_ANONYMOUS_LLM),
+        enabled: bool = RATE_LIMIT_ENABLED,
+    ):
+        self.app = app
+        self.limits = limits
+        self.resolve_limits = resolve_limits
+        self.anonymous = {"api": tuple(anonymous), "llm": tuple(anonymous_llm)}
+        self.authenticated = at_least(authenticated, anonymous)
+        self.enabled = enabled
+
+    async def limits_for(self, group: str, user_id: Optional[str]) -> Tuple[Limit, ...]:
+        floor = self.anonymous[group]
+        if user_id is None:
+            return floor
+        if group == "api":
+            return self.authenticated
+        try:
+            return at_least(await self.resolve_limits(user_id), floor)
+        except Exception as e:
+            logger.warning(f"Rate limiter: plan lookup failed for {user_id}: {e}")
+            return floor
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        group = route_group(scope.get("path", "")) if scope["type"] == "http" and self.enabled else None
+        if group is None or scope.get("method") == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        subject, user_id = await subject_of(scope)
+        limits = await self.limits_for(group, user_id) if subject is not None else ()
+        if not limits:
+            return await self.app(scope, receive, send)
+
+        decision = await self.limits.hit(group, subject, limits)
+        if not decision.allowed:
+            return await _limited_response(decision)(scope, receive, send)
+
+        extra = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in _rate_headers(decision).items()]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
 
 
 class RateLimiter:
-    
-    def __init__(self,requests:int=5,window:int=60):
-        self.requests = requests # No of requests allowed
-        self.window = window # Time window in seconds
-        self.clients = {}
-
-    async def __call__(self,client_id:str="default"):
-        current_time = time.time()
-
-        # Clean old records  or initialize new client
-        if client_id in self.clients:
-            self.clients[client_id] = [ts for ts in self.clients[client_id] if current_time - ts < self.window]
-        else:
-            self.clients[client_id] = [] # Initialize as empty list for this client
-
-        # Check if limit exceeded
-        if len(self.clients[client_id]) >= self.requests:
-            raise HTTPException(status_code=429,detail="Rate limit exceeded.")
-        
-        # Add current request timestamp
-        self.clients[client_id].append(current_time)
+    """Per-endpoint limit on top of the middleware's: `Depends(RateLimiter(requests=5, window=60))`.
 
-        return True
+    Counted per user (or IP) in a bucket of its own, named by `group`.
+    """
 
+    def __init__(self, requests: int = 5, window: int = 60, group: Optional[str] = None, limits: RateLimits = rate_limits):
+        self.limit = Limit(requests, window)
+        self.group = group or f"endpoint-{requests}-{window}"
+        self.rate_limits = limits
 
+    async def __call__(self, request: Request):
+        subject, _ = await subject_of(request.scope)
+        if subject is None:
+            return True
+        decision = await self.rate_limits.hit(self.group, subject, (self.limit,))
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded.",
+                headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))},
+            )
+        return True
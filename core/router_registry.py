@@ -0,0 +1,181 @@
+"""Lazy router registry.
+
+Route tables are declared up front (prefix -> module path) but a router module
+is only imported - and any external clients it builds at import time are only
+constructed - when the first request hits its prefix. Every import is timed so
+slow routers show up in the startup report and on `/debug/imports`.
+
+Usage (see main.py):
+
+    registry = LazyRouterRegistry()
+    registry.register('/lumi', 'api.routers.lumi')
+    registry.install(app)                # reserves the route slot
+    app.add_middleware(LazyRouterMiddleware, registry=registry)
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Paths that need the full route table (OpenAPI schema / docs UI).
+_DOC_PATHS = ('/docs', '/redoc', '/openapi.json')
+
+
+class RouterEntry:
+    """A single `include_router` call waiting to happen."""
+
+    def __init__(self, prefix: str, module_path: str, match: Optional[str] = None, attr: str = 'router'):
+        self.prefix = prefix
+        self.module_path = module_path
+        self.attr = attr
+        self.name = module_path.rsplit('.', 1)[-1]
+        # Routers that carry their own prefix are mounted at '' - `match` tells
+        # the registry which request paths belong to them.
+        self.match = (prefix if match is None else match).rstrip('/')
+        self.included = False
+
+    def matches(self, path: str) -> bool:
+        if not self.match:
+            return False
+        return path == self.match or path.startswith(self.match + '/')
+
+
+class LazyRouterRegistry:
+    def __init__(self):
+        self.entries: List[RouterEntry] = []
+        self.modules: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+        self._app = None
+        self._insert_at = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def register(self, prefix: str, module_path: str, match: Optional[str] = None, attr: str = 'router'):
+        self.entries.append(RouterEntry(prefix, module_path, match=match, attr=attr))
+
+    def install(self, app):
+        """Bind to the app. Lazily loaded routes are spliced in at this position so
+        they keep precedence over routes registered later (e.g. the SPA catch-all)."""
+        self._app = app
+        self._insert_at = len(app.router.routes)
+
+    @property
+    def pending(self) -> List[RouterEntry]:
+        return [e for e in self.entries if not e.included]
+
+    @property
+    def loaded(self) -> List[str]:
+        return [k.rsplit('.', 1)[-1] for k, v in self.modules.items() if v is not None]
+
+    def import_module(self, module_path: str):
+        """Import (once) and time a router module. Failures are recorded, not raised."""
+        if module_path in self.modules:
+            return self.modules[module_path]
+        name = module_path.rsplit('.', 1)[-1]
+        start = time.perf_counter()
+        try:
+            mod = importlib.import_module(module_path)
+        except Exception as e:
+            logger.warning(f"Optional router {module_path} failed to import: {e}")
+            self.errors[name] = str(e)
+            mod = None
+        self.timings[name] = time.perf_counter() - start
+        self.modules[module_path] = mod
+        return mod
+
+    def include(self, entry: RouterEntry):
+        """Include an entry's router into the app (importing the module if needed)."""
+        if entry.included:
+            return
+        entry.included = True
+        mod = self.import_module(entry.module_path)
+        router = getattr(mod, entry.attr, None) if mod else None
+        if router is None or self._app is None:
+            return
+
+        routes = self._app.router.routes
+        before = len(routes)
+        try:
+            self._app.include_router(router, prefix=entry.prefix)
+        except Exception as e:
+            logger.warning(f"Failed to include router {entry.name} at {entry.prefix}: {e}")
+            del routes[before:]
+            return
+        added = routes[before:]
+        del routes[before:]
+        routes[self._insert_at:self._insert_at] = added
+        self._insert_at += len(added)
+        # Cached schema no longer reflects the route table.
+        self._app.openapi_schema = None
+
+    def load_all(self):
+        """Eagerly include every pending router (the old import-everything behaviour)."""
+        for entry in self.pending:
+            self.include(entry)
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _include_async(self, entries: List[RouterEntry]):
+        async with self._get_lock():
+            for entry in entries:
+                if entry.included:
+                    continue
+                # Import off the event loop - module-level client construction can block.
+                await asyncio.to_thread(self.import_module, entry.module_path)
+                self.include(entry)
+
+    async def ensure_loaded(self, path: str):
+        """Load every pending router whose prefix covers `path`."""
+        if path.startswith(_DOC_PATHS):
+            entries = self.pending
+        else:
+            entries = [e for e in self.pending if e.matches(path)]
+        if entries:
+            await self._include_async(entries)
+
+    async def warm(self, delay: float = 0.0):
+        """Background warm-up: import the remaining routers one by one after startup."""
+        if delay:
+            await asyncio.sleep(delay)
+        start = time.perf_counter()
+        for entry in self.pending:
+            await self._include_async([entry])
+            # Yield between modules so live requests are not starved.
+            await asyncio.sleep(0)
+        logger.info(f"Router warm-up finished in {time.perf_counter() - start:.2f}s")
+        self.log_report()
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Per-module import timings, slowest first."""
+        rows = [
+            {"module": name, "seconds": round(secs, 4), "ok": name not in self.errors}
+            for name, secs in self.timings.items()
+        ]
+        rows.sort(key=lambda r: r["seconds"], reverse=True)
+        return rows
+
+    def log_report(self, top: int = 10):
+        rows = self.report()
+        total = sum(r["seconds"] for r in rows)
+        logger.info(f"Router import report: {len(rows)} modules, {total:.2f}s total")
+        for r in rows[:top]:
+            logger.info(f"  {r['module']}: {r['seconds']:.3f}s{'' if r['ok'] else ' (failed)'}")
+
+
+class LazyRouterMiddleware:
+    """ASGI middleware that loads the router for a path before the app routes it."""
+
+    def __init__(self, app, registry: LazyRouterRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] in ("http", "websocket") and self.registry.pending:
+            await self.registry.ensure_loaded(scope.get("path", ""))
+        return await self.app(scope, receive, send)
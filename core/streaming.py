@@ -0,0 +1,156 @@
+"""Streaming variant of the LLM-backed endpoints.
+
+`/lumi/chat/`, `/ai-mode/{mode}/start` and every `/games/{slug}/action` can be
+streamed by sending `Accept: text/event-stream` (SSE) or
+`Accept: application/x-ndjson`, or by adding `?stream=sse|ndjson` (`?stream=1`
+means SSE). The endpoint itself is unchanged: it runs as usual while the first
+LLM call it makes pushes tokens into a sink (services/llm_stream.py), and this
+middleware forwards them to the client as they arrive:
+
+    event: token           {"type": "token", "text": "..."}
+    event: token           ...
+    event: done            {"type": "done", "status": 200, "data": <endpoint JSON>}
+
+`done` is sent once the endpoint has returned, i.e. after the conversation turn
+or game state has been persisted, and carries the authoritative response body.
+Errors raised before the first token are returned as normal JSON responses.
+"""
+import asyncio
+import json
+import re
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from core.logging import logger
+from services.llm_stream import TokenSink, bind_sink, ttft_stats
+
+STREAMABLE_PATHS = {
+    "lumi_chat": re.compile(r"^/lumi/chat/?$"),
+    "ai_mode_start": re.compile(r"^/ai-mode/[^/]+/start/?$"),
+    "game_action": re.compile(r"^/games/[^/]+/action/?$"),
+}
+
+SSE = "text/event-stream"
+NDJSON = "application/x-ndjson"
+
+
+def _endpoint_group(path: str) -> Optional[str]:
+    for name, pattern in STREAMABLE_PATHS.items():
+        if pattern.match(path):
+            return name
+    return None
+
+
+def _requested_format(scope: Dict[str, Any]) -> Optional[str]:
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    flag = (query.get("stream") or [""])[0].lower()
+    if flag == "ndjson":
+        return NDJSON
+    if flag in ("1", "true", "sse"):
+        return SSE
+    for name, value in scope.get("headers", []):
+        if name == b"accept":
+            accept = value.decode("latin-1")
+            if SSE in accept:
+                return SSE
+            if NDJSON in accept:
+                return NDJSON
+    return None
+
+
+def _encode(fmt: str, event: dict) -> bytes:
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    if fmt == SSE:
+        return f"event: {event['type']}\ndata: {data}\n\n".encode("utf-8")
+    return (data + "\n").encode("utf-8")
+
+
+class LLMStreamMiddleware:
+    """ASGI middleware that streams LLM tokens for opted-in requests.
+
+    Add it before CORSMiddleware so CORS headers are applied to the stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope.get("method") != "POST":
+            return await self.app(scope, receive, send)
+        group = _endpoint_group(scope.get("path", ""))
+        fmt = _requested_format(scope) if group else None
+        if fmt is None:
+            return await self.app(scope, receive, send)
+
+        sink = TokenSink()
+        response: Dict[str, Any] = {"start": None, "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["start"] = message
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        async def run():
+            bind_sink(sink)
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                sink.close()
+
+        task = asyncio.ensure_future(run())
+        started = False
+        client_gone = False
+
+        async def emit(payload: bytes, more: bool = True):
+            nonlocal started, client_gone
+            if client_gone:
+                return
+            try:
+                if not started:
+                    started = True
+                    await send({
+                        "type": "http.response.start",
+                        "status": 200,
+                        "headers": [
+                            (b"content-type", f"{fmt}; charset=utf-8".encode()),
+                            (b"cache-control", b"no-cache"),
+                            (b"x-accel-buffering", b"no"),
+                        ],
+                    })
+                await send({"type": "http.response.body", "body": payload, "more_body": more})
+            except OSError:
+                # Client went away; let the endpoint finish so the turn is still saved.
+                client_gone = True
+
+        while True:
+            token = await sink.queue.get()
+            if token is None:
+                break
+            await emit(_encode(fmt, {"type": "token", "text": token}))
+
+        try:
+            await task
+        except Exception as e:
+            if not started:
+                raise
+            logger.error(f"Streamed {scope.get('path')} failed after first token: {e}")
+            await emit(_encode(fmt, {"type": "error", "status": 500, "detail": "Internal Server Error"}), more=False)
+            return
+
+        if sink.ttft is not None:
+            ttft_stats.record_success(group, sink.ttft)
+
+        start = response["start"] or {"status": 500, "headers": []}
+        body = b"".join(response["body"])
+        if not started and start["status"] >= 400:
+            # Nothing streamed yet: surface the error as the endpoint produced it.
+            await send(start)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+            return
+
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = body.decode("utf-8", errors="replace")
+        await emit(_encode(fmt, {"type": "done", "status": start["status"], "data": data}), more=False)
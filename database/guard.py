@@ -0,0 +1,50 @@
+"""Detect sync-engine queries that run on the event loop.
+
+A blocking `Session` query inside an `async def` stalls every request on the
+worker. `install_blocking_guard(engine)` hooks the sync engine's
+``before_cursor_execute``: when a statement runs in a thread that has a
+running event loop, it logs the offending call site (DB_BLOCKING_GUARD=warn)
+or raises `BlockingDBCallError` (DB_BLOCKING_GUARD=raise, for tests: routers
+not yet moved to AsyncSession still query on the loop). Queries from worker
+threads (`asyncio.to_thread`, sync `def` endpoints, Celery) and from the
+AsyncSession engine are not affected.
+"""
+import asyncio
+import os
+import traceback
+
+from sqlalchemy import event
+
+from core.logging import logger
+
+DB_BLOCKING_GUARD = os.getenv("DB_BLOCKING_GUARD", "off").lower()
+
+
+class BlockingDBCallError(RuntimeError):
+    pass
+
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def install_blocking_guard(engine, mode: str = DB_BLOCKING_GUARD) -> bool:
+    """Attach the guard to a sync `engine`; returns False when `mode` is off."""
+    if mode not in ("warn", "raise"):
+        return False
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _check(conn, cursor, statement, parameters, context, executemany):
+        if not on_event_loop():
+            return
+        message = f"Sync DB call on the event loop: {statement.splitlines()[0][:120]}"
+        if mode == "raise":
+            raise BlockingDBCallError(message)
+        caller = "".join(traceback.format_stack(limit=12)[:-1])
+        logger.warning(f"{message}\n{caller}")
+
+    return True
@@ -0,0 +1,142 @@
+"""Connection-pool settings and telemetry for the SQLAlchemy engines.
+
+`engine_options(url, is_async=...)` turns the DB_POOL_* settings into
+`create_engine` / `create_async_engine` keyword arguments:
+
+- QueuePool sized by DB_POOL_SIZE + DB_MAX_OVERFLOW, with DB_POOL_TIMEOUT,
+  DB_POOL_RECYCLE and DB_POOL_PRE_PING (drops connections the server or a
+  load balancer closed while idle);
+- the asyncpg dialect caches DB_STATEMENT_CACHE_SIZE prepared statements per
+  connection (``prepared_statement_cache_size``);
+- DB_PGBOUNCER=1 makes both drivers PgBouncer (transaction mode) safe: no
+  statement cache, uniquely named asyncpg statements, and no psycopg
+  server-side prepares. DB_POOL_SIZE=0 leaves pooling to PgBouncer (NullPool).
+
+The pool classes time every checkout, so `pool_stats()` reports, per engine,
+connections checked out / idle / in overflow and a histogram of how long
+requests waited for a connection. A growing wait histogram at a stable
+checked-out count means the pool (or the workers) are undersized.
+"""
+import time
+import uuid
+from typing import Dict, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from utils.settings import (
+    DB_MAX_OVERFLOW,
+    DB_PGBOUNCER,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE,
+)
+
+# Upper bounds (ms) of the checkout wait histogram; the last bucket is open.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    def observe(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        ms = seconds * 1000
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def snapshot(self, pool) -> dict:
+        out = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            out.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+                max_overflow=pool._max_overflow,
+            )
+        labels = [f"<={b}ms" for b in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        out.update(
+            checkouts=self.checkouts,
+            timeouts=self.timeouts,
+            mean_wait_ms=round(self.wait_seconds / self.checkouts * 1000, 3) if self.checkouts else None,
+            max_wait_ms=round(self.max_wait * 1000, 3),
+            wait_histogram=dict(zip(labels, self.buckets)),
+        )
+        return out
+
+
+POOL_METRICS: Dict[str, PoolMetrics] = {}
+
+
+def timed_pool_class(base, name: str):
+    """`base` (a QueuePool) that records checkout waits in POOL_METRICS[name].
+
+    The metrics live on the class, so pools recreated by `engine.dispose()` keep them.
+    """
+    metrics = POOL_METRICS.setdefault(name, PoolMetrics(name))
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return base._do_get(self)
+        except exc.TimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.observe(time.perf_counter() - started)
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get, "metrics": metrics})
+
+
+def engine_options(url: str, is_async: bool = False, name: Optional[str] = None, connect_args: Optional[dict] = None) -> dict:
+    """Pool and driver keyword arguments for `create_engine` / `create_async_engine`."""
+    driver = make_url(url).get_driver_name()
+    connect_args = dict(connect_args or {})
+    if driver == "asyncpg":
+        # SQLAlchemy's asyncpg dialect prepares statements itself and caches them per
+        # connection; asyncpg's own statement_cache_size doesn't apply to those.
+        connect_args["prepared_statement_cache_size"] = 0 if DB_PGBOUNCER else DB_STATEMENT_CACHE_SIZE
+        if DB_PGBOUNCER:
+            # Server-side statement names must not collide across pooled backends.
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    elif driver == "psycopg" and DB_PGBOUNCER:
+        connect_args["prepare_threshold"] = None
+
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "connect_args": connect_args}
+    if DB_POOL_SIZE <= 0:
+        options["poolclass"] = NullPool
+        return options
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    options.update(
+        poolclass=timed_pool_class(base, name or ("async" if is_async else "sync")),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def pool_stats(engines: Dict[str, object]) -> dict:
+    """{name: pool snapshot} for `engines` ({name: Engine or AsyncEngine})."""
+    out = {}
+    for name, engine in engines.items():
+        pool = engine.pool
+        metrics = getattr(pool, "metrics", None) or POOL_METRICS.get(name) or PoolMetrics(name)
+        out[name] = metrics.snapshot(pool)
+    return out
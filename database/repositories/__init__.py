@@ -0,0 +1,3 @@
+from .base import Repository, run_sync
+
+__all__ = ["Repository", "run_sync"]
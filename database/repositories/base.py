@@ -0,0 +1,106 @@
+"""Async repository helpers on top of `database.session.async_session`.
+
+`async def` endpoints should not run `Session.query(...)` on the event loop:
+one slow query then stalls every other request on the worker. Routers that
+take ``db: AsyncSession = Depends(get_async_db)`` use these helpers instead:
+
+    posts = Repository(db, SocialPost)
+    latest = await posts.list(order_by=SocialPost.created_at.desc(), limit=50)
+    count = await posts.count(SocialPost.author_id == me)
+
+Sync helpers shared with Celery / scripts (`connection_graph.lookup`, ...)
+run through `run_sync(db, fn, ...)`, which executes them on the async
+connection without blocking the loop. database/guard.py catches sync-engine
+queries that still happen on the loop.
+"""
+from typing import Any, Callable, Dict, Generic, Iterable, List, Optional, Sequence, Type, TypeVar
+
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+ModelT = TypeVar("ModelT")
+T = TypeVar("T")
+
+
+class Repository(Generic[ModelT]):
+    """CRUD for one mapped class on an `AsyncSession`."""
+
+    def __init__(self, db: AsyncSession, model: Type[ModelT]):
+        self.db = db
+        self.model = model
+
+    def _select(self, where: Sequence[Any], options: Iterable[Any] = (), order_by: Any = None):
+        stmt = select(self.model).where(*where)
+        if options:
+            stmt = stmt.options(*options)
+        if order_by is not None:
+            stmt = stmt.order_by(*(order_by if isinstance(order_by, (list, tuple)) else (order_by,)))
+        return stmt
+
+    async def get(self, ident: Any, options: Iterable[Any] = ()) -> Optional[ModelT]:
+        return await self.db.get(self.model, ident, options=list(options) or None)
+
+    async def get_many(self, idents: Iterable[Any], options: Iterable[Any] = (), key: str = "id") -> Dict[Any, ModelT]:
+        """{ident: row} for the idents that exist, in one query."""
+        idents = list(dict.fromkeys(i for i in idents if i is not None))
+        if not idents:
+            return {}
+        column = getattr(self.model, key)
+        rows = await self.list(column.in_(idents), options=options)
+        return {getattr(row, key): row for row in rows}
+
+    async def first(self, *where: Any, options: Iterable[Any] = (), order_by: Any = None) -> Optional[ModelT]:
+        result = await self.db.execute(self._select(where, options, order_by).limit(1))
+        return result.scalars().first()
+
+    async def list(
+        self,
+        *where: Any,
+        options: Iterable[Any] = (),
+        order_by: Any = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> List[ModelT]:
+        stmt = self._select(where, options, order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        if offset:
+            stmt = stmt.offset(offset)
+        result = await self.db.execute(stmt)
+        return list(result.unique().scalars().all())
+
+    async def count(self, *where: Any) -> int:
+        result = await self.db.execute(select(func.count()).select_from(self.model).where(*where))
+        return int(result.scalar_one())
+
+    async def exists(self, *where: Any) -> bool:
+        result = await self.db.execute(select(exists().where(*where)))
+        return bool(result.scalar())
+
+    def add(self, obj: ModelT) -> ModelT:
+        self.db.add(obj)
+        return obj
+
+    async def create(self, **values: Any) -> ModelT:
+        """Insert a row and return it refreshed (server defaults loaded)."""
+        obj = self.add(self.model(**values))
+        await self.db.commit()
+        await self.db.refresh(obj)
+        return obj
+
+    async def update_where(self, *where: Any, **values: Any) -> int:
+        """Bulk UPDATE without loading rows; returns the matched row count (not committed)."""
+        result = await self.db.execute(update(self.model).where(*where).values(**values))
+        return result.rowcount
+
+    async def delete_where(self, *where: Any) -> int:
+        result = await self.db.execute(delete(self.model).where(*where))
+        return result.rowcount
+
+    async def commit(self):
+        await self.db.commit()
+
+
+async def run_sync(db: AsyncSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run sync ORM code `fn(session, *args, **kwargs)` on the async connection; its I/O doesn't block the loop."""
+    return await db.run_sync(lambda session: fn(session, *args, **kwargs))
@@ -3,8 +3,10 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
-from utils.settings import DATABASE_URL, REDIS_HOST, REDIS_PORT, REDIS_DB, REDIS_PASSWORD
-import redis
+from utils.settings import DATABASE_URL
+from utils.redis_pool import redis_client
+from database.guard import install_blocking_guard
+from database.pool import engine_options, pool_stats as _pool_stats
 
 # Async SQLAlchemy
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
@@ -17,8 +19,12 @@ load_dotenv()
 
 
 # SQLAlchemy (sync) setup - used for metadata.create_all and sync code
-engine = create_engine(DATABASE_URL.replace("+asyncpg", ""))
+# Pool size / overflow / recycle / pre-ping and PgBouncer mode come from DB_* settings (database/pool.py)
+SYNC_DATABASE_URL = DATABASE_URL.replace("+asyncpg", "")
+engine = create_engine(SYNC_DATABASE_URL, **engine_options(SYNC_DATABASE_URL, name="sync"))
 Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# DB_BLOCKING_GUARD=warn|raise reports sync queries issued on the event loop (database/guard.py)
+install_blocking_guard(engine)
 Base = declarative_base()
 
 # Async engine and sessionmaker for application async DB operations
@@ -33,7 +39,12 @@ if "sslmode" in ASYNC_DATABASE_URL:
 async_engine = create_async_engine(
     ASYNC_DATABASE_URL, 
     future=True,
-    connect_args={"ssl": "require"} if "azure" in ASYNC_DATABASE_URL or "sslmode" in DATABASE_URL else {}
+    **engine_options(
+        ASYNC_DATABASE_URL,
+        is_async=True,
+        name="async",
+        connect_args={"ssl": "require"} if "azure" in ASYNC_DATABASE_URL or "sslmode" in DATABASE_URL else {},
+    )
 )
 async_session = async_sessionmaker(bind=async_engine, expire_on_commit=False, class_=AsyncSession)
 
@@ -57,19 +68,14 @@ async def get_async_db():
 def get_client():
     return engine.connect()
 
-# Redis client dependency
+# Redis client dependency: a client on the process-wide pool (utils/redis_pool.py);
+# responses stay bytes to avoid encoding issues
 def get_redis_client():
-    redis_client = redis.Redis(
-        host=REDIS_HOST, 
-        port=REDIS_PORT,
-        db=REDIS_DB,
-        password=REDIS_PASSWORD,
-        decode_responses=False  # Keep as bytes to avoid encoding issues
-    )
-    try:
-        yield redis_client
-    finally:
-        redis_client.close()
+    yield redis_client()
+
+def pool_stats() -> dict:
+    """Live stats of both engines' connection pools."""
+    return _pool_stats({"sync": engine, "async": async_engine})
 
 # Import models so Alembic/autogenerate sees them when it imports this module
 try:
@@ -4,6 +4,7 @@ import numpy as np
 from ._mongodb import MongoDB
 import os
 from core.logging import logger
+from services.embedder import embedder
 
 # Configure the API key
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -13,14 +14,17 @@ model = genai.GenerativeModel('gemini-2.0-flash')  # Or 'gemini-1.5-pro' if you
 
 class ElinityEmbedding: 
     def __init__(self,model=None): 
-        self.model_name = 'mock-mpnet-base-v2' 
-        # self.model = SentenceTransformer(self.model_name)
+        self.embedder = embedder
         self.mongodb =  MongoDB(db_name= "personas",collection_name="profiles")
         
     def generate_dummy_embedding(dimension):
         """Generates a random embedding for testing."""
         return np.random.rand(dimension)
 
+    @property
+    def model_name(self):
+        return self.embedder.model_id
+
     def _generate_self_description(self,json_data):
         """
         Generates a self-description from the given JSON data using generative AI.
@@ -70,32 +74,35 @@ class ElinityEmbedding:
             logger.debug(f"OpenRouter fallback failed: {e}")
             return None
             
+    def describe(self,user_profile):
+        """Self-description for a profile dict: the LLM's, else the bio, else name + interests."""
+        desc = self._generate_self_description(user_profile)
+        if not desc:
+            # Fallback: use 'bio' or join some fields to create a description
+            bio = user_profile.get('bio') or user_profile.get('description')
+            if bio:
+                desc = bio
+            else:
+                # try to build a short description from available fields
+                parts = []
+                if user_profile.get('first_name'):
+                    parts.append(user_profile.get('first_name'))
+                if user_profile.get('interests'):
+                    if isinstance(user_profile.get('interests'), (list, tuple)):
+                        parts.append(' '.join(user_profile.get('interests')))
+                    else:
+                        parts.append(str(user_profile.get('interests')))
+                desc = ' '.join(parts) if parts else None
+        return desc
+
     def create_embedding(self,user_profile):
         if isinstance(user_profile,dict): 
-            desc = self._generate_self_description(user_profile)
-            if not desc:
-                # Fallback: use 'bio' or join some fields to create a description
-                bio = user_profile.get('bio') or user_profile.get('description')
-                if bio:
-                    desc = bio
-                else:
-                    # try to build a short description from available fields
-                    parts = []
-                    if user_profile.get('first_name'):
-                        parts.append(user_profile.get('first_name'))
-                    if user_profile.get('interests'):
-                        if isinstance(user_profile.get('interests'), (list, tuple)):
-                            parts.append(' '.join(user_profile.get('interests')))
-                        else:
-                            parts.append(str(user_profile.get('interests')))
-                    desc = ' '.join(parts) if parts else None
+            desc = self.describe(user_profile)
             if not desc:
                 return None, None
-            # return desc, self.model.encode(desc)
-            return desc, np.random.rand(768).tolist()
+            return desc, self.embedder.encode_sync([desc])[0].tolist()
         if isinstance(user_profile,str): 
-            # return user_profile, self.model.encode(user_profile)
-            return user_profile, np.random.rand(768).tolist()
+            return user_profile, self.embedder.encode_sync([user_profile])[0].tolist()
         return None, None
 
     def store(self,metadata,profile): 
@@ -1,8 +1,9 @@
 from pymilvus import MilvusClient
 from dotenv import load_dotenv
-from pymilvus import model
 import os 
 
+from services.embedder import embedder
+
 load_dotenv()
 
 
@@ -19,8 +20,6 @@ class MilvusDB:
             return
 
         try:
-            from pymilvus import model
-            self.embedding_fn = model.DefaultEmbeddingFunction()
             self.client = MilvusClient(uri=self._uri, token=self._token)
             if not self.client.has_collection(collection_name=self.collection_name):
                 self.client.create_collection(
@@ -31,7 +30,7 @@ class MilvusDB:
             print(f"Error initializing Milvus: {e}")
             self.client = None
     def embed_docs(self,docs):  
-        return self.embedding_fn.encode_documents(docs)
+        return list(embedder.encode_sync(docs))
         
     def upsert(self,data):
         res = self.client.insert(collection_name=self.collection_name,data=data)
@@ -1,5 +1,7 @@
 from services.ai_service import AIService, DEFAULT_MODEL
+import json
 import os
+import re
 from dotenv import load_dotenv
 
 from elinity_ai.modes.prompts import (
@@ -13,17 +15,27 @@ class ElinityInsights:
         # We rely purely on AIService (OpenRouter) now
         pass
 
-    def generate_insight(self, query, user_id, user_name, score, user_interests, match_type="general"):
-        """Generate an AI insight using AIService (lightweight)."""
-        
-        system_prompt = "You are an insightful AI relationship expert."
-        
-        if "romantic" in query.lower() or match_type == "romantic":
-            system_prompt = SYSTEM_PROMPT_MATCH_ROMANTIC
-        elif "friend" in query.lower() or match_type == "friendship":
-            system_prompt = SYSTEM_PROMPT_MATCH_FRIENDSHIP
-        elif "work" in query.lower() or "collab" in query.lower() or match_type == "work":
-            system_prompt = SYSTEM_PROMPT_MATCH_WORK
+    @staticmethod
+    def match_type_for(query, match_type="general"):
+        """The effective match type: explicit, or guessed from the search query."""
+        query = (query or "").lower()
+        if "romantic" in query or match_type == "romantic":
+            return "romantic"
+        if "friend" in query or match_type == "friendship":
+            return "friendship"
+        if "work" in query or "collab" in query or match_type == "work":
+            return "work"
+        return "general"
+
+    def _system_prompt(self, query, match_type="general"):
+        return {
+            "romantic": SYSTEM_PROMPT_MATCH_ROMANTIC,
+            "friendship": SYSTEM_PROMPT_MATCH_FRIENDSHIP,
+            "work": SYSTEM_PROMPT_MATCH_WORK,
+        }.get(self.match_type_for(query, match_type), "You are an insightful AI relationship expert.")
+
+    def _build_prompt(self, query, user_name, user_interests, match_type="general"):
+        system_prompt = self._system_prompt(query, match_type)
 
         formatted_prompt = (
             f"Generate a deep, warm AI insight for {user_name}. "
@@ -33,31 +45,72 @@ class ElinityInsights:
             "Write in a clean, neat, and conversational tone as an insightful relationship expert. "
             "Focus strictly on their personality and compatibility."
         )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": formatted_prompt}
+        ]
 
+    async def agenerate_insight(self, query, user_id, user_name, score, user_interests, match_type="general"):
+        """Generate an AI insight on the caller's event loop (uses the shared LLM transport)."""
         try:
-            # We strictly use the async AIService, but this method is often called synchronously via to_thread.
-            # We must handle the async call properly.
-            import asyncio
-            
-            async def _call_ai():
-                svc = AIService()
-                # System prompt + User prompt
-                return await svc.chat([
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": formatted_prompt}
-                ], model=DEFAULT_MODEL)
-
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    # Check if we are in a thread where we can verify a new loop or use run_coroutine_threadsafe
-                    # But simpler: if loop is running and we are in a thread, `asyncio.run` might fail.
-                    # Best approach for to_thread usage: just create a new loop if it's a dedicated thread.
-                    # Safety check:
-                    return asyncio.run(_call_ai()) 
-            except RuntimeError:
-                 return asyncio.run(_call_ai())
-
+            svc = AIService()
+            return await svc.chat(self._build_prompt(query, user_name, user_interests, match_type), model=DEFAULT_MODEL, cache_site="match_insight")
         except Exception as e:
             print(f"Insight Generation Error: {e}")
             return f"Insight unavailable for {user_name}."
+
+    def generate_insight(self, query, user_id, user_name, score, user_interests, match_type="general"):
+        """Synchronous wrapper for callers without an event loop (scripts, worker threads)."""
+        import asyncio
+        return asyncio.run(self.agenerate_insight(query, user_id, user_name, score, user_interests, match_type))
+
+    def _build_batch_prompt(self, query, viewer_interests, candidates, match_type="general"):
+        people = "\n".join(
+            f"- ref {ref}: {name}. Interests: {interests or 'not shared'}." for ref, name, interests in candidates
+        )
+        formatted_prompt = (
+            f"Generate a deep, warm AI insight for each of these {len(candidates)} people, "
+            f"as potential matches for someone whose interests are: {viewer_interests or 'not shared'}.\n"
+            f"{people}\n"
+            f"Context Query: {query}. "
+            "IMPORTANT: Do NOT include any IDs, technical scores, or Markdown formatting like **asterisks** in the insights. "
+            "Write each in a clean, neat, and conversational tone as an insightful relationship expert, "
+            "focusing strictly on their personality and compatibility. "
+            'Reply with JSON only, exactly: {"insights": [{"ref": "<ref>", "insight": "<text>"}]}'
+        )
+        return [
+            {"role": "system", "content": self._system_prompt(query, match_type)},
+            {"role": "user", "content": formatted_prompt}
+        ]
+
+    @staticmethod
+    def _parse_batch(text):
+        """{ref: insight} from the model's JSON reply (tolerates code fences and surrounding prose)."""
+        match = re.search(r"\{.*\}", text or "", re.DOTALL)
+        if not match:
+            return {}
+        try:
+            items = json.loads(match.group(0)).get("insights", [])
+        except (ValueError, AttributeError):
+            return {}
+        return {
+            str(item["ref"]): item["insight"].strip()
+            for item in items
+            if isinstance(item, dict) and item.get("ref") is not None and isinstance(item.get("insight"), str) and item["insight"].strip()
+        }
+
+    async def abatch_insights(self, query, viewer_interests, candidates, match_type="general"):
+        """Insights for several candidates from one structured-JSON completion.
+
+        `candidates` are (ref, name, interests) tuples; returns {ref: insight} for
+        the refs the model answered (missing refs are left to the caller).
+        """
+        try:
+            svc = AIService()
+            text = await svc.chat(self._build_batch_prompt(query, viewer_interests, candidates, match_type), model=DEFAULT_MODEL)
+        except Exception as e:
+            print(f"Batch Insight Generation Error: {e}")
+            return {}
+        wanted = {ref for ref, _, _ in candidates}
+        return {ref: insight for ref, insight in self._parse_batch(text).items() if ref in wanted}
+
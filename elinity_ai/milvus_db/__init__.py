@@ -1,5 +1,10 @@
 from ._milvus_db import milvus_db
-from ._similarity_pipeline import MilvusUserSimilarityPipeline
+from ._local_pipeline import LocalUserSimilarityPipeline, get_similarity_pipeline
+try:
+    from ._similarity_pipeline import MilvusUserSimilarityPipeline
+except ImportError:
+    # pymilvus not installed: keep the mock so imports still resolve.
+    from ._milvus_db import MilvusUserSimilarityPipeline
 
 
-__all__ = ["milvus_db", "MilvusUserSimilarityPipeline"]
\ No newline at end of file
+__all__ = ["milvus_db", "MilvusUserSimilarityPipeline", "LocalUserSimilarityPipeline", "get_similarity_pipeline"]
@@ -0,0 +1,64 @@
+import os
+
+from services.vector_index import get_vector_index
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "local").lower()
+
+
+class LocalUserSimilarityPipeline:
+    """Drop-in for `MilvusUserSimilarityPipeline` served by the in-process index (services/vector_index.py).
+
+    Ids are `Tenant.embedding_id`s; each hit's metadata carries the tenant id.
+    Without an explicit `index`, each call uses the current process-wide index,
+    so snapshots swapped in by the reloader are picked up.
+    """
+
+    def __init__(self, index=None):
+        self._index = index
+
+    @property
+    def index(self):
+        return self._index if self._index is not None else get_vector_index()
+
+    def get_user_vector_by_id(self, user_id, index=None):
+        """Retrieve a user's vector by their ID."""
+        vector = (index or self.index).vector(user_id)
+        if vector is None:
+            raise ValueError(f"User with ID {user_id} not found")
+        return vector
+
+    def find_similar_users(self, query_vector, top_k=10, exclude_ids=None, index=None):
+        """Find similar users based on vector similarity."""
+        index = index or self.index
+        if exclude_ids is None:
+            exclude_ids = ()
+        elif not isinstance(exclude_ids, (list, tuple, set)):
+            exclude_ids = (exclude_ids,)
+        return [
+            {"id": embedding_id, "score": score, "metadata": {"tenant_id": index.labels.get(embedding_id)}}
+            for embedding_id, score in index.search(query_vector, k=top_k, exclude=exclude_ids)
+        ]
+
+    def find_similar_users_by_id(self, user_id, top_k=10, include_self=False):
+        """Pipeline to find similar users based on a user ID."""
+        index = self.index  # one snapshot for both steps
+        user_vector = self.get_user_vector_by_id(user_id, index)
+        return self.find_similar_users(user_vector, top_k=top_k, exclude_ids=None if include_self else user_id, index=index)
+
+    def close(self):
+        pass
+
+
+_pipeline = None
+
+
+def get_similarity_pipeline():
+    """Process-wide pipeline. VECTOR_BACKEND=local (default) uses the in-process index; milvus needs MILVUS_URI/MILVUS_TOKEN."""
+    global _pipeline
+    if _pipeline is None:
+        if VECTOR_BACKEND == "milvus":
+            from ._similarity_pipeline import MilvusUserSimilarityPipeline
+            _pipeline = MilvusUserSimilarityPipeline()
+        else:
+            _pipeline = LocalUserSimilarityPipeline()
+    return _pipeline
@@ -25,5 +25,8 @@ fi
 
 echo "[entrypoint] Starting uvicorn on 0.0.0.0:${PORT} (SKIP_HEAVY_IMPORTS=${SKIP_HEAVY_IMPORTS:-})"
 
-# Exec into uvicorn so signals are forwarded correctly
-exec uvicorn main:app --host 0.0.0.0 --port "$PORT"
\ No newline at end of file
+# Exec into uvicorn so signals are forwarded correctly.
+# Behind the App Service front end, take the client address from X-Forwarded-For
+# (rate limiting keys anonymous clients by IP). Narrow FORWARDED_ALLOW_IPS to the
+# proxy's addresses when the container is reachable other than through it.
+exec uvicorn main:app --host 0.0.0.0 --port "$PORT" --proxy-headers --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-*}"
\ No newline at end of file
@@ -7,13 +7,18 @@ from pathlib import Path
 from middleware.auth_middleware import AdminAuthMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 import os
-import importlib
+import asyncio
 import logging
+from core.router_registry import LazyRouterRegistry, LazyRouterMiddleware
+from core.streaming import LLMStreamMiddleware
 
-# Defensive router imports: some routers initialize external clients at import-time
-# (Firebase, AssemblyAI, Milvus, etc.). To make local/dev boots reliable we
-# attempt to import each router individually and continue on failure. Set
-# SKIP_HEAVY_IMPORTS=1 in the env to prefer skipping optional heavy routers.
+# Router modules are registered with a lazy registry (core/router_registry.py):
+# a module is imported - and any external clients it builds at import time
+# (Firebase, AssemblyAI, Milvus, ...) constructed - only when the first request
+# hits its prefix. Import failures are recorded and the app keeps serving.
+# Set LAZY_ROUTERS=0 to import everything at boot, ROUTER_WARMUP=1 to import
+# the remaining routers in the background once the server reports ready.
+# Set SKIP_HEAVY_IMPORTS=1 in the env to skip the websocket routers.
 
 _ROUTER_MODULES = [
     'auth',
@@ -116,26 +121,21 @@ _ROUTER_MODULES = [
     'games_the_long_quest',
 ]
 
-_IMPORTED = {}
-_IMPORT_ERRORS = {}
 # Default to skipping heavy imports to make local/dev boots reliable unless
 # explicitly disabled. Set SKIP_HEAVY_IMPORTS=0 to enable heavy modules.
 SKIP_HEAVY = os.getenv('SKIP_HEAVY_IMPORTS', '0') not in ('0', 'false', 'no')
-for mod_name in _ROUTER_MODULES:
-    try:
-        _IMPORTED[mod_name] = importlib.import_module(f"api.routers.{mod_name}")
-    except Exception as e:
-        error_msg = f"Optional router api.routers.{mod_name} failed to import: {e}"
-        logging.getLogger(__name__).warning(error_msg)
-        _IMPORT_ERRORS[mod_name] = str(e)
-        _IMPORTED[mod_name] = None
+LAZY_ROUTERS = os.getenv('LAZY_ROUTERS', '1') not in ('0', 'false', 'no')
+ROUTER_WARMUP = os.getenv('ROUTER_WARMUP', '0') not in ('0', 'false', 'no')
 
-# ... (Rest of file) ...
-
-# ... removed from here ...
+# Module name -> import path for everything that may be mounted via _INCLUDES.
+_MODULE_PATHS = {name: f"api.routers.{name}" for name in _ROUTER_MODULES}
+_MODULE_PATHS['voice_onboarding'] = 'api.routers.voice_onboarding'
+_MODULE_PATHS['voice_onboarding_save'] = 'api.routers.voice_onboarding_save'
+# Emergency disable:
+if not SKIP_HEAVY:
+    _MODULE_PATHS['websocket'] = 'api.routers.websockets.websocket'
+    _MODULE_PATHS['group_chat'] = 'api.routers.websockets.group_chat'
 
-# Expose imported modules as variables (e.g. auth, users, ...) expected later in the file
-globals().update(_IMPORTED)
 dashboard_app = None
 login = None
 try:
@@ -143,47 +143,23 @@ try:
 except Exception as e:
     logging.getLogger(__name__).warning(f"Dashboard routers failed to import: {e}")
 
-websocket = None
-onboarding = None
-group_chat = None
-# Emergency disable:
-if not SKIP_HEAVY:
-    try:
-        from api.routers.websockets import websocket, onboarding, group_chat
-    except Exception as e:
-        logging.getLogger(__name__).warning(f"Websocket routers failed to import: {e}")
-
 internal_users_router = None
 try:
     from api.routers.internal_users import router as internal_users_router
 except Exception as e:
     logging.getLogger(__name__).warning(f"Internal users router failed to import: {e}")
-voice_onboarding = None
-voice_onboarding_save = None
-# Emergency disable:
-try:
-    from api.routers import voice_onboarding as _voice_onboarding, voice_onboarding_save as _voice_onboarding_save
-    voice_onboarding = _voice_onboarding
-    voice_onboarding_save = _voice_onboarding_save
-except Exception:
-    pass
-#     except Exception:
-#         # If optional dependencies (like speech_recognition) are missing or something else fails,
-#         # don't prevent the app from starting. The endpoints will be unavailable until dependencies are installed.
-#         import logging
-#         logging.getLogger(__name__).warning("Voice onboarding routers not loaded (optional). Install audio dependencies to enable them.")
 from fastapi.responses import HTMLResponse, FileResponse
 from database.session import engine, Base
 import time
 from sqlalchemy.exc import OperationalError
-from core.limiter import RateLimiter
+from core.limiter import RateLimiter, RateLimitMiddleware
 # Ensure DB models that are not auto-imported get registered
 try:
     import models.service_key  # registers ServiceKey on Base.metadata
 except Exception:
     pass
 
-limiter = RateLimiter(requests=5, window=60)
+limiter = RateLimiter(requests=5, window=60, group="root")
 
 import os
 from dotenv import load_dotenv
@@ -224,10 +200,79 @@ async def lifespan(app: FastAPI):
                 print("DEBUG: Migration: added connection_preferences")
             except Exception:
                 pass # Already exists
+        with engine.begin() as conn:
+            try:
+                conn.execute(text("ALTER TABLE game_sessions ADD COLUMN version INTEGER DEFAULT 0 NOT NULL"))
+                print("DEBUG: Migration: added game_sessions.version")
+            except Exception:
+                pass # Already exists
+        with engine.begin() as conn:
+            try:
+                conn.execute(text("ALTER TABLE tenants ADD COLUMN suspended_at TIMESTAMPTZ"))
+                print("DEBUG: Migration: added tenants.suspended_at")
+            except Exception:
+                pass # Already exists
+        with engine.begin() as conn:
+            try:
+                conn.execute(text("ALTER TABLE tenants ADD COLUMN embedding_hash VARCHAR(64)"))
+                print("DEBUG: Migration: added tenants.embedding_hash")
+            except Exception:
+                pass # Already exists
     except Exception as e:
         print(f"DEBUG: Migration check failed: {e}")
 
+    # 3. Shared pooled HTTP transport for LLM providers
+    from services.llm_transport import llm_transport
+    await llm_transport.start()
+
+    # 4. Hot game-session store (replays any unflushed journal, starts write-behind)
+    from services.game_session_store import game_store
+    await game_store.start()
+
+    # 5. Websocket fan-out broker (Redis pub/sub when WS_BROKER=redis)
+    from utils.websockets import manager as ws_manager
+    await ws_manager.start()
+    # Game-state changes are pushed to /games/multiplayer/ws/{session_id} subscribers
+    from services import game_push
+    game_push.install(game_store)
+
+    # 6. Group-chat write-behind (batched inserts, spill file replay)
+    from services.chat_writer import chat_writer
+    await chat_writer.start()
+
+    # 7. In-memory service-key registry for /internal/* (Mongo change stream or polling)
+    from auth.service_key_registry import service_key_registry
+    if os.getenv('MONGO_DB_URL'):
+        await service_key_registry.start()
+
+    # 8. Vector index snapshots written by the embedding job, picked up off the request path
+    from services.vector_index import vector_index_reloader
+    await vector_index_reloader.start()
+
+    # 9. Optional background warm-up of lazily registered routers. The task
+    # starts running once the server reports ready.
+    warm_task = None
+    if ROUTER_WARMUP and router_registry.pending:
+        warm_delay = float(os.getenv('ROUTER_WARMUP_DELAY', '1'))
+        warm_task = asyncio.create_task(router_registry.warm(delay=warm_delay))
+
     yield
+    if warm_task and not warm_task.done():
+        warm_task.cancel()
+    from services.observer_queue import observer_queue
+    await observer_queue.drain()
+    from services.game_history import game_history
+    await game_history.close()
+    await game_store.close()
+    await chat_writer.close()
+    from services.embedder import embedder
+    await embedder.close()
+    await ws_manager.close()
+    await service_key_registry.close()
+    await vector_index_reloader.close()
+    from utils.mongo_pool import close_all as close_mongo_clients
+    close_mongo_clients()
+    await llm_transport.close()
     print("DEBUG: Exiting lifespan...")
 
 
@@ -347,6 +392,14 @@ _INCLUDES = [
 # Keep this lightweight so import-time doesn't trigger heavy subsystems.
 app = FastAPI(lifespan=lifespan, title=os.getenv("APP_NAME", "elinity-backend"))
 
+# Token streaming for Lumi / AI modes / game actions (see core/streaming.py).
+# Registered before CORS so it sits inside it and streamed responses get CORS headers.
+app.add_middleware(LLMStreamMiddleware)
+
+# Plan-aware per-user / per-IP rate limits (core/limiter.py), inside CORS so
+# 429 responses carry CORS headers.
+app.add_middleware(RateLimitMiddleware)
+
 # Basic CORS middleware (override with CORS_ALLOW_ORIGINS env as comma-separated list)
 cors_env = os.getenv("CORS_ALLOW_ORIGINS")
 allow_origins = cors_env.split(",") if cors_env else ["*"]
@@ -375,22 +428,30 @@ app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY", "dev-se
 if Path("static").exists():
     app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Routers mounted at '' carry their own prefix; tell the registry which
+# request paths belong to them.
+_MATCH_PREFIXES = {
+    'connections': '/connections',
+    'lumi_coach': '/lumi/relationship-coach',
+}
+
+router_registry = LazyRouterRegistry()
 for prefix, varname in _INCLUDES:
-    mod = globals().get(varname)
-    if mod and hasattr(mod, 'router'):
-        try:
-            app.include_router(prefix=prefix, router=mod.router)
-        except Exception as e:
-            logging.getLogger(__name__).warning(f"Failed to include router {varname} at {prefix}: {e}")
-
-if voice_onboarding and hasattr(voice_onboarding, 'router'):
-    app.include_router(router=voice_onboarding.router)
-if voice_onboarding_save and hasattr(voice_onboarding_save, 'router'):
-    app.include_router(prefix='/voice', router=voice_onboarding_save.router)
-
-# The remaining game routers are included dynamically above in the
-# _INCLUDES loop; avoid re-including them here to prevent NameError when
-# optional routers failed to import.
+    if varname not in _MODULE_PATHS:
+        continue
+    match = _MATCH_PREFIXES.get(varname) if prefix == '' else None
+    router_registry.register(prefix, _MODULE_PATHS[varname], match=match)
+router_registry.register('', _MODULE_PATHS['voice_onboarding'], match='/voice')
+router_registry.register('/voice', _MODULE_PATHS['voice_onboarding_save'])
+router_registry.install(app)
+app.add_middleware(LazyRouterMiddleware, registry=router_registry)
+
+if not LAZY_ROUTERS:
+    router_registry.load_all()
+    router_registry.log_report()
+
+# The remaining game routers are included lazily by the registry above;
+# avoid including them here directly or they would be mounted twice.
 
 # Include dashboard router with /admin prefix
 # Include dashboard router with /admin prefix
@@ -416,14 +477,132 @@ if internal_users_router:
 
 @app.get("/debug/imports")
 async def debug_imports():
-    """Debug endpoint to list loaded modules and import errors."""
+    """Debug endpoint to list loaded modules, import errors and import timings."""
     return {
-        "loaded": [k for k, v in _IMPORTED.items() if v is not None],
-        "errors": _IMPORT_ERRORS,
+        "loaded": router_registry.loaded,
+        "pending": sorted({e.name for e in router_registry.pending}),
+        "errors": router_registry.errors,
+        "timings": router_registry.report(),
         "routes": [route.path for route in app.routes]
     }
 
 
+@app.get("/debug/llm")
+async def debug_llm():
+    """Debug endpoint with rolling per-model latency/error stats, time-to-first-token and response-cache metrics."""
+    from api.routers._llm import model_stats, ttft_model_stats, _model_candidates
+    from services.llm_cache import llm_cache
+    from services.llm_stream import ttft_stats
+    return {
+        "candidates": _model_candidates(),
+        "models": model_stats(),
+        "ttft": {"endpoints": ttft_stats.snapshot(), "models": ttft_model_stats()},
+        "cache": llm_cache.stats(),
+    }
+
+
+
+@app.get("/debug/observer")
+async def debug_observer():
+    """Debug endpoint with shadow-observer queue depth, coalescing and run stats."""
+    from services.observer_queue import observer_queue
+    return observer_queue.stats()
+
+
+@app.get("/debug/game-store")
+async def debug_game_store():
+    """Debug endpoint with hot game-session store hit rate and write-behind stats."""
+    from services.game_session_store import game_store
+    from services.game_history import game_history
+    return {**game_store.stats(), "history": game_history.stats()}
+
+
+@app.get("/debug/websockets")
+async def debug_websockets():
+    """Debug endpoint with local websocket rooms/connections and broker relay counts."""
+    from utils.websockets import manager as ws_manager
+    return ws_manager.stats()
+
+
+@app.get("/debug/matching")
+async def debug_matching():
+    """Debug endpoint with matching snapshot size, age, last query latency and vector index reloads."""
+    from services.matching import matching_engine
+    from services.vector_index import vector_index_reloader
+    return {**matching_engine.stats(), "vector_index_reloads": vector_index_reloader.stats()}
+
+
+@app.get("/debug/chat-writer")
+async def debug_chat_writer():
+    """Debug endpoint with group-chat batch writer throughput, backlog and history-ring hits."""
+    from services.chat_writer import chat_writer
+    return chat_writer.stats()
+
+
+@app.get("/debug/embeddings")
+async def debug_embeddings():
+    """Debug endpoint with embedding backend, batch sizes, cache hits and encode throughput (texts/sec)."""
+    from services.embedder import embedder
+    return embedder.stats()
+
+
+@app.get("/debug/embedding-pipeline")
+async def debug_embedding_pipeline():
+    """Debug endpoint with the dirty-profile backlog, its oldest age and the last pipeline run (throughput, lag)."""
+    from services.profile_embeddings import profile_embedding_pipeline
+    return await asyncio.to_thread(profile_embedding_pipeline.stats)
+
+
+@app.get("/debug/daily-batches")
+async def debug_daily_batches():
+    """Debug endpoint with per-shard progress of today's daily-match precomputation."""
+    from services.daily_batches import BatchProgress, today
+    return await asyncio.to_thread(lambda: BatchProgress(today()).snapshot())
+
+
+@app.get("/debug/connection-graph")
+async def debug_connection_graph():
+    """Debug endpoint with connection-status cache hits, misses and pair-key queries."""
+    from services.connection_graph import connection_graph
+    return connection_graph.stats()
+
+
+@app.get("/debug/match-insights")
+async def debug_match_insights():
+    """Debug endpoint with AI match-insight cache hits, batched completions and fallbacks."""
+    from services.match_insights import match_insights
+    return match_insights.stats()
+
+
+@app.get("/debug/auth")
+async def debug_auth():
+    """Debug endpoint with auth fast-path hits, JWT decodes, principal loads and revocation checks."""
+    from services.auth_cache import auth_cache
+    return auth_cache.stats()
+
+
+@app.get("/debug/service-keys")
+async def debug_service_keys():
+    """Debug endpoint with service-key registry size, lookups, negative-cache hits and refreshes."""
+    from auth.service_key_registry import service_key_registry
+    return service_key_registry.stats()
+
+
+@app.get("/debug/rate-limits")
+async def debug_rate_limits():
+    """Debug endpoint with rate-limit checks, rejections, backend in use and plan-limit lookups."""
+    from core.limiter import rate_limits
+    from services.plan_limits import plan_limits
+    return {"limiter": rate_limits.stats(), "plans": plan_limits.stats()}
+
+
+@app.get("/debug/pools")
+async def debug_pools():
+    """Debug endpoint with Postgres pool usage and checkout-wait histograms, and Redis pool usage."""
+    from database.session import pool_stats
+    from utils.redis_pool import pool_stats as redis_pool_stats
+    return {"database": pool_stats(), "redis": redis_pool_stats()}
+
 # ------------------------------------------------------------------
 # FRONTEND SERVING (Option B: Monolith)
 # ------------------------------------------------------------------
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 import uuid
-from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, Float
+from sqlalchemy import Column, String, DateTime, Date, JSON, ForeignKey, Float, Index, func
 from sqlalchemy.orm import relationship
 from database.session import Base
 
@@ -46,3 +46,27 @@ class Connection(Base):
     # Relationships
     user_a = relationship("Tenant", foreign_keys=[user_a_id], backref="connections_as_a")
     user_b = relationship("Tenant", foreign_keys=[user_b_id], backref="connections_as_b")
+
+    __table_args__ = (
+        # Order-independent pair key: status lookups for many targets in one query (services/connection_graph.py).
+        Index(
+            "ix_connections_pair",
+            func.least(user_a_id.collate("C"), user_b_id.collate("C")),
+            func.greatest(user_a_id.collate("C"), user_b_id.collate("C")),
+        ),
+    )
+
+
+class DailyBatch(Base):
+    """
+    A user's daily recommendations for one mode, precomputed by the nightly job
+    (services/daily_batches.py) or stored by the first request of the day.
+    `items` is the response of GET /connections/daily/{mode}, served as-is.
+    """
+    __tablename__ = "daily_batches"
+
+    tenant_id = Column(String, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    mode = Column(String, primary_key=True)
+    batch_date = Column(Date, nullable=False, index=True)
+    items = Column(JSON, nullable=False, default=[])
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
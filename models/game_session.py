@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, JSON, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.sql import func
 from database.session import Base
 import uuid
@@ -29,5 +29,19 @@ class GameSession(Base):
     
     # Metadata
     is_active = Column(Boolean, default=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0") # Bumped on every state delta (compare-and-swap)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class GameEvent(Base):
+    """Append-only game history; the session keeps only a recent window in `history`."""
+    __tablename__ = "game_events"
+    __table_args__ = (Index("ix_game_events_session_kind_seq", "session_id", "kind", "seq"),)
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    session_id = Column(String, nullable=False)
+    kind = Column(String, nullable=False, default="history") # history, story_text, history_data
+    seq = Column(Integer, nullable=False) # Position within the session's full list of this kind
+    payload = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -23,6 +23,8 @@ class Tenant(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     embedding_id = Column(Integer, nullable=True)
+    embedding_hash = Column(String(64), nullable=True)
+    suspended_at = Column(DateTime(timezone=True), nullable=True)  # suspended users can't authenticate
     
     declined_users = Column(JSON, default=[])
     archived_connections = Column(JSON, default=[])
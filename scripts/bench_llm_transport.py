@@ -0,0 +1,133 @@
+"""
+Benchmark: per-call httpx.AsyncClient vs the shared pooled LLM transport.
+
+Starts a local stub chat-completions server, fires N requests with bounded
+concurrency through both strategies and prints p50/p99 latency and how many
+TCP connections the server saw. A per-connection delay (--handshake-ms)
+stands in for the TCP+TLS handshake cost paid against OpenRouter/NVIDIA.
+
+    python scripts/bench_llm_transport.py --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from services.llm_transport import LLMTransport  # noqa: E402
+
+BODY = json.dumps({"choices": [{"message": {"content": "ok"}}]}).encode()
+
+
+class StubServer:
+    def __init__(self, handshake_ms: float, latency_ms: float):
+        self.handshake = handshake_ms / 1000
+        self.latency = latency_ms / 1000
+        self.connections = 0
+        self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        await asyncio.sleep(self.handshake)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(BODY)}\r\n\r\n".encode() + BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/v1/chat/completions"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def _pct(samples, p):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+    return samples[idx] * 1000
+
+
+async def _run(url: str, n: int, concurrency: int, call) -> list:
+    sem = asyncio.Semaphore(concurrency)
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "hi"}]}
+    latencies = []
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            resp = await call(url, payload)
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    return latencies
+
+
+async def main(args):
+    results = {}
+
+    # Before: a fresh client (and connection) per call, as AIService/_llm used to do.
+    server = StubServer(args.handshake_ms, args.latency_ms)
+    url = await server.start()
+
+    async def per_call(u, payload):
+        async with httpx.AsyncClient(timeout=30) as client:
+            return await client.post(u, json=payload)
+
+    lat = await _run(url, args.requests, args.concurrency, per_call)
+    results["per-call client"] = (lat, server.connections)
+    await server.stop()
+
+    # After: the shared pooled transport.
+    server = StubServer(args.handshake_ms, args.latency_ms)
+    url = await server.start()
+    transport = LLMTransport(max_connections=args.concurrency, max_keepalive=args.concurrency, host_limits={})
+    await transport.start()
+
+    async def pooled(u, payload):
+        return await transport.post(u, json=payload)
+
+    lat = await _run(url, args.requests, args.concurrency, pooled)
+    results["pooled transport"] = (lat, server.connections)
+    await transport.close()
+    await server.stop()
+
+    print(f"{args.requests} requests, concurrency={args.concurrency}, "
+          f"handshake={args.handshake_ms}ms, server latency={args.latency_ms}ms")
+    print(f"{'strategy':<18}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'conns':>8}")
+    for name, (lat, conns) in results.items():
+        print(f"{name:<18}{_pct(lat, 50):>10.2f}{_pct(lat, 99):>10.2f}"
+              f"{statistics.mean(lat) * 1000:>10.2f}{conns:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--handshake-ms", type=float, default=20.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+Benchmark: per-candidate Python scoring loop vs the vectorized matching engine.
+
+Builds a synthetic population (interests drawn from a Zipf-ish vocabulary,
+a few hundred cities, Big Five traits), then times, for several viewers:
+
+- ``loop``: the set-intersection + location compare that recommendations /
+  connections ran per candidate (over the whole population, then sorted);
+- ``engine``: `CandidateMatrix.top_k` (bitset popcount + argpartition).
+
+Also checks that both return the same top-k scores.
+
+    python scripts/bench_matching.py --users 100000 --queries 20
+    python scripts/bench_matching.py --users 1000000 --queries 20 --skip-loop
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from services.matching import CandidateMatrix  # noqa: E402
+
+
+def population(n: int, vocab: int, cities: int, seed: int):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(vocab)]
+    names = [f"interest-{i}" for i in range(vocab)]
+    places = [f"City {i}" for i in range(cities)] + [""]
+    for i in range(n):
+        interests = list(set(rng.choices(names, weights, k=rng.randint(0, 8))))
+        big_five = tuple(rng.random() for _ in range(5))
+        yield f"user-{i}", interests, rng.choice(places), big_five
+
+
+def loop_score(my_interests: set, my_location: str, interests, location) -> float:
+    score = 0.1
+    overlap = len(my_interests.intersection(interests))
+    if overlap > 0:
+        score += min(overlap * 0.2, 0.5)
+    their_location = location.lower() if location else ""
+    if my_location and their_location and my_location == their_location:
+        score += 0.3
+    return min(score, 0.99)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--vocab", type=int, default=500)
+    parser.add_argument("--cities", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-loop", action="store_true", help="only time the engine (the loop is slow at 1M)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    people = list(population(args.users, args.vocab, args.cities, args.seed))
+    print(f"generated {len(people)} users in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    matrix = CandidateMatrix(capacity=len(people))
+    for person in people:
+        matrix.upsert(*person)
+    print(f"snapshot: {time.perf_counter() - started:.1f}s, {matrix.nbytes() / 1e6:.1f} MB, "
+          f"{len(matrix.vocab)} interests, {len(matrix.locations)} locations")
+
+    viewers = random.Random(args.seed + 1).sample(people, args.queries)
+    engine_times, loop_times = [], []
+    mismatches = 0
+    for viewer in viewers:
+        t0 = time.perf_counter()
+        top = matrix.top_k(viewer, args.k, exclude={viewer[0]})
+        engine_times.append(time.perf_counter() - t0)
+        if args.skip_loop:
+            continue
+        t0 = time.perf_counter()
+        mine, my_location = set(viewer[1]), (viewer[2] or "").lower()
+        scored = [
+            (tenant_id, loop_score(mine, my_location, interests, location))
+            for tenant_id, interests, location, _ in people if tenant_id != viewer[0]
+        ]
+        scored.sort(key=lambda x: x[1], reverse=True)
+        loop_times.append(time.perf_counter() - t0)
+        mismatches += [s for _, s in scored[:args.k]] != [s for _, s in top]
+
+    print(f"engine: p50={pct(engine_times, 0.5):.2f}ms p99={pct(engine_times, 0.99):.2f}ms "
+          f"mean={statistics.fmean(engine_times) * 1000:.2f}ms")
+    if loop_times:
+        print(f"loop:   p50={pct(loop_times, 0.5):.2f}ms p99={pct(loop_times, 0.99):.2f}ms "
+              f"mean={statistics.fmean(loop_times) * 1000:.2f}ms")
+        print(f"speedup: {statistics.fmean(loop_times) / statistics.fmean(engine_times):.0f}x, "
+              f"top-{args.k} score mismatches: {mismatches}/{len(viewers)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: local IVF vector index vs brute force (recall@k and latency).
+
+Generates clustered synthetic embeddings (or loads the saved profile index
+with --snapshot), trains the IVF quantiser and reports recall@k against exact
+search for a range of nprobe values, plus query latency for both.
+
+    python scripts/bench_vector_index.py --vectors 200000 --dim 768
+    python scripts/bench_vector_index.py --snapshot data/vector_index/profiles
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from services.vector_index import VectorIndex  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=500, help="topic clusters in the synthetic data")
+    parser.add_argument("--noise", type=float, default=0.8)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 12, 24, 48])
+    parser.add_argument("--snapshot", default=None, help="benchmark an existing index snapshot instead")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        index = VectorIndex(path=args.snapshot, dim=args.dim)
+        if not index.load():
+            sys.exit(f"no snapshot at {args.snapshot}")
+    else:
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((args.clusters, args.dim)).astype(np.float32)
+        index = VectorIndex(path=str(Path(tempfile.mkdtemp()) / "bench"), dim=args.dim)
+        started = time.perf_counter()
+        for start in range(0, args.vectors, 20_000):
+            n = min(20_000, args.vectors - start)
+            batch = centers[rng.integers(0, args.clusters, n)]
+            batch += args.noise * rng.standard_normal((n, args.dim)).astype(np.float32)
+            index.add(range(start, start + n), batch)
+        print(f"added {len(index)} vectors in {time.perf_counter() - started:.1f}s")
+    if index.centroids is None:
+        started = time.perf_counter()
+        index.train()
+        print(f"trained {index.stats()['lists']} lists in {time.perf_counter() - started:.1f}s")
+
+    print(f"{len(index)} vectors, dim={index.dim}, dtype={index.dtype}, lists={index.stats()['lists']}")
+    for nprobe in args.nprobe:
+        report = index.recall_at_k(k=args.k, queries=args.queries, nprobe=nprobe)
+        print(f"  nprobe={nprobe:<3} recall@{args.k}={report['recall']:.3f}  "
+              f"ann p50={report['ann_p50_ms']:.2f}ms  exact p50={report['exact_p50_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
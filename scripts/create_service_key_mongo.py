@@ -4,8 +4,9 @@ Create a service key and store its hash in MongoDB (collection `service_keys`).
 
 Behavior:
 - Reads `MONGO_DB_URL` from the environment (or `.env` if present).
-- Generates a secure random key, hashes it with the repo's pwd_context,
-  inserts a document into `service_keys`, and prints the plain key once to stdout.
+- Generates a secure random key, stores its SHA-256 digest (`key_digest`, what
+  the /internal/* registry looks up) and a bcrypt hash (`key_hash`) in a new
+  `service_keys` document, and prints the plain key once to stdout.
 - Does NOT save the plain key to disk by default.
 
 Run from the repo root: `python scripts/create_service_key_mongo.py`
@@ -46,8 +47,9 @@ except Exception:
     sys.exit(3)
 
 try:
-    # import pwd_context from the app utilities
+    # import pwd_context and the registry digest from the app utilities
     from utils.token import pwd_context
+    from auth.service_key_registry import key_digest
 except Exception:
     print('Unable to import pwd_context from utils.token. Ensure you run from repo root with project on PYTHONPATH.', file=sys.stderr)
     sys.exit(4)
@@ -60,6 +62,7 @@ try:
     db = client.get_default_database()
     coll = db.get_collection('service_keys')
     doc = {
+        'key_digest': key_digest(plain),
         'key_hash': hashed,
         'created_at': datetime.utcnow(),
         'created_by': 'system',
@@ -0,0 +1,93 @@
+"""
+Load test: throughput of sync-Session vs AsyncSession queries inside coroutines.
+
+Fires --requests "requests" with bounded concurrency on one event loop, as a
+uvicorn worker would. A --slow-pct share run `SELECT pg_sleep(--slow-ms)`
+(a slow report query), the rest `SELECT 1` (a primary-key read). Each
+strategy is timed separately:
+
+- sync: `Session().execute(...)` called directly in the coroutine, as the
+  routers did before moving to database/repositories (blocks the loop);
+- async: the same statement on `async_session()`.
+
+Prints requests/s and p50/p99 latency of the fast queries, which is what
+the blocking pattern hurts: every fast request queues behind slow ones.
+
+    DATABASE_URL=postgresql://... python scripts/loadtest_db_async.py --requests 400 --concurrency 20
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from database.session import Session, async_engine, async_session  # noqa: E402
+
+
+def _pct(samples, p):
+    samples = sorted(samples)
+    idx = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+    return samples[idx] * 1000
+
+
+async def _run(kinds, concurrency: int, call):
+    sem = asyncio.Semaphore(concurrency)
+    fast = []
+
+    async def one(slow: bool):
+        async with sem:
+            start = time.perf_counter()
+            await call(slow)
+            if not slow:
+                fast.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(slow) for slow in kinds))
+    return len(kinds) / (time.perf_counter() - start), fast
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    kinds = [rng.random() < args.slow_pct / 100 for _ in range(args.requests)]
+    slow_stmt = text("SELECT pg_sleep(:s)").bindparams(s=args.slow_ms / 1000)
+    fast_stmt = text("SELECT 1")
+
+    async def blocking(slow: bool):
+        with Session() as db:
+            db.execute(slow_stmt if slow else fast_stmt)
+
+    async def non_blocking(slow: bool):
+        async with async_session() as db:
+            await db.execute(slow_stmt if slow else fast_stmt)
+
+    # Warm both pools so connection setup isn't measured.
+    await _run([False] * args.concurrency, args.concurrency, blocking)
+    await _run([False] * args.concurrency, args.concurrency, non_blocking)
+
+    results = {
+        "sync Session": await _run(kinds, args.concurrency, blocking),
+        "AsyncSession": await _run(kinds, args.concurrency, non_blocking),
+    }
+    await async_engine.dispose()
+
+    print(f"{args.requests} requests ({sum(kinds)} slow x {args.slow_ms}ms), concurrency={args.concurrency}")
+    print(f"{'strategy':<16}{'req/s':>10}{'fast p50 ms':>14}{'fast p99 ms':>14}{'fast mean ms':>14}")
+    for name, (rps, fast) in results.items():
+        print(f"{name:<16}{rps:>10.1f}{_pct(fast, 50):>14.2f}{_pct(fast, 99):>14.2f}"
+              f"{statistics.mean(fast) * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--slow-pct", type=float, default=10.0)
+    parser.add_argument("--slow-ms", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
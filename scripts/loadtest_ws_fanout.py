@@ -0,0 +1,118 @@
+"""
+Load test: websocket broadcast fan-out latency across N workers via the Redis broker.
+
+Spawns N worker processes, each holding --sockets in-memory sockets joined to
+--rooms rooms through its own ConnectionManager + RedisBroker (as uvicorn
+workers would). The parent process broadcasts --messages messages round-robin
+over the rooms from its own manager and every worker reports, per delivered
+message, the time from `broadcast()` to the socket's send. Prints delivery
+counts and p50/p95/p99 latency per worker and overall.
+
+    REDIS_URL=redis://localhost:6379/0 python scripts/loadtest_ws_fanout.py --workers 4 --sockets 200
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+
+class CountingSocket:
+    def __init__(self, samples):
+        self.samples = samples
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        self.samples.append(time.time() - json.loads(frame)["sent_at"])
+
+
+def worker(index, args, ready, results):
+    from utils.websockets._broker import RedisBroker
+    from utils.websockets._manager import ConnectionManager
+
+    async def run():
+        samples = []
+        manager = ConnectionManager(RedisBroker(url=args.redis_url))
+        for i in range(args.sockets):
+            await manager.connect(CountingSocket(samples), f"room-{i % args.rooms}")
+        ready.release()
+        expected = args.messages * args.sockets // args.rooms
+        deadline = time.time() + args.timeout
+        while len(samples) < expected and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        await manager.close()
+        results.put((index, samples))
+
+    asyncio.run(run())
+
+
+def pct(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sockets", type=int, default=100, help="sockets per worker")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=500, help="broadcasts per second")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    if args.redis_url is None:
+        from utils.settings import REDIS_URL
+        args.redis_url = REDIS_URL
+
+    ctx = mp.get_context("spawn")
+    ready, results = ctx.Semaphore(0), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(i, args, ready, results)) for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+
+    from utils.websockets._broker import RedisBroker
+    from utils.websockets._manager import ConnectionManager
+
+    async def publish():
+        manager = ConnectionManager(RedisBroker(url=args.redis_url))
+        await manager.start()
+        await asyncio.sleep(0.5)  # let subscriptions settle
+        start = time.perf_counter()
+        for i in range(args.messages):
+            await manager.broadcast(f"room-{i % args.rooms}", {"type": "chat", "n": i, "sent_at": time.time()})
+            await asyncio.sleep(max(0.0, start + (i + 1) / args.rate - time.perf_counter()))
+        await manager.close()
+
+    asyncio.run(publish())
+    collected = dict(results.get(timeout=args.timeout + 10) for _ in procs)
+    for p in procs:
+        p.join()
+
+    expected = args.messages * args.sockets // args.rooms
+    everything = []
+    print(f"workers={args.workers} sockets/worker={args.sockets} rooms={args.rooms} messages={args.messages}")
+    for index in sorted(collected):
+        samples = collected[index]
+        everything.extend(samples)
+        print(f"  worker {index}: delivered {len(samples)}/{expected}  "
+              f"p50={pct(samples, 0.5):.2f}ms p95={pct(samples, 0.95):.2f}ms p99={pct(samples, 0.99):.2f}ms")
+    print(f"  overall: delivered {len(everything)}/{expected * args.workers}  "
+          f"mean={statistics.fmean(everything) * 1000 if everything else float('nan'):.2f}ms "
+          f"p50={pct(everything, 0.5):.2f}ms p99={pct(everything, 0.99):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Precompute today's daily-match batches for every active user.
+
+Runs the shards of services/daily_batches.py in a local process pool and
+prints aggregate progress while they work. Interrupt it at any time; running
+it again skips users whose batch for the day is already stored.
+
+    python scripts/precompute_daily_batches.py --workers 8
+    python scripts/precompute_daily_batches.py --shard 3 --of 8   # a single shard
+    python scripts/precompute_daily_batches.py --prewarm          # then generate AI insights
+"""
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+from services.daily_batches import (  # noqa: E402
+    DAILY_BATCH_CHUNK, DAILY_BATCH_WORKERS, BatchProgress, _active_tenant_ids, run_all, run_shard, today,
+)
+
+
+def prewarm(batch_date: date, tenant_ids=None):
+    from services.match_insights import match_insights
+
+    started = time.perf_counter()
+    result = asyncio.run(match_insights.prewarm_daily_batches(batch_date, tenant_ids))
+    print(f"{result['insights']} insights for {result['rows']} batches in {time.perf_counter() - started:.1f}s "
+          f"({match_insights.stats()})")
+
+
+def report(progress: BatchProgress, stop: threading.Event, every: float):
+    while not stop.wait(every):
+        snap = progress.snapshot()
+        if snap["total"]:
+            print(f"{snap['done']}/{snap['total']} users ({snap['percent']}%), {snap['written']} batches written", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=DAILY_BATCH_WORKERS)
+    parser.add_argument("--chunk", type=int, default=DAILY_BATCH_CHUNK)
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="batch date (UTC), default today")
+    parser.add_argument("--shard", type=int, default=None, help="run only this shard")
+    parser.add_argument("--of", type=int, default=None, help="shard count for --shard (default --workers)")
+    parser.add_argument("--prewarm", action="store_true", help="generate AI match insights for the stored batches")
+    parser.add_argument("--every", type=float, default=5.0, help="progress interval in seconds")
+    args = parser.parse_args()
+
+    batch_date = args.date or today()
+    started = time.perf_counter()
+    if args.shard is not None:
+        print(run_shard(args.shard, args.of or args.workers, batch_date, args.chunk))
+        if args.prewarm:
+            prewarm(batch_date, _active_tenant_ids(args.shard, args.of or args.workers))
+        return
+
+    stop = threading.Event()
+    threading.Thread(target=report, args=(BatchProgress(batch_date), stop, args.every), daemon=True).start()
+    try:
+        results = run_all(batch_date, workers=args.workers, chunk=args.chunk)
+    finally:
+        stop.set()
+    for result in results:
+        print(result)
+    print(f"{sum(r['done'] for r in results)} users, {sum(r['written'] for r in results)} batches "
+          f"in {time.perf_counter() - started:.1f}s")
+    if args.prewarm:
+        prewarm(batch_date)
+
+
+if __name__ == "__main__":
+    main()
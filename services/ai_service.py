@@ -1,6 +1,8 @@
 import os
-import httpx
 from typing import Optional
+from services.llm_transport import llm_transport
+from services.llm_cache import llm_cache, make_key
+from services.llm_stream import claim_sink, iter_sse_deltas
 
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 NVIDIA_URL = "https://integrate.api.nvidia.com/v1/chat/completions"
@@ -20,11 +22,13 @@ class AIService:
         self.openrouter_key = os.getenv("OPENROUTER_API_KEY")
         self.nvidia_key = os.getenv("NVIDIA_API_KEY")
 
-    async def chat(self, prompt: Optional[object], user_input: Optional[str] = None, model: Optional[str] = None, api_key: Optional[str] = None) -> str:
+    async def chat(self, prompt: Optional[object], user_input: Optional[str] = None, model: Optional[str] = None, api_key: Optional[str] = None, cache_site: Optional[str] = None, cache_ttl: Optional[int] = None) -> str:
         """Send either a system prompt (string) + optional user_input or a full messages list.
 
         - If `prompt` is a list, it's treated as the messages payload and sent as-is.
         - If `prompt` is a string, it's used as the system message and `user_input` becomes the user message.
+        - If `cache_site` is given, identical requests are served from the LLM response cache.
+        - If the current request asked for a streamed response, tokens are pushed to it as they arrive.
         """
 
         # Determine which provider to use
@@ -52,12 +56,25 @@ class AIService:
         payload = {"model": model_to_use, "messages": messages}
         headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
 
+        sink = claim_sink()
+        if sink is not None:
+            post = lambda: self._post_stream(url, payload, headers, sink)
+        else:
+            post = lambda: self._post(url, payload, headers)
+
+        if not cache_site:
+            text, _ = await post()
+            return text
+        cache_key = make_key(f"{url}|{model_to_use}", messages)
+        return await llm_cache.get_or_compute(cache_key, cache_site, post, ttl=cache_ttl)
+
+    async def _post(self, url: str, payload: dict, headers: dict):
+        """Returns (text, ok). Error texts come back with ok=False so they are never cached."""
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                resp = await client.post(url, json=payload, headers=headers)
+            resp = await llm_transport.post(url, json=payload, headers=headers, timeout=30.0)
         except Exception as e:
             print(f"AI request failed: {e}")
-            return "(error) The AI service is currently unavailable."
+            return "(error) The AI service is currently unavailable.", False
 
         if resp.status_code != 200:
             # Print debug info and return a readable error-like message
@@ -66,14 +83,34 @@ class AIService:
             except Exception:
                 body = resp.text
             print(f"AI API error: status={resp.status_code}, body={body}")
-            return f"(ai error {resp.status_code}) The AI did not return a valid response."
+            return f"(ai error {resp.status_code}) The AI did not return a valid response.", False
 
         try:
             data = resp.json()
-            return data["choices"][0]["message"]["content"]
+            return data["choices"][0]["message"]["content"], True
         except Exception as e:
             print(f"Failed to parse AI response: {e} -- raw: {resp.text}")
-            return "(error) Unable to parse AI response."
+            return "(error) Unable to parse AI response.", False
+
+    async def _post_stream(self, url: str, payload: dict, headers: dict, sink):
+        """Streaming variant of `_post`: pushes each token to `sink`, returns (full text, ok)."""
+        parts = []
+        try:
+            async with llm_transport.stream(url, json={**payload, "stream": True}, headers=headers, timeout=30.0) as resp:
+                if resp.status_code != 200:
+                    body = (await resp.aread()).decode("utf-8", errors="replace")
+                    print(f"AI API error: status={resp.status_code}, body={body}")
+                    return f"(ai error {resp.status_code}) The AI did not return a valid response.", False
+                async for delta in iter_sse_deltas(resp):
+                    parts.append(delta)
+                    sink.push(delta)
+        except Exception as e:
+            print(f"AI stream failed after {len(parts)} chunks: {e}")
+            return "(error) The AI service is currently unavailable.", False
+
+        if not parts:
+            return "(error) Unable to parse AI response.", False
+        return "".join(parts), True
 
 
 async def ask_llm(prompt: str, model: Optional[str] = None, api_key: Optional[str] = None) -> str:
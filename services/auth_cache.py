@@ -0,0 +1,213 @@
+"""Auth fast path: verified access tokens -> cached principals.
+
+Every authenticated request used to decode its JWT and `SELECT` the tenant.
+`auth_cache.principal(token)` instead keeps, per token (keyed by its SHA-256
+hash, in an LRU of AUTH_CLAIM_CACHE_SIZE entries), the verified claims and a
+lightweight `Principal` (id, role, profile version) until the token expires.
+A cached token costs no JWT decode and no database query.
+
+Revocation: `revoke(user_id)` (suspension, role change, password reset, ...)
+bumps the user's version in Redis (``auth:version:<id>``). Each process
+re-reads that version at most every AUTH_REVOCATION_CHECK_SECONDS per user,
+and a changed version reloads the principal from `tenants`, where suspended
+users are rejected. So such changes take effect everywhere within a few
+seconds. Without Redis, principals are re-read from the database on that same
+interval. In any case, none is trusted for longer than AUTH_PRINCIPAL_MAX_AGE.
+
+Handlers that need the full `Tenant` use `utils.token.get_current_user`,
+which loads it once per request on top of the principal.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from core.logging import logger
+
+AUTH_CLAIM_CACHE_SIZE = int(os.getenv("AUTH_CLAIM_CACHE_SIZE", "10000"))
+AUTH_REVOCATION_CHECK_SECONDS = float(os.getenv("AUTH_REVOCATION_CHECK_SECONDS", "5"))
+AUTH_PRINCIPAL_MAX_AGE = float(os.getenv("AUTH_PRINCIPAL_MAX_AGE", "300"))
+
+VERSION_KEY = "auth:version:{}"
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as far as most endpoints care: no ORM state."""
+    id: str
+    role: str = "user"
+    profile_version: str = ""
+
+    @property
+    def is_admin(self) -> bool:
+        return (self.role or "").lower() == "admin"
+
+
+class _Entry:
+    __slots__ = ("user_id", "expires_at", "principal", "version", "loaded_at")
+
+    def __init__(self, user_id: str, expires_at: float):
+        self.user_id = user_id
+        self.expires_at = expires_at
+        self.principal: Optional[Principal] = None
+        self.version: Optional[str] = None
+        self.loaded_at: Optional[float] = None  # None: principal not loaded yet
+
+
+def _decode(token: str) -> Optional[dict]:
+    from jose import JWTError, jwt
+    from utils.settings import JWT_HASH_ALGORITHM, SECRET_KEY
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[JWT_HASH_ALGORITHM])
+    except JWTError:
+        return None
+
+
+async def _load_principal(user_id: str) -> Optional[Principal]:
+    """The user's principal, or None when the user doesn't exist or is suspended."""
+    from sqlalchemy import select
+    from database.session import async_session
+    from models.user import Tenant
+
+    async with async_session() as db:
+        row = (await db.execute(
+            select(Tenant.id, Tenant.role, Tenant.updated_at, Tenant.suspended_at).where(Tenant.id == user_id)
+        )).first()
+    if row is None or row.suspended_at is not None:
+        return None
+    return Principal(row.id, row.role or "user", row.updated_at.isoformat() if row.updated_at else "")
+
+
+async def _read_version(user_id: str) -> str:
+    from utils.redis_pool import async_redis_client
+
+    value = await async_redis_client().get(VERSION_KEY.format(user_id))
+    return value.decode() if isinstance(value, bytes) else str(value or 0)
+
+
+async def _bump_version(user_id: str):
+    from utils.redis_pool import async_redis_client
+    from utils.settings import JWT_REFRESH_TOKEN_EXPIRE_DAYS
+
+    key = VERSION_KEY.format(user_id)
+    client = async_redis_client()
+    await client.incr(key)
+    await client.expire(key, JWT_REFRESH_TOKEN_EXPIRE_DAYS * 86400)  # outlives every token of the user
+
+
+class AuthCache:
+    def __init__(
+        self,
+        max_tokens: int = AUTH_CLAIM_CACHE_SIZE,
+        check_interval: float = AUTH_REVOCATION_CHECK_SECONDS,
+        max_age: float = AUTH_PRINCIPAL_MAX_AGE,
+        decode: Callable[[str], Optional[dict]] = _decode,
+        load: Callable[[str], Awaitable[Optional[Principal]]] = _load_principal,
+        read_version: Callable[[str], Awaitable[str]] = _read_version,
+        bump_version: Callable[[str], Awaitable[None]] = _bump_version,
+    ):
+        self.max_tokens = max_tokens
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._decode = decode
+        self._load = load
+        self._read_version = read_version
+        self._bump_version = bump_version
+        self._tokens: "OrderedDict[str, _Entry]" = OrderedDict()
+        # user id -> (checked at, version or None when Redis was unavailable)
+        self._versions: Dict[str, Tuple[float, Optional[str]]] = {}
+        self.stats_counters = {
+            "lookups": 0, "hits": 0, "decodes": 0, "rejected": 0, "loads": 0,
+            "version_checks": 0, "redis_errors": 0, "revocations": 0,
+        }
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _entry(self, token: str, now: float) -> Optional[_Entry]:
+        key = self.token_key(token)
+        entry = self._tokens.get(key)
+        if entry is not None and entry.expires_at > now:
+            self._tokens.move_to_end(key)
+            self.stats_counters["hits"] += 1
+            return entry
+        self._tokens.pop(key, None)
+        self.stats_counters["decodes"] += 1
+        claims = self._decode(token)
+        if not claims or not claims.get("sub") or claims.get("exp") is None:
+            return None
+        # Cached entries live on the monotonic clock; the token's exp is wall-clock.
+        entry = self._tokens[key] = _Entry(str(claims["sub"]), now + float(claims["exp"]) - time.time())
+        while len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+        return entry
+
+    async def _version(self, user_id: str, now: float) -> Optional[str]:
+        checked = self._versions.get(user_id)
+        if checked is not None and now - checked[0] < self.check_interval:
+            return checked[1]
+        self.stats_counters["version_checks"] += 1
+        try:
+            version = await self._read_version(user_id)
+        except Exception as e:
+            self.stats_counters["redis_errors"] += 1
+            logger.debug(f"auth version check failed for {user_id}: {e}")
+            version = None
+        self._versions[user_id] = (now, version)
+        if len(self._versions) > self.max_tokens:
+            self._versions.pop(next(iter(self._versions)))
+        return version
+
+    async def principal(self, token: str) -> Optional[Principal]:
+        """The principal `token` authenticates, or None (invalid, expired, unknown or suspended user)."""
+        self.stats_counters["lookups"] += 1
+        now = time.monotonic()
+        entry = self._entry(token, now)
+        if entry is None:
+            self.stats_counters["rejected"] += 1
+            return None
+        version = await self._version(entry.user_id, now)
+        stale = (
+            entry.loaded_at is None
+            or now - entry.loaded_at > self.max_age
+            or (version is None and now - entry.loaded_at > self.check_interval)
+            or (version is not None and version != entry.version)
+        )
+        if stale:
+            self.stats_counters["loads"] += 1
+            entry.principal = await self._load(entry.user_id)
+            entry.version, entry.loaded_at = version, now
+        if entry.principal is None:
+            # Kept (negative entry) so a rejected token doesn't query on every request.
+            self.stats_counters["rejected"] += 1
+        return entry.principal
+
+    async def revoke(self, user_id: str):
+        """Make every process reload `user_id` (call after suspending them or changing their role)."""
+        self.stats_counters["revocations"] += 1
+        self.forget(user_id)
+        try:
+            await self._bump_version(user_id)
+        except Exception as e:
+            logger.warning(f"auth revocation for {user_id} not published, other workers may serve "
+                           f"the old principal for up to {self.max_age:g}s: {e}")
+
+    def forget(self, user_id: str):
+        """Drop this process' cached principals of `user_id`."""
+        self._versions.pop(user_id, None)
+        for key in [k for k, e in self._tokens.items() if e.user_id == user_id]:
+            del self._tokens[key]
+
+    def clear(self):
+        self._tokens.clear()
+        self._versions.clear()
+
+    def stats(self) -> dict:
+        return {**self.stats_counters, "tokens": len(self._tokens), "users": len(self._versions)}
+
+
+auth_cache = AuthCache()
@@ -0,0 +1,336 @@
+"""Write-behind persistence for group-chat messages.
+
+The group-chat websocket broadcasts a message first and then hands it to
+`chat_writer.submit()`, so fan-out latency no longer waits on a Postgres commit.
+The writer:
+
+- appends every message to a local spill file (CHAT_SPILL_PATH) before queuing
+  it, so a crash or a database outage loses nothing (at-least-once);
+- every CHAT_WRITER_FLUSH_MS, or as soon as CHAT_WRITER_BATCH messages are
+  queued, writes everything queued across all rooms as multi-row INSERTs
+  (``ON CONFLICT (id) DO NOTHING``, so a retried batch is harmless);
+- deletes the spill segment once its batch is committed. When a batch fails,
+  its segments stay on disk and the next flush re-reads them, so memory stays
+  bounded however long the database is down. Leftovers are replayed on start;
+- when a batch is refused because of its data (integrity or data errors, e.g.
+  a group that doesn't exist), retries its rows one at a time and appends the
+  ones still refused to CHAT_DEAD_LETTER_PATH, so one bad row can't hold back
+  every other room's messages.
+
+It also keeps the last CHAT_HISTORY_RING messages of the CHAT_HISTORY_ROOMS
+most recently active rooms, which serve the history replay on connect. A
+room's ring is only trusted once it has been seeded from the database (or has
+filled up), and only with a single worker / the memory websocket broker, since
+another worker's messages never pass through this ring.
+"""
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from core.logging import logger
+
+CHAT_WRITER_FLUSH_MS = float(os.getenv("CHAT_WRITER_FLUSH_MS", "250"))
+CHAT_WRITER_BATCH = int(os.getenv("CHAT_WRITER_BATCH", "200"))
+CHAT_SPILL_PATH = os.getenv("CHAT_SPILL_PATH", "data/chat_spill.jsonl")
+CHAT_DEAD_LETTER_PATH = os.getenv("CHAT_DEAD_LETTER_PATH", "data/chat_rejected.jsonl")
+CHAT_SPILL_FSYNC = os.getenv("CHAT_SPILL_FSYNC", "0") not in ("0", "false", "no")
+CHAT_HISTORY_RING = int(os.getenv("CHAT_HISTORY_RING", "50"))
+CHAT_HISTORY_ROOMS = int(os.getenv("CHAT_HISTORY_ROOMS", "2048"))
+
+Row = Dict[str, Any]
+
+
+def _naive_utc(value: Optional[str]) -> Optional[datetime]:
+    """`chats.created_at` is a naive (UTC) timestamp; asyncpg refuses aware datetimes for it."""
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _is_row_error(error: Exception) -> bool:
+    """Whether the database refused the rows themselves (retrying them as-is can't succeed)."""
+    from sqlalchemy.exc import DataError, IntegrityError
+    return isinstance(error, (IntegrityError, DataError, ValueError))
+
+
+async def _insert_chats(rows: List[Row]):
+    from sqlalchemy.dialects.postgresql import insert
+    from database.session import async_session
+    from models.chat import Chat
+
+    values = [{**row, "created_at": _naive_utc(row.get("created_at"))} for row in rows]
+    async with async_session() as db:
+        await db.execute(insert(Chat).on_conflict_do_nothing(index_elements=["id"]), values)
+        await db.commit()
+
+
+class _SpillFile:
+    """Append-only JSON-lines log of queued messages, rotated into numbered segments."""
+
+    def __init__(self, path: str, fsync: bool = CHAT_SPILL_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self._fh = None
+        self._seq = 0
+
+    def _segments(self) -> List[str]:
+        return sorted(glob.glob(f"{self.path}.*[0-9]"), key=lambda p: int(p.rsplit(".", 1)[-1]))
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        if segments:
+            self._seq = int(segments[-1].rsplit(".", 1)[-1])
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def append(self, row: Row):
+        if self._fh is None:
+            return
+        self._fh.write(json.dumps(row, default=str) + "\n")
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+
+    def rotate(self) -> int:
+        """Seal the live file as a segment; returns its sequence number."""
+        if self._fh is None:
+            return 0
+        self._fh.close()
+        self._seq += 1
+        if os.path.exists(self.path):
+            os.replace(self.path, f"{self.path}.{self._seq}")
+        self._fh = open(self.path, "a", encoding="utf-8")
+        return self._seq
+
+    def read_through(self, seq: int) -> List[Row]:
+        rows: Dict[str, Row] = {}
+        for segment in self._segments():
+            if int(segment.rsplit(".", 1)[-1]) > seq:
+                continue
+            with open(segment, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line from a crash mid-write.
+                    rows[row["id"]] = row
+        return list(rows.values())
+
+    def discard_through(self, seq: int):
+        for segment in self._segments():
+            if int(segment.rsplit(".", 1)[-1]) <= seq:
+                os.remove(segment)
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class ChatWriter:
+    def __init__(
+        self,
+        inserter: Callable[[List[Row]], Awaitable[None]] = _insert_chats,
+        is_row_error: Callable[[Exception], bool] = _is_row_error,
+        dead_letter_path: Optional[str] = CHAT_DEAD_LETTER_PATH,
+        flush_ms: float = CHAT_WRITER_FLUSH_MS,
+        batch_size: int = CHAT_WRITER_BATCH,
+        spill_path: Optional[str] = CHAT_SPILL_PATH,
+        ring_size: int = CHAT_HISTORY_RING,
+        ring_rooms: int = CHAT_HISTORY_ROOMS,
+    ):
+        self._insert = inserter
+        self._is_row_error = is_row_error
+        self.dead_letter_path = dead_letter_path
+        self.flush_ms = flush_ms
+        self.batch_size = batch_size
+        self.ring_size = ring_size
+        self.ring_rooms = ring_rooms
+        self._spill = _SpillFile(spill_path) if spill_path else None
+        self._queue: List[Row] = []
+        # A failed batch lives on in its spill segments; re-read them next time.
+        self._backlog = False
+        self._rings: "OrderedDict[str, Deque[Row]]" = OrderedDict()
+        self._seeded = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats_counters = {
+            "submitted": 0, "written": 0, "batches": 0, "failures": 0,
+            "replayed": 0, "rejected": 0, "ring_hits": 0, "ring_misses": 0,
+        }
+        self.last_batch_ms: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        if self._spill is not None:
+            self._spill.open()
+            # Leftovers from a previous run (crash or database outage).
+            self._backlog = bool(self._spill._segments()) or os.path.getsize(self._spill.path) > 0
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Chat writer started (flush={self.flush_ms}ms, batch={self.batch_size})")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Chat writer: final flush failed ({e}); messages kept in spill file")
+        if self._spill is not None:
+            self._spill.close()
+
+    # -- writes ---------------------------------------------------------------
+    def submit(self, row: Row):
+        """Queue one `chats` row (id, sender, group, message, created_at ISO string)."""
+        if self._spill is not None:
+            self._spill.append(row)
+        self._queue.append(row)
+        self.stats_counters["submitted"] += 1
+        self.remember(row["group"], row)
+        if self._wakeup is not None and len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _dead_letter(self, row: Row, error: Exception):
+        self.stats_counters["rejected"] += 1
+        logger.error(f"Chat writer: message {row.get('id')} refused ({error}); moved to {self.dead_letter_path}")
+        if not self.dead_letter_path:
+            return
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.dead_letter_path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({**row, "error": str(error)}, default=str) + "\n")
+
+    async def _write(self, batch: List[Row]) -> int:
+        """Insert one batch; on a data error, row by row with rejects dead-lettered. Returns rows written."""
+        try:
+            await self._insert(batch)
+            return len(batch)
+        except Exception as e:
+            if not self._is_row_error(e):
+                raise
+        written = 0
+        for row in batch:
+            try:
+                await self._insert([row])
+                written += 1
+            except Exception as e:
+                if not self._is_row_error(e):
+                    raise
+                self._dead_letter(row, e)
+        return written
+
+    async def flush(self):
+        """Write everything queued (and any spilled backlog) to Postgres."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._queue and not self._backlog:
+                return
+            rows, self._queue = self._queue, []
+            seq = 0
+            if self._spill is not None:
+                seq = self._spill.rotate()
+                if self._backlog:
+                    rows = self._spill.read_through(seq)
+                    self.stats_counters["replayed"] += len(rows)
+            started = time.perf_counter()
+            written = 0
+            try:
+                for i in range(0, len(rows), self.batch_size):
+                    written += await self._write(rows[i:i + self.batch_size])
+                    self.stats_counters["batches"] += 1
+            except Exception:
+                self.stats_counters["failures"] += 1
+                if self._spill is None:
+                    self._queue = rows + self._queue
+                self._backlog = self._spill is not None
+                raise
+            self._backlog = False
+            self.stats_counters["written"] += written
+            self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+            if self._spill is not None:
+                self._spill.discard_through(seq)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Chat writer: batch failed ({e}); spilled to disk, retrying")
+                await asyncio.sleep(self.flush_ms / 1000)
+
+    # -- history ring -----------------------------------------------------------
+    def remember(self, room_id: str, row: Row):
+        ring = self._rings.get(room_id)
+        if ring is None:
+            ring = self._rings[room_id] = deque(maxlen=self.ring_size)
+            if len(self._rings) > self.ring_rooms:
+                evicted, _ = self._rings.popitem(last=False)
+                self._seeded.discard(evicted)
+        else:
+            self._rings.move_to_end(room_id)
+        ring.append(row)
+
+    def recent(self, room_id: str) -> Optional[List[Row]]:
+        """The room's last messages (oldest first), or None when the database must be asked."""
+        ring = self._rings.get(room_id)
+        if ring is None or (room_id not in self._seeded and len(ring) < self.ring_size):
+            self.stats_counters["ring_misses"] += 1
+            return None
+        self._rings.move_to_end(room_id)
+        self.stats_counters["ring_hits"] += 1
+        return list(ring)
+
+    def seed(self, room_id: str, rows: List[Row]) -> List[Row]:
+        """Merge database history (oldest first) under anything already in the ring."""
+        ring = self._rings.get(room_id) or deque()
+        seen = {row["id"] for row in ring}
+        merged = [row for row in rows if row["id"] not in seen] + list(ring)
+        self._rings[room_id] = deque(merged, maxlen=self.ring_size)
+        self._rings.move_to_end(room_id)
+        if len(self._rings) > self.ring_rooms:
+            evicted, _ = self._rings.popitem(last=False)
+            self._seeded.discard(evicted)
+        self._seeded.add(room_id)
+        return list(self._rings[room_id])
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "queued": len(self._queue),
+            "backlog": self._backlog,
+            "rooms_cached": len(self._rings),
+            "last_batch_ms": self.last_batch_ms,
+        }
+
+
+chat_writer = ChatWriter()
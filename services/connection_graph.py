@@ -0,0 +1,114 @@
+"""Batched connection-status lookups with a per-user adjacency cache.
+
+List endpoints that show relationship state (recommendations, search) used
+to run one ``Connection`` query per row. `connection_graph.lookup(db, me,
+targets)` resolves every target in one query on the normalised pair key
+``(least(user_a_id, user_b_id), greatest(user_a_id, user_b_id))``, which the
+``ix_connections_pair`` expression index serves directly. Ids are compared
+with the "C" collation there, so the database orders a pair exactly like
+`pair_key` does in Python.
+
+Answers (including "no connection") are remembered per viewer, so repeated
+lists hit the database only for targets not seen before. The routes that
+change a connection (`/connections/request`, `/connections/action`, ...) call
+`invalidate(a, b)`, which drops that pair from both users' entries. The cache is per process: another worker's
+change becomes visible here after CONNECTION_CACHE_TTL seconds at most.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONNECTION_CACHE_TTL = float(os.getenv("CONNECTION_CACHE_TTL", "60"))
+CONNECTION_CACHE_USERS = int(os.getenv("CONNECTION_CACHE_USERS", "10000"))
+
+# When a pair has several connections (one per mode), the most advanced status is shown.
+STATUS_RANK = {
+    "personal_circle": 6, "personal": 6, "matched": 5, "pending_b": 4,
+    "suggested": 3, "archived": 2, "declined": 1,
+}
+
+Edge = Tuple[str, str]  # (status, connection_id)
+Pair = Tuple[str, str]
+
+
+def pair_key(a: str, b: str) -> Pair:
+    """Order-independent key of the pair (a, b): (min id, max id)."""
+    return (a, b) if a <= b else (b, a)
+
+
+def _fetch_edges(db, pairs: Sequence[Pair]) -> List[Tuple[str, str, str, str]]:
+    """(connection_id, user_a_id, user_b_id, status) of every connection between the given pairs."""
+    from sqlalchemy import func, select, tuple_
+    from models.connection import Connection
+
+    a, b = Connection.user_a_id.collate("C"), Connection.user_b_id.collate("C")
+    stmt = select(Connection.id, Connection.user_a_id, Connection.user_b_id, Connection.status).where(
+        tuple_(func.least(a, b), func.greatest(a, b)).in_(pairs)
+    )
+    return list(db.execute(stmt))
+
+
+class ConnectionGraph:
+    def __init__(
+        self,
+        ttl: float = CONNECTION_CACHE_TTL,
+        max_users: int = CONNECTION_CACHE_USERS,
+        fetch: Callable[..., List[Tuple[str, str, str, str]]] = _fetch_edges,
+    ):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._fetch = fetch
+        # viewer id -> (loaded at, {other id: edge or None})
+        self._adjacency: "OrderedDict[str, Tuple[float, Dict[str, Optional[Edge]]]]" = OrderedDict()
+        self.stats_counters = {"lookups": 0, "hits": 0, "misses": 0, "queries": 0, "invalidations": 0}
+
+    def _known(self, user_id: str) -> Dict[str, Optional[Edge]]:
+        entry = self._adjacency.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            entry = self._adjacency[user_id] = (time.monotonic(), {})
+        self._adjacency.move_to_end(user_id)
+        while len(self._adjacency) > self.max_users:
+            self._adjacency.popitem(last=False)
+        return entry[1]
+
+    def lookup(self, db, user_id: str, target_ids: Iterable[str]) -> Dict[str, Edge]:
+        """{target id: (status, connection id)} for the targets `user_id` has a connection with."""
+        targets = list(dict.fromkeys(t for t in target_ids if t and t != user_id))
+        self.stats_counters["lookups"] += 1
+        known = self._known(user_id)
+        missing = [t for t in targets if t not in known]
+        self.stats_counters["hits"] += len(targets) - len(missing)
+        if missing:
+            self.stats_counters["misses"] += len(missing)
+            self.stats_counters["queries"] += 1
+            found: Dict[str, Edge] = {}
+            for connection_id, a, b, status in self._fetch(db, [pair_key(user_id, t) for t in missing]):
+                other = b if a == user_id else a
+                best = found.get(other)
+                if best is None or STATUS_RANK.get(status, 0) > STATUS_RANK.get(best[0], 0):
+                    found[other] = (status, connection_id)
+            for t in missing:
+                known[t] = found.get(t)
+        return {t: known[t] for t in targets if known.get(t) is not None}
+
+    def status(self, db, user_id: str, target_id: str) -> Optional[Edge]:
+        return self.lookup(db, user_id, [target_id]).get(target_id)
+
+    def invalidate(self, a: str, b: str):
+        """Forget the cached state of the pair (a, b), on both sides; call after it changes."""
+        self.stats_counters["invalidations"] += 1
+        for viewer, other in ((a, b), (b, a)):
+            entry = self._adjacency.get(viewer)
+            if entry is not None:
+                entry[1].pop(other, None)
+
+    def stats(self) -> dict:
+        return {
+            **self.stats_counters,
+            "users": len(self._adjacency),
+            "edges": sum(len(known) for _, known in self._adjacency.values()),
+        }
+
+
+connection_graph = ConnectionGraph()
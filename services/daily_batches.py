@@ -0,0 +1,339 @@
+"""Nightly precomputation of daily-match batches.
+
+GET /connections/daily/{mode} used to build each batch on the first request:
+load every connection of the user, score candidates, insert `suggested`
+rows. This job does the same work for every active user (last login within
+DAILY_BATCH_ACTIVE_DAYS) and every mode enabled in their
+``connection_preferences.active_modes``, ahead of the morning peak:
+
+- users are split into shards by a stable hash of their id (computed by
+  the database on PostgreSQL, so a shard reads only its own ids); each shard runs
+  in its own process (the CLI's process pool, or one Celery task per shard),
+  with its own candidate snapshot (services/matching.py);
+- a shard handles its users in chunks of DAILY_BATCH_CHUNK. Per chunk it
+  loads preferences and connections with two queries, tops up each mode to
+  ``daily_limit`` exactly like the endpoint (``threshold`` vs ``top_picks``,
+  ``min_threshold``), inserts the new `suggested` connections and upserts
+  one `daily_batches` row per (user, mode) holding the formatted response,
+  all in a single commit;
+- a chunk is the unit of resumption: users who already have today's row are
+  skipped, so an interrupted run is simply started again (with any number of
+  workers);
+- each shard reports progress (users done / total, rows written) to Redis,
+  or to JSON files under DAILY_BATCH_STATE_DIR without Redis. /debug/daily-batches
+  and the CLI show the aggregate.
+
+The endpoint then serves today's row with one primary-key read. Actions that
+change a suggestion drop the affected users' rows (`invalidate`), which sends
+their next request down the on-demand path.
+
+    python scripts/precompute_daily_batches.py --workers 8
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from core.logging import logger
+from utils.settings import REDIS_URL
+
+DAILY_BATCH_WORKERS = int(os.getenv("DAILY_BATCH_WORKERS", str(min(8, os.cpu_count() or 2))))
+DAILY_BATCH_CHUNK = int(os.getenv("DAILY_BATCH_CHUNK", "500"))
+DAILY_BATCH_ACTIVE_DAYS = int(os.getenv("DAILY_BATCH_ACTIVE_DAYS", "30"))
+DAILY_BATCH_HOUR = int(os.getenv("DAILY_BATCH_HOUR", "3"))  # UTC
+DAILY_BATCH_STATE_DIR = os.getenv("DAILY_BATCH_STATE_DIR", "data/daily_batches")
+
+MODES = ("romantic", "social", "professional")
+DEFAULT_PREFERENCES = {
+    "daily_limit": 3,
+    "filter_mode": "threshold",
+    "min_threshold": 0.60,
+    "active_modes": {mode: True for mode in MODES},
+}
+
+Pick = Tuple[str, float]
+
+
+def today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def shard_of(tenant_id: str, shards: int) -> int:
+    """Stable shard number (process-independent, unlike `hash()`): the first 32 bits of the id's MD5."""
+    return int(hashlib.md5(tenant_id.encode()).hexdigest()[:8], 16) % shards
+
+
+def shard_clause(column, shard: int, shards: int):
+    """PostgreSQL predicate equivalent to ``shard_of(column, shards) == shard``."""
+    from sqlalchemy import BigInteger, String, cast, func, literal
+    from sqlalchemy.dialects.postgresql import BIT
+
+    prefix = func.left(func.md5(column), 8, type_=String)
+    return cast(cast(literal("x") + prefix, BIT(32)), BigInteger) % shards == shard
+
+
+def generate_ai_insight(first_name: Optional[str], score: float) -> str:
+    """Stub for AI explanation."""
+    return f"We noticed you share common interests. With a compatibility score of {int(score*100)}%, {first_name} could be a great match."
+
+
+def suggestion_payload(connection_id: str, user_b_id: str, info, score: float, mode: str, status: str) -> Dict[str, Any]:
+    """One entry of the /connections/daily/{mode} response; `info` is the other user's PersonalInfo (or None)."""
+    first = info.first_name if info else ""
+    last = info.last_name if info else ""
+    return {
+        "id": connection_id,
+        "user_b": {
+            "id": user_b_id,
+            "name": f"{first or ''} {last or ''}".strip() or "Unknown",
+            "location": info.location if info else "",
+        },
+        "score": score,
+        "mode": mode,
+        "status": status,
+        "ai_insight": generate_ai_insight(first, score),
+    }
+
+
+def preferences(raw: Optional[dict]) -> dict:
+    prefs = {**DEFAULT_PREFERENCES, **(raw or {})}
+    prefs["active_modes"] = {**DEFAULT_PREFERENCES["active_modes"], **(prefs.get("active_modes") or {})}
+    return prefs
+
+
+def plan_user(
+    matrix,
+    profile,
+    prefs: dict,
+    suggested: Dict[str, int],
+    connected: Set[str],
+    semantic: Optional[Dict[str, float]] = None,
+) -> Dict[str, List[Pick]]:
+    """New picks per active mode, topping each up to `daily_limit` like the endpoint does.
+
+    `suggested` counts the user's open suggestions per mode; `connected` is
+    everyone the user already has a connection with (it grows as modes are
+    filled, so one candidate is never suggested twice).
+    """
+    picks: Dict[str, List[Pick]] = {}
+    tenant_id = profile[0]
+    for mode in MODES:
+        if not prefs["active_modes"].get(mode):
+            continue
+        needed = prefs["daily_limit"] - suggested.get(mode, 0)
+        if needed <= 0:
+            picks[mode] = []
+            continue
+        min_score = prefs["min_threshold"] if prefs["filter_mode"] == "threshold" else None
+        chosen = matrix.top_k(profile, needed, exclude={tenant_id, *connected}, min_score=min_score, semantic=semantic)
+        connected.update(candidate for candidate, _ in chosen)
+        picks[mode] = chosen
+    return picks
+
+
+class BatchProgress:
+    """Per-shard progress of one day's run, in Redis (or JSON files without it)."""
+
+    def __init__(self, batch_date: date, url: Optional[str] = REDIS_URL, state_dir: str = DAILY_BATCH_STATE_DIR):
+        self.batch_date = batch_date
+        self.key = f"daily:progress:{batch_date.isoformat()}"
+        self.state_dir = Path(state_dir)
+        self._redis = None
+        if url:
+            try:
+                from utils.redis_pool import redis_client
+                self._redis = redis_client(url)
+                self._redis.ping()
+            except Exception as e:
+                logger.debug(f"Daily batches: Redis unavailable ({e}); progress kept in {state_dir}")
+                self._redis = None
+
+    def update(self, shard: int, **fields):
+        fields["updated_at"] = time.time()
+        if self._redis is not None:
+            self._redis.hset(self.key, str(shard), json.dumps(fields))
+            self._redis.expire(self.key, 7 * 86400)
+            return
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        path = self.state_dir / f"{self.batch_date.isoformat()}.shard{shard}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(fields))
+        os.replace(tmp, path)
+
+    def reset(self):
+        """Forget per-shard entries (a run with a different shard count starts afresh)."""
+        if self._redis is not None:
+            self._redis.delete(self.key)
+            return
+        for path in self.state_dir.glob(f"{self.batch_date.isoformat()}.shard*.json"):
+            path.unlink()
+
+    def snapshot(self) -> Dict[str, Any]:
+        if self._redis is not None:
+            shards = {int(k): json.loads(v) for k, v in self._redis.hgetall(self.key).items()}
+        else:
+            shards = {}
+            for path in self.state_dir.glob(f"{self.batch_date.isoformat()}.shard*.json"):
+                shards[int(path.stem.rsplit("shard", 1)[1])] = json.loads(path.read_text())
+        done = sum(s.get("done", 0) for s in shards.values())
+        total = sum(s.get("total", 0) for s in shards.values())
+        return {
+            "date": self.batch_date.isoformat(),
+            "shards": dict(sorted(shards.items())),
+            "done": done,
+            "total": total,
+            "written": sum(s.get("written", 0) for s in shards.values()),
+            "percent": round(100 * done / total, 1) if total else None,
+            "finished": bool(shards) and all(s.get("finished") for s in shards.values()),
+        }
+
+
+# -- database side -------------------------------------------------------------------
+def store(db, tenant_id: str, mode: str, batch_date: date, items: List[dict]):
+    """Save (replace) one user's batch for `mode`; the caller commits."""
+    from models.connection import DailyBatch
+    db.merge(DailyBatch(tenant_id=tenant_id, mode=mode, batch_date=batch_date, items=items))
+
+
+def invalidate(db, *tenant_ids: str):
+    """Drop the stored batches of users whose suggestions changed; the caller commits."""
+    from models.connection import DailyBatch
+    db.query(DailyBatch).filter(DailyBatch.tenant_id.in_(tenant_ids)).delete(synchronize_session=False)
+
+
+def _active_tenant_ids(shard: int, shards: int) -> List[str]:
+    from sqlalchemy import select
+    from database.session import Session
+    from models.user import Tenant
+
+    since = datetime.now(timezone.utc) - timedelta(days=DAILY_BATCH_ACTIVE_DAYS)
+    query = select(Tenant.id).where(Tenant.last_login >= since).order_by(Tenant.id)
+    with Session() as db:
+        if db.get_bind().dialect.name == "postgresql":
+            return list(db.scalars(query.where(shard_clause(Tenant.id, shard, shards))))
+        # Other databases (local SQLite): no md5(), filter here.
+        return [tenant_id for tenant_id in db.scalars(query) if shard_of(tenant_id, shards) == shard]
+
+
+def _write_chunk(matrix, profiles: Dict[str, Any], chunk: Sequence[str], batch_date: date, semantic: bool) -> int:
+    """Plan, insert and store one chunk of users in one transaction; returns rows written.
+
+    Users that already have a batch for `batch_date` are skipped (resumption).
+    """
+    from types import SimpleNamespace
+    from sqlalchemy import or_
+    from sqlalchemy.dialects.postgresql import insert
+    from database.session import Session
+    from models.connection import Connection, DailyBatch
+    from models.user import PersonalInfo, Tenant
+    from services.matching import matching_engine
+
+    with Session() as db:
+        done = {
+            tenant_id for (tenant_id,) in
+            db.query(DailyBatch.tenant_id).filter(DailyBatch.tenant_id.in_(chunk), DailyBatch.batch_date == batch_date)
+        }
+        chunk = [tenant_id for tenant_id in chunk if tenant_id not in done]
+        if not chunk:
+            return 0
+        tenants = db.query(Tenant.id, Tenant.connection_preferences, Tenant.embedding_id).filter(Tenant.id.in_(chunk)).all()
+        connected: Dict[str, Set[str]] = {tenant_id: set() for tenant_id in chunk}
+        open_suggestions: Dict[Tuple[str, str], List[Tuple[str, str, float]]] = {}
+        rows = db.query(
+            Connection.id, Connection.user_a_id, Connection.user_b_id, Connection.mode, Connection.status, Connection.score,
+        ).filter(or_(Connection.user_a_id.in_(chunk), Connection.user_b_id.in_(chunk)))
+        for conn_id, a, b, mode, status, score in rows:
+            for me, other in ((a, b), (b, a)):
+                if me in connected:
+                    connected[me].add(other)
+            if status == "suggested" and a in connected:
+                open_suggestions.setdefault((a, mode), []).append((conn_id, b, score))
+
+        batches: Dict[Tuple[str, str], List[Tuple[str, str, float]]] = {}
+        new_connections = []
+        for tenant_id, raw_prefs, embedding_id in tenants:
+            profile = profiles.get(tenant_id)
+            if profile is None:
+                continue
+            prefs = preferences(raw_prefs)
+            neighbours = None
+            if semantic and embedding_id is not None:
+                neighbours = matching_engine.semantic_neighbours(SimpleNamespace(id=tenant_id, embedding_id=embedding_id))
+            counts = {mode: len(open_suggestions.get((tenant_id, mode), [])) for mode in MODES}
+            for mode, picks in plan_user(matrix, profile, prefs, counts, connected[tenant_id], neighbours).items():
+                batch = list(open_suggestions.get((tenant_id, mode), []))
+                for candidate, score in picks:
+                    conn_id = str(uuid.uuid4())
+                    new_connections.append({
+                        "id": conn_id, "user_a_id": tenant_id, "user_b_id": candidate, "mode": mode,
+                        "score": score, "status": "suggested", "feedback": {},
+                    })
+                    batch.append((conn_id, candidate, score))
+                batches[(tenant_id, mode)] = batch
+
+        people = {b for batch in batches.values() for _, b, _ in batch}
+        info = {p.tenant: p for p in db.query(PersonalInfo).filter(PersonalInfo.tenant.in_(people))} if people else {}
+        if new_connections:
+            db.execute(Connection.__table__.insert(), new_connections)
+        if batches:
+            values = [
+                {
+                    "tenant_id": tenant_id, "mode": mode, "batch_date": batch_date,
+                    "items": [suggestion_payload(c, b, info.get(b), s, mode, "suggested") for c, b, s in batch],
+                    "created_at": datetime.now(timezone.utc),
+                }
+                for (tenant_id, mode), batch in batches.items()
+            ]
+            stmt = insert(DailyBatch).values(values)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["tenant_id", "mode"],
+                set_={"batch_date": stmt.excluded.batch_date, "items": stmt.excluded.items, "created_at": stmt.excluded.created_at},
+            ))
+        db.commit()
+        return len(batches)
+
+
+def run_shard(shard: int, shards: int, batch_date: Optional[date] = None, chunk: int = DAILY_BATCH_CHUNK, semantic: bool = True) -> Dict[str, Any]:
+    """Compute one shard's batches; safe to re-run (users done today are skipped)."""
+    from services.matching import build_snapshot
+    from services.vector_index import refresh_vector_index
+
+    batch_date = batch_date or today()
+    if semantic:
+        refresh_vector_index()  # long-lived workers: use the embedding job's latest snapshot
+    progress = BatchProgress(batch_date)
+    started = time.time()
+    ids = _active_tenant_ids(shard, shards)
+    state = {"total": len(ids), "done": 0, "written": 0, "started_at": started, "finished": False}
+    progress.update(shard, **state)
+    if ids:
+        profiles: Dict[str, Any] = dict.fromkeys(ids)
+        matrix = build_snapshot(viewers=profiles)
+        for i in range(0, len(ids), chunk):
+            part = ids[i:i + chunk]
+            state["written"] += _write_chunk(matrix, profiles, part, batch_date, semantic)
+            state["done"] += len(part)
+            progress.update(shard, **state)
+    state.update(finished=True, seconds=round(time.time() - started, 1))
+    progress.update(shard, **state)
+    logger.info(f"Daily batches {batch_date} shard {shard}/{shards}: {state}")
+    return {"shard": shard, **state}
+
+
+def run_all(batch_date: Optional[date] = None, workers: int = DAILY_BATCH_WORKERS, chunk: int = DAILY_BATCH_CHUNK) -> List[Dict[str, Any]]:
+    """All shards in a local process pool (the CLI path; Celery fans out one task per shard instead)."""
+    batch_date = batch_date or today()
+    BatchProgress(batch_date).reset()
+    if workers <= 1:
+        return [run_shard(0, 1, batch_date, chunk)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_shard, shard, workers, batch_date, chunk) for shard in range(workers)]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return sorted(results, key=lambda r: r["shard"])
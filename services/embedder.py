@@ -0,0 +1,281 @@
+"""Local text embeddings with micro-batching and a content-hash cache.
+
+Profile texts are embedded in-process on CPU instead of by a remote service
+(or, previously, `np.random.rand`). Backends (EMBEDDING_BACKEND):
+
+- ``onnx`` (default): EMBEDDING_MODEL through sentence-transformers' ONNX
+  runtime backend, loading EMBEDDING_ONNX_FILE from the model repo. The
+  default is the portable export; on CPUs that support it, a quantised one
+  (e.g. ``onnx/model_qint8_avx512_vnni.onnx``) is several times faster;
+- ``sentence-transformers``: the same model on the torch CPU backend;
+- ``hashing``: dependency-free signed feature hashing of word unigrams and
+  bigrams. Deterministic and instant, for offline use and tests. Only used
+  when set explicitly: its vectors are not comparable with the model's, so a
+  model that fails to load is an error rather than a silent fallback.
+
+Vectors are L2-normalised float32 of VECTOR_INDEX_DIM dimensions, ready for
+services/vector_index.py.
+
+`await embedder.embed(text)` queues the text; a worker gathers requests from
+all callers for up to EMBED_BATCH_WAIT_MS (or EMBED_BATCH_SIZE texts) and runs
+one batched forward pass in a thread. Identical texts are encoded once: results
+are cached in an LRU keyed by a SHA-256 of (model, normalised text). Sync
+callers (Celery tasks) use `encode_sync`, which shares the cache.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.logging import logger
+from services.vector_index import VECTOR_INDEX_DIM
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+
+_WS = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def normalise_text(text: str) -> str:
+    return _WS.sub(" ", text or "").strip()
+
+
+class HashingBackend:
+    """Signed feature hashing of unigrams + bigrams; no model, fully deterministic."""
+
+    name = "hashing"
+
+    def __init__(self, dim: int = VECTOR_INDEX_DIM):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        words = _WORD.findall(text.lower())
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if not grams:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(g.encode(), digest_size=8).digest(), "little") for g in grams],
+            dtype=np.uint64,
+        )
+        index = (hashes % np.uint64(self.dim)).astype(np.int64)
+        sign = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+        return index, sign
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            index, sign = self._features(text)
+            np.add.at(out[row], index, sign)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class SentenceTransformerBackend:
+    """EMBEDDING_MODEL on CPU, optionally through the quantised ONNX export."""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, onnx_file: Optional[str] = EMBEDDING_ONNX_FILE):
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {"device": "cpu"}
+        if onnx_file:
+            kwargs.update(backend="onnx", model_kwargs={"file_name": onnx_file})
+        self._model = SentenceTransformer(model, **kwargs)
+        self.name = "onnx" if onnx_file else "sentence-transformers"
+        self.model = model
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(
+            list(texts), batch_size=max(1, len(texts)), normalize_embeddings=True, convert_to_numpy=True,
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def make_backend(kind: str = EMBEDDING_BACKEND):
+    """The EMBEDDING_BACKEND backend; raises when its model can't be loaded."""
+    if kind == "hashing":
+        return HashingBackend()
+    if kind not in ("onnx", "sentence-transformers"):
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{kind}' (onnx, sentence-transformers or hashing)")
+    try:
+        backend = SentenceTransformerBackend(onnx_file=EMBEDDING_ONNX_FILE if kind == "onnx" else None)
+    except Exception as e:
+        # Hashed vectors mixed into an index of model vectors would silently ruin every search.
+        raise RuntimeError(
+            f"Embedding backend '{kind}' unavailable ({e}); set EMBEDDING_BACKEND=hashing to use feature hashing"
+        ) from e
+    if backend.dim != VECTOR_INDEX_DIM:
+        logger.warning(f"{backend.model} produces {backend.dim}-d vectors but VECTOR_INDEX_DIM={VECTOR_INDEX_DIM}")
+    return backend
+
+
+class Embedder:
+    def __init__(
+        self,
+        backend=None,
+        batch_size: int = EMBED_BATCH_SIZE,
+        wait_ms: float = EMBED_BATCH_WAIT_MS,
+        cache_size: int = EMBED_CACHE_SIZE,
+    ):
+        self._backend = backend
+        self.batch_size = batch_size
+        self.wait_ms = wait_ms
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats_counters = {"requests": 0, "hits": 0, "coalesced": 0, "encoded": 0, "batches": 0}
+        self.encode_seconds = 0.0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = make_backend()
+        return self._backend
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.backend.name}:{self.backend.model}"
+
+    @property
+    def dim(self) -> int:
+        return self.backend.dim
+
+    def key(self, text: str) -> str:
+        """Content hash of (model, normalised text); the same profile text always maps to one key."""
+        return hashlib.sha256(f"{self.model_id}\0{normalise_text(text)}".encode("utf-8")).hexdigest()
+
+    # -- cache -------------------------------------------------------------------
+    def _cached(self, key: str) -> Optional[np.ndarray]:
+        vector = self._cache.get(key)
+        if vector is not None:
+            self._cache.move_to_end(key)
+        return vector
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        started = time.perf_counter()
+        vectors = self.backend.encode([normalise_text(t) for t in texts])
+        self.encode_seconds += time.perf_counter() - started
+        self.stats_counters["encoded"] += len(texts)
+        self.stats_counters["batches"] += 1
+        return vectors
+
+    # -- sync API ------------------------------------------------------------------
+    def encode_sync(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed `texts` in the calling thread (batched, cached); rows follow the input order."""
+        self.stats_counters["requests"] += len(texts)
+        keys = [self.key(t) for t in texts]
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in missing or self._cached(key) is not None:
+                self.stats_counters["hits"] += 1
+            else:
+                missing[key] = text
+        pending = list(missing.items())
+        for i in range(0, len(pending), self.batch_size):
+            chunk = pending[i:i + self.batch_size]
+            for (key, _), vector in zip(chunk, self._encode([text for _, text in chunk])):
+                self._remember(key, vector)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, key in enumerate(keys):
+            vector = self._cached(key)
+            out[row] = vector if vector is not None else self._encode([texts[row]])[0]
+        return out
+
+    # -- async micro-batching --------------------------------------------------------
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._inflight = {}
+            self._task = loop.create_task(self._worker())
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text; concurrent callers are encoded together in one batch."""
+        self.stats_counters["requests"] += 1
+        key = self.key(text)
+        vector = self._cached(key)
+        if vector is not None:
+            self.stats_counters["hits"] += 1
+            return vector
+        self._ensure_worker()
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats_counters["coalesced"] += 1
+        else:
+            future = self._inflight[key] = self._loop.create_future()
+            self._queue.put_nowait((key, text))
+        return await asyncio.shield(future)
+
+    async def embed_many(self, texts: Sequence[str]) -> List[np.ndarray]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    async def _worker(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.wait_ms / 1000
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                vectors = await asyncio.to_thread(self._encode, [text for _, text in batch])
+            except Exception as e:
+                for key, _ in batch:
+                    future = self._inflight.pop(key, None)
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                continue
+            for (key, _), vector in zip(batch, vectors):
+                self._remember(key, vector)
+                future = self._inflight.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_result(vector)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        encoded, batches = self.stats_counters["encoded"], self.stats_counters["batches"]
+        return {
+            **self.stats_counters,
+            "backend": self.backend.name if self._backend is not None else None,
+            "model": self.backend.model if self._backend is not None else EMBEDDING_MODEL,
+            "cached": len(self._cache),
+            "mean_batch": round(encoded / batches, 2) if batches else None,
+            "texts_per_sec": round(encoded / self.encode_seconds, 1) if self.encode_seconds else None,
+        }
+
+
+embedder = Embedder()
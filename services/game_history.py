@@ -0,0 +1,208 @@
+"""Bounded game history: a rolling window in the hot session, the rest in `game_events`.
+
+`GameSession.history` and the narrative lists some games keep in their state
+(`story_text`, `history_data`) are trimmed by `GameManager.update_state` to the
+last GAME_HISTORY_WINDOW entries. Trimming happens in chunks of
+GAME_HISTORY_SLACK so it costs one insert every few turns, not one per turn.
+Entries that roll out are:
+
+- appended to `game_events` with their position in the full list (`seq`), and
+- folded into `state["history_summary"]`, a short running summary the LLM
+  rewrites in the background, so prompts keep the gist of the whole game.
+
+`state["history_offsets"]` records how many entries of each list were rolled
+out, which lets `page()` walk the window and the table with one `seq` cursor.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from core.logging import logger
+
+GAME_HISTORY_WINDOW = int(os.getenv("GAME_HISTORY_WINDOW", "20"))
+GAME_HISTORY_SLACK = int(os.getenv("GAME_HISTORY_SLACK", "10"))
+
+# Lists in `state` that grow every turn and are windowed like `history`.
+WINDOWED_STATE_KEYS = ("story_text", "history_data")
+# Rolled-out kinds fed to the summary (`history_data` repeats `story_text`).
+SUMMARIZED_KINDS = ("history", "story_text")
+SUMMARY_KEY = "history_summary"
+OFFSETS_KEY = "history_offsets"
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You keep the running summary of a multiplayer story game. Merge the new events "
+    "into the summary so far. Keep names, decisions, open threads and the current "
+    "situation. Plain prose, at most 150 words."
+)
+
+
+def trim(entries: list, window: int = GAME_HISTORY_WINDOW, slack: int = GAME_HISTORY_SLACK) -> Tuple[list, list]:
+    """Split `entries` into (kept, rolled_out); nothing rolls out until the slack is used up."""
+    if len(entries) <= window + slack:
+        return entries, []
+    return entries[-window:], entries[:-window]
+
+
+def story_so_far(state: dict) -> str:
+    """Prompt preamble with the running summary of entries no longer in the window."""
+    summary = (state or {}).get(SUMMARY_KEY)
+    return f"STORY SO FAR: {summary}\n" if summary else ""
+
+
+def _render(entry: Any) -> str:
+    text = entry if isinstance(entry, str) else json.dumps(entry, default=str)
+    return text[:500]
+
+
+async def _insert_events(rows: List[Dict[str, Any]]):
+    from sqlalchemy import insert
+    from database.session import async_session
+    from models.game_session import GameEvent
+
+    async with async_session() as db:
+        await db.execute(insert(GameEvent), rows)
+        await db.commit()
+
+
+async def _fetch_events(session_id: str, kind: str, before: int, limit: int) -> List[Dict[str, Any]]:
+    from sqlalchemy.future import select
+    from database.session import async_session
+    from models.game_session import GameEvent
+
+    async with async_session() as db:
+        result = await db.execute(
+            select(GameEvent)
+            .where(GameEvent.session_id == session_id, GameEvent.kind == kind, GameEvent.seq < before)
+            .order_by(GameEvent.seq.desc())
+            .limit(limit)
+        )
+        return [
+            {"seq": e.seq, "entry": e.payload, "at": e.created_at.isoformat() if e.created_at else None}
+            for e in result.scalars()
+        ]
+
+
+async def _summarize(previous: str, entries: list) -> str:
+    from api.routers._llm import safe_chat_completion
+
+    lines = "\n".join(_render(e) for e in entries)
+    prompt = f"Summary so far:\n{previous or '(the game just started)'}\n\nNew events:\n{lines}"
+    return await safe_chat_completion(SUMMARY_SYSTEM_PROMPT, prompt, temperature=0.3, max_tokens=300, fallback="")
+
+
+class GameHistory:
+    def __init__(
+        self,
+        inserter: Callable[[List[Dict[str, Any]]], Awaitable[None]] = _insert_events,
+        fetcher: Callable[..., Awaitable[List[Dict[str, Any]]]] = _fetch_events,
+        summarizer: Callable[[str, list], Awaitable[str]] = _summarize,
+        store=None,
+    ):
+        self._insert = inserter
+        self._fetch = fetcher
+        self._summarizer = summarizer
+        self._store = store
+        self._unwritten: List[Dict[str, Any]] = []
+        self._unsummarized: Dict[str, list] = {}
+        self._summarizing: Dict[str, asyncio.Task] = {}
+        self.stats_counters = {"events_written": 0, "write_failures": 0, "summaries": 0, "summary_failures": 0}
+
+    @property
+    def store(self):
+        if self._store is None:
+            from services.game_session_store import game_store
+            self._store = game_store
+        return self._store
+
+    async def append(self, session_id: str, rolled: Dict[str, list], starts: Dict[str, int]):
+        """Persist entries trimmed from the window; `starts[kind]` is the seq of the first one."""
+        for kind, entries in rolled.items():
+            self._unwritten.extend(
+                {"session_id": session_id, "kind": kind, "seq": starts[kind] + i, "payload": entry}
+                for i, entry in enumerate(entries)
+            )
+        await self.flush()
+        to_summarize = [e for kind in SUMMARIZED_KINDS for e in rolled.get(kind, ())]
+        if to_summarize:
+            self._unsummarized.setdefault(session_id, []).extend(to_summarize)
+            if session_id not in self._summarizing:
+                self._summarizing[session_id] = asyncio.ensure_future(self._summarize_session(session_id))
+
+    async def flush(self):
+        """Insert entries not yet in `game_events`; kept for the next attempt on failure."""
+        rows, self._unwritten = self._unwritten, []
+        if not rows:
+            return
+        try:
+            await self._insert(rows)
+        except Exception as e:
+            self.stats_counters["write_failures"] += 1
+            self._unwritten = rows + self._unwritten
+            logger.error(f"Game history: writing {len(rows)} event(s) failed: {e}")
+            return
+        self.stats_counters["events_written"] += len(rows)
+
+    async def _summarize_session(self, session_id: str):
+        from services.llm_stream import bind_sink
+
+        # Background work must never stream into the request that scheduled it.
+        bind_sink(None)
+        try:
+            while self._unsummarized.get(session_id):
+                entries = self._unsummarized.pop(session_id)
+                session = await self.store.get(session_id)
+                if session is None:
+                    return
+                previous = (session.state or {}).get(SUMMARY_KEY) or ""
+                try:
+                    summary = await self._summarizer(previous, entries)
+                except Exception as e:
+                    logger.warning(f"Game history: summary failed for {session_id}: {e}")
+                    summary = ""
+                if not summary:
+                    # Retried with the next roll-out; bounded so a dead LLM can't grow it.
+                    self.stats_counters["summary_failures"] += 1
+                    pending = entries + self._unsummarized.get(session_id, [])
+                    self._unsummarized[session_id] = pending[-GAME_HISTORY_SLACK * 5:]
+                    return
+                await self.store.mutate(session_id, lambda s: {"state": {**(s.state or {}), SUMMARY_KEY: summary}})
+                self.stats_counters["summaries"] += 1
+        finally:
+            self._summarizing.pop(session_id, None)
+
+    async def page(self, session, kind: str = "history", before: Optional[int] = None, limit: int = 50) -> dict:
+        """Newest-first page of `kind` entries with seq < `before` (window first, then the table)."""
+        state = session.state or {}
+        window = (session.history if kind == "history" else state.get(kind)) or []
+        offset = (state.get(OFFSETS_KEY) or {}).get(kind, 0)
+        top = offset + len(window) if before is None else min(before, offset + len(window))
+
+        events = [{"seq": seq, "entry": window[seq - offset]} for seq in range(top - 1, offset - 1, -1)][:limit]
+        older = min(top, offset)
+        if len(events) < limit and older > 0:
+            await self.flush()
+            events.extend(await self._fetch(session.session_id, kind, older, limit - len(events)))
+        last = events[-1]["seq"] if events else 0
+        return {
+            "kind": kind,
+            "events": events,
+            "next_cursor": last if last > 0 else None,
+            "summary": state.get(SUMMARY_KEY),
+        }
+
+    async def close(self):
+        for task in list(self._summarizing.values()):
+            task.cancel()
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "unwritten": len(self._unwritten),
+            "summarizing": len(self._summarizing),
+            **self.stats_counters,
+        }
+
+
+# Application-wide instance
+game_history = GameHistory()
@@ -0,0 +1,68 @@
+"""Push game-session changes to connected players instead of having them poll.
+
+Every committed change to a hot session (services/game_session_store.py) is
+broadcast on the session's topic (``game:<session_id>``) as a versioned
+JSON-patch delta::
+
+    {"type": "delta", "session_id": ..., "version": 7, "ops": [...]}
+
+A client subscribes via ``/games/multiplayer/ws/<session_id>``, receives a full
+``snapshot`` first and applies each delta whose version is exactly one more
+than what it holds. On a gap (a frame dropped for a slow consumer, or a
+``resync`` after a write conflict) it fetches ``GET /session/<id>?since=<v>``
+or the full snapshot. Lobby events (``player_joined``, ``player_ready``,
+``chat``) go out on the same topic.
+
+Polling still works: GET /session/<id> carries a weak ETag of the session
+version and answers 304 when nothing has changed.
+"""
+import asyncio
+from typing import List, Optional
+
+from core.logging import logger
+
+
+def topic(session_id: str) -> str:
+    return f"game:{session_id}"
+
+
+def etag(session_id: str, version: int) -> str:
+    return f'W/"{session_id}-{version}"'
+
+
+async def publish(session_id: str, event: dict):
+    """Broadcast `event` to every socket subscribed to the session (on any worker)."""
+    from utils.websockets import manager
+
+    try:
+        await manager.broadcast(topic(session_id), event)
+    except Exception as e:
+        logger.warning(f"Game push failed for {session_id}: {e}")
+
+
+def _schedule(session_id: str, event: dict):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    asyncio.ensure_future(publish(session_id, event))
+
+
+def on_change(session_id: str, version: int, ops: Optional[List[dict]]):
+    """Game-store listener: one delta (or resync) frame per committed change."""
+    if ops is None:
+        _schedule(session_id, {"type": "resync", "session_id": session_id, "version": version})
+    else:
+        _schedule(session_id, {"type": "delta", "session_id": session_id, "version": version, "ops": ops})
+
+
+def emit(session_id: str, event_type: str, **payload):
+    """Fire-and-forget typed lobby event (player_joined, player_ready, chat, ...)."""
+    _schedule(session_id, {"type": event_type, "session_id": session_id, **payload})
+
+
+def install(store=None):
+    if store is None:
+        from services.game_session_store import game_store as store
+    if on_change not in store._listeners:
+        store.add_listener(on_change)
@@ -0,0 +1,798 @@
+"""Hot store for live game sessions with write-behind to Postgres.
+
+`GameManager` reads and patches the live `GameSession` document here instead of
+running SELECT / full-row UPDATE / refresh on every call. Changes are written
+back to `game_sessions` in batches:
+
+- every GAME_STORE_FLUSH_SECONDS by the background flusher,
+- immediately on status / phase changes and at game end (`flush(session_id)`),
+- on shutdown (`close()`).
+
+Every mutation is recorded as an RFC 6902 delta (services/json_patch.py) and
+bumps the session's monotonic `version`. Writes are compare-and-swap on that
+column: when another writer got there first the pending deltas are re-applied
+onto the fresh row and the write is retried (up to GAME_STORE_CAS_RETRIES). The
+last GAME_STORE_DELTA_HISTORY deltas per session are kept so clients can fetch
+`deltas_since(version)` instead of the full state.
+
+Tiers (GAME_STORE_BACKEND):
+
+- ``memory`` (default): documents live in this process. Every delta is appended
+  to a journal file (GAME_STORE_JOURNAL) before it is acknowledged; journal
+  segments are deleted once the batch they cover is in Postgres, and leftovers
+  are replayed into Postgres on the next start, so a crash loses nothing that was
+  acknowledged. Requires a single worker, or sticky routing by session id.
+- ``redis``: documents live in Redis (shared by all workers) and are patched with
+  WATCH/MULTI; any worker's flusher drains the shared dirty set.
+
+Readers get private copies, so routers may freely mutate what they receive.
+"""
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.logging import logger
+from services.json_patch import JsonPatchError, apply_patch, make_patch, split_pointer
+from utils.settings import REDIS_URL
+
+GAME_STORE_BACKEND = os.getenv("GAME_STORE_BACKEND", "memory").lower()
+GAME_STORE_FLUSH_SECONDS = float(os.getenv("GAME_STORE_FLUSH_SECONDS", "2"))
+GAME_STORE_IDLE_SECONDS = float(os.getenv("GAME_STORE_IDLE_SECONDS", "1800"))
+GAME_STORE_JOURNAL = os.getenv("GAME_STORE_JOURNAL", "data/game_sessions.journal")
+GAME_STORE_FSYNC = os.getenv("GAME_STORE_FSYNC", "0") not in ("0", "false", "no")
+GAME_STORE_DELTA_HISTORY = int(os.getenv("GAME_STORE_DELTA_HISTORY", "64"))
+GAME_STORE_CAS_RETRIES = int(os.getenv("GAME_STORE_CAS_RETRIES", "3"))
+
+COLUMNS = (
+    "id", "session_id", "game_slug", "game_mode", "room_code", "status", "max_players",
+    "host_user_id", "players", "state", "analysis", "history", "is_active", "version",
+    "created_at", "updated_at",
+)
+# Columns that change during play and are written back to Postgres.
+MUTABLE_COLUMNS = ("status", "players", "state", "analysis", "history", "is_active")
+
+# One committed change: (version it produced, RFC 6902 operations).
+Delta = Tuple[int, List[dict]]
+# Called after every committed change; ops=None means earlier deltas were discarded.
+Listener = Callable[[str, int, Optional[List[dict]]], None]
+
+
+def clone(value):
+    """Fast deep copy for JSON-shaped data."""
+    if isinstance(value, dict):
+        return {k: clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [clone(v) for v in value]
+    return value
+
+
+def _column(pointer: str) -> str:
+    """Top-level session column an operation path points into."""
+    tokens = split_pointer(pointer)
+    if not tokens or tokens[0] not in MUTABLE_COLUMNS:
+        raise JsonPatchError(f"path {pointer!r} is not inside a mutable game-session column")
+    return tokens[0]
+
+
+def check_client_ops(ops: List[dict]):
+    """Raise unless every operation stays inside ``/state/``.
+
+    Clients (PATCH /session/{id}/state) may only change the game state: players,
+    status, analysis and history are server-managed.
+    """
+    for op in ops:
+        pointers = [op.get("path") or ""] + ([op["from"]] if "from" in op else [])
+        for pointer in pointers:
+            tokens = split_pointer(str(pointer))
+            if len(tokens) < 2 or tokens[0] != "state":
+                raise JsonPatchError(f"path {pointer!r} is outside /state/")
+
+
+def _touched(ops: List[dict]) -> Set[str]:
+    columns = set()
+    for op in ops:
+        if op.get("op") == "test":
+            continue
+        columns.add(_column(op.get("path") or ""))
+        if op.get("op") == "move":
+            columns.add(_column(op.get("from") or ""))
+    return columns
+
+
+def _apply_to(doc, ops: List[dict]):
+    """Apply `ops` to the mutable columns of `doc` (a HotSession) in place."""
+    view = {name: getattr(doc, name) for name in MUTABLE_COLUMNS}
+    view = apply_patch(view, clone(ops))
+    for name in MUTABLE_COLUMNS:
+        setattr(doc, name, view.get(name))
+
+
+class HotSession:
+    """In-memory `GameSession` document exposing the same attributes as the model."""
+
+    __slots__ = COLUMNS
+
+    def __init__(self, **fields):
+        for name in COLUMNS:
+            setattr(self, name, fields.get(name))
+        self.version = self.version or 0
+
+    @classmethod
+    def from_model(cls, row) -> "HotSession":
+        return cls(**{name: clone(getattr(row, name, None)) for name in COLUMNS})
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "HotSession":
+        return cls(**doc)
+
+    def to_doc(self) -> dict:
+        doc = {name: getattr(self, name) for name in COLUMNS}
+        for name in ("created_at", "updated_at"):
+            if isinstance(doc[name], datetime):
+                doc[name] = doc[name].isoformat()
+        return doc
+
+    def copy(self) -> "HotSession":
+        return HotSession(**{name: clone(getattr(self, name)) for name in COLUMNS})
+
+
+class PostgresSessionWriter:
+    """Default writer: loads rows and writes batches compare-and-swap on `version`.
+
+    Each batch item is ``{"fields": {...}, "version": new, "base": expected}``.
+    With a `base` the UPDATE only matches a row still at that version; with
+    ``base=None`` (Redis tier) it only matches an older row, so versions never go
+    backwards. Returns the session ids whose UPDATE matched nothing.
+    """
+
+    async def load(self, session_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        from sqlalchemy.future import select
+        from database.session import async_session
+        from models.game_session import GameSession
+
+        async with async_session() as db:
+            result = await db.execute(select(GameSession).where(GameSession.session_id.in_(list(session_ids))))
+            return {
+                row.session_id: {name: getattr(row, name) for name in MUTABLE_COLUMNS + ("version",)}
+                for row in result.scalars()
+            }
+
+    async def write(self, batch: Dict[str, Dict[str, Any]]) -> Set[str]:
+        from sqlalchemy import update
+        from sqlalchemy.sql import func
+        from database.session import async_session
+        from models.game_session import GameSession
+
+        conflicts = set()
+        async with async_session() as db:
+            for session_id, item in batch.items():
+                if item["base"] is None:
+                    guard = GameSession.version < item["version"]
+                else:
+                    guard = GameSession.version == item["base"]
+                result = await db.execute(
+                    update(GameSession)
+                    .where(GameSession.session_id == session_id, guard)
+                    .values(**item["fields"], version=item["version"], updated_at=func.now())
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 0:
+                    conflicts.add(session_id)
+            await db.commit()
+        return conflicts
+
+
+class _Journal:
+    """Append-only delta log, rotated into numbered segments at each flush."""
+
+    def __init__(self, path: str, fsync: bool = GAME_STORE_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self._fh = None
+        self._seq = 0
+
+    def _segments(self) -> List[str]:
+        def seq(p):
+            suffix = p.rsplit(".", 1)[-1]
+            return int(suffix) if suffix.isdigit() else 0
+        return sorted(glob.glob(f"{self.path}.*[0-9]"), key=seq)
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        if segments:
+            self._seq = int(segments[-1].rsplit(".", 1)[-1])
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def append(self, session_id: str, version: int, ops: List[dict]) -> int:
+        """Log one delta; returns the bytes written."""
+        if self._fh is None:
+            return 0
+        line = json.dumps({"sid": session_id, "v": version, "ops": ops}, default=str) + "\n"
+        self._fh.write(line)
+        self._fh.flush()
+        if self.fsync:
+            os.fsync(self._fh.fileno())
+        return len(line)
+
+    def rotate(self) -> int:
+        """Seal the current file as a segment; returns its sequence number."""
+        if self._fh is None:
+            return 0
+        self._fh.close()
+        self._seq += 1
+        if os.path.exists(self.path):
+            os.replace(self.path, f"{self.path}.{self._seq}")
+        self._fh = open(self.path, "a", encoding="utf-8")
+        return self._seq
+
+    def discard_through(self, seq: int):
+        for segment in self._segments():
+            if int(segment.rsplit(".", 1)[-1]) <= seq:
+                os.remove(segment)
+
+    def replay(self) -> Dict[str, List[Tuple[Optional[int], List[dict]]]]:
+        """Every unflushed delta (segments, then the live file), grouped by session in order."""
+        deltas: Dict[str, List[Tuple[Optional[int], List[dict]]]] = {}
+        for path in self._segments() + [self.path]:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a crash mid-write.
+                        continue
+                    if "ops" in entry:
+                        deltas.setdefault(entry["sid"], []).append((entry["v"], entry["ops"]))
+                    else:
+                        # Whole-column entries written before deltas existed: always apply.
+                        ops = [{"op": "replace", "path": f"/{k}", "value": v} for k, v in entry["fields"].items()]
+                        deltas.setdefault(entry["sid"], []).append((None, ops))
+        return deltas
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class GameSessionStore:
+    def __init__(
+        self,
+        writer=None,
+        backend: str = GAME_STORE_BACKEND,
+        flush_interval: float = GAME_STORE_FLUSH_SECONDS,
+        idle_seconds: float = GAME_STORE_IDLE_SECONDS,
+        journal_path: Optional[str] = GAME_STORE_JOURNAL,
+        delta_history: int = GAME_STORE_DELTA_HISTORY,
+        cas_retries: int = GAME_STORE_CAS_RETRIES,
+    ):
+        self._writer = writer or PostgresSessionWriter()
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self.delta_history = delta_history
+        self.cas_retries = cas_retries
+        self._docs: Dict[str, HotSession] = {}
+        self._rooms: Dict[str, str] = {}
+        self._dirty: Dict[str, Set[str]] = {}
+        self._last_access: Dict[str, float] = {}
+        # Deltas not yet confirmed in Postgres (re-applied on a CAS conflict),
+        # the version Postgres holds, and the recent deltas served to clients.
+        self._pending: Dict[str, List[Delta]] = {}
+        self._flushed: Dict[str, int] = {}
+        self._deltas: Dict[str, Deque[Delta]] = {}
+        self._journal = _Journal(journal_path) if journal_path and backend == "memory" else None
+        self._redis = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._recovery_pending = False
+        self._listeners: List[Listener] = []
+        self.stats_counters = {
+            "hits": 0, "misses": 0, "mutations": 0, "flushes": 0,
+            "rows_written": 0, "flush_failures": 0, "recovered": 0,
+            "conflicts": 0, "rebased": 0, "lost_updates": 0,
+            "journal_bytes": 0, "delta_bytes": 0,
+        }
+        self.last_flush_ms: Optional[float] = None
+
+    def add_listener(self, listener: Listener):
+        """Register `listener(session_id, version, ops)`; it must not block."""
+        self._listeners.append(listener)
+
+    def _notify(self, session_id: str, version: int, ops: Optional[List[dict]]):
+        for listener in self._listeners:
+            try:
+                listener(session_id, version, ops)
+            except Exception as e:
+                logger.warning(f"Game store listener failed for {session_id}: {e}")
+
+    # -- lifecycle ----------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        """True once the background flusher is active (otherwise callers write through)."""
+        return self._task is not None
+
+    async def start(self):
+        if self.backend == "redis":
+            try:
+                from utils.redis_pool import async_redis_client
+                self._redis = async_redis_client(REDIS_URL)
+                await self._redis.ping()
+            except Exception as e:
+                logger.warning(f"Game store: Redis unavailable ({e}); using in-process tier")
+                self._redis = None
+                self.backend = "memory"
+                if self._journal is None and GAME_STORE_JOURNAL:
+                    self._journal = _Journal(GAME_STORE_JOURNAL)
+        if self._journal is not None:
+            self._journal.open()
+            await self._recover()
+        if self.flush_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+        logger.info(f"Game session store started (backend={self.backend}, flush={self.flush_interval}s)")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._journal is not None:
+            self._journal.close()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _recover(self):
+        journaled = self._journal.replay()
+        if not journaled:
+            self._recovery_pending = False
+            return
+        seq = self._journal.rotate()
+        try:
+            recovered = await self._replay(journaled)
+        except Exception as e:
+            # Keep every segment; the flusher retries the replay before discarding anything.
+            self._recovery_pending = True
+            logger.error(f"Game store: journal replay failed: {e}")
+            return
+        self._recovery_pending = False
+        self._journal.discard_through(seq)
+        self.stats_counters["recovered"] += recovered
+        logger.warning(f"Game store: replayed {recovered} unflushed session(s) from journal")
+
+    async def _replay(self, journaled: Dict[str, List[Tuple[Optional[int], List[dict]]]]) -> int:
+        """Apply journaled deltas newer than each row's version and write them back."""
+        remaining = dict(journaled)
+        recovered = 0
+        for _ in range(self.cas_retries + 1):
+            rows = await self._writer.load(remaining)
+            batch = {}
+            for sid, deltas in remaining.items():
+                row = rows.get(sid)
+                if row is None:
+                    continue
+                base = row.get("version") or 0
+                doc = HotSession(**{name: clone(row.get(name)) for name in MUTABLE_COLUMNS}, version=base)
+                columns = set()
+                for version, ops in deltas:
+                    if version is not None and version <= base:
+                        continue  # Already in Postgres.
+                    try:
+                        _apply_to(doc, ops)
+                    except JsonPatchError:
+                        self.stats_counters["lost_updates"] += 1
+                        continue
+                    columns |= _touched(ops)
+                    doc.version = max(doc.version + 1, version or 0)
+                if columns:
+                    batch[sid] = {
+                        "fields": {name: getattr(doc, name) for name in columns},
+                        "version": doc.version, "base": base,
+                    }
+            if not batch:
+                return recovered
+            conflicts = await self._writer.write(batch) or set()
+            recovered += len(batch) - len(conflicts)
+            remaining = {sid: remaining[sid] for sid in conflicts}
+            if not remaining:
+                return recovered
+            self.stats_counters["conflicts"] += len(conflicts)
+        raise RuntimeError(f"sessions still conflicting after {self.cas_retries} retries: {sorted(remaining)}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if self._recovery_pending:
+                    await self._recover()
+                await self.flush()
+                self._evict_idle()
+            except Exception as e:
+                logger.error(f"Game store flush failed: {e}")
+
+    # -- reads ----------------------------------------------------------------
+    def _key(self, session_id: str) -> str:
+        return f"game:session:{session_id}"
+
+    def _deltas_key(self, session_id: str) -> str:
+        return f"game:deltas:{session_id}"
+
+    def _version_key(self, session_id: str) -> str:
+        return f"game:version:{session_id}"
+
+    async def version(self, session_id: str) -> Optional[int]:
+        """Current version of a hot session without copying it (None if not hot)."""
+        if self._redis is not None:
+            raw = await self._redis.get(self._version_key(session_id))
+            return int(raw) if raw is not None else None
+        doc = self._docs.get(session_id)
+        return doc.version if doc is not None else None
+
+    async def get(self, session_id: str = None, room_code: str = None) -> Optional[HotSession]:
+        """Private copy of the live document, or None if the session is not hot."""
+        if self._redis is not None:
+            if session_id is None:
+                raw_sid = await self._redis.get(f"game:room:{room_code}")
+                session_id = raw_sid.decode() if isinstance(raw_sid, bytes) else raw_sid
+            raw = await self._redis.get(self._key(session_id)) if session_id else None
+            if raw is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self.stats_counters["hits"] += 1
+            return HotSession.from_doc(json.loads(raw))
+
+        if session_id is None:
+            session_id = self._rooms.get(room_code)
+        doc = self._docs.get(session_id) if session_id else None
+        if doc is None:
+            self.stats_counters["misses"] += 1
+            return None
+        self.stats_counters["hits"] += 1
+        self._last_access[session_id] = time.monotonic()
+        return doc.copy()
+
+    async def deltas_since(self, session_id: str, version: int) -> Optional[List[dict]]:
+        """Operations that bring a client at `version` up to date.
+
+        Returns None when they are no longer available (session not hot, too far
+        behind, or history reset by a conflict); the client then needs a full
+        snapshot.
+        """
+        if self._redis is not None:
+            raw = await self._redis.lrange(self._deltas_key(session_id), 0, -1)
+            history = [tuple(json.loads(entry)) for entry in raw]
+            doc_raw = await self._redis.get(self._key(session_id))
+            if doc_raw is None:
+                return None
+            current = json.loads(doc_raw).get("version") or 0
+        else:
+            doc = self._docs.get(session_id)
+            if doc is None:
+                return None
+            history = self._deltas.get(session_id) or ()
+            current = doc.version
+        if version == current:
+            return []
+        if version > current or not history or history[0][0] > version + 1:
+            return None
+        return [op for v, ops in history if v > version for op in ops]
+
+    async def adopt(self, row) -> HotSession:
+        """Make a freshly loaded/created DB row hot; an already-hot document wins."""
+        session = HotSession.from_model(row)
+        if self._redis is not None:
+            doc = json.dumps(session.to_doc(), default=str)
+            await self._redis.set(self._key(session.session_id), doc, ex=int(self.idle_seconds), nx=True)
+            await self._redis.set(self._version_key(session.session_id), session.version, ex=int(self.idle_seconds), nx=True)
+            if session.room_code:
+                await self._redis.set(f"game:room:{session.room_code}", session.session_id, ex=int(self.idle_seconds))
+            return await self.get(session.session_id) or session
+
+        existing = self._docs.get(session.session_id)
+        if existing is not None:
+            return existing.copy()
+        self._docs[session.session_id] = session
+        self._flushed[session.session_id] = session.version
+        if session.room_code:
+            self._rooms[session.room_code] = session.session_id
+        self._last_access[session.session_id] = time.monotonic()
+        return session.copy()
+
+    # -- writes ---------------------------------------------------------------
+    @staticmethod
+    def _diff(doc: HotSession, updates: Dict[str, Any]) -> List[dict]:
+        ops = []
+        for name, value in updates.items():
+            if name not in MUTABLE_COLUMNS:
+                raise ValueError(f"{name} is not a mutable game-session column")
+            ops.extend(make_patch(getattr(doc, name), value, f"/{name}"))
+        # Detach from the caller's objects: deltas are kept and re-applied later.
+        return clone(ops)
+
+    async def mutate(self, session_id: str, fn: Callable[[HotSession], Dict[str, Any]]) -> Optional[HotSession]:
+        """Apply `fn` to the live document.
+
+        `fn` receives a private copy and returns `{column: new_value}`; if it raises
+        nothing is changed. Only the difference is recorded, as a delta that bumps
+        `version`. Returns a copy of the updated document, or None when the session
+        is not hot (load it with `adopt` and retry).
+        """
+        if self._redis is not None:
+            return await self._mutate_redis(session_id, fn)
+
+        doc = self._docs.get(session_id)
+        if doc is None:
+            return None
+        snapshot = doc.copy()
+        updates = fn(snapshot) or {}
+        ops = self._diff(doc, updates)
+        if ops:
+            _apply_to(doc, ops)
+            doc.version += 1
+            self._record(session_id, doc.version, ops)
+            for name, value in updates.items():
+                setattr(snapshot, name, value)
+            snapshot.version = doc.version
+            self._notify(session_id, doc.version, ops)
+        self._last_access[session_id] = time.monotonic()
+        return snapshot
+
+    def _record(self, session_id: str, version: int, ops: List[dict]):
+        if self._journal is not None:
+            self.stats_counters["journal_bytes"] += self._journal.append(session_id, version, ops)
+        self._pending.setdefault(session_id, []).append((version, ops))
+        history = self._deltas.get(session_id)
+        if history is None:
+            history = self._deltas[session_id] = deque(maxlen=self.delta_history)
+        history.append((version, ops))
+        self._dirty.setdefault(session_id, set()).update(_touched(ops))
+        self.stats_counters["mutations"] += 1
+
+    async def patch(self, session_id: str, ops: List[dict], base_version: Optional[int] = None) -> Optional[HotSession]:
+        """Apply client-supplied RFC 6902 operations to the session's mutable columns.
+
+        Paths are rooted at the session, e.g. ``/state/story_text/-``. Operations
+        made against an older `base_version` are applied onto the current document
+        (a `test` op pins a value the client depends on); if any operation no
+        longer applies, JsonPatchError is raised and nothing changes.
+        """
+        if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+            raise JsonPatchError("patch must be a list of operations")
+        columns = _touched(ops)
+        for op in ops:
+            if op.get("op") == "copy":
+                _column(op.get("from") or "")
+        stale = False
+
+        def apply(s):
+            nonlocal stale
+            stale = base_version is not None and base_version != s.version
+            view = {name: getattr(s, name) for name in MUTABLE_COLUMNS}
+            view = apply_patch(view, clone(ops))
+            return {name: view.get(name) for name in columns}
+
+        session = await self.mutate(session_id, apply)
+        if session is not None and stale:
+            self.stats_counters["rebased"] += 1
+        return session
+
+    async def _mutate_redis(self, session_id: str, fn) -> Optional[HotSession]:
+        from redis.exceptions import WatchError
+
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is None:
+                        await pipe.unwatch()
+                        return None
+                    current = HotSession.from_doc(json.loads(raw))
+                    snapshot = HotSession.from_doc(json.loads(raw))
+                    updates = fn(snapshot) or {}
+                    ops = self._diff(current, updates)
+                    for name, value in updates.items():
+                        setattr(snapshot, name, value)
+                    if ops:
+                        snapshot.version = current.version + 1
+                    pipe.multi()
+                    pipe.set(key, json.dumps(snapshot.to_doc(), default=str), ex=int(self.idle_seconds))
+                    if ops:
+                        deltas_key = self._deltas_key(session_id)
+                        pipe.rpush(deltas_key, json.dumps([snapshot.version, ops], default=str))
+                        pipe.ltrim(deltas_key, -self.delta_history, -1)
+                        pipe.expire(deltas_key, int(self.idle_seconds))
+                        pipe.sadd("game:dirty", session_id)
+                    pipe.set(self._version_key(session_id), snapshot.version, ex=int(self.idle_seconds))
+                    await pipe.execute()
+                    if ops:
+                        self.stats_counters["mutations"] += 1
+                        self._notify(session_id, snapshot.version, ops)
+                    return snapshot
+                except WatchError:
+                    continue
+
+    async def flush(self, session_id: str = None):
+        """Write dirty sessions (or just `session_id`) to Postgres."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            start = time.perf_counter()
+            if self._redis is not None:
+                batch = await self._take_dirty_redis(session_id)
+            else:
+                batch = self._take_dirty(session_id)
+            if not batch:
+                return
+            seq = None
+            if self._journal is not None and session_id is None and not self._recovery_pending:
+                seq = self._journal.rotate()
+            try:
+                await self._write(batch)
+            except Exception:
+                self.stats_counters["flush_failures"] += 1
+                self._restore_dirty(batch)
+                raise
+            if seq is not None:
+                self._journal.discard_through(seq)
+            self.stats_counters["flushes"] += 1
+            self.stats_counters["rows_written"] += len(batch)
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    async def _write(self, batch: Dict[str, Dict[str, Any]]):
+        """Compare-and-swap write; conflicting sessions are rebased and retried."""
+        for _ in range(self.cas_retries + 1):
+            self.stats_counters["delta_bytes"] += sum(
+                len(json.dumps(item["fields"], default=str)) for item in batch.values()
+            )
+            conflicts = await self._writer.write(batch) or set()
+            if self._redis is not None:
+                # A conflict here means Postgres already holds a newer version.
+                return
+            for sid, item in batch.items():
+                if sid not in conflicts:
+                    self._confirm(sid, item["version"])
+            if not conflicts:
+                return
+            self.stats_counters["conflicts"] += len(conflicts)
+            rows = await self._writer.load(conflicts)
+            batch = {}
+            for sid in conflicts:
+                item = self._rebase(sid, rows.get(sid))
+                if item is not None:
+                    batch[sid] = item
+            if not batch:
+                return
+        raise RuntimeError(f"sessions still conflicting after {self.cas_retries} retries: {sorted(batch)}")
+
+    def _confirm(self, session_id: str, version: int):
+        self._flushed[session_id] = version
+        pending = self._pending.get(session_id)
+        if pending:
+            pending[:] = [delta for delta in pending if delta[0] > version]
+            if not pending:
+                del self._pending[session_id]
+
+    def _rebase(self, session_id: str, row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Re-apply unconfirmed deltas onto the row another writer committed."""
+        doc = self._docs.get(session_id)
+        if doc is None:
+            return None
+        if row is None:
+            # Deleted underneath us; nothing left to write to.
+            self._pending.pop(session_id, None)
+            self._dirty.pop(session_id, None)
+            self.evict(session_id)
+            return None
+        base = row.get("version") or 0
+        rebased = HotSession(**{name: clone(row.get(name)) for name in MUTABLE_COLUMNS}, version=base)
+        pending = self._pending.get(session_id, [])
+        columns, applied = set(), 0
+        for _, ops in pending:
+            try:
+                _apply_to(rebased, ops)
+            except JsonPatchError:
+                self.stats_counters["lost_updates"] += 1
+                continue
+            columns |= _touched(ops)
+            applied += 1
+        for name in MUTABLE_COLUMNS:
+            setattr(doc, name, getattr(rebased, name))
+        # Deltas clients hold no longer line up with the merged document.
+        self._deltas.pop(session_id, None)
+        self._flushed[session_id] = base
+        self.stats_counters["rebased"] += 1
+        if not applied:
+            doc.version = base
+            self._pending.pop(session_id, None)
+            self._notify(session_id, doc.version, None)
+            return None
+        doc.version = max(doc.version, base + applied)
+        self._notify(session_id, doc.version, None)
+        return {
+            "fields": {name: clone(getattr(doc, name)) for name in columns},
+            "version": doc.version, "base": base,
+        }
+
+    def _take_dirty(self, session_id: str = None) -> Dict[str, Dict[str, Any]]:
+        sids = [session_id] if session_id else list(self._dirty)
+        batch = {}
+        for sid in sids:
+            fields = self._dirty.pop(sid, None)
+            doc = self._docs.get(sid)
+            if fields and doc is not None:
+                # Live values are patched in place, so snapshot them for the write.
+                batch[sid] = {
+                    "fields": {name: clone(getattr(doc, name)) for name in fields},
+                    "version": doc.version,
+                    "base": self._flushed.get(sid, 0),
+                }
+        return batch
+
+    async def _take_dirty_redis(self, session_id: str = None) -> Dict[str, Dict[str, Any]]:
+        if session_id:
+            sids = [session_id] if await self._redis.srem("game:dirty", session_id) else []
+        else:
+            sids = [s.decode() if isinstance(s, bytes) else s for s in (await self._redis.spop("game:dirty", 1000) or [])]
+        batch = {}
+        for sid in sids:
+            raw = await self._redis.get(self._key(sid))
+            if raw is not None:
+                doc = json.loads(raw)
+                batch[sid] = {
+                    "fields": {name: doc.get(name) for name in MUTABLE_COLUMNS},
+                    "version": doc.get("version") or 0,
+                    "base": None,
+                }
+        return batch
+
+    def _restore_dirty(self, batch: Dict[str, Dict[str, Any]]):
+        if self._redis is not None:
+            asyncio.ensure_future(self._redis.sadd("game:dirty", *batch.keys()))
+            return
+        for sid, item in batch.items():
+            self._dirty.setdefault(sid, set()).update(item["fields"])
+
+    def _evict_idle(self):
+        if self._redis is not None:
+            return  # Redis expires idle documents itself.
+        cutoff = time.monotonic() - self.idle_seconds
+        for sid, last in list(self._last_access.items()):
+            if last < cutoff and sid not in self._dirty and sid not in self._pending:
+                self.evict(sid)
+
+    def evict(self, session_id: str):
+        doc = self._docs.pop(session_id, None)
+        self._last_access.pop(session_id, None)
+        self._deltas.pop(session_id, None)
+        self._flushed.pop(session_id, None)
+        if doc is not None and doc.room_code:
+            self._rooms.pop(doc.room_code, None)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "hot_sessions": len(self._docs),
+            "dirty_sessions": len(self._dirty),
+            "last_flush_ms": round(self.last_flush_ms, 2) if self.last_flush_ms is not None else None,
+            **self.stats_counters,
+        }
+
+
+# Application-wide instance
+game_store = GameSessionStore()
@@ -0,0 +1,154 @@
+"""Minimal RFC 6902 JSON Patch: apply operations and diff two documents.
+
+Used for game-session state deltas. `make_patch` is tuned for how game state
+evolves: appends to lists (story text, history) become `add .../-` operations
+instead of rewriting the whole list.
+"""
+import copy
+from typing import Any, List
+
+_MISSING = object()
+
+
+class JsonPatchError(ValueError):
+    """Raised when an operation cannot be applied (bad path, failed `test`, ...)."""
+
+
+def escape(token: str) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def split_pointer(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"invalid JSON pointer {pointer!r}")
+    return [_unescape(t) for t in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise JsonPatchError(f"invalid list index {token!r}")
+    idx = int(token)
+    if idx > len(container) or (idx == len(container) and not allow_end):
+        raise JsonPatchError(f"list index {idx} out of range")
+    return idx
+
+
+def _resolve(doc: Any, tokens: List[str]) -> Any:
+    node = doc
+    for token in tokens:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"path segment {token!r} not found")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_index(node, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"cannot descend into {type(node).__name__}")
+    return node
+
+
+def _get(doc: Any, pointer: str) -> Any:
+    return _resolve(doc, split_pointer(pointer))
+
+
+def _add(doc: Any, pointer: str, value: Any) -> Any:
+    tokens = split_pointer(pointer)
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    last = tokens[-1]
+    if isinstance(parent, dict):
+        parent[last] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, last, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"cannot add to {type(parent).__name__}")
+    return doc
+
+
+def _remove(doc: Any, pointer: str) -> Any:
+    tokens = split_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("cannot remove the document root")
+    parent = _resolve(doc, tokens[:-1])
+    last = tokens[-1]
+    if isinstance(parent, dict):
+        if last not in parent:
+            raise JsonPatchError(f"path {pointer!r} not found")
+        return parent.pop(last)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, last, allow_end=False))
+    raise JsonPatchError(f"cannot remove from {type(parent).__name__}")
+
+
+def apply_patch(doc: Any, ops: List[dict]) -> Any:
+    """Apply `ops` to `doc` in place and return the (possibly new root) document.
+
+    Apply to a copy when the patch must be all-or-nothing; a failing operation
+    raises JsonPatchError and leaves earlier operations applied.
+    """
+    for op in ops:
+        kind = op.get("op")
+        path = op.get("path")
+        if path is None:
+            raise JsonPatchError(f"operation without path: {op!r}")
+        if kind == "add":
+            doc = _add(doc, path, op.get("value"))
+        elif kind == "remove":
+            _remove(doc, path)
+        elif kind == "replace":
+            _get(doc, path)  # must exist
+            if split_pointer(path):
+                _remove(doc, path)
+            doc = _add(doc, path, op.get("value"))
+        elif kind == "move":
+            value = _remove(doc, op["from"])
+            doc = _add(doc, path, value)
+        elif kind == "copy":
+            doc = _add(doc, path, copy.deepcopy(_get(doc, op["from"])))
+        elif kind == "test":
+            if _get(doc, path) != op.get("value"):
+                raise JsonPatchError(f"test failed at {path!r}")
+        else:
+            raise JsonPatchError(f"unsupported operation {kind!r}")
+    return doc
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[dict]:
+    """Operations that turn `old` into `new`."""
+    if old is new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{escape(key)}"
+            previous = old.get(key, _MISSING)
+            if previous is _MISSING:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(previous, value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        n = len(old)
+        if len(new) >= n and new[:n] == old:
+            return [{"op": "add", "path": f"{path}/-", "value": v} for v in new[n:]]
+        if len(new) == n:
+            ops = []
+            for i, (a, b) in enumerate(zip(old, new)):
+                ops.extend(make_patch(a, b, f"{path}/{i}"))
+            return ops
+        return [{"op": "replace", "path": path, "value": new}]
+    if type(old) is type(new) and old == new:
+        return []
+    return [{"op": "replace", "path": path, "value": new}]
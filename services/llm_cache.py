@@ -0,0 +1,252 @@
+"""Response cache for deterministic / repeated LLM prompts.
+
+Sits in front of `safe_chat_completion` and `AIService.chat`. Entries are keyed on
+a normalized hash of (model, messages, temperature, max_tokens) and stored in an
+in-process LRU, plus an optional Redis tier shared by all workers
+(LLM_CACHE_REDIS=1). Concurrent identical requests share one upstream call
+(single-flight), and hits / estimated cost saved are tracked per call site.
+
+Callers opt in by passing a call-site name:
+
+    await safe_chat_completion(system, prompt, cache_site="recommend_game")
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from core.logging import logger
+from utils.settings import REDIS_URL
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "no")
+LLM_CACHE_REDIS = os.getenv("LLM_CACHE_REDIS", "0") not in ("0", "false", "no")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", "600"))
+# Rough blended price used to estimate the cost a hit saved.
+LLM_COST_PER_1K_TOKENS = float(os.getenv("LLM_COST_PER_1K_TOKENS", "0.0006"))
+
+# Per-call-site TTLs (seconds). Override with LLM_CACHE_TTLS="site=seconds,...".
+CALL_SITE_TTLS: Dict[str, int] = {
+    "daily_relationship_card": 6 * 3600,
+    "recommend_game": 3600,
+    "game_opening": 900,
+    "match_insight": 24 * 3600,
+}
+for _part in os.getenv("LLM_CACHE_TTLS", "").split(","):
+    if "=" in _part:
+        _site, _, _ttl = _part.partition("=")
+        try:
+            CALL_SITE_TTLS[_site.strip()] = int(_ttl)
+        except ValueError:
+            pass
+
+_WS = re.compile(r"\s+")
+
+
+def _normalize_messages(messages) -> list:
+    out = []
+    for m in messages or []:
+        content = m.get("content", "")
+        if isinstance(content, str):
+            content = _WS.sub(" ", content).strip()
+        out.append({"role": m.get("role", "user"), "content": content})
+    return out
+
+
+def make_key(model: str, messages, temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    """Stable hash of a completion request. Whitespace differences do not change the key."""
+    payload = {
+        "model": model or "",
+        "messages": _normalize_messages(messages),
+        "temperature": round(float(temperature), 3) if temperature is not None else None,
+        "max_tokens": max_tokens,
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return "llmcache:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+class _SiteStats:
+    __slots__ = ("hits", "misses", "coalesced", "tokens_saved")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.tokens_saved = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "cost_saved_usd": round(self.tokens_saved / 1000 * LLM_COST_PER_1K_TOKENS, 4),
+        }
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, use_redis: bool = LLM_CACHE_REDIS):
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, _SiteStats] = {}
+        self._use_redis = use_redis
+        self._redis = None
+
+    # -- tiers -------------------------------------------------------------
+    def _redis_client(self):
+        if not self._use_redis:
+            return None
+        if self._redis is None:
+            try:
+                from utils.redis_pool import async_redis_client
+                self._redis = async_redis_client(REDIS_URL)
+            except Exception as e:
+                logger.warning(f"LLM cache: Redis tier disabled ({e})")
+                self._use_redis = False
+                return None
+        return self._redis
+
+    def _lru_get(self, key: str) -> Optional[str]:
+        item = self._lru.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.time():
+            self._lru.pop(key, None)
+            return None
+        self._lru.move_to_end(key)
+        return value
+
+    def _lru_set(self, key: str, value: str, ttl: int):
+        self._lru[key] = (time.time() + ttl, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._lru_get(key)
+        if value is not None:
+            return value
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(key)
+            if raw is None:
+                return None
+            ttl = await client.ttl(key)
+            value = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+            self._lru_set(key, value, ttl if ttl and ttl > 0 else LLM_CACHE_DEFAULT_TTL)
+            return value
+        except Exception as e:
+            logger.debug(f"LLM cache: Redis get failed: {e}")
+            return None
+
+    async def set(self, key: str, value: str, ttl: int):
+        self._lru_set(key, value, ttl)
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            await client.set(key, value, ex=ttl)
+        except Exception as e:
+            logger.debug(f"LLM cache: Redis set failed: {e}")
+
+    def clear(self):
+        self._lru.clear()
+
+    # -- main entry point --------------------------------------------------
+    def _site(self, site: str) -> _SiteStats:
+        stats = self._stats.get(site)
+        if stats is None:
+            stats = self._stats[site] = _SiteStats()
+        return stats
+
+    async def get_or_compute(
+        self,
+        key: str,
+        site: str,
+        compute: Callable[[], Awaitable[Tuple[str, bool]]],
+        ttl: Optional[int] = None,
+    ) -> str:
+        """Return the cached value for `key` or run `compute` once for all concurrent callers.
+
+        If the caller running `compute` is cancelled, one of the waiting callers
+        runs it instead; the others keep waiting.
+
+        `compute` returns `(value, cacheable)`; fallback/error texts should come back
+        with `cacheable=False` so they are returned but never stored.
+        """
+        stats = self._site(site)
+        if not LLM_CACHE_ENABLED:
+            value, _ = await compute()
+            return value
+
+        cached = self._lru_get(key)
+        if cached is not None:
+            stats.hits += 1
+            stats.tokens_saved += _estimate_tokens(cached)
+            return cached
+
+        # Checked before any await so concurrent callers can't both become leaders.
+        inflight = self._inflight.get(key)
+        while inflight is not None:
+            try:
+                value = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # this caller was cancelled, not the leader
+                # The leader's request went away: the first follower to wake up takes over.
+                inflight = self._inflight.get(key)
+                continue
+            stats.coalesced += 1
+            stats.hits += 1
+            stats.tokens_saved += _estimate_tokens(value)
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self.get(key)  # shared Redis tier
+            if value is not None:
+                stats.hits += 1
+                stats.tokens_saved += _estimate_tokens(value)
+            else:
+                stats.misses += 1
+                value, cacheable = await compute()
+                if cacheable and value:
+                    await self.set(key, value, ttl or CALL_SITE_TTLS.get(site, LLM_CACHE_DEFAULT_TTL))
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody was waiting on it.
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._lru),
+            "redis": bool(self._use_redis),
+            "sites": {site: s.as_dict() for site, s in self._stats.items()},
+        }
+
+
+# Application-wide instance
+llm_cache = LLMResponseCache()
@@ -0,0 +1,85 @@
+"""Token streaming plumbing shared by the LLM helpers and core/streaming.py.
+
+A request that asked for a streamed response gets a `TokenSink` bound to its
+context. The first LLM call made while serving that request claims the sink,
+asks the provider for an SSE stream and pushes each token into it as it
+arrives; later calls in the same request (e.g. the shadow observer) run
+normally. The middleware drains the sink to the client and records
+time-to-first-token per endpoint group.
+"""
+import asyncio
+import json
+import time
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from services.model_health import ModelHealthTracker
+
+_current_sink: ContextVar[Optional["TokenSink"]] = ContextVar("llm_token_sink", default=None)
+
+# Time-to-first-token per endpoint group (lumi_chat, ai_mode_start, game_action).
+ttft_stats = ModelHealthTracker(window=200, min_samples=1)
+
+
+class TokenSink:
+    def __init__(self):
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self.claimed = False
+        self.tokens = 0
+        self.started_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def push(self, text: str):
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+        self.queue.put_nowait(text)
+
+    def close(self):
+        self.queue.put_nowait(None)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+
+def bind_sink(sink: TokenSink):
+    """Attach `sink` to the current context (call inside the task serving the request)."""
+    return _current_sink.set(sink)
+
+
+def claim_sink() -> Optional[TokenSink]:
+    """Return the request's sink if no other LLM call has claimed it yet."""
+    sink = _current_sink.get()
+    if sink is None or sink.claimed:
+        return None
+    sink.claimed = True
+    return sink
+
+
+async def iter_sse_deltas(response: httpx.Response) -> AsyncIterator[str]:
+    """Yield content deltas from an OpenAI-compatible `stream: true` response."""
+    async for line in response.aiter_lines():
+        line = line.strip()
+        # Blank keep-alives and ": PROCESSING" comments carry no data.
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        if chunk.get("error"):
+            raise RuntimeError(f"provider stream error: {chunk['error']}")
+        choices = chunk.get("choices") or [{}]
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
@@ -0,0 +1,139 @@
+"""Application-scoped HTTP transport for LLM providers.
+
+One pooled `httpx.AsyncClient` per upstream host (OpenRouter, NVIDIA, ...) with
+keep-alive and HTTP/2, so game turns, Lumi messages and insights reuse warm
+TCP/TLS connections instead of handshaking on every call.
+
+The transport is opened in the FastAPI lifespan (`await llm_transport.start()`)
+and closed on shutdown. Callers outside the app (scripts, Celery) can use it
+directly; it starts itself on first use.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from core.logging import logger
+from utils.settings import (
+    LLM_HTTP2,
+    LLM_TIMEOUT_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY_SECONDS,
+    LLM_HOST_LIMITS,
+)
+
+
+def _parse_host_limits(raw: str) -> Dict[str, int]:
+    limits = {}
+    for part in (raw or "").split(","):
+        if "=" not in part:
+            continue
+        host, _, value = part.partition("=")
+        try:
+            limits[host.strip().lower()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM_HOST_LIMITS entry: {part!r}")
+    return limits
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LLMTransport:
+    def __init__(
+        self,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY_SECONDS,
+        host_limits: Optional[Dict[str, int]] = None,
+        http2: bool = LLM_HTTP2,
+    ):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.host_limits = host_limits if host_limits is not None else _parse_host_limits(LLM_HOST_LIMITS)
+        self.http2 = http2 and _http2_available()
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    async def start(self):
+        """Bind the transport to the running event loop."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            logger.info(f"LLM transport started (http2={self.http2}, max_connections={self.max_connections})")
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Failed to close LLM client: {e}")
+        self._loop = None
+
+    def _limits_for(self, host: str) -> httpx.Limits:
+        max_conn = self.host_limits.get(host, self.max_connections)
+        return httpx.Limits(
+            max_connections=max_conn,
+            max_keepalive_connections=min(self.max_keepalive, max_conn),
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """Pooled client for the host of `url` (one pool per host)."""
+        host = (urlsplit(url).hostname or "").lower()
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self._limits_for(host),
+                http2=self.http2,
+            )
+            self._clients[host] = client
+        return client
+
+    def _is_foreign_loop(self) -> bool:
+        return self._loop is not None and asyncio.get_running_loop() is not self._loop
+
+    async def post(self, url: str, *, json: dict = None, headers: dict = None, timeout: float = None) -> httpx.Response:
+        if not self.started:
+            await self.start()
+        if self._is_foreign_loop():
+            # Pooled connections belong to the app loop; a caller running its own
+            # loop (asyncio.run in a worker thread) gets a short-lived client.
+            async with httpx.AsyncClient(timeout=timeout or self.timeout) as client:
+                return await client.post(url, json=json, headers=headers)
+        client = self.client_for(url)
+        return await client.post(url, json=json, headers=headers, timeout=timeout or self.timeout)
+
+    @asynccontextmanager
+    async def stream(self, url: str, *, json: dict = None, headers: dict = None, timeout: float = None) -> AsyncIterator[httpx.Response]:
+        """POST and yield the response without reading the body (for SSE token streams)."""
+        if not self.started:
+            await self.start()
+        if self._is_foreign_loop():
+            async with httpx.AsyncClient(timeout=timeout or self.timeout) as client:
+                async with client.stream("POST", url, json=json, headers=headers) as resp:
+                    yield resp
+            return
+        client = self.client_for(url)
+        async with client.stream("POST", url, json=json, headers=headers, timeout=timeout or self.timeout) as resp:
+            yield resp
+
+
+# Application-wide instance
+llm_transport = LLMTransport()
@@ -0,0 +1,249 @@
+"""Cached, batched AI match insights.
+
+`/recommendations` used to ask the LLM for one insight per candidate on every
+hit. `match_insights.insights_for()` instead:
+
+- keys each insight on (viewer, candidate, match type, query, viewer profile
+  version, candidate profile version), where a profile version is a short
+  hash of the fields the prompt uses (`profile_version`). Results are stored
+  in the shared LLM response cache (services/llm_cache.py: in-process LRU,
+  plus Redis with LLM_CACHE_REDIS=1) for INSIGHT_TTL seconds, so an insight
+  is reused until either profile changes or it expires;
+- generates all misses of a request with one structured-JSON completion per
+  INSIGHT_BATCH_SIZE candidates (`ElinityInsights.abatch_insights`). Anyone
+  the model leaves out falls back to the single-insight call;
+- coalesces concurrent requests for the same key into one generation.
+
+`prewarm_daily_batches()` runs the same path over the precomputed daily
+batches (services/daily_batches.py) and writes the insights into the stored
+responses, so the morning's first view needs no LLM call. The nightly Celery
+shards do this after computing their batches unless INSIGHT_PREWARM=0.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.logging import logger
+from services.llm_cache import CALL_SITE_TTLS, LLM_CACHE_ENABLED, llm_cache
+
+INSIGHT_TTL = int(os.getenv("INSIGHT_TTL", str(CALL_SITE_TTLS.get("match_insight", 24 * 3600))))
+INSIGHT_BATCH_SIZE = int(os.getenv("INSIGHT_BATCH_SIZE", "8"))
+INSIGHT_PREWARM = os.getenv("INSIGHT_PREWARM", "1") not in ("0", "false", "no")
+INSIGHT_PREWARM_CONCURRENCY = int(os.getenv("INSIGHT_PREWARM_CONCURRENCY", "4"))
+
+# Daily-batch modes -> insight match types.
+MODE_MATCH_TYPES = {"romantic": "romantic", "social": "friendship", "professional": "work"}
+
+_WS = re.compile(r"\s+")
+
+# (candidate id, display name, interests as text)
+Candidate = Tuple[str, str, str]
+
+
+def profile_version(*fields) -> str:
+    """Short content hash of the profile fields an insight depends on."""
+    raw = json.dumps(fields, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def display_name(info) -> str:
+    parts = [getattr(info, f, None) for f in ("first_name", "middle_name", "last_name")] if info else []
+    return " ".join(p for p in parts if p).strip() or "Unknown User"
+
+
+def interests_text(hobbies) -> str:
+    return ','.join(hobbies.interests or []) if hobbies else ""
+
+
+def _insights():
+    from elinity_ai.insights import ElinityInsights
+    return ElinityInsights()
+
+
+class MatchInsights:
+    def __init__(self, generator=None, cache=llm_cache, batch_size: int = INSIGHT_BATCH_SIZE, ttl: int = INSIGHT_TTL):
+        self._generator = generator
+        self.cache = cache
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats_counters = {"requests": 0, "hits": 0, "coalesced": 0, "generated": 0, "batches": 0, "fallbacks": 0}
+
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = _insights()
+        return self._generator
+
+    def key(self, viewer_id: str, viewer_version: str, candidate: Candidate, match_type: str, query: str) -> str:
+        candidate_id, name, interests = candidate
+        raw = json.dumps([
+            viewer_id, viewer_version, candidate_id, profile_version(name, interests),
+            match_type, _WS.sub(" ", query or "").strip().lower(),
+        ])
+        return "insight:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def insights_for(
+        self,
+        viewer_id: str,
+        viewer_interests: str,
+        candidates: Sequence[Candidate],
+        match_type: str = "general",
+        query: str = "",
+    ) -> Dict[str, str]:
+        """{candidate id: insight} for every candidate, from cache or batched generation."""
+        generator = self.generator
+        match_type = generator.match_type_for(query, match_type)
+        viewer_version = profile_version(viewer_interests)
+        self.stats_counters["requests"] += 1
+        result: Dict[str, str] = {}
+        waiting: List[Tuple[str, asyncio.Future]] = []
+        todo: List[Tuple[str, Candidate]] = []
+        for candidate in dict((c[0], c) for c in candidates).values():
+            key = self.key(viewer_id, viewer_version, candidate, match_type, query)
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                self.stats_counters["coalesced"] += 1
+                waiting.append((candidate[0], inflight))
+                continue
+            self._inflight[key] = asyncio.get_running_loop().create_future()
+            todo.append((key, candidate))
+
+        try:
+            misses = []
+            for key, candidate in todo:
+                cached = await self.cache.get(key) if LLM_CACHE_ENABLED else None
+                if cached is not None:
+                    self.stats_counters["hits"] += 1
+                    self._resolve(key, cached)
+                    result[candidate[0]] = cached
+                else:
+                    misses.append((key, candidate))
+            for i in range(0, len(misses), self.batch_size):
+                chunk = misses[i:i + self.batch_size]
+                generated = await self._generate(viewer_interests, [c for _, c in chunk], match_type, query)
+                for key, candidate in chunk:
+                    text, cacheable = generated[candidate[0]]
+                    if cacheable and LLM_CACHE_ENABLED:
+                        await self.cache.set(key, text, self.ttl)
+                    self._resolve(key, text)
+                    result[candidate[0]] = text
+        except BaseException as e:
+            for key, _ in todo:
+                self._fail(key, e)
+            raise
+
+        for candidate_id, future in waiting:
+            result[candidate_id] = await asyncio.shield(future)
+        return result
+
+    async def _generate(self, viewer_interests: str, candidates: List[Candidate], match_type: str, query: str) -> Dict[str, Tuple[str, bool]]:
+        """{candidate id: (insight, cacheable)}; one batched completion, singles for what it missed."""
+        refs = {str(i + 1): c for i, c in enumerate(candidates)}
+        answered: Dict[str, str] = {}
+        if len(candidates) > 1:
+            self.stats_counters["batches"] += 1
+            answered = await self.generator.abatch_insights(
+                query, viewer_interests, [(ref, name, interests) for ref, (_, name, interests) in refs.items()], match_type,
+            )
+        out: Dict[str, Tuple[str, bool]] = {}
+        singles = []
+        for ref, (candidate_id, name, interests) in refs.items():
+            if ref in answered:
+                out[candidate_id] = (answered[ref], True)
+                self.stats_counters["generated"] += 1
+            else:
+                singles.append((candidate_id, name, interests))
+        if singles:
+            self.stats_counters["fallbacks"] += len(singles)
+            # The single-insight path has its own response cache (cache_site="match_insight").
+            texts = await asyncio.gather(*(
+                self.generator.agenerate_insight(query, candidate_id, name, 0.0, interests, match_type)
+                for candidate_id, name, interests in singles
+            ))
+            for (candidate_id, _, _), text in zip(singles, texts):
+                out[candidate_id] = (text, False)
+        return out
+
+    def _resolve(self, key: str, text: str):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(text)
+
+    def _fail(self, key: str, error: BaseException):
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            if isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+                future.exception()
+
+    def stats(self) -> dict:
+        return dict(self.stats_counters)
+
+    # -- daily batches ----------------------------------------------------------------
+    async def prewarm_daily_batches(self, batch_date: date, tenant_ids: Optional[Iterable[str]] = None, page: int = 200) -> dict:
+        """Generate insights for the stored daily batches of `batch_date` and write them into the rows."""
+        from database.session import Session
+        from models.connection import DailyBatch
+        from models.user import Tenant
+        from sqlalchemy.orm import joinedload
+
+        def load_page(after: Optional[Tuple[str, str]]):
+            with Session() as db:
+                q = db.query(DailyBatch).filter(DailyBatch.batch_date == batch_date)
+                if tenant_ids is not None:
+                    q = q.filter(DailyBatch.tenant_id.in_(list(tenant_ids)))
+                if after is not None:
+                    q = q.filter((DailyBatch.tenant_id > after[0]) | ((DailyBatch.tenant_id == after[0]) & (DailyBatch.mode > after[1])))
+                rows = q.order_by(DailyBatch.tenant_id, DailyBatch.mode).limit(page).all()
+                people_ids = {row.tenant_id for row in rows} | {item["user_b"]["id"] for row in rows for item in row.items}
+                people = {
+                    t.id: (display_name(t.personal_info), interests_text(t.interests_and_hobbies))
+                    for t in db.query(Tenant).options(
+                        joinedload(Tenant.personal_info), joinedload(Tenant.interests_and_hobbies)
+                    ).filter(Tenant.id.in_(people_ids))
+                } if people_ids else {}
+                return [(row.tenant_id, row.mode, row.items) for row in rows], people
+
+        def save(updates: List[Tuple[str, str, list]]):
+            with Session() as db:
+                for tenant_id, mode, items in updates:
+                    db.query(DailyBatch).filter(
+                        DailyBatch.tenant_id == tenant_id, DailyBatch.mode == mode, DailyBatch.batch_date == batch_date,
+                    ).update({"items": items}, synchronize_session=False)
+                db.commit()
+
+        semaphore = asyncio.Semaphore(INSIGHT_PREWARM_CONCURRENCY)
+        totals = {"rows": 0, "insights": 0}
+
+        async def warm(tenant_id, mode, items, people):
+            async with semaphore:
+                viewer = people.get(tenant_id, ("", ""))
+                candidates = [
+                    (item["user_b"]["id"], *people.get(item["user_b"]["id"], (item["user_b"]["name"], "")))
+                    for item in items
+                ]
+                texts = await self.insights_for(tenant_id, viewer[1], candidates, MODE_MATCH_TYPES.get(mode, "general"))
+            return tenant_id, mode, [{**item, "ai_insight": texts.get(item["user_b"]["id"], item["ai_insight"])} for item in items]
+
+        after = None
+        while True:
+            rows, people = await asyncio.to_thread(load_page, after)
+            if not rows:
+                break
+            updates = await asyncio.gather(*(warm(t, m, items, people) for t, m, items in rows if items))
+            await asyncio.to_thread(save, list(updates))
+            totals["rows"] += len(rows)
+            totals["insights"] += sum(len(items) for _, _, items in updates)
+            after = rows[-1][:2]
+        logger.info(f"Prewarmed match insights for {batch_date}: {totals}")
+        return totals
+
+
+match_insights = MatchInsights()
@@ -0,0 +1,393 @@
+"""Vectorized candidate scoring for recommendations and daily matches.
+
+`/recommendations` and `/connections/daily/{mode}` used to score an arbitrary
+``limit(50)`` slice of tenants in a Python loop. The engine instead keeps a
+columnar snapshot of every eligible tenant and scores the whole population in
+one pass:
+
+- interests as bitsets over an interned vocabulary (``uint64`` words), so the
+  overlap with the viewer is AND + popcount over the viewer's non-zero words;
+- location as an interned id (lower-cased), compared as integers;
+- Big Five traits as a ``float32`` (n, 5) matrix.
+
+The score is the same heuristic as before (0.1 base, +0.2 per shared interest up
+to 0.5, +0.3 for the same location, capped at 0.99), so thresholds keep their
+meaning; since it only depends on (overlap, same location) it is a table
+lookup. Big Five similarity only breaks ties among candidates at the cut-off
+score. Top-k uses a partition over the full population, so results are the
+global best rather than the best of the first 50 rows.
+
+The snapshot is rebuilt from Postgres in a worker thread when it is older than
+MATCH_SNAPSHOT_TTL seconds (the stale one keeps serving meanwhile); `observe()`
+folds a tenant's current profile in immediately. See
+scripts/bench_matching.py for numbers against the old loop.
+
+When the viewer has a profile embedding, its nearest neighbours from the
+vector index (elinity_ai.milvus_db.get_similarity_pipeline) get a bonus of
+MATCH_SEMANTIC_WEIGHT * cosine similarity.
+"""
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.logging import logger
+
+MATCH_SNAPSHOT_TTL = float(os.getenv("MATCH_SNAPSHOT_TTL", "300"))
+# Semantic neighbours (profile-embedding ANN, services/vector_index.py) get up to this much extra score.
+MATCH_SEMANTIC_WEIGHT = float(os.getenv("MATCH_SEMANTIC_WEIGHT", "0.3"))
+MATCH_SEMANTIC_K = int(os.getenv("MATCH_SEMANTIC_K", "50"))
+
+BIG_FIVE = ("openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism")
+# Synthetic accounts created by games and guest flows never show up as matches.
+EXCLUDED_PREFIXES = ("host_", "player_", "guest_")
+
+# (tenant_id, interests, location, big five tuple or None)
+Profile = Tuple[str, Sequence, Optional[str], Optional[Sequence[float]]]
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:  # NumPy < 2.0
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return _POP8[words.view(np.uint8)].reshape(len(words), 8).sum(axis=1, dtype=np.uint8)
+
+
+def _heuristic(overlap: int, same_location: bool) -> float:
+    """The original per-candidate score, evaluated once per (overlap, location) cell."""
+    score = 0.1
+    if overlap > 0:
+        score += min(overlap * 0.2, 0.5)
+    if same_location:
+        score += 0.3
+    return min(score, 0.99)
+
+
+# Interest overlap saturates at 3 (3 * 0.2 > 0.5), so every score is a lookup.
+MAX_OVERLAP = 3
+SCORE_TABLE = np.array([[_heuristic(o, loc) for loc in (False, True)] for o in range(MAX_OVERLAP + 1)])
+
+
+def eligible(tenant_id: str, email: Optional[str]) -> bool:
+    return not tenant_id.startswith(EXCLUDED_PREFIXES) and not (email or "").startswith(EXCLUDED_PREFIXES)
+
+
+def _interest_key(item) -> str:
+    return item if isinstance(item, str) else json.dumps(item, sort_keys=True, default=str)
+
+
+def profile_of(tenant) -> Profile:
+    """Matching features of an ORM `Tenant` (relationships loaded on access)."""
+    hobbies = tenant.interests_and_hobbies
+    info = tenant.personal_info
+    big_five = None
+    try:
+        traits = tenant.big_five_traits
+        if traits is not None:
+            big_five = tuple(float(getattr(traits, name) or 0.0) for name in BIG_FIVE)
+    except Exception:
+        big_five = None  # Only a tiebreak; never fail a query over it.
+    return tenant.id, (hobbies.interests or []) if hobbies else [], info.location if info else None, big_five
+
+
+class CandidateMatrix:
+    """Columnar, incrementally updatable feature snapshot of the candidate population.
+
+    Interest bitsets are stored word-major, (words, capacity), so each of the
+    viewer's non-zero words is one contiguous pass over the population.
+    """
+
+    def __init__(self, capacity: int = 1024, words: int = 1):
+        self.vocab: Dict[str, int] = {}
+        self.locations: Dict[str, int] = {}
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.n = 0
+        self.bits = np.zeros((words, capacity), dtype=np.uint64)
+        self.loc = np.full(capacity, -1, dtype=np.int32)
+        self.big5 = np.zeros((capacity, len(BIG_FIVE)), dtype=np.float32)
+        self.has_big5 = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _grow(self, rows: int, words: int):
+        have_words, capacity = self.bits.shape
+        if rows > capacity:
+            extra = max(rows, capacity * 2) - capacity
+            self.bits = np.hstack([self.bits, np.zeros((have_words, extra), dtype=np.uint64)])
+            self.loc = np.concatenate([self.loc, np.full(extra, -1, dtype=np.int32)])
+            self.big5 = np.vstack([self.big5, np.zeros((extra, len(BIG_FIVE)), dtype=np.float32)])
+            self.has_big5 = np.concatenate([self.has_big5, np.zeros(extra, dtype=bool)])
+            self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        if words > have_words:
+            words = max(words, have_words * 2)
+            self.bits = np.vstack([self.bits, np.zeros((words - have_words, self.bits.shape[1]), dtype=np.uint64)])
+
+    def _encode(self, interests: Iterable, intern: bool) -> np.ndarray:
+        ids = set()
+        for item in interests or ():
+            key = _interest_key(item)
+            index = self.vocab.get(key)
+            if index is None:
+                if not intern:
+                    continue  # Nobody has it, so it can't overlap.
+                index = self.vocab[key] = len(self.vocab)
+            ids.add(index)
+        if intern:
+            self._grow(self.n, len(self.vocab) // 64 + 1)
+        vector = np.zeros(self.bits.shape[0], dtype=np.uint64)
+        for index in ids:
+            vector[index // 64] |= np.uint64(1) << np.uint64(index % 64)
+        return vector
+
+    def _location(self, location: Optional[str], intern: bool) -> int:
+        key = (location or "").strip().lower()
+        if not key:
+            return -1
+        if intern:
+            return self.locations.setdefault(key, len(self.locations))
+        return self.locations.get(key, -2)  # -2: known location nobody else has
+
+    def upsert(self, tenant_id: str, interests: Sequence, location: Optional[str], big_five: Optional[Sequence[float]]):
+        row = self.rows.get(tenant_id)
+        if row is None:
+            row = self.n
+            self._grow(row + 1, 1)
+            self.n += 1
+            self.rows[tenant_id] = row
+            self.ids.append(tenant_id)
+        self.bits[:, row] = self._encode(interests, intern=True)
+        self.loc[row] = self._location(location, intern=True)
+        self.has_big5[row] = big_five is not None
+        self.big5[row] = big_five if big_five is not None else 0.0
+        self.alive[row] = True
+
+    def remove(self, tenant_id: str):
+        row = self.rows.pop(tenant_id, None)
+        if row is not None:
+            self.alive[row] = False
+            self.ids[row] = None
+
+    def scores(self, interests: Sequence, location: Optional[str]) -> np.ndarray:
+        """Heuristic score of every row (dead rows included) against the given profile."""
+        n = self.n
+        mine = self._encode(interests, intern=False)
+        overlap = np.zeros(n, dtype=np.uint8)
+        for word in np.flatnonzero(mine):
+            overlap += _popcount(self.bits[word, :n] & mine[word])
+            np.minimum(overlap, MAX_OVERLAP, out=overlap)
+        my_loc = self._location(location, intern=False)
+        same = self.loc[:n] == my_loc if my_loc >= 0 else np.zeros(n, dtype=bool)
+        return SCORE_TABLE[overlap, same.view(np.uint8)]
+
+    def top_k(
+        self,
+        profile: Profile,
+        k: int,
+        exclude: Iterable[str] = (),
+        min_score: Optional[float] = None,
+        semantic: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Best `k` (tenant_id, score) pairs, highest first, over the whole population.
+
+        `semantic` maps tenant ids to embedding cosine similarity; those rows get
+        MATCH_SEMANTIC_WEIGHT * similarity on top of the heuristic score.
+        """
+        _, interests, location, big_five = profile
+        n = self.n
+        if k <= 0 or n == 0:
+            return []
+        score = self.scores(interests, location)
+        if semantic:
+            pairs = [(self.rows[t], max(0.0, sim)) for t, sim in semantic.items() if t in self.rows]
+            if pairs:
+                rows, sims = map(np.asarray, zip(*pairs))
+                score[rows] = np.minimum(score[rows] + MATCH_SEMANTIC_WEIGHT * sims, 0.99)
+        rank = score.copy()
+        rank[~self.alive[:n]] = -np.inf
+        for tenant_id in exclude:
+            row = self.rows.get(tenant_id)
+            if row is not None:
+                rank[row] = -np.inf
+        if min_score is not None:
+            rank[score < min_score] = -np.inf
+        k = min(k, n)
+        # Everyone scoring at least the k-th best score: the winners plus anyone tied with them.
+        cut = -np.partition(-rank, k - 1)[k - 1]
+        band = np.flatnonzero(rank >= cut) if np.isfinite(cut) else np.flatnonzero(np.isfinite(rank))
+        order = rank[band]
+        if big_five is not None and len(band) > k:
+            # Big Five similarity only breaks ties (scores move in steps of 0.1).
+            distance = np.abs(self.big5[band] - np.asarray(big_five, dtype=np.float32)).mean(axis=1)
+            order = order + np.where(self.has_big5[band], 1e-3 * np.clip(1.0 - distance, 0.0, 1.0), 0.0)
+        top = band[np.argsort(-order, kind="stable")[:k]]
+        return [(self.ids[row], float(score[row])) for row in top]
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.bits, self.loc, self.big5, self.has_big5, self.alive))
+
+
+def _load_profiles() -> Iterable[Tuple[str, Optional[str], Sequence, Optional[str], Optional[Sequence[float]]]]:
+    from sqlalchemy import select
+    from database.session import Session
+    from models.user import BigFiveTraits, InterestsAndHobbies, PersonalInfo, Tenant
+
+    stmt = (
+        select(
+            Tenant.id, Tenant.email, InterestsAndHobbies.interests, PersonalInfo.location,
+            *(getattr(BigFiveTraits, name) for name in BIG_FIVE), BigFiveTraits.id,
+        )
+        .outerjoin(InterestsAndHobbies, InterestsAndHobbies.tenant == Tenant.id)
+        .outerjoin(PersonalInfo, PersonalInfo.tenant == Tenant.id)
+        .outerjoin(BigFiveTraits, BigFiveTraits.tenant == Tenant.id)
+        .execution_options(yield_per=10000)
+    )
+    with Session() as db:
+        for row in db.execute(stmt):
+            tenant_id, email, interests, location = row[:4]
+            big_five = None
+            if row[-1] is not None:
+                try:
+                    big_five = tuple(float(v or 0.0) for v in row[4:-1])
+                except (TypeError, ValueError):
+                    pass
+            yield tenant_id, email, interests or [], location, big_five
+
+
+def build_snapshot(loader=_load_profiles, viewers: Optional[Dict[str, Optional[Profile]]] = None) -> CandidateMatrix:
+    """Candidate matrix of every eligible tenant the loader yields.
+
+    When given, `viewers` (keyed by tenant id) is filled in with those tenants'
+    profiles on the same pass, e.g. for a batch job scoring many viewers.
+    """
+    matrix = CandidateMatrix()
+    for tenant_id, email, interests, location, big_five in loader():
+        if viewers is not None and tenant_id in viewers:
+            viewers[tenant_id] = (tenant_id, interests, location, big_five)
+        if eligible(tenant_id, email):
+            matrix.upsert(tenant_id, interests, location, big_five)
+    return matrix
+
+
+class MatchingEngine:
+    def __init__(self, loader=_load_profiles, ttl: float = MATCH_SNAPSHOT_TTL):
+        self._loader = loader
+        self.ttl = ttl
+        self.matrix: Optional[CandidateMatrix] = None
+        self.built_at = 0.0
+        self.last_build_ms: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh: Optional[asyncio.Task] = None
+        # Profiles observed while a rebuild runs, re-applied to the new snapshot.
+        self._observed: Dict[str, Profile] = {}
+        self.queries = 0
+        self.last_query_ms: Optional[float] = None
+
+    def _build(self) -> CandidateMatrix:
+        return build_snapshot(self._loader)
+
+    async def rebuild(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._observed = {}
+            started = time.perf_counter()
+            matrix = await asyncio.to_thread(self._build)
+            for profile in self._observed.values():
+                matrix.upsert(*profile)
+            self.matrix = matrix
+            self.built_at = time.time()
+            self.last_build_ms = round((time.perf_counter() - started) * 1000, 2)
+            logger.info(f"Matching snapshot rebuilt: {len(matrix)} tenants in {self.last_build_ms}ms")
+
+    async def _rebuild_quietly(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"Matching snapshot rebuild failed: {e}")
+
+    async def ready(self) -> CandidateMatrix:
+        """Current snapshot; builds it on first use, refreshes it in the background when stale."""
+        if self.matrix is None:
+            await self.rebuild()
+        elif time.time() - self.built_at > self.ttl and (self._refresh is None or self._refresh.done()):
+            self._refresh = asyncio.ensure_future(self._rebuild_quietly())
+        return self.matrix
+
+    def observe(self, tenant, email: Optional[str] = None):
+        """Fold a tenant's current profile into the snapshot (e.g. the viewer, after edits)."""
+        if not eligible(tenant.id, email if email is not None else getattr(tenant, "email", None)):
+            return
+        profile = profile_of(tenant)
+        self._observed[tenant.id] = profile
+        if self.matrix is not None:
+            self.matrix.upsert(*profile)
+
+    def forget(self, tenant_id: str):
+        self._observed.pop(tenant_id, None)
+        if self.matrix is not None:
+            self.matrix.remove(tenant_id)
+
+    def semantic_neighbours(self, tenant, k: int = MATCH_SEMANTIC_K) -> Dict[str, float]:
+        """Tenant id -> cosine similarity of the tenant's nearest profile embeddings ({} if none).
+
+        Blocking (ANN search or Milvus round trip): `top_k` runs it in a worker thread.
+        """
+        if getattr(tenant, "embedding_id", None) is None or MATCH_SEMANTIC_WEIGHT <= 0:
+            return {}
+        try:
+            from elinity_ai.milvus_db import get_similarity_pipeline
+            hits = get_similarity_pipeline().find_similar_users_by_id(tenant.embedding_id, top_k=k)
+        except Exception as e:
+            logger.debug(f"No semantic neighbours for {tenant.id}: {e}")
+            return {}
+        return {
+            hit["metadata"]["tenant_id"]: float(hit["score"])
+            for hit in hits if (hit.get("metadata") or {}).get("tenant_id")
+        }
+
+    async def top_k(
+        self,
+        tenant,
+        k: int,
+        exclude: Iterable[str] = (),
+        min_score: Optional[float] = None,
+        semantic: bool = True,
+    ) -> List[Tuple[str, float]]:
+        """Global top-k candidates for `tenant` (an ORM Tenant); never includes the tenant itself."""
+        matrix = await self.ready()
+        started = time.perf_counter()
+        neighbours = None
+        if semantic:
+            neighbours = {}
+            if getattr(tenant, "embedding_id", None) is not None:
+                # Plain values: the ORM tenant must not be touched from the worker thread.
+                viewer = SimpleNamespace(id=tenant.id, embedding_id=tenant.embedding_id)
+                neighbours = await asyncio.to_thread(self.semantic_neighbours, viewer)
+        result = matrix.top_k(profile_of(tenant), k, exclude={tenant.id, *exclude}, min_score=min_score, semantic=neighbours)
+        self.queries += 1
+        self.last_query_ms = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def stats(self) -> dict:
+        matrix = self.matrix
+        return {
+            "tenants": len(matrix) if matrix else 0,
+            "interests": len(matrix.vocab) if matrix else 0,
+            "locations": len(matrix.locations) if matrix else 0,
+            "snapshot_bytes": matrix.nbytes() if matrix else 0,
+            "snapshot_age_s": round(time.time() - self.built_at, 1) if matrix else None,
+            "last_build_ms": self.last_build_ms,
+            "queries": self.queries,
+            "last_query_ms": self.last_query_ms,
+        }
+
+
+matching_engine = MatchingEngine()
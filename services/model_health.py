@@ -0,0 +1,94 @@
+"""Rolling per-model latency/error stats used to order and hedge LLM candidates."""
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class ModelHealth:
+    """Keeps the last `window` outcomes (latency in seconds, ok flag) for one model."""
+
+    def __init__(self, window: int = 50):
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+        self.last_error_at: Optional[float] = None
+
+    def record_success(self, latency: float):
+        self.samples.append((latency, True))
+
+    def record_error(self, latency: float):
+        self.samples.append((latency, False))
+        self.last_error_at = time.time()
+
+    @property
+    def count(self) -> int:
+        return len(self.samples)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def latency_pct(self, pct: float) -> Optional[float]:
+        ok = sorted(lat for lat, good in self.samples if good)
+        if not ok:
+            return None
+        idx = min(len(ok) - 1, int(round(pct / 100 * (len(ok) - 1))))
+        return ok[idx]
+
+    def snapshot(self) -> dict:
+        return {
+            "samples": self.count,
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": _ms(self.latency_pct(50)),
+            "p90_ms": _ms(self.latency_pct(90)),
+        }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+class ModelHealthTracker:
+    def __init__(self, window: int = 50, min_samples: int = 5):
+        self.window = window
+        self.min_samples = min_samples
+        self.models: Dict[str, ModelHealth] = {}
+
+    def get(self, model: str) -> ModelHealth:
+        health = self.models.get(model)
+        if health is None:
+            health = self.models[model] = ModelHealth(self.window)
+        return health
+
+    def record_success(self, model: str, latency: float):
+        self.get(model).record_success(latency)
+
+    def record_error(self, model: str, latency: float):
+        self.get(model).record_error(latency)
+
+    def order(self, candidates: List[str]) -> List[str]:
+        """Reorder candidates by recent health.
+
+        A model is only demoted once it has `min_samples` outcomes; error rates are
+        bucketed to one decimal so small differences don't reshuffle on every call.
+        Ties keep the configured order. Latency is handled by hedging, not ordering.
+        """
+        def key(item):
+            position, model = item
+            health = self.models.get(model)
+            if health is None or health.count < self.min_samples:
+                return (0.0, position)
+            return (round(health.error_rate, 1), position)
+
+        return [m for _, m in sorted(enumerate(candidates), key=key)]
+
+    def hedge_delay(self, model: str, default: float, pct: float = 90) -> float:
+        """How long to wait for `model` before firing the next candidate."""
+        health = self.models.get(model)
+        if health is None or health.count < self.min_samples:
+            return default
+        latency = health.latency_pct(pct)
+        return latency if latency is not None else default
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {model: health.snapshot() for model, health in self.models.items()}
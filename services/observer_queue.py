@@ -0,0 +1,163 @@
+"""Background queue for the AI shadow observer.
+
+`GameManager.update_state` commits the turn and calls `observer_queue.schedule(session_id)`
+instead of awaiting the analysis. Jobs are debounced per session: turns that arrive
+within OBSERVER_DEBOUNCE_MS of each other coalesce into one analysis call (capped by
+OBSERVER_MAX_WAIT_MS so a busy session is still analysed), and a turn that lands
+while the session is being analysed schedules exactly one follow-up run. At most
+OBSERVER_CONCURRENCY analyses run at once.
+
+Finished results are merged into `session.analysis` / player scores by
+`GameManager.apply_analysis`, pushed to the game room websocket
+(`/room/ws/{session_id}`) as an `analysis` event and handed to any other
+registered listener:
+
+    observer_queue.add_listener(async_callback)   # callback(session_id, session)
+
+Set OBSERVER_ASYNC=0 to fall back to running the analysis inline.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from core.logging import logger
+
+OBSERVER_ASYNC = os.getenv("OBSERVER_ASYNC", "1") not in ("0", "false", "no")
+OBSERVER_DEBOUNCE_MS = float(os.getenv("OBSERVER_DEBOUNCE_MS", "1500"))
+OBSERVER_MAX_WAIT_MS = float(os.getenv("OBSERVER_MAX_WAIT_MS", "8000"))
+OBSERVER_CONCURRENCY = int(os.getenv("OBSERVER_CONCURRENCY", "4"))
+
+Listener = Callable[[str, object], Awaitable[None]]
+
+
+async def _run_analysis(session_id: str):
+    """Default job: analyse the session in its own DB session and return the updated row."""
+    from database.session import async_session
+    from api.routers.game_session_manager import GameManager
+
+    async with async_session() as db:
+        return await GameManager(db).run_analysis(session_id)
+
+
+async def push_analysis(session_id: str, session):
+    """Send merged analysis and player scores to everyone connected to the game room."""
+    from services.game_push import topic
+    from utils.websockets import manager
+
+    event = {
+        "type": "analysis",
+        "session_id": session_id,
+        "analysis": session.analysis or {},
+        "players": session.players or {},
+    }
+    await manager.broadcast(session_id, event)
+    await manager.broadcast(topic(session_id), event)
+
+
+class ObserverQueue:
+    def __init__(
+        self,
+        run: Callable[[str], Awaitable[object]] = _run_analysis,
+        debounce_ms: float = OBSERVER_DEBOUNCE_MS,
+        max_wait_ms: float = OBSERVER_MAX_WAIT_MS,
+        concurrency: int = OBSERVER_CONCURRENCY,
+    ):
+        self._run = run
+        self.debounce = debounce_ms / 1000
+        self.max_wait = max_wait_ms / 1000
+        self.concurrency = concurrency
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._first_seen: Dict[str, float] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._dirty: Set[str] = set()
+        self._listeners: List[Listener] = []
+        self.scheduled = 0
+        self.coalesced = 0
+        self.runs = 0
+        self.failures = 0
+        self.last_duration: Optional[float] = None
+
+    def add_listener(self, listener: Listener):
+        self._listeners.append(listener)
+
+    def schedule(self, session_id: str):
+        """Queue an analysis for `session_id`, coalescing with any pending one."""
+        loop = asyncio.get_running_loop()
+        self.scheduled += 1
+        if session_id in self._running:
+            # Picked up by one follow-up run once the current analysis finishes.
+            if session_id in self._dirty:
+                self.coalesced += 1
+            self._dirty.add(session_id)
+            return
+        now = loop.time()
+        first = self._first_seen.setdefault(session_id, now)
+        handle = self._timers.pop(session_id, None)
+        if handle is not None:
+            handle.cancel()
+            self.coalesced += 1
+        delay = min(self.debounce, max(0.0, first + self.max_wait - now))
+        self._timers[session_id] = loop.call_later(delay, self._fire, session_id)
+
+    def _fire(self, session_id: str):
+        self._timers.pop(session_id, None)
+        self._first_seen.pop(session_id, None)
+        self._running[session_id] = asyncio.ensure_future(self._execute(session_id))
+
+    async def _execute(self, session_id: str):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        try:
+            async with self._sem:
+                start = time.perf_counter()
+                session = await self._run(session_id)
+                self.runs += 1
+                self.last_duration = time.perf_counter() - start
+            if session is not None:
+                for listener in list(self._listeners):
+                    try:
+                        await listener(session_id, session)
+                    except Exception as e:
+                        logger.warning(f"Observer listener failed for {session_id}: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"AI Analysis failed for {session_id}: {e}")
+        finally:
+            self._running.pop(session_id, None)
+            if session_id in self._dirty:
+                self._dirty.discard(session_id)
+                self.schedule(session_id)
+
+    async def drain(self, timeout: float = 10.0):
+        """Run pending debounced jobs now and wait for in-flight ones (used on shutdown)."""
+        for session_id in list(self._timers):
+            self._timers.pop(session_id).cancel()
+            self._fire(session_id)
+        self._dirty.clear()
+        tasks = list(self._running.values())
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "async": OBSERVER_ASYNC,
+            "pending": len(self._timers),
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration_ms": round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+        }
+
+
+# Application-wide instance
+observer_queue = ObserverQueue()
+observer_queue.add_listener(push_analysis)
@@ -0,0 +1,130 @@
+"""Per-user quotas for the metered (LLM) routes, from their subscription's plan.
+
+`plan_limits.limits_for(user_id)` maps the user's active subscription tier
+(``subscriptions.tier``: free, premium, ...) to the active `Plan` with that
+``plan_type`` (or name), and returns its ``max_requests_per_minute / hour /
+day`` as `core.limiter.Limit`s. Users without a subscription get the "free"
+plan. Tiers without a matching plan row get RATE_LIMIT_PLAN_DEFAULT (the
+`Plan` column defaults). core/limiter.py never applies a quota tighter than
+the anonymous limit of the same routes.
+
+The plans table is cached for PLAN_LIMITS_TTL seconds, and each user's tier
+in an LRU of PLAN_LIMITS_USERS entries for the same time, so the rate limiter
+normally costs no query. `forget(user_id)` drops a user's tier after an upgrade.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from core.limiter import Limit, parse_limits
+from core.logging import logger
+
+PLAN_LIMITS_TTL = float(os.getenv("PLAN_LIMITS_TTL", "60"))
+PLAN_LIMITS_USERS = int(os.getenv("PLAN_LIMITS_USERS", "50000"))
+RATE_LIMIT_PLAN_DEFAULT = os.getenv("RATE_LIMIT_PLAN_DEFAULT", "10/minute,100/hour,1000/day")
+
+Limits = Tuple[Limit, ...]
+
+
+def limits_of(per_minute: Optional[int], per_hour: Optional[int], per_day: Optional[int]) -> Limits:
+    pairs = ((per_minute, 60), (per_hour, 3600), (per_day, 86400))
+    return tuple(Limit(int(count), seconds) for count, seconds in pairs if count and count > 0)
+
+
+async def _fetch_tier(user_id: str) -> Optional[str]:
+    from sqlalchemy import select
+    from database.session import async_session
+    from models.platform import Subscription
+
+    async with async_session() as db:
+        return (await db.execute(
+            select(Subscription.tier)
+            .where(Subscription.tenant == user_id, Subscription.status == "active")
+            .order_by(Subscription.created_at.desc())
+            .limit(1)
+        )).scalar()
+
+
+async def _fetch_plans() -> Dict[str, Limits]:
+    from sqlalchemy import select
+    from database.session import async_session
+    from models.credits import Plan
+
+    async with async_session() as db:
+        rows = (await db.execute(
+            select(Plan.name, Plan.plan_type, Plan.max_requests_per_minute,
+                   Plan.max_requests_per_hour, Plan.max_requests_per_day).where(Plan.is_active.is_(True))
+        )).all()
+    plans: Dict[str, Limits] = {}
+    for row in rows:
+        limits = limits_of(row.max_requests_per_minute, row.max_requests_per_hour, row.max_requests_per_day)
+        plans.setdefault(row.name.lower(), limits)
+        if row.plan_type is not None:
+            plans[row.plan_type.value] = limits  # the plan_type match wins over a same-named plan
+    return plans
+
+
+class PlanLimits:
+    def __init__(
+        self,
+        ttl: float = PLAN_LIMITS_TTL,
+        max_users: int = PLAN_LIMITS_USERS,
+        default: Limits = parse_limits(RATE_LIMIT_PLAN_DEFAULT),
+        fetch_tier: Callable[[str], Awaitable[Optional[str]]] = _fetch_tier,
+        fetch_plans: Callable[[], Awaitable[Dict[str, Limits]]] = _fetch_plans,
+    ):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.default = tuple(default)
+        self._fetch_tier = fetch_tier
+        self._fetch_plans = fetch_plans
+        self._plans: Dict[str, Limits] = {}
+        self._plans_loaded_at: Optional[float] = None
+        self._tiers: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # user id -> (loaded at, tier)
+        self.stats_counters = {"lookups": 0, "tier_queries": 0, "plan_queries": 0, "errors": 0}
+
+    async def _plan_table(self, now: float) -> Dict[str, Limits]:
+        if self._plans_loaded_at is None or now - self._plans_loaded_at > self.ttl:
+            self.stats_counters["plan_queries"] += 1
+            self._plans_loaded_at = now  # one reload per TTL, even when it fails
+            try:
+                self._plans = await self._fetch_plans()
+            except Exception as e:
+                self.stats_counters["errors"] += 1
+                logger.warning(f"Plan limits: could not load plans ({e}); keeping {len(self._plans)} cached")
+        return self._plans
+
+    async def _tier(self, user_id: str, now: float) -> str:
+        cached = self._tiers.get(user_id)
+        if cached is not None and now - cached[0] <= self.ttl:
+            self._tiers.move_to_end(user_id)
+            return cached[1]
+        self.stats_counters["tier_queries"] += 1
+        try:
+            tier = (await self._fetch_tier(user_id) or "free").lower()
+        except Exception as e:
+            self.stats_counters["errors"] += 1
+            logger.warning(f"Plan limits: could not load the subscription of {user_id}: {e}")
+            tier = cached[1] if cached is not None else "free"
+        self._tiers[user_id] = (now, tier)
+        self._tiers.move_to_end(user_id)
+        while len(self._tiers) > self.max_users:
+            self._tiers.popitem(last=False)
+        return tier
+
+    async def limits_for(self, user_id: str) -> Limits:
+        self.stats_counters["lookups"] += 1
+        now = time.monotonic()
+        plans = await self._plan_table(now)
+        tier = await self._tier(user_id, now)
+        return plans.get(tier) or self.default
+
+    def forget(self, user_id: str):
+        self._tiers.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {**self.stats_counters, "plans": sorted(self._plans), "users": len(self._tiers)}
+
+
+plan_limits = PlanLimits()
@@ -0,0 +1,422 @@
+"""Change-driven profile embedding pipeline.
+
+Profile edits (the PUT /me/... endpoints) call `mark_profile_dirty`, which adds
+the tenant to a Redis sorted set (EMBED_DIRTY_KEY) scored by the time it first
+became dirty; repeated edits before the next run collapse into one entry. The
+Celery beat task runs `ProfileEmbeddingPipeline.run_once()`, which:
+
+1. claims up to EMBED_PIPELINE_BATCH of the oldest dirty tenants, topped up
+   with never-embedded (and never-hashed) tenants so existing accounts are
+   backfilled;
+2. loads their profiles in one query and skips those whose content hash still
+   matches ``Tenant.embedding_hash`` (edits that don't change the profile);
+3. writes self-descriptions with the LLM, EMBED_DESCRIBE_CONCURRENCY at a time;
+4. encodes all descriptions in batches (services/embedder.py);
+5. upserts the vectors into the vector index (or Milvus) in one call and bulk
+   updates ``embedding_id`` / ``embedding_hash`` in one transaction.
+
+Only one run goes at a time: `run_once` takes a Redis lock (EMBED_LOCK_KEY,
+SET NX PX, expiring after EMBED_LOCK_SECONDS) and returns right away when
+another worker holds it. New embedding ids are reserved atomically with
+INCRBY on EMBED_IDS_KEY, seeded from ``max(Tenant.embedding_id)``, so two
+runs never hand out the same id.
+
+If a run fails after claiming, the claimed tenants are put back with their
+original timestamps. Each run's throughput and the lag from edit to indexed
+vector are stored under EMBED_STATS_KEY; the API serves them, together with
+the current backlog, at /debug/embedding-pipeline.
+
+Without Redis the dirty set, stats, lock and id counter live in process
+memory, which only helps when the API and the worker share a process; the
+backfill still picks up new accounts.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.logging import logger
+from utils.settings import REDIS_URL
+
+EMBED_DIRTY_KEY = os.getenv("EMBED_DIRTY_KEY", "embed:dirty")
+EMBED_STATS_KEY = os.getenv("EMBED_STATS_KEY", "embed:pipeline")
+EMBED_LOCK_KEY = os.getenv("EMBED_LOCK_KEY", "embed:lock")
+EMBED_LOCK_SECONDS = float(os.getenv("EMBED_LOCK_SECONDS", "900"))
+EMBED_IDS_KEY = os.getenv("EMBED_IDS_KEY", "embed:last_id")
+EMBED_PIPELINE_BATCH = int(os.getenv("EMBED_PIPELINE_BATCH", "256"))
+EMBED_DESCRIBE_CONCURRENCY = int(os.getenv("EMBED_DESCRIBE_CONCURRENCY", "8"))
+EMBED_BACKFILL = os.getenv("EMBED_BACKFILL", "1") not in ("0", "false", "no")
+
+# Bookkeeping / credential fields: not part of the profile, never hashed or sent to the LLM.
+_IGNORED = frozenset({"password", "embedding_id", "embedding_hash", "last_login", "created_at", "updated_at"})
+
+Profile = Dict[str, Any]
+
+# Delete the lock only if this run still holds it (it may have expired and been taken since).
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _strip(value):
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in _IGNORED}
+    if isinstance(value, (list, tuple)):
+        return [_strip(v) for v in value]
+    return value
+
+
+def profile_hash(profile: Profile) -> str:
+    """SHA-256 of the profile content (sorted JSON, bookkeeping fields removed)."""
+    blob = json.dumps(_strip(profile), sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DirtyProfiles:
+    """Sorted set of tenant ids awaiting (re-)embedding, scored by first-dirty time."""
+
+    def __init__(
+        self,
+        url: Optional[str] = REDIS_URL,
+        key: str = EMBED_DIRTY_KEY,
+        stats_key: str = EMBED_STATS_KEY,
+        lock_key: str = EMBED_LOCK_KEY,
+        ids_key: str = EMBED_IDS_KEY,
+    ):
+        self.url = url
+        self.key = key
+        self.stats_key = stats_key
+        self.lock_key = lock_key
+        self.ids_key = ids_key
+        self._sync = None
+        self._async = None
+        self._memory: Dict[str, float] = {}
+        self._memory_stats: Dict[str, str] = {}
+        self._memory_lock = threading.Lock()
+        self._ids_lock = threading.Lock()
+        self._last_id: Optional[int] = None
+
+    def _client(self):
+        if self._sync is None and self.url:
+            try:
+                from utils.redis_pool import redis_client
+                self._sync = redis_client(self.url)
+                self._sync.ping()
+            except Exception as e:
+                logger.warning(f"Embedding pipeline: Redis unavailable ({e}); dirty set kept in memory")
+                self.url = None
+                self._sync = None
+        return self._sync
+
+    def add(self, tenant_ids: Iterable[str], at: Optional[float] = None):
+        at = time.time() if at is None else at
+        mapping = {tenant_id: at for tenant_id in tenant_ids}
+        if not mapping:
+            return
+        client = self._client()
+        if client is not None:
+            client.zadd(self.key, mapping, nx=True)
+        else:
+            for tenant_id, ts in mapping.items():
+                self._memory.setdefault(tenant_id, ts)
+
+    async def aadd(self, tenant_id: str):
+        """`add` for request handlers; never raises."""
+        if self.url:
+            try:
+                if self._async is None:
+                    from utils.redis_pool import async_redis_client
+                    self._async = async_redis_client(self.url)
+                await self._async.zadd(self.key, {tenant_id: time.time()}, nx=True)
+                return
+            except Exception as e:
+                logger.warning(f"Embedding pipeline: could not mark {tenant_id} dirty in Redis ({e})")
+        self._memory.setdefault(tenant_id, time.time())
+
+    def claim(self, n: int) -> List[Tuple[str, float]]:
+        """Remove and return the `n` oldest entries as (tenant_id, dirty_since)."""
+        client = self._client()
+        if client is None:
+            oldest = sorted(self._memory.items(), key=lambda item: item[1])[:n]
+            for tenant_id, _ in oldest:
+                del self._memory[tenant_id]
+            return oldest
+        with client.pipeline() as pipe:
+            pipe.zrange(self.key, 0, n - 1, withscores=True)
+            pipe.zremrangebyrank(self.key, 0, n - 1)
+            claimed, _ = pipe.execute()
+        return [(m.decode() if isinstance(m, bytes) else m, float(s)) for m, s in claimed]
+
+    def restore(self, claimed: Sequence[Tuple[str, float]]):
+        """Put claimed entries back; a newer edit that re-added one keeps its own (later) score."""
+        for tenant_id, ts in claimed:
+            self.add([tenant_id], at=ts)
+
+    def backlog(self) -> Tuple[int, Optional[float]]:
+        client = self._client()
+        if client is None:
+            return len(self._memory), min(self._memory.values(), default=None)
+        size = client.zcard(self.key)
+        oldest = client.zrange(self.key, 0, 0, withscores=True)
+        return size, (float(oldest[0][1]) if oldest else None)
+
+    def acquire(self, token: str, ttl: float) -> bool:
+        """Take the single-run lock for `ttl` seconds; False while another run holds it."""
+        client = self._client()
+        if client is None:
+            return self._memory_lock.acquire(blocking=False)
+        return bool(client.set(self.lock_key, token, nx=True, px=int(ttl * 1000)))
+
+    def release(self, token: str):
+        client = self._client()
+        if client is None:
+            if self._memory_lock.locked():
+                self._memory_lock.release()
+            return
+        client.eval(_RELEASE_LUA, 1, self.lock_key, token)
+
+    def allocate_ids(self, n: int, last_id: Callable[[], int]) -> int:
+        """Reserve `n` consecutive embedding ids and return the first; `last_id()` seeds the counter."""
+        client = self._client()
+        if client is None:
+            with self._ids_lock:
+                first = max(self._last_id or 0, last_id()) + 1
+                self._last_id = first + n - 1
+            return first
+        if not client.exists(self.ids_key):
+            client.set(self.ids_key, last_id(), nx=True)  # a concurrent seed wins; both read the same max
+        return client.incrby(self.ids_key, n) - n + 1
+
+    def record(self, stats: Dict[str, Any]):
+        flat = {k: json.dumps(v) for k, v in stats.items()}
+        client = self._client()
+        if client is not None:
+            client.hset(self.stats_key, mapping=flat)
+        else:
+            self._memory_stats.update(flat)
+
+    def last_run(self) -> Dict[str, Any]:
+        client = self._client()
+        raw = client.hgetall(self.stats_key) if client is not None else self._memory_stats
+        return {
+            (k.decode() if isinstance(k, bytes) else k): json.loads(v)
+            for k, v in raw.items()
+        }
+
+
+# -- default wiring (database, LLM, vector index) -----------------------------------
+def _load_profiles(tenant_ids: Sequence[str]) -> List[Profile]:
+    from services.model_converter import tenant_to_dict
+    from services.user_service import UserService
+    return [tenant_to_dict(t) for t in UserService().get_tenants_by_ids(tenant_ids)]
+
+
+def _unembedded_ids(limit: int) -> List[str]:
+    from services.user_service import UserService
+    return UserService().get_unembedded_ids(limit)
+
+
+def _last_embedding_id() -> int:
+    from services.user_service import UserService
+    return UserService().get_last_index()
+
+
+def _save_embedding_ids(rows: List[Dict[str, Any]]):
+    from services.user_service import UserService
+    UserService().bulk_update_embeddings(rows)
+
+
+_describer = None
+
+
+def _describe(profile: Profile) -> Optional[str]:
+    global _describer
+    if _describer is None:
+        from elinity_ai.embeddings import ElinityEmbedding
+        _describer = ElinityEmbedding()
+    return _describer.describe(profile)
+
+
+def _upsert_vectors(records: List[Dict[str, Any]]):
+    from elinity_ai.milvus_db._local_pipeline import VECTOR_BACKEND
+    if VECTOR_BACKEND == "milvus":
+        from elinity_ai.embeddings import milvus_client
+        return milvus_client.upsert(records)
+    # Local ANN index; API workers pick up the snapshot on their next query.
+    from services.vector_index import get_vector_index, refresh_vector_index
+    refresh_vector_index()  # start from the latest snapshot on disk
+    index = get_vector_index()
+    index.add(
+        [r["id"] for r in records],
+        [r["vector"] for r in records],
+        labels=[r["tenant"]["id"] for r in records],
+    )
+    index.maybe_train()
+    index.save()
+    return index.stats()
+
+
+class ProfileEmbeddingPipeline:
+    def __init__(
+        self,
+        dirty: Optional[DirtyProfiles] = None,
+        batch_size: int = EMBED_PIPELINE_BATCH,
+        concurrency: int = EMBED_DESCRIBE_CONCURRENCY,
+        backfill: bool = EMBED_BACKFILL,
+        lock_seconds: float = EMBED_LOCK_SECONDS,
+        load: Callable[[Sequence[str]], List[Profile]] = _load_profiles,
+        unembedded: Callable[[int], List[str]] = _unembedded_ids,
+        describe: Callable[[Profile], Optional[str]] = _describe,
+        encoder=None,
+        last_id: Callable[[], int] = _last_embedding_id,
+        upsert: Callable[[List[Dict[str, Any]]], Any] = _upsert_vectors,
+        save: Callable[[List[Dict[str, Any]]], None] = _save_embedding_ids,
+    ):
+        self.dirty = dirty if dirty is not None else DirtyProfiles()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.backfill = backfill
+        self.lock_seconds = lock_seconds
+        self._load = load
+        self._unembedded = unembedded
+        self._describe = describe
+        self._encoder = encoder
+        self._last_id = last_id
+        self._upsert = upsert
+        self._save = save
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            from services.embedder import embedder
+            self._encoder = embedder
+        return self._encoder
+
+    def _describe_all(self, profiles: List[Profile]) -> List[Optional[str]]:
+        def safe(profile):
+            try:
+                return self._describe(_strip(profile))
+            except Exception as e:
+                logger.error(f"Embedding pipeline: description failed for tenant {profile.get('id')}: {e}")
+                return None
+
+        if self.concurrency <= 1 or len(profiles) <= 1:
+            return [safe(p) for p in profiles]
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(profiles))) as pool:
+            return list(pool.map(safe, profiles))
+
+    def run_once(self) -> Dict[str, Any]:
+        """Embed one batch of dirty (and never-embedded) tenants; returns the run's stats.
+
+        Returns ``{"candidates": 0, "skipped": "locked"}`` when another run is in progress.
+        """
+        token = uuid.uuid4().hex
+        if not self.dirty.acquire(token, self.lock_seconds):
+            logger.info("Embedding pipeline: another run is in progress, skipping")
+            return {"claimed": 0, "candidates": 0, "embedded": 0, "skipped": "locked"}
+        try:
+            return self._run()
+        finally:
+            try:
+                self.dirty.release(token)
+            except Exception as e:
+                logger.warning(f"Embedding pipeline: could not release the run lock ({e}); it expires on its own")
+
+    def _run(self) -> Dict[str, Any]:
+        started = time.time()
+        claimed = self.dirty.claim(self.batch_size)
+        dirty_since = dict(claimed)
+        tenant_ids = list(dirty_since)
+        if self.backfill and len(tenant_ids) < self.batch_size:
+            tenant_ids += [t for t in self._unembedded(self.batch_size - len(tenant_ids)) if t not in dirty_since]
+        stats = {"claimed": len(claimed), "candidates": len(tenant_ids), "unchanged": 0, "empty": 0, "embedded": 0}
+        try:
+            profiles = self._load(tenant_ids) if tenant_ids else []
+            todo = []
+            for profile in profiles:
+                digest = profile_hash(profile)
+                if profile.get("embedding_id") is not None and profile.get("embedding_hash") == digest:
+                    stats["unchanged"] += 1
+                else:
+                    todo.append((profile, digest))
+
+            t0 = time.time()
+            descriptions = self._describe_all([p for p, _ in todo])
+            stats["describe_seconds"] = round(time.time() - t0, 3)
+            ready = [(p, d, text) for (p, d), text in zip(todo, descriptions) if text]
+            # Nothing to describe yet: remember the hash so the backfill moves on; an edit re-queues it.
+            empty = [
+                {"id": p["id"], "embedding_id": p.get("embedding_id"), "embedding_hash": d}
+                for (p, d), text in zip(todo, descriptions) if not text
+            ]
+            stats["empty"] = len(empty)
+
+            records = []
+            if ready:
+                t0 = time.time()
+                vectors = self.encoder.encode_sync([text for _, _, text in ready])
+                stats["encode_seconds"] = round(time.time() - t0, 3)
+                new = sum(1 for profile, _, _ in ready if profile.get("embedding_id") is None)
+                next_id = self.dirty.allocate_ids(new, self._last_id) if new else None
+                now = datetime.now(timezone.utc).isoformat()
+                for (profile, digest, text), vector in zip(ready, vectors):
+                    embedding_id = profile.get("embedding_id")
+                    if embedding_id is None:
+                        embedding_id, next_id = next_id, next_id + 1
+                    records.append({
+                        "created_at": now,
+                        "source": "profile_embedding",
+                        "tenant": profile,
+                        "id": embedding_id,
+                        "vector": vector.tolist(),
+                        "bio": text,
+                        "hash": digest,
+                    })
+                self._upsert(records)
+            rows = [{"id": r["tenant"]["id"], "embedding_id": r["id"], "embedding_hash": r["hash"]} for r in records]
+            if rows or empty:
+                self._save(rows + empty)
+        except Exception:
+            self.dirty.restore(claimed)
+            raise
+
+        finished = time.time()
+        stats["embedded"] = len(records)
+        stats["seconds"] = round(finished - started, 3)
+        stats["profiles_per_sec"] = round(len(records) / (finished - started), 2) if records else 0.0
+        lags = [finished - dirty_since[r["tenant"]["id"]] for r in records if r["tenant"]["id"] in dirty_since]
+        stats["lag_max_s"] = round(max(lags), 3) if lags else None
+        stats["lag_mean_s"] = round(sum(lags) / len(lags), 3) if lags else None
+        stats["finished_at"] = finished
+        if tenant_ids:
+            logger.info(f"Embedding pipeline: {stats}")
+        try:
+            self.dirty.record(stats)
+        except Exception as e:
+            logger.warning(f"Embedding pipeline: could not record stats ({e})")
+        return stats
+
+    def stats(self) -> Dict[str, Any]:
+        size, oldest = self.dirty.backlog()
+        return {
+            "backlog": size,
+            "oldest_dirty_age_s": round(time.time() - oldest, 3) if oldest is not None else None,
+            "last_run": self.dirty.last_run(),
+        }
+
+
+dirty_profiles = DirtyProfiles()
+profile_embedding_pipeline = ProfileEmbeddingPipeline(dirty=dirty_profiles)
+
+
+async def mark_profile_dirty(tenant_id: str):
+    """Queue `tenant_id` for re-embedding after a profile edit."""
+    await dirty_profiles.aadd(tenant_id)
@@ -1,10 +1,18 @@
 from models.user import Tenant
 from sqlalchemy.orm import selectinload
-from sqlalchemy import func
+from sqlalchemy import func, update
 from database.session import Session
 from typing import List
 from fastapi import HTTPException
 
+PROFILE_RELATIONSHIPS = (
+    "profile_pictures", "personal_info", "big_five_traits", "mbti_traits", "psychology",
+    "interests_and_hobbies", "values_beliefs_and_goals", "favorites", "relationship_preferences",
+    "friendship_preferences", "collaboration_preferences", "personal_free_form", "intentions",
+    "aspiration_and_reflections", "ideal_characteristics",
+)
+
+
 class UserService:
     def __init__(self):
         self.limit = 10
@@ -55,5 +63,34 @@ class UserService:
             db.commit(); db.refresh(user)
             print(f"✅ Successfully updated embedding_id for tenant {tenant_id}")
             return user
-        
-     
\ No newline at end of file
+
+    def get_tenants_by_ids(self, tenant_ids: List[str]) -> List[Tenant]:
+        """Tenants with every profile section loaded, for the embedding pipeline."""
+        with Session() as db:
+            return (
+                db.query(Tenant)
+                .options(*[selectinload(getattr(Tenant, rel)) for rel in PROFILE_RELATIONSHIPS])
+                .filter(Tenant.id.in_(list(tenant_ids)))
+                .all()
+            )
+
+    def get_unembedded_ids(self, limit: int) -> List[str]:
+        with Session() as db:
+            rows = (
+                db.query(Tenant.id)
+                .filter(Tenant.embedding_id.is_(None), Tenant.embedding_hash.is_(None))
+                .limit(limit)
+                .all()
+            )
+            return [row[0] for row in rows]
+
+    def bulk_update_embeddings(self, rows: List[dict]):
+        """Set embedding_id / embedding_hash for many tenants in one transaction.
+
+        `rows` are ``{"id": tenant_id, "embedding_id": ..., "embedding_hash": ...}``.
+        """
+        if not rows:
+            return
+        with Session() as db:
+            db.execute(update(Tenant), rows)
+            db.commit()
@@ -0,0 +1,450 @@
+"""In-process approximate nearest-neighbour index for profile embeddings.
+
+Replaces the Milvus round trip (and its mock) for "who is semantically closest
+to this profile" with an IVF index over a memory-mapped matrix, so
+`/recommendations` and `/connections/daily` get a semantic top-k without an
+outside service:
+
+- vectors are L2-normalised (cosine similarity = dot product) and stored as
+  VECTOR_INDEX_DTYPE (float16 by default) in ``<path>.vectors``, a flat
+  memory-mapped file that grows by doubling;
+- entries are keyed by `Tenant.embedding_id`; `add` upserts and `delete`
+  tombstones. Freed slots are only reused after the next snapshot, so the
+  snapshot on disk never points at a slot that now holds another vector;
+- once VECTOR_INDEX_TRAIN_MIN vectors exist, a spherical k-means coarse
+  quantiser (~2*sqrt(n) lists) is trained and queries scan only the
+  VECTOR_INDEX_NPROBE closest lists. Smaller indexes are searched exactly;
+- `save()` writes ids, labels (tenant ids), centroids and list assignments to
+  ``<path>.meta.npz`` atomically; `vector_index_reloader` makes the API
+  workers pick up snapshots written by the embedding job (checked every
+  VECTOR_INDEX_RELOAD_SECONDS, off the request path).
+
+`recall_at_k()` measures the IVF results against brute force on the live data.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.logging import logger
+
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "data/vector_index/profiles")
+VECTOR_INDEX_DIM = int(os.getenv("VECTOR_INDEX_DIM", "768"))
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float16")
+VECTOR_INDEX_NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", "12"))
+VECTOR_INDEX_TRAIN_MIN = int(os.getenv("VECTOR_INDEX_TRAIN_MIN", "4096"))
+VECTOR_INDEX_RELOAD_SECONDS = float(os.getenv("VECTOR_INDEX_RELOAD_SECONDS", "30"))
+
+_BATCH = 65536
+
+
+def _normalise(vectors) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    def __init__(
+        self,
+        path: Optional[str] = VECTOR_INDEX_PATH,
+        dim: int = VECTOR_INDEX_DIM,
+        dtype: str = VECTOR_INDEX_DTYPE,
+        nprobe: int = VECTOR_INDEX_NPROBE,
+        train_min: int = VECTOR_INDEX_TRAIN_MIN,
+        capacity: int = 1024,
+    ):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self._meta_mtime: Optional[float] = None
+        self._reset(capacity)
+
+    # -- storage ----------------------------------------------------------------
+    def _reset(self, capacity: int):
+        self.capacity = 0
+        self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+        self._ids = np.zeros(0, dtype=np.int64)     # slot -> embedding_id (-1: empty)
+        self._assign = np.zeros(0, dtype=np.int32)  # slot -> IVF list (-1: none)
+        self._pos = np.zeros(0, dtype=np.int32)     # slot -> index inside its list
+        self._slots: Dict[int, int] = {}            # embedding_id -> slot
+        self.labels: Dict[int, str] = {}            # embedding_id -> tenant id
+        self._used = 0
+        self._free: List[int] = []
+        self._released: List[int] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._sizes: List[int] = []
+        self.trained_size = 0
+        self._grow(capacity)
+
+    def _vectors_path(self) -> str:
+        return f"{self.path}.vectors"
+
+    def _meta_path(self) -> str:
+        return f"{self.path}.meta.npz"
+
+    def _grow(self, capacity: int):
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            self._vectors = None
+            size = capacity * self.dim * self.dtype.itemsize
+            with open(self._vectors_path(), "ab") as fh:
+                if fh.tell() < size:  # never shrink: a snapshot may cover more rows
+                    fh.truncate(size)
+            self._vectors = np.memmap(self._vectors_path(), dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        else:
+            vectors = np.zeros((capacity, self.dim), dtype=self.dtype)
+            vectors[:self.capacity] = self._vectors
+            self._vectors = vectors
+        extra = capacity - self.capacity
+        self._ids = np.concatenate([self._ids, np.full(extra, -1, dtype=np.int64)])
+        self._assign = np.concatenate([self._assign, np.full(extra, -1, dtype=np.int32)])
+        self._pos = np.concatenate([self._pos, np.zeros(extra, dtype=np.int32)])
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, embedding_id: int) -> bool:
+        return int(embedding_id) in self._slots
+
+    def vector(self, embedding_id: int) -> Optional[np.ndarray]:
+        slot = self._slots.get(int(embedding_id))
+        return None if slot is None else np.asarray(self._vectors[slot], dtype=np.float32)
+
+    # -- IVF lists ---------------------------------------------------------------
+    def _list_add(self, slot: int, cell: int):
+        size = self._sizes[cell]
+        if size == len(self._lists[cell]):
+            grown = np.empty(max(16, size * 2), dtype=np.int32)
+            grown[:size] = self._lists[cell][:size]
+            self._lists[cell] = grown
+        self._lists[cell][size] = slot
+        self._sizes[cell] = size + 1
+        self._assign[slot] = cell
+        self._pos[slot] = size
+
+    def _list_remove(self, slot: int):
+        cell = self._assign[slot]
+        if cell < 0:
+            return
+        last = self._sizes[cell] - 1
+        moved = self._lists[cell][last]
+        self._lists[cell][self._pos[slot]] = moved
+        self._pos[moved] = self._pos[slot]
+        self._sizes[cell] = last
+        self._assign[slot] = -1
+
+    def _nearest_cells(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _live_slots(self) -> np.ndarray:
+        return np.flatnonzero(self._ids[:self._used] >= 0)
+
+    def train(self, iterations: int = 8, sample: int = 50_000, seed: int = 0):
+        """Fit the coarse quantiser on (a sample of) the live vectors and re-bucket everything."""
+        started = time.perf_counter()
+        slots = self._live_slots()
+        if len(slots) == 0:
+            return
+        rng = np.random.default_rng(seed)
+        nlist = int(min(4096, len(slots), max(1, 2 * np.sqrt(len(slots)))))
+        sample = min(sample, 40 * nlist)  # ~40 points per list is plenty for a coarse quantiser
+        picked = slots if len(slots) <= sample else rng.choice(slots, sample, replace=False)
+        data = np.asarray(self._vectors[np.sort(picked)], dtype=np.float32)
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            cells = np.argmax(data @ centroids.T, axis=1)
+            order = np.argsort(cells, kind="stable")
+            counts = np.bincount(cells, minlength=nlist)
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            sums[~empty] = np.add.reduceat(data[order], starts[~empty], axis=0)
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids = _normalise(sums)
+        self.centroids = centroids
+        self._lists = [np.empty(16, dtype=np.int32) for _ in range(nlist)]
+        self._sizes = [0] * nlist
+        self._assign[:] = -1
+        for i in range(0, len(slots), _BATCH):
+            batch = slots[i:i + _BATCH]
+            for slot, cell in zip(batch, self._nearest_cells(np.asarray(self._vectors[batch], dtype=np.float32))):
+                self._list_add(int(slot), int(cell))
+        self.trained_size = len(slots)
+        logger.info(f"Vector index trained: {len(slots)} vectors, {nlist} lists in "
+                    f"{(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def maybe_train(self) -> bool:
+        """Train once big enough, and retrain when the index has grown 4x since."""
+        n = len(self)
+        if n >= self.train_min and (self.centroids is None or n > 4 * self.trained_size):
+            self.train()
+            return True
+        return False
+
+    # -- writes ------------------------------------------------------------------
+    def add(self, embedding_ids: Sequence[int], vectors, labels: Optional[Sequence[Optional[str]]] = None):
+        """Insert or replace vectors keyed by `Tenant.embedding_id` (labels: tenant ids)."""
+        vectors = _normalise(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+        cells = self._nearest_cells(vectors) if self.centroids is not None else None
+        for i, embedding_id in enumerate(embedding_ids):
+            embedding_id = int(embedding_id)
+            slot = self._slots.get(embedding_id)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    self._grow(self._used + 1)
+                    slot = self._used
+                    self._used += 1
+                self._slots[embedding_id] = slot
+                self._ids[slot] = embedding_id
+            else:
+                self._list_remove(slot)
+            self._vectors[slot] = vectors[i]
+            if cells is not None:
+                self._list_add(slot, int(cells[i]))
+            if labels is not None and labels[i] is not None:
+                self.labels[embedding_id] = labels[i]
+
+    def delete(self, embedding_ids: Iterable[int]) -> int:
+        removed = 0
+        for embedding_id in embedding_ids:
+            slot = self._slots.pop(int(embedding_id), None)
+            if slot is None:
+                continue
+            self._list_remove(slot)
+            self._ids[slot] = -1
+            self.labels.pop(int(embedding_id), None)
+            # The last snapshot may still map an id to this slot: reuse it after the next save.
+            self._released.append(slot)
+            removed += 1
+        return removed
+
+    # -- reads -------------------------------------------------------------------
+    def _top(self, slots: np.ndarray, query: np.ndarray, k: int, exclude: Iterable[int]) -> List[Tuple[int, float]]:
+        if len(slots) == 0 or k <= 0:
+            return []
+        order = np.argsort(slots, kind="stable")  # sequential reads from the memmap
+        slots = slots[order]
+        scores = np.asarray(self._vectors[slots], dtype=np.float32) @ query
+        for embedding_id in exclude or ():
+            slot = self._slots.get(int(embedding_id))
+            if slot is not None:
+                scores[slots == slot] = -np.inf
+        k = min(k, len(slots))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(slots) else np.arange(len(slots))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(self._ids[slots[i]]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def search(self, vector, k: int = 10, exclude: Iterable[int] = (), nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Approximate top-k (embedding_id, cosine similarity), best first."""
+        query = _normalise(vector)[0]
+        if self.centroids is None:
+            return self.brute_force(query, k, exclude)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        closeness = self.centroids @ query
+        cells = np.argpartition(-closeness, nprobe - 1)[:nprobe] if nprobe < len(closeness) else range(len(closeness))
+        slots = np.concatenate([self._lists[c][:self._sizes[c]] for c in cells])
+        return self._top(slots, query, k, exclude)
+
+    def brute_force(self, vector, k: int = 10, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        return self._top(self._live_slots(), _normalise(vector)[0], k, exclude)
+
+    def recall_at_k(self, k: int = 10, queries: int = 100, nprobe: Optional[int] = None, seed: int = 0) -> Dict[str, float]:
+        """Mean overlap between IVF and exact top-k for live vectors used as queries."""
+        slots = self._live_slots()
+        if len(slots) == 0:
+            return {"recall": 1.0, "queries": 0}
+        picked = np.random.default_rng(seed).choice(slots, min(queries, len(slots)), replace=False)
+        hits, ann_ms, exact_ms = 0.0, [], []
+        for slot in picked:
+            query, own = self._vectors[slot], [int(self._ids[slot])]
+            t0 = time.perf_counter()
+            approx = {i for i, _ in self.search(query, k, exclude=own, nprobe=nprobe)}
+            t1 = time.perf_counter()
+            exact = {i for i, _ in self.brute_force(query, k, exclude=own)}
+            t2 = time.perf_counter()
+            hits += len(approx & exact) / max(1, len(exact))
+            ann_ms.append((t1 - t0) * 1000)
+            exact_ms.append((t2 - t1) * 1000)
+        return {
+            "recall": round(hits / len(picked), 4),
+            "queries": len(picked),
+            "k": k,
+            "ann_p50_ms": round(float(np.median(ann_ms)), 3),
+            "exact_p50_ms": round(float(np.median(exact_ms)), 3),
+        }
+
+    # -- snapshots ---------------------------------------------------------------
+    def save(self):
+        if not self.path:
+            return
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        ids = np.fromiter(self.labels.keys(), dtype=np.int64, count=len(self.labels))
+        tmp = f"{self.path}.meta.tmp.npz"
+        np.savez(
+            tmp,
+            dim=self.dim, dtype=str(self.dtype), capacity=self.capacity, used=self._used,
+            ids=self._ids, assign=self._assign, trained_size=self.trained_size,
+            centroids=self.centroids if self.centroids is not None else np.zeros((0, self.dim), dtype=np.float32),
+            label_ids=ids, label_values=np.array([self.labels[i] for i in ids.tolist()], dtype=object),
+        )
+        os.replace(tmp, self._meta_path())
+        self._meta_mtime = os.path.getmtime(self._meta_path())
+        self._free.extend(self._released)
+        self._released = []
+
+    def load(self) -> bool:
+        if not self.path or not os.path.exists(self._meta_path()):
+            return False
+        mtime = os.path.getmtime(self._meta_path())
+        with np.load(self._meta_path(), allow_pickle=True) as meta:
+            if int(meta["dim"]) != self.dim:
+                raise ValueError(f"snapshot has dim {int(meta['dim'])}, index expects {self.dim}")
+            self.dtype = np.dtype(str(meta["dtype"]))
+            capacity, used = int(meta["capacity"]), int(meta["used"])
+            ids, assign = meta["ids"], meta["assign"]
+            centroids = meta["centroids"]
+            trained_size = int(meta["trained_size"])
+            labels = dict(zip(meta["label_ids"].tolist(), meta["label_values"].tolist()))
+        self._vectors = None
+        self._reset(0)
+        self._grow(capacity)
+        self._ids[:] = ids
+        self._used = used
+        live = np.flatnonzero(self._ids[:used] >= 0)
+        self._slots = {int(self._ids[s]): int(s) for s in live}
+        self._free = np.flatnonzero(self._ids[:used] < 0).tolist()
+        self.labels = labels
+        if len(centroids):
+            self.centroids = np.asarray(centroids, dtype=np.float32)
+            self._lists = [np.empty(16, dtype=np.int32) for _ in range(len(centroids))]
+            self._sizes = [0] * len(centroids)
+            for slot in live:
+                if assign[slot] >= 0:
+                    self._list_add(int(slot), int(assign[slot]))
+            self.trained_size = trained_size
+        self._meta_mtime = mtime
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Pick up a snapshot written by another process (e.g. the embedding job)."""
+        if not self.path or not os.path.exists(self._meta_path()):
+            return False
+        if os.path.getmtime(self._meta_path()) == self._meta_mtime:
+            return False
+        return self.load()
+
+    def stats(self) -> dict:
+        return {
+            "vectors": len(self),
+            "dim": self.dim,
+            "dtype": str(self.dtype),
+            "capacity": self.capacity,
+            "lists": len(self.centroids) if self.centroids is not None else 0,
+            "nprobe": self.nprobe,
+            "trained_size": self.trained_size,
+            "pending_free_slots": len(self._released),
+        }
+
+
+_index: Optional[VectorIndex] = None
+
+
+def _load_index() -> VectorIndex:
+    index = VectorIndex()
+    try:
+        index.load()
+    except Exception as e:
+        logger.error(f"Vector index snapshot unreadable ({e}); starting empty")
+        index = VectorIndex()
+    return index
+
+
+def get_vector_index() -> VectorIndex:
+    """Process-wide index, loaded from the last snapshot on first use (blocking).
+
+    Newer snapshots are picked up by `refresh_vector_index`, not here, so the
+    request path never stats or reloads files.
+    """
+    global _index
+    if _index is None:
+        _index = _load_index()
+    return _index
+
+
+def refresh_vector_index() -> bool:
+    """Swap in a snapshot written by another process, if there is a newer one (blocking).
+
+    The snapshot is loaded into a new index, so searches still running on the
+    previous one are unaffected. Does nothing before the index is first used.
+    """
+    global _index
+    current = _index
+    if current is None or not current.path or not os.path.exists(current._meta_path()):
+        return False
+    if os.path.getmtime(current._meta_path()) == current._meta_mtime:
+        return False
+    fresh = VectorIndex(current.path, current.dim, str(current.dtype), current.nprobe, current.train_min)
+    if not fresh.load():
+        return False
+    _index = fresh
+    return True
+
+
+class VectorIndexReloader:
+    """Background task checking for a newer snapshot every VECTOR_INDEX_RELOAD_SECONDS."""
+
+    def __init__(self, interval: float = VECTOR_INDEX_RELOAD_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.stats_counters = {"checks": 0, "reloads": 0, "errors": 0}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.stats_counters["checks"] += 1
+            try:
+                if await asyncio.to_thread(refresh_vector_index):
+                    self.stats_counters["reloads"] += 1
+                    logger.info(f"Vector index reloaded: {len(get_vector_index())} vectors")
+            except Exception as e:
+                self.stats_counters["errors"] += 1
+                logger.warning(f"Vector index reload failed: {e}")
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {**self.stats_counters, "interval": self.interval, "running": self._task is not None}
+
+
+vector_index_reloader = VectorIndexReloader()
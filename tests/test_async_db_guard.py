@@ -0,0 +1,87 @@
+import ast
+import asyncio
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+ROUTERS = Path(__file__).resolve().parent.parent / "api" / "routers"
+
+# Routers moved to AsyncSession + database/repositories: no sync Session in any coroutine.
+MIGRATED = {
+    "billing.py", "chats.py", "connections.py", "notifications.py",
+    "recommendations.py", "search.py", "social_feed.py", "user_dashboard.py",
+}
+
+# `async def` endpoints still taking `Depends(get_db)`, per router. This only
+# ratchets down: migrate a router and lower (or drop) its entry.
+LEGACY = {
+    "admin_panel.py": 3, "assets.py": 2, "auth.py": 5, "blogs.py": 1, "events.py": 3,
+    "games_ai_puzzle_saga.py": 5, "games_ai_sandbox.py": 5, "games_collaborative_canvas.py": 5,
+    "games_connection_sparks.py": 5, "games_dream_battles.py": 5, "games_emotion_charades.py": 5,
+    "games_emotion_labyrinth_node.py": 5, "games_epic_poem_duel.py": 5, "games_friendship_towers.py": 5,
+    "games_gratitude_quest.py": 5, "games_great_debate.py": 5, "games_journey_journal.py": 5,
+    "games_legacy_builder.py": 5, "games_life_goals_board_game.py": 5, "games_mind_meld.py": 5,
+    "games_mood_journey.py": 5, "games_mood_mosaic.py": 5, "games_myth_builder.py": 5,
+    "games_relationship_rpg.py": 5, "games_serendipity_hunt.py": 5, "games_shared_playlist_maker.py": 5,
+    "games_story_relay.py": 5, "games_the_alignment_game.py": 2, "games_the_hidden_question.py": 5,
+    "games_the_long_journey.py": 5, "games_truth_arcade.py": 5, "games_truth_timeline.py": 5,
+    "groups.py": 6, "internal_users.py": 1, "journal.py": 1, "lifebook.py": 4, "lumi_coach.py": 2,
+    "members.py": 5, "public_users.py": 2, "tools.py": 10, "users.py": 22, "voice_onboarding.py": 2,
+    "voice_onboarding_save.py": 2, "websockets/onboarding.py": 3,
+}
+
+
+def _is_call(node, name):
+    return isinstance(node, ast.Call) and getattr(node.func, "id", getattr(node.func, "attr", None)) == name
+
+
+def _sync_db_coroutines():
+    """(router, function) for every coroutine that takes a sync Session or queries one."""
+    found = []
+    for path in sorted(ROUTERS.rglob("*.py")):
+        router = path.relative_to(ROUTERS).as_posix()
+        for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+            if not isinstance(node, ast.AsyncFunctionDef):
+                continue
+            defaults = node.args.defaults + [d for d in node.args.kw_defaults if d is not None]
+            takes_session = any(
+                _is_call(d, "Depends") and d.args and getattr(d.args[0], "id", None) == "get_db" for d in defaults
+            )
+            queries = any(
+                _is_call(n, "query") and getattr(n.func.value, "id", None) == "db" for n in ast.walk(node)
+                if isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute)
+            )
+            if takes_session or (router in MIGRATED and queries):
+                found.append((router, node.name))
+    return found
+
+
+def test_no_new_sync_sessions_in_coroutines():
+    counts = Counter(router for router, _ in _sync_db_coroutines())
+    assert not set(counts) & MIGRATED, {r: c for r, c in counts.items() if r in MIGRATED}
+    grown = {r: (c, LEGACY.get(r, 0)) for r, c in counts.items() if c > LEGACY.get(r, 0)}
+    assert not grown, f"async endpoints must use get_async_db / database.repositories: {grown}"
+
+
+def test_runtime_guard_flags_sync_queries_on_the_loop():
+    guard = pytest.importorskip("database.guard")  # the database package needs the Postgres driver
+    engine = create_engine("sqlite://")
+    assert guard.install_blocking_guard(engine, "raise")
+    assert not guard.install_blocking_guard(create_engine("sqlite://"), "off")
+
+    def query():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT 1")).scalar()
+
+    async def on_loop():
+        return query()
+
+    async def in_thread():
+        return await asyncio.to_thread(query)
+
+    assert query() == 1
+    assert asyncio.run(in_thread()) == 1
+    with pytest.raises(guard.BlockingDBCallError):
+        asyncio.run(on_loop())
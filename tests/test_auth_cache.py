@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from jose import jwt
+
+from services.auth_cache import AuthCache, Principal
+from utils.settings import JWT_HASH_ALGORITHM, SECRET_KEY
+
+
+def _token(sub, ttl=600):
+    return jwt.encode({"sub": sub, "role": "user", "exp": int(time.time()) + ttl}, SECRET_KEY, algorithm=JWT_HASH_ALGORITHM)
+
+
+class _Backend:
+    def __init__(self):
+        self.users = {"u1": Principal("u1", "user", "v1"), "u2": Principal("u2", "admin", "v1")}
+        self.versions = {}
+        self.loads = []
+        self.redis_up = True
+
+    async def load(self, user_id):
+        self.loads.append(user_id)
+        return self.users.get(user_id)
+
+    async def read_version(self, user_id):
+        if not self.redis_up:
+            raise ConnectionError("redis down")
+        return str(self.versions.get(user_id, 0))
+
+    async def bump_version(self, user_id):
+        self.versions[user_id] = self.versions.get(user_id, 0) + 1
+
+
+def _cache(backend, **kw):
+    return AuthCache(load=backend.load, read_version=backend.read_version, bump_version=backend.bump_version, **kw)
+
+
+def test_tokens_are_decoded_and_loaded_once_then_served_from_the_lru():
+    backend = _Backend()
+    cache = _cache(backend, max_tokens=2)
+    t1, t2, t3 = _token("u1"), _token("u2"), _token("u1", ttl=300)
+
+    async def run():
+        assert await cache.principal(t1) == Principal("u1", "user", "v1")
+        assert (await cache.principal(t1)).id == "u1"
+        assert (await cache.principal(t2)).is_admin
+        await cache.principal(t3)  # evicts t1
+        await cache.principal(t1)
+        assert await cache.principal("not-a-jwt") is None
+        assert await cache.principal(_token("ghost")) is None
+        assert await cache.principal(_token("u1", ttl=-10)) is None  # expired
+
+    asyncio.run(run())
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["decodes"] == 7 and stats["tokens"] == 2
+    assert backend.loads == ["u1", "u2", "u1", "u1", "ghost"]
+
+
+def test_revocation_reloads_the_principal_on_every_process():
+    backend = _Backend()
+    here, other = _cache(backend, check_interval=0), _cache(backend, check_interval=0)
+    token = _token("u1")
+
+    async def run():
+        assert await here.principal(token) and await other.principal(token)
+        backend.users["u1"] = None  # suspended
+        await here.revoke("u1")
+        assert await here.principal(token) is None
+        assert await other.principal(token) is None  # sees the bumped version
+        assert await other.principal(token) is None  # negative entry: no reload
+        assert backend.loads == ["u1", "u1", "u1", "u1"]
+
+        backend.users["u1"] = Principal("u1", "admin", "v2")
+        await here.revoke("u1")
+        assert (await other.principal(token)).is_admin
+
+    asyncio.run(run())
+
+
+def test_without_redis_principals_are_reread_after_the_check_interval():
+    backend = _Backend()
+    backend.redis_up = False
+    cache = _cache(backend, check_interval=0.05)
+    token = _token("u2")
+
+    async def run():
+        await cache.principal(token)
+        await cache.principal(token)
+        assert backend.loads == ["u2"]
+        await asyncio.sleep(0.06)
+        await cache.principal(token)
+        assert backend.loads == ["u2", "u2"]
+        await cache.revoke("u2")  # not published, but this process forgets u2 right away
+        await cache.principal(token)
+        assert backend.loads == ["u2", "u2", "u2"]
+
+    asyncio.run(run())
+    assert cache.stats()["redis_errors"] == 3
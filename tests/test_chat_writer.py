@@ -0,0 +1,127 @@
+import asyncio
+
+import json
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from services.chat_writer import ChatWriter, _naive_utc
+
+
+class FakeInserter:
+    def __init__(self):
+        self.batches = []
+        self.down = False
+
+    async def __call__(self, rows):
+        if self.down:
+            raise RuntimeError("db down")
+        self.batches.append([row["id"] for row in rows])
+
+
+def _msg(n, room="r1"):
+    return {"id": f"m{n}", "sender": "u1", "group": room, "message": f"hello {n}",
+            "created_at": f"2026-01-01T00:00:{n % 60:02d}+00:00"}
+
+
+def test_messages_across_rooms_are_written_in_batches(tmp_path):
+    db = FakeInserter()
+    writer = ChatWriter(inserter=db, flush_ms=10_000, batch_size=3, spill_path=str(tmp_path / "spill"))
+
+    async def scenario():
+        await writer.start()
+        for n in range(7):
+            writer.submit(_msg(n, room=f"r{n % 2}"))
+        await asyncio.sleep(0.01)  # the full batch wakes the writer without waiting for the interval
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert db.batches == [["m0", "m1", "m2"], ["m3", "m4", "m5"], ["m6"]]
+    assert writer.stats()["written"] == 7 and writer.stats()["queued"] == 0
+    assert list(tmp_path.glob("spill.*")) == []
+
+
+def test_database_outage_spills_and_replays_at_least_once(tmp_path):
+    db = FakeInserter()
+    spill = str(tmp_path / "spill")
+
+    async def outage():
+        writer = ChatWriter(inserter=db, flush_ms=10_000, spill_path=spill)
+        await writer.start()
+        db.down = True
+        writer.submit(_msg(1))
+        with pytest.raises(RuntimeError):
+            await writer.flush()
+        writer.submit(_msg(2))
+        with pytest.raises(RuntimeError):
+            await writer.flush()
+        stats = writer.stats()
+        await writer.close()  # still down: nothing is lost, the spill file keeps it
+        return stats
+
+    stats = asyncio.run(outage())
+    assert stats["queued"] == 0 and stats["backlog"] is True and stats["failures"] == 2
+
+    async def restart():
+        db.down = False
+        writer = ChatWriter(inserter=db, flush_ms=10_000, spill_path=spill)
+        await writer.start()
+        writer.submit(_msg(3))
+        await writer.flush()
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(restart())
+    assert sorted(db.batches[-1]) == ["m1", "m2", "m3"]
+    assert writer.stats()["backlog"] is False
+    assert list(tmp_path.glob("spill.*")) == []
+
+
+def test_a_rejected_row_is_dead_lettered_without_blocking_the_batch(tmp_path):
+    class RejectingInserter(FakeInserter):
+        async def __call__(self, rows):
+            if any(row["group"] == "no-such-group" for row in rows):
+                raise IntegrityError("INSERT INTO chats ...", {}, Exception("violates foreign key chats_group_fkey"))
+            await super().__call__(rows)
+
+    db = RejectingInserter()
+    dead = tmp_path / "rejected.jsonl"
+    writer = ChatWriter(inserter=db, flush_ms=10_000, spill_path=str(tmp_path / "spill"), dead_letter_path=str(dead))
+
+    async def scenario():
+        await writer.start()
+        writer.submit(_msg(1))
+        writer.submit(_msg(2, room="no-such-group"))
+        writer.submit(_msg(3, room="r2"))
+        await writer.flush()
+        writer.submit(_msg(4))
+        await writer.flush()
+        await writer.close()
+
+    asyncio.run(scenario())
+    assert db.batches == [["m1"], ["m3"], ["m4"]]
+    assert [json.loads(line)["id"] for line in dead.read_text().splitlines()] == ["m2"]
+    stats = writer.stats()
+    assert stats["written"] == 3 and stats["rejected"] == 1 and stats["backlog"] is False
+    assert list(tmp_path.glob("spill.*")) == []
+
+
+def test_timestamps_are_stored_as_naive_utc():
+    assert _naive_utc("2026-01-01T02:00:00+02:00").isoformat() == "2026-01-01T00:00:00"
+    assert _naive_utc(None) is None
+
+
+def test_history_ring_serves_replay_once_seeded():
+    writer = ChatWriter(inserter=FakeInserter(), spill_path=None, ring_size=3, ring_rooms=2)
+
+    assert writer.recent("r1") is None
+    writer.submit(_msg(5))
+    assert writer.recent("r1") is None  # partial ring: older messages may be in the DB
+    history = writer.seed("r1", [_msg(3), _msg(4), _msg(5)])
+    assert [m["id"] for m in history] == ["m3", "m4", "m5"]
+    writer.submit(_msg(6))
+    assert [m["id"] for m in writer.recent("r1")] == ["m4", "m5", "m6"]
+
+    writer.seed("r2", [])
+    writer.seed("r3", [])  # evicts the least recently used room
+    assert writer.recent("r1") is None and writer.recent("r3") == []
@@ -0,0 +1,49 @@
+from services.connection_graph import ConnectionGraph, pair_key
+
+ROWS = [
+    ("c1", "me", "bob", "suggested"),
+    ("c2", "carol", "me", "matched"),
+    ("c3", "me", "carol", "declined"),  # same pair, another mode: the matched one wins
+    ("c4", "bob", "carol", "matched"),
+]
+
+
+class _Db:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def fetch(self, db, pairs):
+        self.queries.append(sorted(pairs))
+        return [row for row in self.rows if pair_key(row[1], row[2]) in set(pairs)]
+
+
+def test_statuses_resolve_in_one_query_and_are_cached_per_viewer():
+    db = _Db(ROWS)
+    graph = ConnectionGraph(fetch=db.fetch)
+
+    edges = graph.lookup(None, "me", ["bob", "carol", "dave", "me", "bob"])
+    assert edges == {"bob": ("suggested", "c1"), "carol": ("matched", "c2")}
+    assert db.queries == [[("bob", "me"), ("carol", "me"), ("dave", "me")]]
+
+    # Known answers, including "no connection" for dave, come from the cache; only erin is queried.
+    assert graph.lookup(None, "me", ["carol", "dave", "erin"]) == {"carol": ("matched", "c2")}
+    assert db.queries[1:] == [[("erin", "me")]]
+
+    db.rows = [("c1", "me", "bob", "pending_b")] + ROWS[1:]
+    graph.lookup(None, "bob", ["me"])
+    graph.invalidate("bob", "me")
+    assert graph.status(None, "me", "bob") == ("pending_b", "c1")
+    assert graph.status(None, "bob", "me") == ("pending_b", "c1")
+    assert graph.stats()["queries"] == 5
+
+
+def test_entries_expire_and_are_bounded():
+    db = _Db(ROWS)
+    graph = ConnectionGraph(ttl=0, max_users=2, fetch=db.fetch)
+    graph.lookup(None, "me", ["bob"])
+    graph.lookup(None, "me", ["bob"])
+    assert len(db.queries) == 2
+    for viewer in ("a", "b", "c"):
+        graph.lookup(None, viewer, ["me"])
+    assert graph.stats()["users"] == 2
@@ -0,0 +1,52 @@
+from datetime import date
+from types import SimpleNamespace
+
+from services.daily_batches import BatchProgress, plan_user, preferences, shard_of, suggestion_payload
+from services.matching import CandidateMatrix
+
+
+def _matrix():
+    matrix = CandidateMatrix()
+    matrix.upsert("strong-1", ["chess", "jazz", "go"], "Berlin", None)
+    matrix.upsert("strong-2", ["chess", "jazz"], "berlin", None)
+    matrix.upsert("mid", ["chess"], "Berlin", None)
+    matrix.upsert("weak-1", [], "Lima", None)
+    matrix.upsert("weak-2", ["go"], None, None)
+    return matrix
+
+
+def test_plan_respects_limits_modes_threshold_and_exclusions():
+    me = ("me", ["chess", "jazz", "go"], "Berlin", None)
+    prefs = preferences({"daily_limit": 2, "min_threshold": 0.6, "active_modes": {"professional": False}})
+    connected = {"strong-1"}
+    picks = plan_user(_matrix(), me, prefs, {"romantic": 1}, connected)
+
+    assert set(picks) == {"romantic", "social"}  # professional switched off
+    assert [c for c, _ in picks["romantic"]] == ["strong-2"]  # one slot left, strong-1 already connected
+    # Only "mid" still clears the threshold; candidates are never repeated across modes.
+    assert [c for c, _ in picks["social"]] == ["mid"]
+    assert connected == {"strong-1", "strong-2", "mid"}
+
+    top = plan_user(_matrix(), me, preferences({"daily_limit": 5, "filter_mode": "top_picks"}), {}, set())
+    assert len(top["romantic"]) == 5 and top["social"] == [] and top["professional"] == []
+
+
+def test_shards_are_stable_and_progress_aggregates(tmp_path):
+    ids = [f"tenant-{i}" for i in range(1000)]
+    assert [shard_of(t, 4) for t in ids] == [shard_of(t, 4) for t in ids]
+    assert {shard_of(t, 4) for t in ids} == {0, 1, 2, 3}
+
+    progress = BatchProgress(date(2026, 1, 2), url=None, state_dir=str(tmp_path))
+    progress.update(0, total=10, done=10, written=25, finished=True)
+    progress.update(1, total=30, done=5, written=9, finished=False)
+    snap = progress.snapshot()
+    assert (snap["done"], snap["total"], snap["written"], snap["percent"], snap["finished"]) == (15, 40, 34, 37.5, False)
+    progress.reset()
+    assert progress.snapshot()["total"] == 0
+
+
+def test_payload_matches_endpoint_shape():
+    info = SimpleNamespace(first_name="Ada", last_name=None, location="Berlin")
+    item = suggestion_payload("c1", "u2", info, 0.8, "social", "suggested")
+    assert item["user_b"] == {"id": "u2", "name": "Ada", "location": "Berlin"}
+    assert "80%" in item["ai_insight"] and suggestion_payload("c1", "u2", None, 0.5, "social", "suggested")["user_b"]["name"] == "Unknown"
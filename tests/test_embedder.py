@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services import embedder as embedder_module
+from services.embedder import Embedder, HashingBackend
+
+
+def test_hashing_backend_is_deterministic_normalised_and_content_sensitive():
+    backend = HashingBackend(dim=64)
+    a, b, c, empty = backend.encode(["loves jazz and chess", "loves  jazz and chess", "hiking in the alps", ""])
+    assert np.allclose(a, backend.encode(["loves jazz and chess"])[0])
+    assert abs(np.linalg.norm(a) - 1) < 1e-6 and not empty.any()
+    assert float(a @ b) > 0.999 and float(a @ c) < 0.5
+
+
+def test_concurrent_embeds_share_batches_and_cache():
+    embedder = Embedder(backend=HashingBackend(dim=32), batch_size=8, wait_ms=20)
+    texts = [f"profile {i}" for i in range(10)]
+
+    async def scenario():
+        first = await embedder.embed_many(texts + texts[:3])
+        again = await embedder.embed("profile 4")
+        await embedder.close()
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    stats = embedder.stats()
+    assert stats["encoded"] == 10 and stats["batches"] == 2 and stats["coalesced"] == 3
+    assert stats["hits"] == 1 and np.array_equal(again, first[4])
+
+    rows = embedder.encode_sync(["profile 1", "  profile   1 ", "something new"])
+    assert np.array_equal(rows[0], first[1]) and np.array_equal(rows[1], first[1])
+    assert embedder.stats()["encoded"] == 11
+
+
+def test_unavailable_model_is_an_error_not_a_silent_fallback(monkeypatch):
+    def broken(**kwargs):
+        raise ImportError("No module named 'sentence_transformers'")
+
+    monkeypatch.setattr(embedder_module, "SentenceTransformerBackend", broken)
+    with pytest.raises(RuntimeError, match="EMBEDDING_BACKEND=hashing"):
+        embedder_module.make_backend("onnx")
+    assert isinstance(embedder_module.make_backend("hashing"), HashingBackend)
@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.game_history import GameHistory, OFFSETS_KEY, SUMMARY_KEY, trim
+from services.game_session_store import GameSessionStore
+
+
+def test_trim_rolls_out_in_chunks():
+    assert trim(list(range(30)), window=20, slack=10) == (list(range(30)), [])
+    kept, rolled = trim(list(range(31)), window=20, slack=10)
+    assert kept == list(range(11, 31)) and rolled == list(range(11))
+
+
+def test_page_walks_window_then_table_and_summary_lands_in_state():
+    table = []
+
+    async def insert(rows):
+        table.extend(rows)
+
+    async def fetch(session_id, kind, before, limit):
+        rows = sorted((r for r in table if r["kind"] == kind and r["seq"] < before), key=lambda r: -r["seq"])
+        return [{"seq": r["seq"], "entry": r["payload"]} for r in rows[:limit]]
+
+    async def summarize(previous, entries):
+        return f"{previous}+{len(entries)}"
+
+    store = GameSessionStore(writer=object(), backend="memory", flush_interval=0, journal_path=None)
+    history = GameHistory(inserter=insert, fetcher=fetch, summarizer=summarize, store=store)
+
+    async def scenario():
+        await store.adopt(SimpleNamespace(session_id="s1", room_code=None, state={}, history=[], players={}))
+        await history.append("s1", {"history": [{"turn": i} for i in range(5)]}, {"history": 0})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        await store.mutate("s1", lambda s: {
+            "history": [{"turn": i} for i in range(5, 8)],
+            "state": {**s.state, OFFSETS_KEY: {"history": 5}},
+        })
+        session = await store.get("s1")
+        first = await history.page(session, limit=4)
+        second = await history.page(session, before=first["next_cursor"], limit=4)
+        return session, first, second
+
+    session, first, second = asyncio.run(scenario())
+    assert [e["seq"] for e in first["events"]] == [7, 6, 5, 4]
+    assert first["events"][0]["entry"] == {"turn": 7}
+    assert [e["seq"] for e in second["events"]] == [3, 2, 1, 0] and second["next_cursor"] is None
+    assert session.state[SUMMARY_KEY] == "+5"
+    assert history.stats()["events_written"] == 5
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+from services import game_push
+from services.game_session_store import GameSessionStore, clone
+from services.json_patch import apply_patch
+from utils.websockets import manager
+from tests.test_game_session_store import FakeDB, _row
+from tests.test_ws_broker import FakeSocket, _settle
+
+
+def test_store_changes_are_pushed_as_versioned_deltas(tmp_path):
+    store = GameSessionStore(writer=FakeDB([_row()]), backend="memory", flush_interval=0,
+                             journal_path=str(tmp_path / "journal"))
+    game_push.install(store)
+    game_push.install(store)  # idempotent
+    player, bystander = FakeSocket(), FakeSocket()
+
+    async def scenario():
+        await store.start()
+        await store.adopt(_row())
+        await manager.connect(player, game_push.topic("s1"))
+        await manager.connect(bystander, game_push.topic("s2"))
+        before = await store.get("s1")
+        await store.mutate("s1", lambda s: {"state": {**s.state, "turn": 2}})
+        await store.mutate("s1", lambda s: {})  # no-op: nothing pushed
+        await store.mutate("s1", lambda s: {"state": {**s.state, "story_text": s.state["story_text"] + ["upon"]}})
+        game_push.emit("s1", "chat", message={"message": "hi"})
+        await _settle()
+        await manager.disconnect(player, game_push.topic("s1"))
+        await manager.disconnect(bystander, game_push.topic("s2"))
+        return before, await store.get("s1"), await store.version("s1"), await store.version("missing")
+
+    before, after, version, missing = asyncio.run(scenario())
+    frames = [json.loads(f) for f in player.received]
+    assert [f["type"] for f in frames] == ["delta", "delta", "chat"]
+    assert [f["version"] for f in frames[:2]] == [1, 2]
+    assert bystander.received == [] and len(store._listeners) == 1
+
+    # A client holding the earlier snapshot converges by applying the deltas in order.
+    doc = {"state": clone(before.state)}
+    for frame in frames[:2]:
+        doc = apply_patch(doc, frame["ops"])
+    assert doc["state"] == after.state
+    assert version == after.version == 2 and missing is None
+    assert game_push.etag("s1", 2) == 'W/"s1-2"'
@@ -0,0 +1,178 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.game_session_store import GameSessionStore, MUTABLE_COLUMNS, check_client_ops, clone
+from services.json_patch import JsonPatchError, apply_patch, make_patch
+
+
+def _row(**overrides):
+    fields = dict(
+        id=1, session_id="s1", game_slug="story", room_code="ABC123", status="lobby",
+        max_players=5, host_user_id="u1", players={}, state={"turn": 1, "story_text": ["Once"]},
+        analysis={}, history=[], is_active=True, version=0,
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+class FakeDB:
+    """Dict-backed stand-in for PostgresSessionWriter (same CAS semantics)."""
+
+    def __init__(self, rows=(), fail=False):
+        self.rows = {r.session_id: {n: clone(getattr(r, n)) for n in MUTABLE_COLUMNS + ("version",)} for r in rows}
+        self.fail = fail
+        self.writes = []
+
+    async def load(self, session_ids):
+        return {sid: clone(self.rows[sid]) for sid in session_ids if sid in self.rows}
+
+    async def write(self, batch):
+        if self.fail:
+            raise RuntimeError("db down")
+        conflicts = set()
+        for sid, item in batch.items():
+            row = self.rows.get(sid)
+            if row is None or row["version"] != item["base"]:
+                conflicts.add(sid)
+                continue
+            row.update(clone(item["fields"]), version=item["version"])
+            self.writes.append((sid, item))
+        return conflicts
+
+
+def _store(tmp_path, db):
+    return GameSessionStore(writer=db, backend="memory", flush_interval=0,
+                            journal_path=str(tmp_path / "journal"))
+
+
+def test_reads_are_private_copies_and_flush_writes_dirty_columns(tmp_path):
+    db = FakeDB([_row()])
+    store = _store(tmp_path, db)
+
+    async def scenario():
+        await store.start()
+        await store.adopt(_row())
+        snapshot = await store.get(room_code="ABC123")
+        snapshot.state["story_text"].append("tampered")
+
+        def turn(s):
+            s.state["story_text"].append("upon a time")
+            return {"state": {**s.state, "turn": 2}, "history": s.history + [{"user": "u1"}]}
+
+        updated = await store.mutate("s1", turn)
+        await store.flush()
+        return updated, await store.get("s1")
+
+    updated, current = asyncio.run(scenario())
+    assert updated.state == current.state == {"turn": 2, "story_text": ["Once", "upon a time"]}
+    assert current.version == 1
+    assert db.writes == [("s1", {"fields": {"state": current.state, "history": [{"user": "u1"}]}, "version": 1, "base": 0})]
+    assert store.stats()["hits"] == 2 and store.stats()["dirty_sessions"] == 0
+
+
+def test_failed_patch_leaves_session_untouched(tmp_path):
+    store = _store(tmp_path, FakeDB())
+
+    def bad(s):
+        s.players["u2"] = {}
+        raise ValueError("Room is full")
+
+    async def scenario():
+        await store.adopt(_row())
+        with pytest.raises(ValueError):
+            await store.mutate("s1", bad)
+        with pytest.raises(JsonPatchError):
+            await store.patch("s1", [{"op": "add", "path": "/state/score", "value": 1},
+                                     {"op": "test", "path": "/state/turn", "value": 9}])
+        return await store.get("s1")
+
+    session = asyncio.run(scenario())
+    assert session.players == {} and "score" not in session.state and session.version == 0
+
+
+def test_unflushed_deltas_are_replayed_after_a_crash(tmp_path):
+    db = FakeDB([_row()])
+
+    async def crash():
+        db.fail = True
+        store = _store(tmp_path, db)
+        await store.start()
+        await store.adopt(_row())
+        await store.mutate("s1", lambda s: {"state": {**s.state, "turn": 5}})
+        with pytest.raises(RuntimeError):
+            await store.flush()
+        await store.mutate("s1", lambda s: {"status": "finished"})
+        # Process dies here: no close(), nothing reached Postgres.
+
+    async def restart():
+        db.fail = False
+        store = _store(tmp_path, db)
+        await store.start()
+        await store.flush()
+
+    asyncio.run(crash())
+    asyncio.run(restart())
+    assert db.rows["s1"]["state"] == {"turn": 5, "story_text": ["Once"]}
+    assert db.rows["s1"]["status"] == "finished" and db.rows["s1"]["version"] == 2
+    assert not list(tmp_path.glob("journal.*"))
+
+
+def test_cas_conflict_rebases_pending_deltas_onto_the_newer_row(tmp_path):
+    db = FakeDB([_row()])
+    store = _store(tmp_path, db)
+
+    async def scenario():
+        await store.adopt(_row())
+        await store.mutate("s1", lambda s: {"state": {**s.state, "story_text": s.state["story_text"] + ["mine"]}})
+        # Another worker commits a turn straight to Postgres meanwhile.
+        db.rows["s1"]["state"]["story_text"].append("theirs")
+        db.rows["s1"]["version"] = 4
+        await store.flush()
+        return await store.get("s1")
+
+    session = asyncio.run(scenario())
+    assert session.state["story_text"] == ["Once", "theirs", "mine"]
+    assert db.rows["s1"]["state"]["story_text"] == ["Once", "theirs", "mine"]
+    assert session.version == db.rows["s1"]["version"] == 5
+    stats = store.stats()
+    assert stats["conflicts"] == 1 and stats["rebased"] == 1 and stats["lost_updates"] == 0
+
+
+def test_clients_get_deltas_since_their_version(tmp_path):
+    store = _store(tmp_path, FakeDB([_row()]))
+
+    async def scenario():
+        await store.adopt(_row())
+        await store.mutate("s1", lambda s: {"state": {**s.state, "story_text": s.state["story_text"] + ["upon"]}})
+        await store.patch("s1", [{"op": "replace", "path": "/state/turn", "value": 2}], base_version=0)
+        return (await store.deltas_since("s1", 0), await store.deltas_since("s1", 2),
+                await store.deltas_since("s1", 7), await store.get("s1"))
+
+    ops, none_left, unknown, session = asyncio.run(scenario())
+    assert ops == [{"op": "add", "path": "/state/story_text/-", "value": "upon"},
+                   {"op": "replace", "path": "/state/turn", "value": 2}]
+    assert none_left == [] and unknown is None
+    client = {name: clone(getattr(_row(), name)) for name in MUTABLE_COLUMNS}
+    assert apply_patch(client, ops)["state"] == session.state
+    assert store.stats()["rebased"] == 1
+
+
+def test_client_ops_must_stay_inside_the_game_state():
+    check_client_ops([{"op": "replace", "path": "/state/score", "value": 3},
+                      {"op": "move", "from": "/state/a", "path": "/state/b"}])
+    for op in ({"op": "add", "path": "/players/intruder", "value": {"is_ready": True}},
+               {"op": "replace", "path": "/is_active", "value": False},
+               {"op": "replace", "path": "/state", "value": {}},
+               {"op": "copy", "from": "/history", "path": "/state/log"}):
+        with pytest.raises(JsonPatchError):
+            check_client_ops([op])
+
+
+def test_make_patch_round_trips():
+    old = {"a": 1, "list": [1, 2], "nested": {"x": [1], "gone": True}, "same": [1, 2, 3]}
+    new = {"a": 2, "list": [1, 2, 3, 4], "nested": {"x": [0]}, "same": [1, 5, 3], "new": None}
+    ops = make_patch(old, new)
+    assert {"op": "add", "path": "/list/-", "value": 3} in ops
+    assert apply_patch(clone(old), ops) == new
@@ -0,0 +1,68 @@
+import asyncio
+
+from services.llm_cache import LLMResponseCache, make_key
+
+
+def test_key_ignores_whitespace_but_not_parameters():
+    a = make_key("m", [{"role": "user", "content": "hello   world\n"}], 0.3, 150)
+    b = make_key("m", [{"role": "user", "content": "hello world"}], 0.3, 150)
+    c = make_key("m", [{"role": "user", "content": "hello world"}], 0.8, 150)
+    assert a == b
+    assert a != c
+
+
+def test_concurrent_identical_requests_share_one_call():
+    cache = LLMResponseCache(use_redis=False)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer", True
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_compute("k", "site", compute) for _ in range(5)))
+        results.append(await cache.get_or_compute("k", "site", compute))
+        return results
+
+    assert asyncio.run(run()) == ["answer"] * 6
+    assert len(calls) == 1
+    stats = cache.stats()["sites"]["site"]
+    assert stats["misses"] == 1 and stats["hits"] == 5 and stats["coalesced"] == 4
+
+
+def test_a_cancelled_leader_hands_over_to_a_follower():
+    cache = LLMResponseCache(use_redis=False)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"answer {len(calls)}", True
+
+    async def run():
+        leader = asyncio.ensure_future(cache.get_or_compute("k", "site", compute))
+        await asyncio.sleep(0)
+        followers = asyncio.gather(*(cache.get_or_compute("k", "site", compute) for _ in range(3)))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await followers
+
+    assert asyncio.run(run()) == ["answer 2"] * 3
+    assert len(calls) == 2
+    assert cache.stats()["sites"]["site"]["coalesced"] == 2
+
+
+def test_fallbacks_are_not_cached():
+    cache = LLMResponseCache(use_redis=False)
+    outcomes = iter([("fallback", False), ("real", True)])
+
+    async def compute():
+        return next(outcomes)
+
+    async def run():
+        first = await cache.get_or_compute("k", "site", compute)
+        second = await cache.get_or_compute("k", "site", compute)
+        return first, second
+
+    assert asyncio.run(run()) == ("fallback", "real")
@@ -0,0 +1,75 @@
+import asyncio
+
+from api.routers import _llm
+from services.model_health import ModelHealthTracker
+
+
+def test_hedge_fires_next_candidate_and_keeps_fastest(monkeypatch):
+    monkeypatch.setattr(_llm, "LLM_HEDGE_DELAY_MS", 20)
+    monkeypatch.setattr(_llm, "model_health", ModelHealthTracker())
+    started, cancelled = [], []
+
+    async def call(model):
+        started.append(model)
+        try:
+            await asyncio.sleep({"slow": 1.0, "fast": 0.01}[model])
+        except asyncio.CancelledError:
+            cancelled.append(model)
+            raise
+        return model
+
+    result = asyncio.run(_llm._hedged(["slow", "fast"], call))
+    assert result == "fast"
+    assert started == ["slow", "fast"]
+    assert cancelled == ["slow"]
+
+
+def test_failed_candidate_falls_through_immediately(monkeypatch):
+    monkeypatch.setattr(_llm, "LLM_HEDGE_DELAY_MS", 10_000)
+    monkeypatch.setattr(_llm, "model_health", ModelHealthTracker())
+
+    async def call(model):
+        if model == "broken":
+            raise RuntimeError("429")
+        return "ok"
+
+    assert asyncio.run(_llm._hedged(["broken", "good"], call)) == "ok"
+
+
+def test_unhealthy_models_are_demoted():
+    tracker = ModelHealthTracker(min_samples=3)
+    for _ in range(5):
+        tracker.record_error("a", 0.1)
+        tracker.record_success("b", 0.2)
+    assert tracker.order(["a", "b", "c"]) == ["b", "c", "a"]
+    assert tracker.hedge_delay("b", default=4.0) == 0.2
+    assert tracker.hedge_delay("c", default=4.0) == 4.0
+
+
+def test_cache_key_does_not_follow_health_order(monkeypatch):
+    from services.llm_cache import LLMResponseCache
+
+    class Reordering:
+        flips = 0
+
+        def order(self, models):
+            self.flips += 1
+            return models[::-1] if self.flips % 2 else list(models)
+
+    calls = []
+
+    async def fake_completion(system, user_prompt, **kwargs):
+        calls.append(user_prompt)
+        return "answer"
+
+    monkeypatch.setattr(_llm, "model_health", Reordering())
+    monkeypatch.setattr(_llm, "llm_cache", LLMResponseCache(use_redis=False))
+    monkeypatch.setattr(_llm, "chat_completion", fake_completion)
+
+    async def run():
+        first = await _llm.safe_chat_completion("sys", "hi", cache_site="site")
+        second = await _llm.safe_chat_completion("sys", "hi", cache_site="site")
+        return first, second
+
+    assert asyncio.run(run()) == ("answer", "answer")
+    assert len(calls) == 1
@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from api.routers import _llm
+from core.streaming import LLMStreamMiddleware
+from services.llm_stream import iter_sse_deltas
+from services.model_health import ModelHealthTracker
+
+
+def _app(monkeypatch, saved):
+    async def fake_tokens(url, payload, headers):
+        assert payload["stream"] is True
+        for token in ["Once ", "upon ", "a time"]:
+            yield token
+
+    monkeypatch.setattr(_llm, "OPENROUTER_API_KEY", "test")
+    monkeypatch.setattr(_llm, "_stream_tokens", fake_tokens)
+    monkeypatch.setattr(_llm, "model_health", ModelHealthTracker())
+    monkeypatch.setattr(_llm, "ttft_health", ModelHealthTracker())
+
+    app = FastAPI()
+    app.add_middleware(LLMStreamMiddleware)
+
+    @app.post("/games/{slug}/action")
+    async def action(slug: str):
+        if slug == "missing":
+            raise HTTPException(status_code=404, detail="Session not found")
+        text = await _llm.safe_chat_completion("sys", "go")
+        # A second LLM call in the same request must not stream.
+        assert _llm.claim_sink() is None
+        saved.append(text)
+        return {"ok": True, "narrative": text}
+
+    return TestClient(app)
+
+
+def _events(body: str):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_action_streams_tokens_then_persisted_result(monkeypatch):
+    saved = []
+    client = _app(monkeypatch, saved)
+    resp = client.post("/games/demo/action", headers={"Accept": "text/event-stream"})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = _events(resp.text)
+    assert [e["text"] for e in events if e["type"] == "token"] == ["Once ", "upon ", "a time"]
+    assert events[-1] == {"type": "done", "status": 200, "data": {"ok": True, "narrative": "Once upon a time"}}
+    assert saved == ["Once upon a time"]
+
+
+def test_plain_requests_and_early_errors_are_unchanged(monkeypatch):
+    client = _app(monkeypatch, [])
+    missing = client.post("/games/missing/action?stream=ndjson")
+    assert missing.status_code == 404
+    assert missing.json() == {"detail": "Session not found"}
+
+
+def test_sse_delta_parser_skips_comments_and_stops_at_done():
+    raw = (
+        ": OPENROUTER PROCESSING\n\n"
+        'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n'
+        'data: {"choices":[{"delta":{"content":"Hi"}}]}\n\n'
+        'data: {"choices":[{"delta":{"content":" there"}}]}\n\n'
+        "data: [DONE]\n\n"
+        'data: {"choices":[{"delta":{"content":"ignored"}}]}\n\n'
+    )
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=raw))
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", "http://llm/v1/chat/completions") as resp:
+                return [d async for d in iter_sse_deltas(resp)]
+
+    assert asyncio.run(run()) == ["Hi", " there"]
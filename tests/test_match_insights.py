@@ -0,0 +1,68 @@
+import asyncio
+
+from elinity_ai.insights._insights import ElinityInsights
+from services.llm_cache import LLMResponseCache
+from services.match_insights import MatchInsights
+
+CANDIDATES = [("bob", "Bob", "hiking,jazz"), ("carol", "Carol", "chess"), ("dave", "Dave", "")]
+
+
+class _Generator:
+    """Answers batches except for `skip` names; records every completion."""
+
+    match_type_for = staticmethod(ElinityInsights.match_type_for)
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.batches = []
+        self.singles = []
+
+    async def abatch_insights(self, query, viewer_interests, candidates, match_type="general"):
+        await asyncio.sleep(0)
+        self.batches.append([name for _, name, _ in candidates])
+        return {ref: f"{match_type}: {name} likes {interests}" for ref, name, interests in candidates if name not in self.skip}
+
+    async def agenerate_insight(self, query, user_id, user_name, score, user_interests, match_type="general"):
+        self.singles.append(user_name)
+        return f"single: {user_name}"
+
+
+def test_misses_are_batched_and_cached_per_profile_version():
+    generator = _Generator()
+    service = MatchInsights(generator=generator, cache=LLMResponseCache(use_redis=False), batch_size=2)
+
+    async def scenario():
+        first = await service.insights_for("me", "jazz", CANDIDATES, "romantic")
+        again = await service.insights_for("me", "jazz", CANDIDATES, "romantic")
+        # Carol edits her interests, and the viewer searches in another mode: only those are regenerated.
+        edited = await service.insights_for("me", "jazz", [("carol", "Carol", "go")] + CANDIDATES[:1])
+        return first, again, edited
+
+    first, again, edited = asyncio.run(scenario())
+    assert first == again
+    assert first["bob"] == "romantic: Bob likes hiking,jazz"
+    assert generator.batches == [["Bob", "Carol"], ["Carol", "Bob"]]
+    # A one-candidate remainder skips the batch prompt; that path keeps its own response cache.
+    assert generator.singles == ["Dave", "Dave"]
+    assert edited == {"carol": "general: Carol likes go", "bob": "general: Bob likes hiking,jazz"}
+    assert service.stats()["hits"] == 2
+
+
+def test_refs_missing_from_the_batch_fall_back_and_concurrent_requests_coalesce():
+    generator = _Generator(skip={"Carol"})
+    service = MatchInsights(generator=generator, cache=LLMResponseCache(use_redis=False))
+
+    async def scenario():
+        return await asyncio.gather(*(service.insights_for("me", "", CANDIDATES) for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert results[0] == results[1] == results[2]
+    assert results[0]["carol"] == "single: Carol"
+    assert len(generator.batches) == 1 and generator.singles == ["Carol"]
+    assert service.stats()["coalesced"] == 6
+
+
+def test_parse_batch_tolerates_fences_and_drops_bad_items():
+    text = 'Sure!\n```json\n{"insights": [{"ref": 1, "insight": " Warm. "}, {"ref": "2"}, {"insight": "x"}]}\n```'
+    assert ElinityInsights._parse_batch(text) == {"1": "Warm."}
+    assert ElinityInsights._parse_batch("no json here") == {}
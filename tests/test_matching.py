@@ -0,0 +1,96 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+from services.matching import CandidateMatrix, MatchingEngine, profile_of
+
+INTERESTS = [f"interest-{i}" for i in range(150)]  # spans several 64-bit words
+CITIES = ["Berlin", "berlin", "Lagos", "Lima", "", None]
+
+
+def calculate_heuristic_score(user_a, user_b):
+    """The per-candidate loop the engine replaces (api/routers/connections.py)."""
+    score = 0.1
+    overlap = len(set(user_a.interests_and_hobbies.interests) & set(user_b.interests_and_hobbies.interests))
+    if overlap > 0:
+        score += min(overlap * 0.2, 0.5)
+    a_loc = (user_a.personal_info.location or ".").lower()
+    b_loc = (user_b.personal_info.location or "..").lower()
+    if a_loc == b_loc:
+        score += 0.3
+    return min(score, 0.99)
+
+
+def _tenant(tenant_id, rng):
+    return SimpleNamespace(
+        id=tenant_id,
+        email=f"{tenant_id}@example.com",
+        interests_and_hobbies=SimpleNamespace(interests=rng.sample(INTERESTS, rng.randint(0, 6))),
+        personal_info=SimpleNamespace(location=rng.choice(CITIES)),
+        big_five_traits=SimpleNamespace(**{t: rng.random() for t in (
+            "openness", "conscientiousness", "extraversion", "agreeableness", "neuroticism")}),
+    )
+
+
+def test_vectorized_scores_match_the_python_heuristic_and_rank_globally():
+    rng = random.Random(7)
+    people = [_tenant(f"t{i}", rng) for i in range(2000)]
+    people[0].interests_and_hobbies.interests = INTERESTS[::4]
+    people[0].personal_info.location = "Berlin"
+    matrix = CandidateMatrix(capacity=16)
+    for person in people:
+        matrix.upsert(*profile_of(person))
+    me = people[0]
+
+    scores = matrix.scores(me.interests_and_hobbies.interests, me.personal_info.location)
+    expected = [calculate_heuristic_score(me, other) for other in people]
+    assert [round(s, 9) for s in scores.tolist()] == [round(s, 9) for s in expected]
+
+    exclude = {"t1", "t2"}
+    top = matrix.top_k(profile_of(me), k=10, exclude={"t0", *exclude})
+    best = sorted((s for p, s in zip(people, expected) if p.id not in exclude | {"t0"}), reverse=True)[:10]
+    assert [score for _, score in top] == best
+    assert not {tenant_id for tenant_id, _ in top} & (exclude | {"t0"})
+
+    threshold = matrix.top_k(profile_of(me), k=5000, exclude={"t0"}, min_score=0.6)
+    assert threshold and all(score >= 0.6 for _, score in threshold)
+    assert len(threshold) == sum(1 for p, s in zip(people[1:], expected[1:]) if s >= 0.6)
+
+    matrix.remove(top[0][0])
+    assert top[0][0] not in {tenant_id for tenant_id, _ in matrix.top_k(profile_of(me), k=10)}
+
+
+def test_engine_skips_synthetic_accounts_and_observes_profile_edits():
+    rng = random.Random(3)
+    rows = [
+        ("real-1", "a@example.com", ["chess", "jazz"], "Paris", None),
+        ("guest_1", "guest_1@elinity.ai", ["chess", "jazz"], "Paris", None),
+        ("real-2", "host_2@example.com", ["chess"], "Paris", None),
+        ("real-3", "c@example.com", [], "Oslo", None),
+    ]
+    engine = MatchingEngine(loader=lambda: iter(rows))
+    me = _tenant("me", rng)
+    me.interests_and_hobbies.interests = ["chess", "jazz"]
+    me.personal_info.location = "paris"
+
+    async def scenario():
+        first = await engine.top_k(me, k=5)
+        changed = _tenant("real-3", rng)
+        changed.interests_and_hobbies.interests = ["chess", "jazz"]
+        changed.personal_info.location = "Paris"
+        engine.observe(changed)
+        return first, await engine.top_k(me, k=1, exclude={"real-1"})
+
+    first, second = asyncio.run(scenario())
+    assert [tenant_id for tenant_id, _ in first] == ["real-1", "real-3"]
+    assert first[0][1] == 0.1 + 0.4 + 0.3
+    assert second == [("real-3", first[0][1])]
+
+
+def test_semantic_neighbours_are_boosted_by_similarity():
+    matrix = CandidateMatrix()
+    for tenant_id in ("a", "b", "c"):
+        matrix.upsert(tenant_id, [], None, None)
+    top = matrix.top_k(("me", [], None, None), k=3, semantic={"c": 0.9, "b": -0.5, "ghost": 1.0})
+    assert top[0][0] == "c" and abs(top[0][1] - (0.1 + 0.3 * 0.9)) < 1e-9
+    assert {tenant_id: score for tenant_id, score in top[1:]} == {"a": 0.1, "b": 0.1}
@@ -0,0 +1,67 @@
+import asyncio
+
+from services.observer_queue import ObserverQueue
+
+
+def test_burst_of_turns_coalesces_into_one_analysis():
+    runs, pushed = [], []
+
+    async def run(session_id):
+        runs.append(session_id)
+        return {"analysis": session_id}
+
+    async def listener(session_id, session):
+        pushed.append((session_id, session))
+
+    async def scenario():
+        queue = ObserverQueue(run=run, debounce_ms=20, max_wait_ms=1000)
+        queue.add_listener(listener)
+        for _ in range(5):
+            queue.schedule("s1")
+            await asyncio.sleep(0.005)
+        queue.schedule("s2")
+        await asyncio.sleep(0.1)
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert sorted(runs) == ["s1", "s2"]
+    assert stats["coalesced"] == 4 and stats["runs"] == 2
+    assert ("s1", {"analysis": "s1"}) in pushed
+
+
+def test_turn_during_analysis_schedules_one_follow_up():
+    runs = []
+
+    async def run(session_id):
+        runs.append(session_id)
+        await asyncio.sleep(0.05)
+
+    async def scenario():
+        queue = ObserverQueue(run=run, debounce_ms=5, max_wait_ms=1000)
+        queue.schedule("s1")
+        await asyncio.sleep(0.02)  # first analysis is now running
+        for _ in range(3):
+            queue.schedule("s1")
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert runs == ["s1", "s1"]
+
+
+def test_max_wait_bounds_a_continuous_burst():
+    runs = []
+
+    async def run(session_id):
+        runs.append(asyncio.get_running_loop().time())
+
+    async def scenario():
+        queue = ObserverQueue(run=run, debounce_ms=30, max_wait_ms=60)
+        start = asyncio.get_running_loop().time()
+        while asyncio.get_running_loop().time() - start < 0.15:
+            queue.schedule("s1")
+            await asyncio.sleep(0.01)
+        await queue.drain()
+        return start
+
+    start = asyncio.run(scenario())
+    assert runs and runs[0] - start < 0.1
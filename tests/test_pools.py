@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils import redis_pool
+
+
+def test_redis_clients_share_one_pool_per_url_and_loop():
+    url = "redis://localhost:6399/3"
+    a, b = redis_pool.redis_client(url), redis_pool.redis_client(url)
+    assert a.connection_pool is b.connection_pool
+    assert a.connection_pool.max_connections == redis_pool.REDIS_MAX_CONNECTIONS
+
+    async def clients():
+        return redis_pool.async_redis_client(url), redis_pool.async_redis_client(url)
+
+    first = asyncio.run(clients())
+    second = asyncio.run(clients())
+    assert first[0].connection_pool is first[1].connection_pool
+    assert first[0].connection_pool is not second[0].connection_pool  # asyncio pools are per loop
+
+    stats = redis_pool.pool_stats()
+    assert stats["sync redis://localhost:6399/3"] == {"in_use": 0, "idle": 0, "max_connections": redis_pool.REDIS_MAX_CONNECTIONS}
+
+
+def test_pool_records_checkout_waits_and_timeouts(tmp_path):
+    pool = pytest.importorskip("database.pool")  # the database package needs the Postgres driver
+    options = pool.engine_options("sqlite://", name="test-pool")
+    options.update(pool_size=1, max_overflow=0, pool_timeout=0.05)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", **options)
+
+    held = engine.connect()
+    with pytest.raises(Exception):
+        engine.connect()
+    held.close()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    stats = pool.pool_stats({"test-pool": engine})["test-pool"]
+    assert stats["checkouts"] == 3 and stats["timeouts"] == 1
+    assert stats["checked_out"] == 0 and stats["size"] == 1
+    assert sum(stats["wait_histogram"].values()) == 3
+    assert stats["max_wait_ms"] >= 50
+
+
+def test_pgbouncer_mode_disables_the_asyncpg_statement_cache(monkeypatch):
+    pool = pytest.importorskip("database.pool")
+    url = "postgresql+asyncpg://u:p@db/app"
+    assert pool.engine_options(url, is_async=True)["connect_args"]["prepared_statement_cache_size"] > 0
+    monkeypatch.setattr(pool, "DB_PGBOUNCER", True)
+    connect_args = pool.engine_options(url, is_async=True)["connect_args"]
+    assert connect_args["prepared_statement_cache_size"] == 0 and "statement_cache_size" not in connect_args
+    name = connect_args["prepared_statement_name_func"]
+    assert name() != name()
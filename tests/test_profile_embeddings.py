@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from services.embedder import Embedder, HashingBackend
+from services.profile_embeddings import DirtyProfiles, ProfileEmbeddingPipeline, profile_hash
+
+
+def _profile(tenant_id, bio, **extra):
+    return {"id": tenant_id, "password": "hash", "embedding_id": None, "embedding_hash": None,
+            "personal_info": {"first_name": tenant_id, "updated_at": "t0"}, "bio": bio, **extra}
+
+
+class _Store:
+    def __init__(self, profiles):
+        self.profiles = {p["id"]: p for p in profiles}
+        self.index = {}
+        self.described = []
+
+    def load(self, ids):
+        return [dict(self.profiles[i]) for i in ids if i in self.profiles]
+
+    def unembedded(self, limit):
+        return [i for i, p in self.profiles.items() if p["embedding_id"] is None and p["embedding_hash"] is None][:limit]
+
+    def describe(self, profile):
+        self.described.append(profile)
+        return profile.get("bio")
+
+    def last_id(self):
+        return max([p["embedding_id"] or 0 for p in self.profiles.values()])
+
+    def upsert(self, records):
+        self.index.update({r["id"]: r["tenant"]["id"] for r in records})
+
+    def save(self, rows):
+        for row in rows:
+            self.profiles[row["id"]].update(embedding_id=row["embedding_id"], embedding_hash=row["embedding_hash"])
+
+
+def _pipeline(store, dirty, **kwargs):
+    wiring = dict(
+        concurrency=4, load=store.load, unembedded=store.unembedded, describe=store.describe,
+        encoder=Embedder(backend=HashingBackend(dim=16)), last_id=store.last_id, upsert=store.upsert,
+        save=store.save,
+    )
+    return ProfileEmbeddingPipeline(dirty=dirty, **{**wiring, **kwargs})
+
+
+def test_hash_ignores_bookkeeping_fields():
+    a = _profile("a", "likes jazz")
+    b = {**a, "embedding_id": 4, "password": "other", "personal_info": {"first_name": "a", "updated_at": "t1"}}
+    assert profile_hash(a) == profile_hash(b) != profile_hash({**a, "bio": "likes chess"})
+
+
+def test_backfill_then_only_changed_profiles_are_reembedded():
+    store = _Store([_profile("a", "likes jazz"), _profile("b", "hikes"), _profile("c", None)])
+    dirty = DirtyProfiles(url=None)
+    pipeline = _pipeline(store, dirty)
+
+    first = pipeline.run_once()
+    assert first["embedded"] == 2 and first["empty"] == 1
+    assert sorted(store.index) == [1, 2] and store.profiles["c"]["embedding_hash"]
+    assert all("password" not in p for p in store.described)
+    assert pipeline.run_once()["candidates"] == 0  # nothing dirty, nothing left to backfill
+
+    a_id = store.profiles["a"]["embedding_id"]
+    store.profiles["a"]["bio"] = "likes jazz and chess"
+    asyncio.run(dirty.aadd("a"))
+    dirty.add(["b"])  # touched but unchanged
+    run = pipeline.run_once()
+    assert (run["claimed"], run["embedded"], run["unchanged"]) == (2, 1, 1)
+    assert store.profiles["a"]["embedding_id"] == a_id and run["lag_max_s"] is not None
+    assert pipeline.stats()["backlog"] == 0 and pipeline.stats()["last_run"]["embedded"] == 1
+
+
+def test_failed_run_puts_claimed_tenants_back():
+    store = _Store([_profile("a", "likes jazz")])
+    dirty = DirtyProfiles(url=None)
+    dirty.add(["a"], at=100.0)
+
+    def broken(records):
+        raise RuntimeError("index unavailable")
+
+    with pytest.raises(RuntimeError):
+        _pipeline(store, dirty, upsert=broken).run_once()
+    assert dirty.claim(10) == [("a", 100.0)]
+
+
+def test_overlapping_runs_are_skipped_and_ids_are_never_reused():
+    store = _Store([_profile("a", "likes jazz")])
+    dirty = DirtyProfiles(url=None)
+    assert dirty.acquire("other-worker", 60)
+    assert _pipeline(store, dirty).run_once()["skipped"] == "locked"
+    assert store.index == {}
+    dirty.release("other-worker")
+    assert _pipeline(store, dirty).run_once()["embedded"] == 1
+
+    # Ids reserved by a run that hasn't saved them yet are not handed out again.
+    assert dirty.allocate_ids(3, lambda: 1) == 2
+    assert dirty.allocate_ids(2, lambda: 1) == 5
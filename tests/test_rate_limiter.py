@@ -0,0 +1,135 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core.limiter import (
+    Limit, RateLimitMiddleware, RateLimits, at_least, client_ip, parse_limits, route_group, subject_of,
+)
+from services.plan_limits import PlanLimits
+
+
+def test_gcra_allows_the_burst_then_spaces_requests_out():
+    limits = RateLimits(backend="memory")
+
+    async def run():
+        return [await limits.hit("api", "ip:1", (Limit(3, 60), Limit(5, 3600))) for _ in range(4)]
+
+    decisions = asyncio.run(run())
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+    assert decisions[0].limit == Limit(3, 60)
+    assert 19 < decisions[3].retry_after <= 20  # one slot frees up every 60 / 3 seconds
+    # A rejected request isn't counted: the hourly bucket only saw three.
+    assert asyncio.run(limits.hit("api", "ip:1", (Limit(5, 3600),))).remaining == 1
+
+
+def test_local_buckets_are_bounded_and_redis_errors_fall_back():
+    class _DownRedis:
+        def __call__(self):
+            raise ConnectionError("redis down")
+
+    limits = RateLimits(backend="redis", max_local_keys=2, redis_client=_DownRedis())
+
+    async def run():
+        for subject in ("a", "b", "c", "d"):
+            assert (await limits.hit("api", subject, (Limit(1, 60),))).allowed
+        return await limits.hit("api", "d", (Limit(1, 60),))
+
+    assert not asyncio.run(run()).allowed
+    stats = limits.stats()
+    assert stats["local_buckets"] == 2 and stats["redis_errors"] == 1 and stats["redis_down"]
+
+
+def _app(monkeypatch, plans):
+    async def resolve(user_id):
+        return plans[user_id]
+
+    async def subject(scope):
+        auth = dict(scope["headers"]).get(b"authorization", b"").decode()
+        return (f"u:{auth[7:]}", auth[7:]) if auth else ("ip:testclient", None)
+
+    monkeypatch.setattr("core.limiter.subject_of", subject)
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limits=RateLimits(backend="memory"), resolve_limits=resolve,
+                       anonymous=parse_limits("4/minute,20/hour"), authenticated=parse_limits("6/minute,30/hour"),
+                       anonymous_llm=parse_limits("2/minute"), enabled=True)
+
+    @app.get("/feed/")
+    async def feed():
+        return {}
+
+    @app.post("/lumi/chat/")
+    async def chat():
+        return {}
+
+    @app.get("/health")
+    async def health():
+        return {}
+
+    return TestClient(app)
+
+
+def test_middleware_keys_by_user_or_ip_and_meters_llm_routes_by_plan(monkeypatch):
+    client = _app(monkeypatch, {"u1": parse_limits("3/minute")})
+    user = {"Authorization": "Bearer u1"}
+    assert [client.get("/feed/").status_code for _ in range(5)] == [200] * 4 + [429]
+    assert client.get("/health").status_code == 200
+    first = client.get("/feed/", headers=user)  # browsing: the authenticated limit, not the plan
+    assert first.headers["x-ratelimit-limit"] == "6;w=60" and first.headers["x-ratelimit-remaining"] == "5"
+    assert [client.post("/lumi/chat/", headers=user).status_code for _ in range(4)] == [200] * 3 + [429]
+    limited = client.post("/lumi/chat/", headers=user)
+    assert limited.json() == {"detail": "Rate limit exceeded."} and int(limited.headers["retry-after"]) > 0
+    assert client.get("/feed/", headers=user).status_code == 200  # separate bucket from the LLM routes
+
+    assert route_group("/games/truth-arcade/action") == "llm"
+    assert route_group("/games/truth-arcade/state") == "api"
+    assert route_group("/debug/pools") is None
+
+
+def test_a_free_user_is_never_limited_more_tightly_than_anonymous_traffic(monkeypatch):
+    client = _app(monkeypatch, {"free": parse_limits("1/minute,1/hour,1/day")})
+    free = {"Authorization": "Bearer free"}
+    for method, path in (("get", "/feed/"), ("post", "/lumi/chat/")):
+        anonymous = [getattr(client, method)(path).status_code for _ in range(8)]
+        signed_in = [getattr(client, method)(path, headers=free).status_code for _ in range(8)]
+        assert signed_in.count(200) >= anonymous.count(200) > 1
+    assert at_least(parse_limits("1/minute,1/day"), parse_limits("4/minute,20/hour")) == (Limit(4, 60),)
+
+
+def test_buckets_are_keyed_by_window_so_plan_changes_keep_them():
+    limits = RateLimits(backend="memory")
+    assert limits.keys("llm", "u:1", parse_limits("5/minute")) == limits.keys("llm", "u:1", parse_limits("100/minute"))
+
+
+def test_plan_limits_follow_the_subscription_tier_and_are_cached():
+    calls = []
+
+    async def fetch_tier(user_id):
+        calls.append(user_id)
+        return {"paid": "PREMIUM", "vip": "family"}.get(user_id)
+
+    async def fetch_plans():
+        calls.append("plans")
+        return {"free": parse_limits("10/minute"), "premium": parse_limits("100/minute,5000/day")}
+
+    plans = PlanLimits(default=parse_limits("60/minute"), fetch_tier=fetch_tier, fetch_plans=fetch_plans)
+
+    async def run():
+        return [await plans.limits_for(u) for u in ("paid", "nobody", "vip", "paid")]
+
+    paid, free, unknown_tier, paid_again = asyncio.run(run())
+    assert paid == paid_again == (Limit(100, 60), Limit(5000, 86400))
+    assert free == (Limit(10, 60),) and unknown_tier == (Limit(60, 60),)
+    assert calls == ["plans", "paid", "nobody", "vip"]
+
+
+def test_client_ips_drop_ports_and_internal_addresses_are_not_ip_limited():
+    def scope(client, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return {"type": "http", "client": (client, 5000), "headers": headers}
+
+    assert asyncio.run(subject_of(scope("81.2.69.142"))) == ("ip:81.2.69.142", None)
+    assert asyncio.run(subject_of(scope("10.0.0.4"))) == (None, None)  # the proxy, not a client
+    assert client_ip(scope("81.2.69.142:51234")) == "81.2.69.142"
+    assert client_ip(scope("[2606:4700::1111]:443")) == "2606:4700::1111" and client_ip(scope("2606:4700::1111")) == "2606:4700::1111"
@@ -0,0 +1,52 @@
+import sys
+import types
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from core.router_registry import LazyRouterRegistry, LazyRouterMiddleware
+
+
+def _fake_router_module(name: str) -> str:
+    router = APIRouter()
+
+    @router.get("/ping")
+    async def ping():
+        return {"module": name}
+
+    module_path = f"tests._fake_routers.{name}"
+    mod = types.ModuleType(module_path)
+    mod.router = router
+    sys.modules[module_path] = mod
+    return module_path
+
+
+def test_router_is_imported_on_first_matching_request():
+    app = FastAPI()
+    registry = LazyRouterRegistry()
+    registry.register("/alpha", _fake_router_module("alpha"))
+    registry.register("/beta", _fake_router_module("beta"))
+    registry.register("/gamma", "tests._fake_routers.does_not_exist")
+    registry.install(app)
+    app.add_middleware(LazyRouterMiddleware, registry=registry)
+
+    # Catch-all registered after install must not shadow lazily loaded routes.
+    @app.get("/{full_path:path}")
+    async def spa(full_path: str):
+        return {"spa": full_path}
+
+    client = TestClient(app)
+    assert registry.loaded == []
+
+    res = client.get("/alpha/ping")
+    assert res.json() == {"module": "alpha"}
+    assert registry.loaded == ["alpha"]
+    assert "alpha" in registry.timings
+
+    # Unknown module is recorded as an error instead of breaking the app.
+    assert client.get("/gamma/ping").json() == {"spa": "gamma/ping"}
+    assert "does_not_exist" in registry.errors
+
+    # Docs need the full table.
+    client.get("/openapi.json")
+    assert registry.pending == []
+    assert client.get("/beta/ping").json() == {"module": "beta"}
@@ -0,0 +1,96 @@
+import asyncio
+
+from auth.service_key_registry import ServiceKeyRegistry, key_digest
+
+
+class _Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.finds = 0
+        self.updates = []
+
+    def find(self, query):
+        self.finds += 1
+        return [dict(d) for d in self.docs]
+
+    def update_one(self, query, update):
+        self.updates.append((query["_id"], update["$set"]["key_digest"]))
+
+    def watch(self, **kwargs):
+        raise RuntimeError("standalone server")
+
+
+def _fake_bcrypt(calls):
+    def verify(key, key_hash):
+        calls.append(key)
+        return key_hash == f"bcrypt:{key}"
+    return verify
+
+
+def test_keys_are_checked_in_memory_with_a_negative_cache():
+    coll = _Collection([{"_id": 1, "name": "p2", "key_digest": key_digest("good")}])
+    bcrypt_calls = []
+    registry = ServiceKeyRegistry(collection=lambda: coll, verify_hash=_fake_bcrypt(bcrypt_calls), watch=False)
+
+    async def run():
+        await registry.start()
+        for _ in range(3):
+            assert (await registry.verify("good"))["name"] == "p2"
+        assert await registry.verify("bad") is None
+        assert await registry.verify("bad") is None
+
+    asyncio.run(run())
+    stats = registry.stats()
+    assert coll.finds == 1 and bcrypt_calls == []
+    assert stats["hits"] == 3 and stats["rejected"] == 1 and stats["negative_hits"] == 1
+
+
+def test_bcrypt_only_keys_are_verified_once_and_learn_their_digest():
+    coll = _Collection([{"_id": 1, "key_hash": "bcrypt:old"}, {"_id": 2, "key_hash": "bcrypt:other"}])
+    bcrypt_calls = []
+    registry = ServiceKeyRegistry(collection=lambda: coll, verify_hash=_fake_bcrypt(bcrypt_calls), watch=False)
+
+    async def run():
+        assert (await registry.verify("old"))["_id"] == 1
+        assert (await registry.verify("old"))["_id"] == 1
+        assert await registry.verify("guess") is None
+        assert await registry.verify("guess") is None
+
+    asyncio.run(run())
+    # "guess" is bcrypt-checked against the one remaining legacy doc, and not again on retry.
+    assert bcrypt_calls == ["old", "guess"]
+    assert coll.updates == [(1, key_digest("old"))]
+    assert registry.stats()["bcrypt_only"] == 1
+
+
+def test_bcrypt_scans_for_unknown_keys_are_throttled():
+    coll = _Collection([{"_id": 1, "key_hash": "bcrypt:old"}, {"_id": 2, "key_hash": "bcrypt:other"}])
+    bcrypt_calls = []
+    registry = ServiceKeyRegistry(collection=lambda: coll, verify_hash=_fake_bcrypt(bcrypt_calls),
+                                  legacy_rate=0.001, legacy_burst=2, watch=False)
+
+    async def run():
+        return [await registry.verify(key) for key in ("bad-1", "bad-2", "bad-3", "old")]
+
+    assert asyncio.run(run()) == [None] * 4
+    # Two scans of two documents each, then refused without bcrypt; "old" isn't blacklisted.
+    assert bcrypt_calls == ["bad-1", "bad-1", "bad-2", "bad-2"]
+    assert registry.stats()["legacy_throttled"] == 2 and registry.stats()["negative_entries"] == 2
+    registry._legacy_filled_at -= 2000  # two scans' worth of refill
+    assert asyncio.run(registry.verify("old"))["_id"] == 1
+
+
+def test_new_keys_show_up_on_refresh_and_a_failed_refresh_keeps_the_old_ones():
+    coll = _Collection([{"_id": 1, "key_digest": key_digest("a")}])
+    registry = ServiceKeyRegistry(collection=lambda: coll, refresh_interval=0, watch=False)
+
+    async def run():
+        assert await registry.verify("b") is None
+        coll.docs.append({"_id": 2, "key_digest": key_digest("b")})
+        assert await registry.verify("b") is not None  # reloaded, negative entry dropped
+
+        coll.find = lambda query: (_ for _ in ()).throw(ConnectionError("mongo down"))
+        assert await registry.verify("a") is not None
+
+    asyncio.run(run())
+    assert registry.stats()["refresh_errors"] == 1
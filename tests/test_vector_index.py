@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+
+import services.vector_index as vector_index
+from services.vector_index import VectorIndex, get_vector_index, refresh_vector_index
+
+
+def _clustered(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dim)).astype(np.float32)
+    return centers[rng.integers(0, 20, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def test_ivf_search_recall_add_delete_and_snapshot(tmp_path):
+    vectors = _clustered(3000, 32)
+    index = VectorIndex(path=str(tmp_path / "profiles"), dim=32, nprobe=8, train_min=1000, capacity=64)
+    index.add(range(1, 3001), vectors, labels=[f"tenant-{i}" for i in range(1, 3001)])
+    assert index.maybe_train() and index.stats()["lists"] > 1
+
+    report = index.recall_at_k(k=10, queries=50)
+    assert report["recall"] >= 0.9
+
+    hits = index.search(vectors[41], k=5, exclude=[42])
+    assert 42 not in {i for i, _ in hits} and len(hits) == 5
+    assert hits == sorted(hits, key=lambda h: -h[1])
+
+    # Upsert moves a vector; delete removes it; freed slots wait for the next snapshot.
+    index.add([7], [vectors[99]])
+    assert index.search(vectors[99], k=2)[0][1] > 0.999 and 7 in {i for i, _ in index.search(vectors[99], k=2)}
+    assert index.delete([7, 12345]) == 1 and 7 not in index
+    assert index.stats()["pending_free_slots"] == 1
+    index.save()
+
+    reloaded = VectorIndex(path=str(tmp_path / "profiles"), dim=32, nprobe=8)
+    assert reloaded.load()
+    assert len(reloaded) == 2999 and 7 not in reloaded and reloaded.labels[100] == "tenant-100"
+    assert reloaded.search(vectors[41], k=5, exclude=[42]) == hits
+    reloaded.add([7], [vectors[7]])  # reuses the freed slot, no growth
+    assert reloaded.capacity == index.capacity
+
+
+def test_small_index_is_exact_until_trained():
+    index = VectorIndex(path=None, dim=4, train_min=100)
+    index.add([1, 2, 3], [[1, 0, 0, 0], [0.9, 0.1, 0, 0], [0, 0, 1, 0]])
+    assert not index.maybe_train()
+    assert [i for i, _ in index.search([1, 0, 0, 0], k=2)] == [1, 2]
+    assert index.search([1, 0, 0, 0], k=5, exclude=[1])[0][0] == 2
+
+
+def test_newer_snapshots_are_swapped_in_by_refresh_only(tmp_path, monkeypatch):
+    path = str(tmp_path / "profiles")
+    writer = VectorIndex(path=path, dim=4)
+    writer.add([1], [[1, 0, 0, 0]], labels=["a"])
+    writer.save()
+    reader = VectorIndex(path=path, dim=4)
+    reader.load()
+    monkeypatch.setattr(vector_index, "_index", reader)
+
+    writer.add([2], [[0, 1, 0, 0]], labels=["b"])
+    writer.save()
+    os.utime(writer._meta_path(), (1, os.path.getmtime(writer._meta_path()) + 1))
+    assert get_vector_index() is reader and 2 not in reader  # the request path never reloads
+    assert refresh_vector_index() and not refresh_vector_index()
+    assert get_vector_index() is not reader and 2 in get_vector_index()
+    assert 2 not in reader  # searches holding the old snapshot are unaffected
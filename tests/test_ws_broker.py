@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+from utils.rooms import Room
+from utils.websockets._broker import MemoryBroker
+from utils.websockets._manager import ConnectionManager
+from utils.websockets._outbound import Outbound, RoomMetrics
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0, fail=False):
+        self.received = []
+        self.delay = delay
+        self.fail = fail
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        if self.fail:
+            raise RuntimeError("gone")
+        await asyncio.sleep(self.delay)
+        self.received.append(frame)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+class LoopbackBus:
+    """Stands in for Redis pub/sub between managers ("workers") in one process."""
+
+    def __init__(self):
+        self.nodes = []
+
+    def broker(self):
+        bus = self
+
+        class Broker(MemoryBroker):
+            name = "loopback"
+
+            async def start(self, deliver):
+                self.deliver = deliver
+                self.rooms = set()
+                bus.nodes.append(self)
+
+            async def subscribe(self, room_id):
+                self.rooms.add(room_id)
+
+            async def unsubscribe(self, room_id):
+                self.rooms.discard(room_id)
+
+            async def publish(self, room_id, frame, key=None):
+                for node in bus.nodes:
+                    if node is not self and room_id in node.rooms:
+                        await node.deliver(room_id, frame, key)
+
+        return Broker()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_broadcast_reaches_sockets_on_other_workers():
+    bus = LoopbackBus()
+    worker_a, worker_b = ConnectionManager(bus.broker()), ConnectionManager(bus.broker())
+    a1, a2, b1, other = FakeSocket(), FakeSocket(), FakeSocket(), FakeSocket()
+
+    async def scenario():
+        await worker_a.connect(a1, "room")
+        await worker_a.connect(a2, "room")
+        await worker_b.connect(b1, "room")
+        await worker_b.connect(other, "elsewhere")
+        await worker_a.broadcast("room", {"type": "chat", "message": "hi"})
+        await _settle()
+        await worker_b.disconnect(b1, "room")
+        await worker_a.broadcast("room", {"type": "chat", "message": "bye"})
+        await _settle()
+
+    asyncio.run(scenario())
+    hi = '{"type":"chat","message":"hi"}'
+    # One encoded frame per broadcast, shared by every socket.
+    assert a1.received[0] is a2.received[0] and a1.received[0] == hi
+    assert b1.received == [hi] and other.received == []
+    assert len(a1.received) == 2 and worker_b.stats()["rooms"] == 1
+
+
+def test_reconnect_during_unsubscribe_keeps_the_room_subscribed():
+    bus = LoopbackBus()
+    broker = bus.broker()
+    worker = ConnectionManager(broker)
+    first, second = FakeSocket(), FakeSocket()
+
+    async def scenario():
+        await worker.connect(first, "room")
+        original = broker.unsubscribe
+
+        async def slow_unsubscribe(room_id):
+            await asyncio.sleep(0.01)
+            await original(room_id)
+
+        broker.unsubscribe = slow_unsubscribe
+        leaving = asyncio.ensure_future(worker.disconnect(first, "room"))
+        await asyncio.sleep(0)
+        await worker.connect(second, "room")
+        await leaving
+
+    asyncio.run(scenario())
+    assert "room" in broker.rooms and worker.stats()["rooms"] == 1
+
+
+def test_slow_socket_does_not_stall_the_room_and_failed_sockets_are_removed():
+    manager = ConnectionManager(MemoryBroker())
+    fast, slow, broken = FakeSocket(), FakeSocket(delay=10), FakeSocket(fail=True)
+
+    async def scenario():
+        for ws in (fast, slow, broken):
+            await manager.connect(ws, "room")
+        for i in range(100):
+            await manager.broadcast("room", {"type": "chat", "n": i})
+            await asyncio.sleep(0)
+        await _settle()
+        stats = manager.stats()["busiest_rooms"]["room"]
+        await manager.disconnect(slow, "room")
+        await manager.disconnect(fast, "room")
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert [json.loads(f)["n"] for f in fast.received] == list(range(100))
+    assert stats["connections"] == 2 and stats["send_errors"] == 1
+    assert stats["dropped"] > 0 and stats["queue_depth"] <= 64
+    assert manager.stats()["rooms"] == 0
+
+
+def test_coalesce_and_disconnect_policies():
+    async def scenario():
+        slow = FakeSocket(delay=10)
+        dead = []
+
+        async def on_dead(ob):
+            dead.append(ob)
+            ob.close()
+
+        coalescing = Outbound(slow, RoomMetrics(), on_dead, maxsize=4, policy="coalesce")
+        coalescing.offer("first")
+        await _settle()  # the writer is now stuck sending "first"
+        for n in range(10):
+            coalescing.offer(f"state-{n}", key="state")
+        coalescing.offer("chat")
+        queued = [item[0] for item in coalescing._queue]
+
+        strict = Outbound(FakeSocket(delay=10), RoomMetrics(), on_dead, maxsize=2, policy="disconnect")
+        for n in range(4):
+            strict.offer(f"m{n}")
+        await _settle()
+        coalescing.close()
+        return queued, coalescing.metrics.coalesced, strict, dead
+
+    queued, coalesced, strict, dead = asyncio.run(scenario())
+    assert queued == ["state-9", "chat"] and coalesced == 9
+    assert dead == [strict] and strict.websocket.closed_with == 1013
+
+
+def test_room_broadcast_survives_failing_connection():
+    room = Room("r1")
+    good, bad = FakeSocket(), FakeSocket(fail=True)
+
+    async def scenario():
+        room.add_connection(good)
+        room.add_connection(bad)
+        await room.broadcast({"type": "chat"})
+        await _settle()
+        await room.broadcast({"type": "chat", "n": 2})
+        await _settle()
+
+    asyncio.run(scenario())
+    assert len(good.received) == 2 and room.get_connections() == {good}
@@ -0,0 +1,40 @@
+"""Process-wide MongoDB clients.
+
+A `MongoClient` owns a connection pool and its server-monitoring threads, so
+building one per call pays connection setup (TLS, auth) every time.
+`mongo_client(url)` returns one shared client per URL, with up to
+MONGO_MAX_POOL_SIZE pooled connections.
+"""
+import threading
+from typing import Dict, Optional
+
+from utils.settings import MONGO_DB_URL, MONGO_MAX_POOL_SIZE, MONGO_SERVER_SELECTION_TIMEOUT_MS
+
+_lock = threading.Lock()
+_clients: Dict[str, object] = {}
+
+
+def mongo_client(url: Optional[str] = None):
+    """The shared client for `url` (default MONGO_DB_URL)."""
+    url = url or MONGO_DB_URL
+    if not url:
+        raise RuntimeError("MONGO_DB_URL not configured")
+    from pymongo import MongoClient
+
+    with _lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = MongoClient(
+                url,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            )
+    return client
+
+
+def close_all():
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
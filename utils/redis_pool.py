@@ -0,0 +1,87 @@
+"""Process-wide Redis connection pools.
+
+Every Redis user in the app (`get_redis_client`, the LLM cache, the game
+store, the embedding pipeline, the websocket broker, ...) takes its client
+from here instead of opening its own pool or a connection per request:
+
+- `redis_client(url)`: sync client on one shared `ConnectionPool` per URL;
+- `async_redis_client(url)`: `redis.asyncio` client on one shared pool per
+  URL and event loop (asyncio connections can't cross loops, and Celery
+  tasks run their own loops).
+
+Pools hold up to REDIS_MAX_CONNECTIONS connections, with socket timeouts and
+periodic health checks. `pool_stats()` reports their usage.
+"""
+import asyncio
+import threading
+import weakref
+from typing import Dict
+
+from utils.settings import (
+    REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_PASSWORD,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_URL,
+)
+
+_lock = threading.Lock()
+_sync_pools: Dict[str, object] = {}
+_async_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, object]]" = weakref.WeakKeyDictionary()
+
+
+def _pool_kwargs() -> dict:
+    return {
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+        "password": REDIS_PASSWORD,  # used when the URL has none
+    }
+
+
+def redis_client(url: str = REDIS_URL):
+    import redis
+
+    with _lock:
+        pool = _sync_pools.get(url)
+        if pool is None:
+            pool = _sync_pools[url] = redis.ConnectionPool.from_url(url, **_pool_kwargs())
+    return redis.Redis(connection_pool=pool)
+
+
+def async_redis_client(url: str = REDIS_URL):
+    """A `redis.asyncio` client for the running loop (call from a coroutine)."""
+    import redis.asyncio as aioredis
+
+    loop = asyncio.get_running_loop()
+    pools = _async_pools.setdefault(loop, {})
+    pool = pools.get(url)
+    if pool is None:
+        pool = pools[url] = aioredis.ConnectionPool.from_url(url, **_pool_kwargs())
+    return aioredis.Redis(connection_pool=pool)
+
+
+def _usage(pool) -> dict:
+    in_use = len(getattr(pool, "_in_use_connections", ()))
+    idle = len(getattr(pool, "_available_connections", ()))
+    return {"in_use": in_use, "idle": idle, "max_connections": pool.max_connections}
+
+
+def _redact(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    return f"{scheme}://{rest.rpartition('@')[2]}" if rest else url
+
+
+def pool_stats() -> dict:
+    out: Dict[str, dict] = {}
+    with _lock:
+        for url, pool in _sync_pools.items():
+            out[f"sync {_redact(url)}"] = _usage(pool)
+    for pools in list(_async_pools.values()):
+        for url, pool in pools.items():
+            stats = out.setdefault(f"async {_redact(url)}", {"in_use": 0, "idle": 0, "max_connections": 0, "loops": 0})
+            for key, value in _usage(pool).items():
+                stats[key] += value
+            stats["loops"] += 1
+    return out
@@ -1,23 +1,35 @@
+from fastapi import WebSocket
 
+from utils.websockets._outbound import Outbound, RoomMetrics, encode
 
 
 class Room:
     def __init__(self,room_id:str):
         self.room = room_id
         self.active_connections = set()
+        self.metrics = RoomMetrics()
+        self._outbound = {}
 
     def add_connection(self,websocket:WebSocket):
+        if websocket in self.active_connections:
+            return
         self.active_connections.add(websocket)
+        self._outbound[websocket] = Outbound(websocket, self.metrics, self._dead)
 
     def remove_connection(self,websocket:WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
+        outbound = self._outbound.pop(websocket, None)
+        if outbound is not None:
+            outbound.close()
+
+    async def _dead(self, outbound: Outbound):
+        self.remove_connection(outbound.websocket)
 
     def get_connections(self):
         return self.active_connections
-    
+
     async def broadcast(self,message:dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                await self.remove_connection(connection)
\ No newline at end of file
+        """Queue `message` (encoded once) on every connection's writer; never waits on a slow socket."""
+        frame, key = encode(message)
+        for outbound in list(self._outbound.values()):
+            outbound.offer(frame, key)
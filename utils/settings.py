@@ -54,3 +54,32 @@ if ssl_mode_env == "require" or (
     if 'sslmode' not in DATABASE_URL:
         connector = '&' if '?' in DATABASE_URL else '?'
         DATABASE_URL = f"{DATABASE_URL}{connector}sslmode=require"
+
+# Connection pools (database/pool.py, utils/redis_pool.py, utils/mongo_pool.py).
+# Each process has a sync and an async engine, so it opens up to
+# 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections; size workers against
+# Postgres' max_connections.
+DB_POOL_SIZE = _int_env("DB_POOL_SIZE", 10)  # 0: no app-side pool (behind PgBouncer)
+DB_MAX_OVERFLOW = _int_env("DB_MAX_OVERFLOW", 20)
+DB_POOL_TIMEOUT = _int_env("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _int_env("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "no")
+DB_STATEMENT_CACHE_SIZE = _int_env("DB_STATEMENT_CACHE_SIZE", 100)  # SQLAlchemy asyncpg prepared-statement cache per connection
+# PgBouncer in transaction mode: no server-side prepared statements that outlive a transaction.
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") not in ("0", "false", "no")
+REDIS_MAX_CONNECTIONS = _int_env("REDIS_MAX_CONNECTIONS", 100)
+REDIS_SOCKET_TIMEOUT = _int_env("REDIS_SOCKET_TIMEOUT", 5)
+REDIS_HEALTH_CHECK_INTERVAL = _int_env("REDIS_HEALTH_CHECK_INTERVAL", 30)
+MONGO_DB_URL = os.getenv("MONGO_DB_URL")
+MONGO_MAX_POOL_SIZE = _int_env("MONGO_MAX_POOL_SIZE", 50)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = _int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 3000)
+
+# Shared LLM HTTP transport (services/llm_transport.py)
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") not in ("0", "false", "no")
+LLM_TIMEOUT_SECONDS = _int_env("LLM_TIMEOUT_SECONDS", 30)
+LLM_MAX_CONNECTIONS = _int_env("LLM_MAX_CONNECTIONS", 20)
+LLM_MAX_KEEPALIVE_CONNECTIONS = _int_env("LLM_MAX_KEEPALIVE_CONNECTIONS", 10)
+LLM_KEEPALIVE_EXPIRY_SECONDS = _int_env("LLM_KEEPALIVE_EXPIRY_SECONDS", 60)
+# Per-host connection caps, e.g. "openrouter.ai=32,integrate.api.nvidia.com=8".
+# Hosts not listed use LLM_MAX_CONNECTIONS.
+LLM_HOST_LIMITS = os.getenv("LLM_HOST_LIMITS", "")
@@ -6,10 +6,12 @@ from pydantic import BaseModel
 from jose import jwt, JWTError
 from typing import Optional
 from fastapi import Depends, HTTPException, status
-from database.session import get_db, Session, get_async_db
+from database.session import get_db, Session, get_async_db, async_session
+from database.repositories import Repository
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+from sqlalchemy.orm import joinedload
 from models.user import Tenant
+from services.auth_cache import Principal, auth_cache
 from utils.settings import (
     SECRET_KEY,
     JWT_HASH_ALGORITHM,
@@ -54,26 +56,30 @@ def verify_access_token(token: str, db: Session) -> Optional[Tenant]:
         if not user_id:
             return None
         # Get user from database
-        user = db.query(Tenant).filter(Tenant.id == user_id).first()
+        user = db.query(Tenant).filter(Tenant.id == user_id, Tenant.suspended_at.is_(None)).first()
         if not user:
             return None
         return user
     except jwt.JWTError as e: 
         return None
+# Relationships endpoints read from `current_user`; loaded with it because the
+# returned Tenant is detached (no lazy loads).
+CURRENT_USER_OPTIONS = (
+    joinedload(Tenant.personal_info),
+    joinedload(Tenant.interests_and_hobbies),
+    joinedload(Tenant.big_five_traits),
+)
+
+
 async def verify_access_token_async(token: str, db: AsyncSession) -> Optional[Tenant]:
     """Async version: Verify the access token and return the user if valid"""
     if not token:
         return None
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_HASH_ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
+        principal = await auth_cache.principal(token)
+        if principal is None:
             return None
-        result = await db.execute(select(Tenant).where(Tenant.id == user_id))
-        user = result.scalars().first()
-        return user
-    except jwt.JWTError:
-        return None
+        return await Repository(db, Tenant).get(principal.id, options=CURRENT_USER_OPTIONS)
     except Exception:
         return None
 
@@ -93,56 +99,73 @@ def create_refresh_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=JWT_HASH_ALGORITHM)
 
-async def get_current_user(
+def _credentials_error(detail: str = "Invalid authentication credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def get_current_principal(
     request: Request = None,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    """Decode JWT, fetch Tenant, and enforce authentication""" 
-    
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """Authenticate the request and return its Principal (id, role, profile version)
+
+    Served from services/auth_cache.py: a token seen before costs no JWT
+    decode and no query. Use it in endpoints that only need the caller's id
+    or role; get_current_user adds the full Tenant.
+    """
     # Try to get token from Authorization header first
     if not token and request:
-        
         # Fall back to cookie if no Authorization header
         token = request.cookies.get("access_token")
-        
         if token and token.startswith("Bearer "):
             token = token[7:]  # Remove 'Bearer ' prefix
-            
-    
+
     if not token:
-        
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        
+        raise _credentials_error("Not authenticated")
+
     try:
-        
-        user = verify_access_token(token, db)
-        if not user:
-            
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        return user
-    except JWTError as e:
-        
+        principal = await auth_cache.principal(token)
+    except Exception:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during authentication",
         )
-    except Exception as e:
-        
+    if principal is None:
+        raise _credentials_error()
+    return principal
+
+
+async def get_current_user(
+    request: Request = None,
+    principal: Principal = Depends(get_current_principal)
+):
+    """Authenticate the request and return its Tenant, loaded once per request
+
+    The lookup runs on its own short AsyncSession, so it never blocks the
+    loop and holds no pooled connection for the rest of the request. The
+    returned Tenant is detached: columns and CURRENT_USER_OPTIONS are loaded,
+    and changes to it must be written through the endpoint's own session.
+    """
+    cached = getattr(request.state, "current_user", None) if request else None
+    if cached is not None and cached.id == principal.id:
+        return cached
+    try:
+        async with async_session() as db:
+            user = await Repository(db, Tenant).get(principal.id, options=CURRENT_USER_OPTIONS)
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during authentication",
         )
+    if not user:
+        raise _credentials_error()
+    if request:
+        request.state.current_user = user
+    return user
 
 async def get_optional_user(
     request: Request = None,
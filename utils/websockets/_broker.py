@@ -0,0 +1,153 @@
+"""Cross-worker fan-out for `ConnectionManager` broadcasts.
+
+A broadcast is encoded once, queued straight onto the sockets connected to this
+worker and handed to the broker, which relays the same frame (never decoded or
+re-encoded on the way) to every other worker that has sockets in the room:
+
+- ``memory`` (default): single process; nothing to relay.
+- ``redis``: Redis pub/sub, one channel per room (``ws:<channel>:<room_id>``).
+  A worker subscribes to a room's channel while it has local sockets in it,
+  so messages only travel to nodes that need them. Each payload is prefixed
+  with the publishing node's id (so the publisher skips its own copy) and the
+  frame's coalesce key.
+
+Select with WS_BROKER; if Redis is unreachable at start-up the manager falls
+back to ``memory`` and logs a warning.
+"""
+import asyncio
+import os
+import uuid
+from typing import Awaitable, Callable, Optional, Set
+
+from core.logging import logger
+from utils.settings import REDIS_URL
+
+WS_BROKER = os.getenv("WS_BROKER", "memory").lower()
+
+Deliver = Callable[[str, str, Optional[str]], Awaitable[None]]
+
+
+class MemoryBroker:
+    """In-process broker: every subscriber is local, so publish has nothing to do."""
+
+    name = "memory"
+
+    async def start(self, deliver: Deliver):
+        pass
+
+    async def subscribe(self, room_id: str):
+        pass
+
+    async def unsubscribe(self, room_id: str):
+        pass
+
+    async def publish(self, room_id: str, frame: str, key: Optional[str] = None):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"broker": self.name}
+
+
+class RedisBroker:
+    """Redis pub/sub relay between workers."""
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, channel: str = "room"):
+        self.url = url
+        self.prefix = f"ws:{channel}:"
+        self.node_id = uuid.uuid4().hex
+        self._redis = None
+        self._pubsub = None
+        self._deliver: Optional[Deliver] = None
+        self._rooms: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    async def start(self, deliver: Deliver):
+        from utils.redis_pool import async_redis_client
+
+        self._deliver = deliver
+        self._redis = async_redis_client(self.url)
+        await self._redis.ping()
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+
+    async def subscribe(self, room_id: str):
+        self._rooms.add(room_id)
+        await self._pubsub.subscribe(self.prefix + room_id)
+        if self._task is None:
+            # The reader needs a live subscription before it can poll.
+            self._task = asyncio.create_task(self._read())
+
+    async def unsubscribe(self, room_id: str):
+        self._rooms.discard(room_id)
+        await self._pubsub.unsubscribe(self.prefix + room_id)
+
+    async def publish(self, room_id: str, frame: str, key: Optional[str] = None):
+        await self._redis.publish(self.prefix + room_id, f"{self.node_id}\n{key or ''}\n{frame}")
+        self.published += 1
+
+    async def _read(self):
+        while True:
+            try:
+                msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if msg is None:
+                    continue
+                data = msg["data"]
+                if isinstance(data, bytes):
+                    data = data.decode()
+                origin, key, frame = data.split("\n", 2)
+                if origin == self.node_id:
+                    continue
+                channel = msg["channel"]
+                if isinstance(channel, bytes):
+                    channel = channel.decode()
+                self.received += 1
+                await self._deliver(channel[len(self.prefix):], frame, key or None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"WS broker: Redis relay failed ({e}); resubscribing")
+                await asyncio.sleep(1)
+                try:
+                    if self._rooms:
+                        await self._pubsub.subscribe(*(self.prefix + r for r in self._rooms))
+                except Exception:
+                    pass
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def stats(self) -> dict:
+        return {
+            "broker": self.name,
+            "node_id": self.node_id,
+            "subscribed_rooms": len(self._rooms),
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
+
+
+def make_broker(kind: str = WS_BROKER, channel: str = "room"):
+    if kind == "redis":
+        return RedisBroker(channel=channel)
+    return MemoryBroker()
@@ -1,14 +1,46 @@
+import asyncio
 from fastapi import WebSocket
-from typing import Dict, Set
+from typing import Any, Dict, Optional, Set
 from core.logging import logger
+from ._broker import MemoryBroker, WS_BROKER, make_broker
+from ._outbound import Outbound, RoomMetrics, encode
 
 # Store active WebSocket connections
 class ConnectionManager:
-    def __init__(self):
+    """Room-keyed websocket connections; broadcasts reach sockets on every worker.
+
+    A broadcast is encoded once and queued on each local socket's `Outbound`
+    (see _outbound.py), so it never waits on a slow client; the broker (see
+    _broker.py) relays the same frame to other workers with sockets in the room.
+    """
+
+    def __init__(self, broker=None, channel: str = "room"):
         self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.broker = broker if broker is not None else make_broker(WS_BROKER, channel)
+        self._outbound: Dict[str, Dict[WebSocket, Outbound]] = {}
+        self._metrics: Dict[str, RoomMetrics] = {}
+        self._start_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        # Shared by concurrent first callers so nobody subscribes before the broker is up.
+        if self._start_task is None:
+            self._start_task = asyncio.ensure_future(self._start_broker())
+        await self._start_task
+
+    async def _start_broker(self):
+        try:
+            await self.broker.start(self._deliver_local)
+        except Exception as e:
+            logger.warning(f"WS broker '{self.broker.name}' unavailable ({e}); broadcasts stay on this worker")
+            self.broker = MemoryBroker()
+
+    async def close(self):
+        await self.broker.close()
+        self._start_task = None
 
     async def connect(self, websocket: WebSocket, room_id: str, is_accepted: bool = False):
         logger.debug(f"Managing websocket connection for room {room_id}")
+        await self.start()
         # Only accept the connection if it hasn't been accepted yet
         if not is_accepted:
             await websocket.accept()
@@ -16,57 +48,70 @@ class ConnectionManager:
         # Add to active connections
         if room_id not in self.active_connections:
             self.active_connections[room_id] = set()
-        self.active_connections[room_id].add(websocket)
+            self._outbound[room_id] = {}
+            self._metrics[room_id] = RoomMetrics()
+            await self.broker.subscribe(room_id)
+        if websocket not in self.active_connections[room_id]:
+            self.active_connections[room_id].add(websocket)
+            self._outbound[room_id][websocket] = Outbound(
+                websocket, self._metrics[room_id], lambda ob: self.disconnect(ob.websocket, room_id)
+            )
 
     async def disconnect(self, websocket: WebSocket, room_id: str):
         if room_id in self.active_connections:
             self.active_connections[room_id].discard(websocket)
+            outbound = self._outbound[room_id].pop(websocket, None)
+            if outbound is not None:
+                outbound.close()
             if not self.active_connections[room_id]:
                 del self.active_connections[room_id]
+                del self._outbound[room_id]
+                del self._metrics[room_id]
+                await self.broker.unsubscribe(room_id)
+                if room_id in self.active_connections:
+                    # A connect re-created the room while we unsubscribed: its subscription was undone.
+                    await self.broker.subscribe(room_id)
 
     async def broadcast(self, room_id: str, message: dict):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                logger.debug(f"Broadcasting message to room {room_id}")
-                try:
-                    await connection.send_json(message)
-                except:
-                    await self.disconnect(connection, room_id)
+        await self.start()
+        frame, key = encode(message)
+        await self._deliver_local(room_id, frame, key)
+        await self.broker.publish(room_id, frame, key)
 
-# Create a singleton instance of the connection manager
-manager = ConnectionManager()
+    async def _deliver_local(self, room_id: str, frame: str, key: Optional[str] = None):
+        # Snapshot: a full queue under the disconnect policy removes sockets.
+        for outbound in list(self._outbound.get(room_id, {}).values()):
+            outbound.offer(frame, key)
 
+    def send_to(self, websocket: WebSocket, room_id: str, message: dict):
+        """Queue `message` for one socket, in order with the room's broadcasts."""
+        outbound = self._outbound.get(room_id, {}).get(websocket)
+        if outbound is not None:
+            outbound.offer(encode(message)[0])
 
-# Store active WebSocket connections
-class OnboardingConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+    def queue_depth(self, room_id: str) -> int:
+        metrics = self._metrics.get(room_id)
+        return metrics.queued if metrics else 0
 
-    async def connect(self, websocket: WebSocket, room_id: str, is_accepted: bool = False):
-        logger.debug(f"Managing websocket connection for room {room_id}")
-        # Only accept the connection if it hasn't been accepted yet
-        if not is_accepted:
-            await websocket.accept()
-        
-        # Add to active connections
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = set()
-        self.active_connections[room_id].add(websocket)
+    def stats(self, top: int = 20) -> dict:
+        busiest = sorted(self._metrics.items(), key=lambda item: item[1].queued, reverse=True)[:top]
+        return {
+            "rooms": len(self.active_connections),
+            "connections": sum(len(c) for c in self.active_connections.values()),
+            "queued": sum(m.queued for m in self._metrics.values()),
+            "busiest_rooms": {room_id: metrics.snapshot() for room_id, metrics in busiest},
+            **self.broker.stats(),
+        }
 
-    async def disconnect(self, websocket: WebSocket, room_id: str):
-        if room_id in self.active_connections:
-            self.active_connections[room_id].discard(websocket)
-            if not self.active_connections[room_id]:
-                del self.active_connections[room_id]
+# Create a singleton instance of the connection manager
+manager = ConnectionManager()
 
-    async def broadcast(self, room_id: str, message: dict):
-        if room_id in self.active_connections:
-            for connection in self.active_connections[room_id]:
-                logger.debug(f"Broadcasting message to room {room_id}")
-                try:
-                    await connection.send_json(message)
-                except:
-                    await self.disconnect(connection, room_id)
+
+class OnboardingConnectionManager(ConnectionManager):
+    """Onboarding sockets keyed by tenant; only the tenant's own socket, so no relay."""
+
+    def __init__(self):
+        super().__init__(broker=MemoryBroker(), channel="onboarding")
 
 # Create a singleton instance of the connection manager
 onboarding_manager = OnboardingConnectionManager()
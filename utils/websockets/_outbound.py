@@ -0,0 +1,174 @@
+"""Per-connection outbound queues for websocket broadcasts.
+
+A broadcast encodes the message once (`encode`) and offers the frame to each
+connection's `Outbound`: a bounded queue drained by that connection's own
+writer task. `offer` never awaits, so one slow mobile client only backs up its
+own queue instead of stalling the room.
+
+When a queue is full the slow-consumer policy (WS_SLOW_POLICY) decides:
+
+- ``drop_oldest`` (default): discard the oldest queued frame.
+- ``coalesce``: like ``drop_oldest``, but a frame whose coalesce key (message
+  types listed in WS_COALESCE_TYPES, e.g. full ``state`` snapshots) matches
+  one still queued replaces it in place, so a lagging client skips straight
+  to the latest snapshot.
+- ``disconnect``: close the socket (1013, try again later); the client
+  reconnects and resyncs.
+
+`RoomMetrics` tracks queue depth, drops and send latency per room.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple
+
+from core.logging import logger
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "64"))
+WS_SLOW_POLICY = os.getenv("WS_SLOW_POLICY", "drop_oldest").lower()
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_COALESCE_TYPES = tuple(t for t in os.getenv("WS_COALESCE_TYPES", "state,analysis,typing").split(",") if t)
+
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+def encode(message: Any) -> Tuple[str, Optional[str]]:
+    """Wire frame (as `send_json` would produce) and coalesce key for `message`."""
+    frame = json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+    kind = message.get("type") if isinstance(message, dict) else None
+    return frame, kind if kind in WS_COALESCE_TYPES else None
+
+
+class RoomMetrics:
+    def __init__(self, window: int = 256):
+        self.connections = 0
+        self.queued = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.send_errors = 0
+        self._latency: Deque[float] = deque(maxlen=window)
+
+    def record_send(self, seconds: float):
+        self.sent += 1
+        self._latency.append(seconds)
+
+    def snapshot(self) -> dict:
+        latency = sorted(self._latency)
+
+        def pct(p):
+            return round(latency[min(len(latency) - 1, int(len(latency) * p))] * 1000, 2) if latency else None
+
+        return {
+            "connections": self.connections,
+            "queue_depth": self.queued,
+            "max_queue_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+            "send_errors": self.send_errors,
+            "send_latency_p50_ms": pct(0.5),
+            "send_latency_p99_ms": pct(0.99),
+        }
+
+
+class Outbound:
+    """Bounded send queue plus writer task for one websocket."""
+
+    def __init__(
+        self,
+        websocket,
+        metrics: RoomMetrics,
+        on_dead: Callable[["Outbound"], Awaitable[None]],
+        maxsize: int = WS_QUEUE_SIZE,
+        policy: str = WS_SLOW_POLICY,
+        send_timeout: float = WS_SEND_TIMEOUT,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown slow-consumer policy {policy!r}; expected one of {POLICIES}")
+        self.websocket = websocket
+        self.metrics = metrics
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._on_dead = on_dead
+        self._queue: Deque[list] = deque()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+        self.closed = False
+        self._dying = False
+        metrics.connections += 1
+
+    def offer(self, frame: str, key: Optional[str] = None):
+        """Queue `frame` without waiting; applies the slow-consumer policy when full."""
+        if self.closed:
+            return
+        if key is not None and self.policy == "coalesce":
+            for item in self._queue:
+                if item[1] == key:
+                    # Keep its place in line but send the newest payload.
+                    item[0], item[2] = frame, time.perf_counter()
+                    self.metrics.coalesced += 1
+                    return
+        if len(self._queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                if not self._dying:
+                    self._dying = True
+                    self.metrics.slow_disconnects += 1
+                    asyncio.ensure_future(self._kill(code=1013))
+                return
+            self._queue.popleft()
+            self.metrics.queued -= 1
+            self.metrics.dropped += 1
+        self._queue.append([frame, key, time.perf_counter()])
+        self.metrics.queued += 1
+        self.metrics.max_depth = max(self.metrics.max_depth, len(self._queue))
+        self._wakeup.set()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue:
+                frame, _, enqueued = self._queue.popleft()
+                self.metrics.queued -= 1
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(frame), self.send_timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.debug(f"Websocket send failed: {e}")
+                    self.metrics.send_errors += 1
+                    await self._kill()
+                    return
+                self.metrics.record_send(time.perf_counter() - enqueued)
+
+    async def _kill(self, code: Optional[int] = None):
+        if self.closed:
+            return
+        if code is not None:
+            try:
+                await self.websocket.close(code=code)
+            except Exception:
+                pass
+        await self._on_dead(self)
+
+    def close(self):
+        """Stop the writer and drop anything still queued."""
+        if self.closed:
+            return
+        self.closed = True
+        self.metrics.connections -= 1
+        self.metrics.queued -= len(self._queue)
+        self._queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()